@@ -11,6 +11,7 @@ from flask.json.provider import DefaultJSONProvider
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from datetime import datetime
+from app.assets import init_assets, DIST_DIR, IMMUTABLE_CACHE_CONTROL
 
 # Load environment variables from .env file only if not already loaded
 if not os.environ.get('ENV_LOADED'):
@@ -176,15 +177,12 @@ def create_app(test_config=None):
         response.headers['X-XSS-Protection'] = '1; mode=block'
         response.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
         
-        # Add cache control headers for CSS and JavaScript files
-        if response.mimetype == 'text/css' or request.path.endswith('.css'):
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
-        elif response.mimetype == 'application/javascript' or request.path.endswith('.js'):
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-            response.headers['Pragma'] = 'no-cache'
-            response.headers['Expires'] = '0'
+        # Fingerprinted assets never change under their URL; other CSS and
+        # JavaScript files are revalidated before each use
+        if request.path.startswith(f"{app.static_url_path}/{DIST_DIR}/") and response.status_code == 200:
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        elif response.mimetype in ('text/css', 'application/javascript', 'text/javascript') or request.path.endswith(('.css', '.js')):
+            response.headers['Cache-Control'] = 'no-cache'
         
         # Only set HSTS in production
         if not app.debug:
@@ -192,6 +190,13 @@ def create_app(test_config=None):
         
         return response
     
+    # Compress large JSON responses
+    from app.compression import init_compression
+    init_compression(app)
+    
+    # Resolve CSS and JavaScript URLs through the asset manifest
+    init_assets(app)
+    
     # Register blueprints
     from app.routes import main_bp
     app.register_blueprint(main_bp)
@@ -199,6 +204,10 @@ def create_app(test_config=None):
     from app.api.routes import api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
     
+    # A large file arrives as many chunk requests; opening and completing
+    # a chunked upload still count against the limits
+    limiter.exempt(app.view_functions['main.upload_chunk'])
+    
     # Register health check
     from app.healthcheck import healthcheck_bp
     app.register_blueprint(healthcheck_bp)
@@ -243,14 +252,11 @@ def create_app(test_config=None):
         """Add asset versioning to template context"""
         
         def versioned_asset(filename):
-            """Add version to asset filename for cache busting"""
-            version = app.config.get('VERSION', datetime.now().strftime("%Y%m%d%H%M%S"))
-            
-            # Add query string with version
-            if '?' in filename:
-                return f"{filename}&v={version}"
-            else:
-                return f"{filename}?v={version}"
+            """Versioned URL of a static file for cache busting; prefer asset_url"""
+            static_prefix = f"{app.static_url_path}/"
+            if filename.startswith(static_prefix) and '?' not in filename:
+                return app.extensions['asset_url'](filename[len(static_prefix):])
+            return filename
                 
         # Include base_url function to generate proper URLs for assets
         def base_url(path=None):
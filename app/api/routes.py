@@ -2,12 +2,22 @@
 API routes for the Music Mix Analyzer application
 """
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app
 import os
+import threading
 import traceback
+from contextlib import contextmanager
 
 from app.core.audio_analyzer import analyze_mix, convert_numpy_types
-from app.core.database import get_ai_usage_stats
+from app.core.database import get_ai_usage_stats, get_ai_usage_writer, find_song_by_hash, get_songs_by_hashes, get_file_hash, get_song_revision, save_song
+from app.core.analyzer_versions import ANALYZER_VERSION
+from app.core.reanalysis import refresh_song
+from app.core.similarity import get_similarity_index, extract_features
+from app.core.result_cache import get_result_cache
+from app.core.llm_clients import get_llm_client_metrics
+from app.core.llm_router import get_router_stats
+from app.core.upload_storage import get_upload_storage
+from app.core.upload_layout import resolve_upload_path
 from app.api import require_api_key
 
 # Create a Blueprint for the API routes
@@ -39,37 +49,165 @@ def test_data():
         }
     })
 
+# One lock per file hash, so concurrent requests for a file that has no
+# current results analyze it once instead of once per request. Entries are
+# [lock, users] and are dropped once the last waiting request is done.
+_analysis_locks = {}
+_analysis_locks_guard = threading.Lock()
+
+@contextmanager
+def _analysis_lock(file_hash):
+    with _analysis_locks_guard:
+        entry = _analysis_locks.setdefault(file_hash, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _analysis_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _analysis_locks[file_hash]
+
+def _current_analysis(file_hash):
+    """Stored results of a file hash if the current analyzer produced them, else None"""
+    song = find_song_by_hash(file_hash)
+    if song and song.get('analysis') and song.get('analyzer_version') == ANALYZER_VERSION:
+        return song
+    return None
+
+def _analysis_etag(file_hash, revision):
+    """ETag of the analysis of a file hash at a revision of its songs row"""
+    return f"{file_hash}-{ANALYZER_VERSION}-{revision}"
+
 @api_bp.route('/analyze/<file_id>', methods=['GET'])
 @require_api_key
 def analyze_file(file_id):
-    """Analyze a specific file and return the results"""
+    """
+    Return the analysis of an uploaded file
+    
+    Stored results are served when the current analyzer version produced
+    them. Results of an older version get their outdated sections
+    recomputed, and the file is only fully analyzed when nothing is stored.
+    
+    The ETag is derived from the file hash, the analyzer version and the
+    revision of the songs row, which every write of the row bumps, so a
+    rescore or re-analysis changes it. If-None-Match is answered from that
+    single column without reading the stored results. Only the upload lookup
+    runs first, and it may query upload_aliases for a name the file was
+    uploaded under.
+    """
     try:
-        # Sanitize file_id to prevent path traversal
-        file_id = os.path.basename(file_id)
-        
-        # Construct the path to the uploaded file
-        from flask import current_app
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], file_id, f"{file_id}.mp3")
+        # Find the uploaded file by its hash, a name it was uploaded under,
+        # or a legacy id; the path is never built from file_id itself
+        file_path = resolve_upload_path(current_app.config['UPLOAD_FOLDER'], file_id)
         
-        if not os.path.exists(file_path):
+        if not file_path:
             return jsonify({'error': 'File not found'}), 404
+        file_id = os.path.basename(os.path.dirname(file_path))
         
-        # Analyze the mix
-        results = analyze_mix(file_path)
+        file_hash = get_file_hash(file_path)
+        revision = get_song_revision(file_hash)
+        if revision is not None and request.if_none_match.contains_weak(_analysis_etag(file_hash, revision)):
+            response = current_app.response_class(status=304)
+            response.set_etag(_analysis_etag(file_hash, revision))
+            return response
         
-        # Convert NumPy types to standard Python types for JSON serialization
-        results = convert_numpy_types(results)
+        song = _current_analysis(file_hash)
+        from_cache = song is not None
+        if not song:
+            with _analysis_lock(file_hash), get_upload_storage(current_app.config['UPLOAD_FOLDER']).pinned(file_id):
+                # Another request may have analyzed the file while we waited
+                song = _current_analysis(file_hash)
+                from_cache = song is not None
+                previous = find_song_by_hash(file_hash) if not song else None
+                if previous and previous.get('analysis') and not previous['analysis'].get('error'):
+                    # Only the sections of outdated analyzers are recomputed
+                    results, _ = refresh_song(previous, file_path, file_id)
+                    song = {'analysis': results}
+                elif not song:
+                    is_instrumental = previous.get('is_instrumental') if previous else None
+                    
+                    # Analyze the mix
+                    results = analyze_mix(file_path, is_instrumental)
+                    
+                    # Convert NumPy types to standard Python types for JSON serialization
+                    results = convert_numpy_types(results)
+                    
+                    if not results.get('error'):
+                        save_song(
+                            filename=file_id,
+                            original_name=previous.get('original_name') if previous else file_id,
+                            file_path=file_path,
+                            file_hash=file_hash,
+                            is_instrumental=bool(is_instrumental),
+                            analysis_json=results
+                        )
+                    song = {'analysis': results}
         
-        return jsonify({
+        results = song['analysis']
+        response = jsonify({
             'file_id': file_id,
+            'file_hash': file_hash,
+            'analyzer_version': ANALYZER_VERSION,
+            'from_cache': from_cache,
             'results': results,
             'channel_info': results.get('channel_info', {})
         })
+        # Failed analyses and results that could not be brought up to date get no ETag
+        if results.get('analyzer_version') == ANALYZER_VERSION:
+            # The revision read with the results, or the one the save just wrote
+            revision = song.get('revision')
+            if revision is None:
+                revision = get_song_revision(file_hash)
+            response.set_etag(_analysis_etag(file_hash, revision))
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         print(f"Error analyzing file: {str(e)}")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500 
 
+@api_bp.route('/similar/<file_hash>', methods=['GET'])
+@require_api_key
+def similar_mixes(file_hash):
+    """Find the stored mixes whose analysis profile is closest to a song"""
+    try:
+        # Only accept SHA-256 hex digests
+        file_hash = file_hash.lower()
+        if len(file_hash) != 64 or any(c not in '0123456789abcdef' for c in file_hash):
+            return jsonify({'error': 'Invalid file hash'}), 400
+        
+        k = max(1, min(request.args.get('k', default=5, type=int), 50))
+        
+        index = get_similarity_index()
+        vector = index.vector(file_hash)
+        if vector is None:
+            song = find_song_by_hash(file_hash, include_arrays=False)
+            if not song or not song.get('analysis'):
+                return jsonify({'error': 'Song not found'}), 404
+            vector = extract_features(song['analysis'])
+        
+        matches = index.query(vector, k=k, exclude=file_hash)
+        
+        # Songs deleted by another worker may still be indexed; skip them
+        songs = get_songs_by_hashes([match_hash for match_hash, _ in matches])
+        similar = []
+        for match_hash, distance in matches:
+            song = songs.get(match_hash)
+            if song:
+                similar.append(dict(song, distance=round(distance, 4)))
+        
+        return jsonify({
+            'file_hash': file_hash,
+            'library_size': len(index),
+            'similar': similar
+        })
+    except Exception as e:
+        print(f"Error finding similar mixes: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
 @api_bp.route('/ai-stats', methods=['GET'])
 @require_api_key
 def ai_usage_stats():
@@ -94,4 +232,24 @@ def ai_usage_stats():
     except Exception as e:
         print(f"Error retrieving AI usage stats: {str(e)}")
         traceback.print_exc()
-        return jsonify({'error': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/metrics', methods=['GET'])
+@require_api_key
+def runtime_metrics():
+    """Get runtime metrics for the caches of this worker process and the upload storage"""
+    try:
+        cache = get_result_cache()
+        
+        return jsonify({
+            'pid': os.getpid(),
+            'result_cache': cache.stats() if cache else {'enabled': False},
+            'upload_storage': get_upload_storage(current_app.config['UPLOAD_FOLDER']).usage(),
+            'ai_usage_writer': get_ai_usage_writer().stats(),
+            'llm_clients': get_llm_client_metrics(),
+            'llm_router': get_router_stats()
+        })
+    except Exception as e:
+        print(f"Error retrieving runtime metrics: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
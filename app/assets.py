@@ -0,0 +1,190 @@
+"""
+Fingerprinted static assets.
+`python manage.py assets` copies every file in app/static/js and
+app/static/css to app/static/dist under a name containing its content hash,
+concatenates the bundles each page loads, and writes a manifest. Templates
+resolve asset URLs through the manifest; since a hashed file never changes,
+it is served with immutable caching. Without a manifest (e.g. in
+development) assets are served from their source files, versioned by a hash
+of their content.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+from flask import url_for
+
+# Minifiers are optional; without them files are copied as they are
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+ASSET_DIRS = ["js", "css"]
+DIST_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+
+# Characters of the SHA-256 content hash put in file names
+HASH_LENGTH = 12
+
+# Files each page loads, in order, concatenated into one file per bundle
+BUNDLES = {
+    "index.css": ["css/styles.css", "css/modal.css", "css/responsive.css", "css/progress-feedback.css"],
+    "index.js": [
+        "js/progress-feedback.js", "js/main.js", "js/modal.js", "js/mobile.js",
+        "js/feedback.js", "js/faq-data.js", "js/score-animations.js", "js/score-effects.js",
+    ],
+    "about.css": ["css/styles.css", "css/modal.css", "css/responsive.css"],
+    "about.js": ["js/main.js", "js/modal.js", "js/mobile.js", "js/feedback.js", "js/faq-data.js"],
+}
+
+# Cache-Control of fingerprinted files, which never change under their URL
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def minify(content, extension):
+    """
+    Minify JavaScript or CSS if the minifier for it is installed
+
+    Args:
+        content: File content as text
+        extension: '.js' or '.css'
+
+    Returns:
+        Minified or unchanged content
+    """
+    if extension == ".js" and rjsmin is not None:
+        return rjsmin.jsmin(content)
+    if extension == ".css" and rcssmin is not None:
+        return rcssmin.cssmin(content)
+    return content
+
+def _write_hashed(dist_dir, name, content):
+    """Write content as dist_dir/<dir>/<stem>.<hash><ext>; returns the path relative to dist_dir"""
+    data = content.encode("utf-8")
+    stem, extension = os.path.splitext(name)
+    hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{extension}"
+    path = os.path.join(dist_dir, hashed)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return hashed
+
+def build_assets(static_dir, minified=True):
+    """
+    Build the fingerprinted assets and their manifest
+
+    The dist directory is rebuilt from scratch.
+
+    Args:
+        static_dir: The application's static folder
+        minified: Whether to minify the files (needs rjsmin and rcssmin)
+
+    Returns:
+        Manifest dictionary with the hashed path of every file and bundle,
+        relative to the static folder
+    """
+    dist_dir = os.path.join(static_dir, DIST_DIR)
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+
+    sources = {}
+    for asset_dir in ASSET_DIRS:
+        for name in sorted(os.listdir(os.path.join(static_dir, asset_dir))):
+            extension = os.path.splitext(name)[1]
+            if extension != f".{asset_dir}":
+                continue
+            with open(os.path.join(static_dir, asset_dir, name), encoding="utf-8") as f:
+                content = f.read()
+            sources[f"{asset_dir}/{name}"] = minify(content, extension) if minified else content
+
+    manifest = {"files": {}, "bundles": {}}
+    for name, content in sources.items():
+        manifest["files"][name] = f"{DIST_DIR}/{_write_hashed(dist_dir, name, content)}"
+
+    for bundle, names in BUNDLES.items():
+        # The semicolon keeps a file without a trailing one from running into the next
+        separator = "\n;\n" if bundle.endswith(".js") else "\n"
+        content = separator.join(sources[name] for name in names)
+        manifest["bundles"][bundle] = f"{DIST_DIR}/{_write_hashed(dist_dir, f'bundles/{bundle}', content)}"
+
+    manifest_path = os.path.join(dist_dir, MANIFEST_NAME)
+    with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+    size = sum(os.path.getsize(os.path.join(static_dir, path)) for path in manifest["bundles"].values())
+    print(f"Built {len(manifest['files'])} assets and {len(manifest['bundles'])} bundles "
+          f"({size / 1024:.0f} KB of bundles, minified: {minified and (rjsmin, rcssmin) != (None, None)})")
+    return manifest
+
+def load_manifest(static_dir):
+    """
+    Load the asset manifest
+
+    Args:
+        static_dir: The application's static folder
+
+    Returns:
+        Manifest dictionary, or None if the assets have not been built
+    """
+    try:
+        with open(os.path.join(static_dir, DIST_DIR, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        print(f"Error reading the asset manifest: {e}")
+        return None
+
+_source_hashes = {}
+
+def _source_hash(static_dir, filename):
+    """Content hash of a source file, recomputed only when it is modified"""
+    path = os.path.join(static_dir, filename)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    cached = _source_hashes.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, "rb") as f:
+            cached = (mtime, hashlib.sha256(f.read()).hexdigest()[:HASH_LENGTH])
+        _source_hashes[path] = cached
+    return cached[1]
+
+def init_assets(app):
+    """
+    Resolve the asset URLs of templates through the manifest
+
+    The manifest is read once at startup. It is ignored in debug mode, where
+    the source files change all the time, unless ASSETS_USE_MANIFEST=true.
+
+    Args:
+        app: Flask application
+    """
+    use_manifest = os.environ.get("ASSETS_USE_MANIFEST", "false" if app.debug else "true").lower() == "true"
+    manifest = load_manifest(app.static_folder) if use_manifest else None
+    if manifest:
+        print(f"Serving fingerprinted assets from {DIST_DIR}/{MANIFEST_NAME}")
+
+    def asset_url(filename):
+        """URL of a static file that changes whenever its content does"""
+        if manifest and filename in manifest["files"]:
+            return url_for("static", filename=manifest["files"][filename])
+        version = _source_hash(app.static_folder, filename)
+        return url_for("static", filename=filename, v=version) if version else url_for("static", filename=filename)
+
+    def asset_urls(bundle):
+        """URLs of the files of a bundle: the bundle itself once built, else each source file"""
+        if manifest and bundle in manifest["bundles"]:
+            return [url_for("static", filename=manifest["bundles"][bundle])]
+        return [asset_url(filename) for filename in BUNDLES[bundle]]
+
+    app.jinja_env.globals.update(asset_url=asset_url, asset_urls=asset_urls)
+    app.extensions["asset_url"] = asset_url
@@ -0,0 +1,102 @@
+"""
+Compression of JSON responses.
+Responses above a size threshold are sent gzip or brotli encoded, whichever
+the client accepts (brotli preferred when the brotli package is installed).
+"""
+
+import os
+import gzip
+from flask import request
+
+# brotli is optional; without it responses are gzip encoded
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = {"application/json"}
+
+def get_compression_settings():
+    """
+    Get the response compression settings from environment variables
+
+    Returns:
+        Dictionary of settings
+    """
+    return {
+        "enabled": os.environ.get("COMPRESSION_ENABLED", "true").lower() == "true",
+        # Smaller bodies fit in a packet or two and are not worth the CPU
+        "min_size": int(os.environ.get("COMPRESSION_MIN_SIZE", 1024)),
+        "gzip_level": int(os.environ.get("COMPRESSION_GZIP_LEVEL", 6)),
+        "brotli_quality": int(os.environ.get("COMPRESSION_BROTLI_QUALITY", 5)),
+    }
+
+def choose_encoding(accept_encodings):
+    """
+    Pick the content encoding for a client
+
+    Args:
+        accept_encodings: werkzeug Accept object of the Accept-Encoding header
+
+    Returns:
+        'br', 'gzip' or None
+    """
+    if brotli is not None and accept_encodings.quality("br") > 0:
+        return "br"
+    if accept_encodings.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+def compress_response(response, accept_encodings, settings=None):
+    """
+    Compress a response body in place if it is worth it
+
+    Args:
+        response: Flask response object
+        accept_encodings: werkzeug Accept object of the Accept-Encoding header
+        settings: Compression settings, defaults to get_compression_settings()
+
+    Returns:
+        The response object
+    """
+    settings = settings or get_compression_settings()
+    if (not settings["enabled"]
+            or response.mimetype not in COMPRESSIBLE_TYPES
+            or response.direct_passthrough
+            or response.is_streamed
+            or response.status_code < 200
+            or response.status_code in (204, 304)
+            or "Content-Encoding" in response.headers):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    encoding = choose_encoding(accept_encodings)
+    if len(data) < settings["min_size"] or not encoding:
+        return response
+
+    if encoding == "br":
+        compressed = brotli.compress(data, quality=settings["brotli_quality"])
+    else:
+        compressed = gzip.compress(data, compresslevel=settings["gzip_level"])
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+
+    # The encoded bytes differ from the ones the ETag was computed over
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def init_compression(app):
+    """
+    Compress the JSON responses of an application
+
+    Args:
+        app: Flask application
+    """
+    settings = get_compression_settings()
+
+    @app.after_request
+    def compress(response):
+        return compress_response(response, request.accept_encodings, settings)
@@ -0,0 +1,45 @@
+"""
+Versions of the analysis pipeline.
+Every section of the results is stamped with the version of the analyzer
+that produced it, so a change to one analyzer only invalidates that section
+of the stored results instead of everything.
+"""
+
+import json
+import hashlib
+
+# Bump a section's version whenever a change to its analyzer changes the
+# numbers it produces. overall_score is recomputed from the stored sections
+# and needs no audio. Changed weights or ideal curves in scoring.py need no
+# bump; rescore_library applies them to the stored scores.
+SECTION_VERSIONS = {
+    "frequency_balance": 1,
+    "dynamic_range": 1,
+    "stereo_field": 1,
+    "clarity": 2,
+    "harmonic_content": 1,
+    "transients": 1,
+    "3d_spatial": 1,
+    "surround_compatibility": 1,
+    "headphone_speaker_optimization": 1,
+    "visualizations": 1,
+    "overall_score": 1,
+}
+
+# Identifies the whole set of section versions, e.g. for ETags
+ANALYZER_VERSION = hashlib.sha1(json.dumps(SECTION_VERSIONS, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+def stale_sections(results):
+    """
+    Sections of stored results that an older analyzer produced
+
+    Results stored before sections were versioned count as entirely stale.
+
+    Args:
+        results: Dictionary of analysis results
+
+    Returns:
+        List of section names, in pipeline order
+    """
+    stamped = (results or {}).get("section_versions") or {}
+    return [name for name, version in SECTION_VERSIONS.items() if stamped.get(name) != version]
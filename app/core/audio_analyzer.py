@@ -11,6 +11,10 @@ import time  # Add time module for tracking performance
 import traceback  # Add traceback for detailed error logging
 matplotlib.use('Agg')  # Use non-interactive backend
 from .music_theory_data.key_relationships import get_key_relationship_info
+from .analyzer_versions import ANALYZER_VERSION, SECTION_VERSIONS, stale_sections
+from .scoring import (score_frequency_balance, get_frequency_balance_analysis,
+                      score_clarity, get_clarity_analysis, calculate_overall_score)
+from .canonical_audio import load_audio
 import threading
 import concurrent.futures
 
@@ -44,6 +48,42 @@ def convert_numpy_types(obj):
     else:
         return obj
 
+def load_stereo_audio(file_path):
+    """
+    Load an audio file as two channels at its native sample rate
+    
+    Mono files get their channel duplicated; of multi-channel files only
+    the first two channels are kept.
+    
+    Args:
+        file_path: Path to the audio file
+        
+    Returns:
+        Tuple of (audio array of shape (2, samples), sample rate)
+    """
+    print(f"Loading audio file for analysis: {file_path}")
+    load_start = time.time()
+    y, sr = load_audio(file_path)
+    print(f"Audio loaded in {time.time() - load_start:.2f} seconds")
+    print(f"Sample rate: {sr} Hz")
+    print(f"Loaded audio shape: {y.shape}, dimensions: {y.ndim}")
+    print(f"Audio duration: {y.shape[-1]/sr:.2f} seconds")
+    
+    # Handle mono files by duplicating the channel
+    if y.ndim == 1:
+        print("Mono file detected, converting to stereo format")
+        y = np.vstack((y, y))
+    elif y.ndim == 2 and y.shape[0] == 1:
+        print("Single channel detected, converting to stereo format")
+        y = np.vstack((y[0], y[0]))
+    elif y.ndim == 2 and y.shape[0] > 2:
+        print("Multi-channel file detected, using first two channels")
+        print(f"Original channels: {y.shape[0]}")
+        y = y[:2]
+    
+    print(f"Final audio shape: {y.shape}, dimensions: {y.ndim}")
+    return y, sr
+
 def analyze_mix(file_path, is_instrumental=None):
     """
     Analyze an audio file and return metrics about the mix quality.
@@ -142,33 +182,9 @@ def analyze_mix(file_path, is_instrumental=None):
         print(f"{'='*50}\n")
         
         # Step 1: Load audio file
-        print(f"Loading audio file for analysis: {file_path}")
-        load_start = time.time()
-        y, sr = librosa.load(file_path, sr=None, mono=False)
-        print(f"Audio loaded in {time.time() - load_start:.2f} seconds")
-        print(f"Sample rate: {sr} Hz")
+        y, sr = load_stereo_audio(file_path)
+        duration_seconds = float(y.shape[-1] / sr)
         
-        # Check audio shape and calculate duration
-        if y.ndim == 1:
-            print(f"Loaded audio shape: {y.shape}, dimensions: {y.ndim}")
-            print(f"Audio duration: {y.shape[0]/sr:.2f} seconds")
-        else:
-            print(f"Loaded audio shape: {y.shape}, dimensions: {y.ndim}")
-            print(f"Audio duration: {y.shape[1]/sr:.2f} seconds")
-        
-        # Handle mono files by duplicating the channel
-        if y.ndim == 1:
-            print("Mono file detected, converting to stereo format")
-            y = np.vstack((y, y))
-        elif y.ndim == 2 and y.shape[0] == 1:
-            print("Single channel detected, converting to stereo format")
-            y = np.vstack((y[0], y[0]))
-        elif y.ndim == 2 and y.shape[0] > 2:
-            print("Multi-channel file detected, using first two channels")
-            print(f"Original channels: {y.shape[0]}")
-            y = y[:2]
-        
-        print(f"Final audio shape: {y.shape}, dimensions: {y.ndim}")
         print(f"Max amplitude: Left={np.max(np.abs(y[0])):.4f}, Right={np.max(np.abs(y[1])):.4f}")
         
         # Get left and right channels
@@ -360,6 +376,11 @@ def analyze_mix(file_path, is_instrumental=None):
                         results[key][subkey] = default_results[key][subkey]
         
         total_time = time.time() - total_start_time
+        results["duration_seconds"] = duration_seconds
+        results["analysis_time_seconds"] = total_time
+        results["analyzer_version"] = ANALYZER_VERSION
+        results["section_versions"] = dict(SECTION_VERSIONS)
+        
         print(f"\n{'='*50}")
         print(f"ANALYSIS COMPLETE: {file_path}")
         print(f"Total analysis time: {total_time:.2f} seconds ({total_time/60:.2f} minutes)")
@@ -466,45 +487,10 @@ def analyze_frequency_balance(y, sr, is_instrumental=None):
         for band, energy in normalized_energy.items():
             print(f"  {band}: normalized to {energy:.2f}%")
         
-        # Calculate balance score based on ideal curve and deviation
-        print("Calculating balance score against ideal curve...")
-        
-        # Use different ideal curves based on whether the track is instrumental or has vocals
-        if is_instrumental:
-            # Ideal curve for instrumental tracks - more balanced between low and high frequencies
-            ideal_curve = {
-                "sub_bass": 80,
-                "bass": 85,
-                "low_mids": 80,
-                "mids": 75,
-                "high_mids": 70,
-                "highs": 70,
-                "air": 65
-            }
-            print("Using ideal curve for instrumental tracks")
-        else:
-            # Ideal curve for tracks with vocals - more emphasis on mid frequencies
-            ideal_curve = {
-                "sub_bass": 75,
-                "bass": 80,
-                "low_mids": 85,
-                "mids": 90,  # Higher emphasis on mids for vocals
-                "high_mids": 85,
-                "highs": 75,
-                "air": 65
-            }
-            print("Using ideal curve for tracks with vocals")
-        
-        # Calculate deviation from ideal curve
-        deviations = [abs(normalized_energy[band] - ideal_curve[band]) for band in bands.keys()]
-        for i, band in enumerate(bands.keys()):
-            print(f"  {band}: ideal={ideal_curve[band]:.1f}%, actual={normalized_energy[band]:.1f}%, deviation={deviations[i]:.1f}%")
-            
-        avg_deviation = float(np.mean(deviations))
-        print(f"Average deviation from ideal curve: {avg_deviation:.2f}%")
-        
-        # Convert to a 0-100 score (lower deviation is better)
-        balance_score = float(max(0, min(100, 100 - avg_deviation)))
+        # Score against the ideal curve for the track type; the normalized
+        # band energy is kept so the track can be re-scored without the audio
+        print(f"Calculating balance score against the {'instrumental' if is_instrumental else 'vocal'} ideal curve...")
+        balance_score = score_frequency_balance(normalized_energy, is_instrumental)
         print(f"Final balance score: {balance_score:.2f}/100")
         
         analysis = get_frequency_balance_analysis(normalized_energy, is_instrumental)
@@ -542,99 +528,6 @@ def analyze_frequency_balance(y, sr, is_instrumental=None):
             "is_instrumental": is_instrumental
         }
 
-def get_frequency_balance_analysis(normalized_energy, is_instrumental=None):
-    """
-    Generate textual analysis of frequency balance
-    
-    Args:
-        normalized_energy: Dictionary of normalized energy values for each frequency band
-        is_instrumental: Boolean indicating if the track is instrumental (no vocals)
-        
-    Returns:
-        List of analysis points
-    """
-    analysis = []
-    
-    # Check for potential issues - different thresholds based on track type
-    if is_instrumental:
-        # Analysis for instrumental tracks
-        
-        if normalized_energy["sub_bass"] > 95:
-            analysis.append("Sub bass is very prominent, which may cause muddiness in this instrumental track.")
-        elif normalized_energy["sub_bass"] < 40:
-            analysis.append("Sub bass is lacking, instrumental mix may sound thin without a foundation.")
-            
-        if normalized_energy["bass"] > 95:
-            analysis.append("Bass is very prominent, which may overpower melodic elements in this instrumental track.")
-        elif normalized_energy["bass"] < 40:
-            analysis.append("Bass is lacking, instrumental mix may lack warmth and impact.")
-        
-        if normalized_energy["mids"] < 40:
-            analysis.append("Mids are recessed, instrumental mix may sound hollow (scooped mids).")
-        
-        if normalized_energy["high_mids"] > 95:
-            analysis.append("High mids are very prominent, instrumental elements may sound harsh.")
-        
-        if normalized_energy["highs"] > 95:
-            analysis.append("Highs are very prominent, instrumental mix may sound brittle or cause ear fatigue.")
-        elif normalized_energy["highs"] < 40:
-            analysis.append("Highs are lacking, instrumental details may be lost and mix may sound dull.")
-
-        # Additional instrumental-specific analysis
-        if normalized_energy["mids"] > normalized_energy["low_mids"] and normalized_energy["mids"] > normalized_energy["high_mids"]:
-            analysis.append("Good balance for melodic instrumental elements in the mid-range.")
-            
-        # Check for extended frequency content
-        good_extremes = (normalized_energy["sub_bass"] > 50) and (normalized_energy["air"] > 50)
-        if good_extremes:
-            analysis.append("Good extended frequency range, providing a full spectrum instrumental sound.")
-        
-    else:
-        # Analysis for tracks with vocals
-        
-        if normalized_energy["sub_bass"] > 95:
-            analysis.append("Sub bass is very prominent, which may mask vocals and cause muddiness.")
-        elif normalized_energy["sub_bass"] < 40:
-            analysis.append("Sub bass is lacking, mix may sound thin beneath the vocals.")
-            
-        if normalized_energy["bass"] > 95:
-            analysis.append("Bass is very prominent, which may compete with lower vocal registers.")
-        elif normalized_energy["bass"] < 40:
-            analysis.append("Bass is lacking, vocal-focused mix may lack warmth and foundation.")
-        
-        # Vocal presence checks
-        if normalized_energy["mids"] < 60:
-            analysis.append("Mids are recessed, vocals may lack presence and clarity.")
-        elif normalized_energy["mids"] > 95:
-            analysis.append("Mids are very emphasized, vocals may sound too forward or harsh.")
-            
-        vocal_presence = normalized_energy["mids"] + normalized_energy["high_mids"]
-        if vocal_presence < 140:
-            analysis.append("Potential lack of vocal presence in the mid and high-mid range.")
-        elif vocal_presence > 180:
-            analysis.append("Vocals may be overly emphasized in the mid and high-mid range.")
-        
-        if normalized_energy["high_mids"] > 95:
-            analysis.append("High mids are very prominent, may cause vocal sibilance issues.")
-        
-        if normalized_energy["highs"] > 95:
-            analysis.append("Highs are very prominent, may exaggerate vocal sibilance or create brittleness.")
-        elif normalized_energy["highs"] < 40:
-            analysis.append("Highs are lacking, vocal air and detail may be lost.")
-            
-        # Check for potential vocal clarity issues
-        if normalized_energy["mids"] > 80 and normalized_energy["low_mids"] > 80:
-            analysis.append("Potential vocal clarity issue with both mids and low-mids being prominent.")
-    
-    # Common analysis for both types
-    if len(analysis) == 0:
-        if is_instrumental:
-            analysis.append("Frequency balance appears well suited for instrumental music.")
-        else:
-            analysis.append("Frequency balance appears well suited for music with vocals.")
-    
-    return analysis
-
 def analyze_dynamic_range(y):
     """Analyze the dynamic range of the mix"""
     start_time = time.time()
@@ -1047,64 +940,9 @@ def analyze_clarity(y, sr, is_instrumental=None):
             print(f"Error calculating spectral centroid: {str(e)}")
             centroid_mean = sr/4  # Default value
         
-        # Calculate clarity score (0-100) with bounds checking and adjustments for track type
-        try:
-            # Different weights for instrumental vs. vocal tracks
-            if is_instrumental:
-                # For instrumental tracks - higher weight on contrast and flatness
-                contrast_weight = 0.5  # Higher contrast weight for instrumental clarity
-                flatness_weight = 0.3
-                centroid_weight = 0.2
-                print("Using instrumental weights for clarity score calculation")
-            else:
-                # For tracks with vocals - higher weight on centroid for vocal clarity
-                contrast_weight = 0.4
-                flatness_weight = 0.2
-                centroid_weight = 0.4  # Higher centroid weight for vocal clarity
-                print("Using vocal weights for clarity score calculation")
-            
-            # Scale contrast score between 0-100
-            contrast_score = min(100, max(0, contrast_mean * 1000))
-            if np.isnan(contrast_score):
-                contrast_score = 70.0
-            
-            # Convert flatness to score (lower flatness is better for clarity)
-            flatness_score = min(100, max(0, (1 - flatness_mean) * 100))
-            if np.isnan(flatness_score):
-                flatness_score = 70.0
-            
-            # Calculate centroid score with different optimal ranges based on track type
-            if is_instrumental:
-                # For instrumental, a wider range can be optimal
-                centroid_score = min(100, max(0, 100 - abs(centroid_mean - sr/4)/(sr/8)))
-            else:
-                # For vocals, a more specific range focused on vocal clarity
-                # Approx 1-5 kHz for vocal clarity
-                vocal_clarity_center = sr/8 + sr/6  # Aim for a bit higher centroid for vocals
-                centroid_score = min(100, max(0, 100 - abs(centroid_mean - vocal_clarity_center)/(sr/10)))
-            
-            if np.isnan(centroid_score):
-                centroid_score = 70.0
-            
-            # Combine scores with weights
-            clarity_score = float(
-                contrast_score * contrast_weight +
-                flatness_score * flatness_weight +
-                centroid_score * centroid_weight
-            )
-            
-            # Ensure final score is between 0-100 and not NaN
-            clarity_score = min(100, max(0, clarity_score))
-            if np.isnan(clarity_score):
-                clarity_score = 70.0
-                
-            print(f"Final clarity score calculated: {clarity_score}")
-            print(f"Component scores - Contrast: {contrast_score:.1f}, Flatness: {flatness_score:.1f}, Centroid: {centroid_score:.1f}")
-            print(f"Component weights - Contrast: {contrast_weight:.1f}, Flatness: {flatness_weight:.1f}, Centroid: {centroid_weight:.1f}")
-            
-        except Exception as e:
-            print(f"Error calculating clarity score: {str(e)}")
-            clarity_score = 70.0  # Default score
+        # Calculate clarity score (0-100) with adjustments for track type
+        clarity_score = score_clarity(contrast_mean, flatness_mean, centroid_mean, sr, is_instrumental)
+        print(f"Final clarity score calculated: {clarity_score}")
         
         # Generate analysis text
         analysis = get_clarity_analysis(contrast_mean, flatness_mean, centroid_mean, sr, is_instrumental)
@@ -1115,6 +953,7 @@ def analyze_clarity(y, sr, is_instrumental=None):
             "spectral_contrast": float(contrast_mean),
             "spectral_flatness": float(flatness_mean),
             "spectral_centroid": float(centroid_mean),
+            "sample_rate": int(sr),
             "analysis": analysis,
             "is_instrumental": is_instrumental,
             "fft_params": successful_fft_params  # Add the successful FFT parameters
@@ -1135,99 +974,11 @@ def analyze_clarity(y, sr, is_instrumental=None):
             "spectral_contrast": 0.5,
             "spectral_flatness": 0.5,
             "spectral_centroid": sr/4 if sr else 2000.0,
+            "sample_rate": int(sr) if sr else None,
             "analysis": [f"Unable to analyze clarity: {str(e)}"],
             "fft_params": {"n_fft": 0, "hop_length": 0, "method": "error"}
         }
 
-def get_clarity_analysis(contrast, flatness, centroid, sr, is_instrumental=None):
-    """
-    Generate textual analysis of clarity
-    
-    Args:
-        contrast: Spectral contrast value
-        flatness: Spectral flatness value
-        centroid: Spectral centroid value
-        sr: Sample rate
-        is_instrumental: Boolean indicating if the track is instrumental (no vocals)
-        
-    Returns:
-        List of analysis points
-    """
-    try:
-        analysis = []
-        
-        # Analyze spectral contrast
-        if is_instrumental:
-            # Instrumental tracks often benefit from higher contrast
-            if contrast < 0.1:
-                analysis.append("Very low spectral contrast - instrumental elements may lack definition and separation.")
-            elif contrast < 0.3:
-                analysis.append("Low spectral contrast - consider enhancing separation between instrumental elements.")
-            elif contrast < 0.6:
-                analysis.append("Moderate spectral contrast - good balance between instrumental elements.")
-            else:
-                analysis.append("High spectral contrast - excellent separation between instrumental elements.")
-        else:
-            # Vocal tracks need enough contrast for vocal clarity but not too much
-            if contrast < 0.1:
-                analysis.append("Very low spectral contrast - vocals may lack definition against the backing music.")
-            elif contrast < 0.25:
-                analysis.append("Low spectral contrast - consider enhancing separation between vocals and background elements.")
-            elif contrast < 0.5:
-                analysis.append("Moderate spectral contrast - good balance between vocals and instrumental elements.")
-            else:
-                analysis.append("High spectral contrast - excellent separation between vocal and instrumental elements.")
-        
-        # Analyze spectral flatness - similar for both types but with different implications
-        if is_instrumental:
-            if flatness < 0.2:
-                analysis.append("Low spectral flatness indicates good tonal focus in instrumental elements.")
-            elif flatness < 0.4:
-                analysis.append("Moderate spectral flatness - good balance between tonal and textural elements.")
-            else:
-                analysis.append("High spectral flatness may indicate noise or lack of tonal focus in instrumental parts.")
-        else:
-            if flatness < 0.2:
-                analysis.append("Low spectral flatness indicates good tonal focus, favorable for vocal clarity.")
-            elif flatness < 0.4:
-                analysis.append("Moderate spectral flatness - good balance between vocal intelligibility and background textures.")
-            else:
-                analysis.append("High spectral flatness may compromise vocal clarity due to noise or diffuse tonal content.")
-        
-        # Analyze spectral centroid - different optimal ranges
-        if is_instrumental:
-            # Instrumental can vary more widely in centroid
-            if centroid < sr/8:
-                analysis.append("Low spectral centroid - instrumental mix may sound dark or lack brightness.")
-            elif centroid < sr/4:
-                analysis.append("Good spectral centroid range for balanced instrumental clarity.")
-            elif centroid < sr/2:
-                analysis.append("High spectral centroid - instrumental mix may sound bright or emphasized in the high end.")
-            else:
-                analysis.append("Very high spectral centroid - consider reducing excessive high frequency content in instruments.")
-        else:
-            # Vocals need more specific centroid ranges for clarity
-            if centroid < sr/10:
-                analysis.append("Low spectral centroid - vocals may sound dark or muffled.")
-            elif centroid < sr/6:
-                analysis.append("Moderate spectral centroid - adequate for vocal clarity but may benefit from more presence.")
-            elif centroid < sr/3:
-                analysis.append("Good spectral centroid range for vocal clarity and presence.")
-            else:
-                analysis.append("Very high spectral centroid - vocals may sound harsh or sibilant, consider reducing high frequency content.")
-        
-        if not analysis:
-            if is_instrumental:
-                analysis.append("Mix appears to have good clarity and definition across instrumental elements.")
-            else:
-                analysis.append("Mix appears to have good vocal clarity and definition against backing elements.")
-                
-        return analysis
-        
-    except Exception as e:
-        print(f"Error generating clarity analysis: {str(e)}")
-        return ["Unable to generate detailed clarity analysis."]
-
 def analyze_harmonic_content(y, sr):
     """
     Analyze the harmonic content of the audio, including key detection and harmonic complexity.
@@ -1848,7 +1599,7 @@ def generate_visualizations(file_path, y=None, sr=None, file_id=None):
         # Use provided audio data if available, otherwise load from file
         if y is None or sr is None:
             print(f"Loading audio file for visualizations: {file_path}")
-            y, sr = librosa.load(file_path, sr=None, mono=False)
+            y, sr = load_audio(file_path)
             print(f"Loaded audio shape: {y.shape}, dimensions: {y.ndim}")
         
         # Create a directory for visualizations
@@ -2228,144 +1979,6 @@ def generate_error_visualizations(file_id=None):
         "dynamic_range": f"{static_prefix}/img/error.png"
     }
 
-def calculate_overall_score(results):
-    """Calculate an overall mix quality score based on all metrics"""
-    try:
-        # Initialize default scores
-        default_scores = {
-            "frequency_balance": 70.0,
-            "dynamic_range": 70.0,
-            "stereo_field": 70.0,
-            "clarity": 70.0,
-            "harmonic_content": 70.0,
-            "transients": 70.0,
-            "3d_spatial": 70.0,
-            "surround_compatibility": 70.0,
-            "headphone_speaker_optimization": 70.0
-        }
-
-        # Weight each component
-        weights = {
-            "frequency_balance": 0.25,
-            "dynamic_range": 0.15,
-            "stereo_field": 0.15,
-            "clarity": 0.20,
-            "harmonic_content": 0.15,
-            "transients": 0.10,
-            "3d_spatial": 0.05,
-            "surround_compatibility": 0.05,
-            "headphone_speaker_optimization": 0.05
-        }
-        
-        # Calculate weighted score
-        score = 0.0
-        
-        # Add frequency balance score
-        try:
-            if "frequency_balance" in results and isinstance(results["frequency_balance"], dict):
-                score += weights["frequency_balance"] * float(results["frequency_balance"].get("balance_score", default_scores["frequency_balance"]))
-            else:
-                score += weights["frequency_balance"] * default_scores["frequency_balance"]
-        except (TypeError, ValueError):
-            score += weights["frequency_balance"] * default_scores["frequency_balance"]
-        
-        # Add dynamic range score
-        try:
-            if "dynamic_range" in results and isinstance(results["dynamic_range"], dict):
-                score += weights["dynamic_range"] * float(results["dynamic_range"].get("dynamic_range_score", default_scores["dynamic_range"]))
-            else:
-                score += weights["dynamic_range"] * default_scores["dynamic_range"]
-        except (TypeError, ValueError):
-            score += weights["dynamic_range"] * default_scores["dynamic_range"]
-        
-        # Add stereo field score
-        try:
-            if "stereo_field" in results and isinstance(results["stereo_field"], dict):
-                stereo_score = 0.0
-                width_score = float(results["stereo_field"].get("width_score", default_scores["stereo_field"]))
-                phase_score = float(results["stereo_field"].get("phase_score", default_scores["stereo_field"]))
-                stereo_score = (width_score + phase_score) / 2
-                score += weights["stereo_field"] * stereo_score
-            else:
-                score += weights["stereo_field"] * default_scores["stereo_field"]
-        except (TypeError, ValueError):
-            score += weights["stereo_field"] * default_scores["stereo_field"]
-        
-        # Add clarity score
-        try:
-            if "clarity" in results and isinstance(results["clarity"], dict):
-                score += weights["clarity"] * float(results["clarity"].get("clarity_score", default_scores["clarity"]))
-            else:
-                score += weights["clarity"] * default_scores["clarity"]
-        except (TypeError, ValueError):
-            score += weights["clarity"] * default_scores["clarity"]
-        
-        # Add harmonic content score
-        try:
-            if "harmonic_content" in results and isinstance(results["harmonic_content"], dict):
-                score += weights["harmonic_content"] * float(results["harmonic_content"].get("harmonic_complexity", default_scores["harmonic_content"]))
-            else:
-                score += weights["harmonic_content"] * default_scores["harmonic_content"]
-        except (TypeError, ValueError):
-            score += weights["harmonic_content"] * default_scores["harmonic_content"]
-        
-        # Add transients score
-        try:
-            if "transients" in results and isinstance(results["transients"], dict):
-                score += weights["transients"] * float(results["transients"].get("transients_score", default_scores["transients"]))
-            else:
-                score += weights["transients"] * default_scores["transients"]
-        except (TypeError, ValueError):
-            score += weights["transients"] * default_scores["transients"]
-        
-        # Add 3D spatial score
-        try:
-            if "3d_spatial" in results and isinstance(results["3d_spatial"], dict):
-                spatial_score = 0.0
-                height_score = float(results["3d_spatial"].get("height_score", default_scores["3d_spatial"]))
-                depth_score = float(results["3d_spatial"].get("depth_score", default_scores["3d_spatial"]))
-                width_score = float(results["3d_spatial"].get("width_consistency", default_scores["3d_spatial"]))
-                spatial_score = (height_score + depth_score + width_score) / 3
-                score += weights["3d_spatial"] * spatial_score
-            else:
-                score += weights["3d_spatial"] * default_scores["3d_spatial"]
-        except (TypeError, ValueError):
-            score += weights["3d_spatial"] * default_scores["3d_spatial"]
-        
-        # Add surround compatibility score
-        try:
-            if "surround_compatibility" in results and isinstance(results["surround_compatibility"], dict):
-                compatibility_score = 0.0
-                mono_score = float(results["surround_compatibility"].get("mono_compatibility", default_scores["surround_compatibility"]))
-                phase_score = float(results["surround_compatibility"].get("phase_score", default_scores["surround_compatibility"]))
-                compatibility_score = (mono_score + phase_score) / 2
-                score += weights["surround_compatibility"] * compatibility_score
-            else:
-                score += weights["surround_compatibility"] * default_scores["surround_compatibility"]
-        except (TypeError, ValueError):
-            score += weights["surround_compatibility"] * default_scores["surround_compatibility"]
-        
-        # Add headphone/speaker optimization score
-        try:
-            if "headphone_speaker_optimization" in results and isinstance(results["headphone_speaker_optimization"], dict):
-                optimization_score = 0.0
-                headphone_score = float(results["headphone_speaker_optimization"].get("headphone_score", default_scores["headphone_speaker_optimization"]))
-                speaker_score = float(results["headphone_speaker_optimization"].get("speaker_score", default_scores["headphone_speaker_optimization"]))
-                optimization_score = (headphone_score + speaker_score) / 2
-                score += weights["headphone_speaker_optimization"] * optimization_score
-            else:
-                score += weights["headphone_speaker_optimization"] * default_scores["headphone_speaker_optimization"]
-        except (TypeError, ValueError):
-            score += weights["headphone_speaker_optimization"] * default_scores["headphone_speaker_optimization"]
-
-        # Ensure score is between 0 and 100
-        score = max(0, min(100, score))
-        
-        return round(score, 1)
-    except Exception as e:
-        print(f"Error calculating overall score: {str(e)}")
-        return 70.0  # Return a reasonable default score if calculation fails
-
 def analyze_3d_spatial(y, sr):
     """
     Analyze 3D spatial imaging characteristics
@@ -2723,4 +2336,69 @@ def get_headphone_speaker_analysis(headphone_score, speaker_score):
     if not analysis:
         analysis.append("Good optimization for both headphones and speakers.")
 
-    return analysis
\ No newline at end of file
+    return analysis
+
+
+# How each versioned section is computed from stereo audio, its sample rate,
+# the mono mix and the instrumental flag; mirrors the steps of analyze_mix
+SECTION_ANALYZERS = {
+    "frequency_balance": lambda y, sr, y_mono, is_instrumental: analyze_frequency_balance(y, sr, is_instrumental),
+    "dynamic_range": lambda y, sr, y_mono, is_instrumental: analyze_dynamic_range(y),
+    "stereo_field": lambda y, sr, y_mono, is_instrumental: analyze_stereo_field(y[0], y[1]),
+    "clarity": lambda y, sr, y_mono, is_instrumental: analyze_clarity(y, sr, is_instrumental),
+    "harmonic_content": lambda y, sr, y_mono, is_instrumental: analyze_harmonic_content(y, sr),
+    "transients": lambda y, sr, y_mono, is_instrumental: analyze_transients(y_mono, sr),
+    "3d_spatial": lambda y, sr, y_mono, is_instrumental: analyze_3d_spatial(y, sr),
+    "surround_compatibility": lambda y, sr, y_mono, is_instrumental: analyze_surround_compatibility(y, sr),
+    "headphone_speaker_optimization": lambda y, sr, y_mono, is_instrumental: analyze_headphone_speaker_optimization(y, sr),
+}
+
+def recompute_sections(file_path, results, sections, is_instrumental=None, file_id=None):
+    """
+    Recompute some sections of stored results and merge them back
+    
+    The audio is only loaded if a section other than overall_score needs
+    it. A section whose analyzer fails keeps its stored value and version,
+    so it is retried next time.
+    
+    Args:
+        file_path: Path to the audio file the results belong to
+        results: Dictionary of analysis results; it is not modified
+        sections: Names of the sections to recompute, from SECTION_VERSIONS
+        is_instrumental: Boolean indicating if the track is instrumental
+        file_id: Directory name of the visualizations, derived from file_path if None
+        
+    Returns:
+        New dictionary of analysis results
+    """
+    results = dict(results)
+    versions = dict(results.get("section_versions") or {})
+    start_time = time.time()
+    
+    audio_sections = [name for name in sections if name in SECTION_ANALYZERS or name == "visualizations"]
+    if audio_sections:
+        y, sr = load_stereo_audio(file_path)
+        y_mono = np.mean(y, axis=0)
+        for name in audio_sections:
+            try:
+                if name == "visualizations":
+                    results[name] = generate_visualizations(file_path, y=y, sr=sr, file_id=file_id)
+                else:
+                    results[name] = SECTION_ANALYZERS[name](y, sr, y_mono, is_instrumental)
+                versions[name] = SECTION_VERSIONS[name]
+            except Exception as e:
+                print(f"Error recomputing {name}: {str(e)}")
+                traceback.print_exc()
+    
+    # The overall score depends on every section, so it follows any change
+    try:
+        results["overall_score"] = calculate_overall_score(results)
+        versions["overall_score"] = SECTION_VERSIONS["overall_score"]
+    except Exception as e:
+        print(f"Error recomputing overall score: {str(e)}")
+    
+    results["section_versions"] = versions
+    if not stale_sections(results):
+        results["analyzer_version"] = ANALYZER_VERSION
+    print(f"Recomputed {', '.join(sections)} in {time.time() - start_time:.2f} seconds")
+    return convert_numpy_types(results)
@@ -0,0 +1,246 @@
+"""
+Canonical re-encoding of uploads.
+Decoding MP3, M4A or OGG goes through audioread/ffmpeg and is slow, and an
+upload is decoded again by every re-analysis, backfill and visualization
+route. With AUDIO_CANONICAL_FORMAT set, each upload is decoded once when it
+is received and stored next to the original in a format that decodes fast:
+
+- "flac": FLAC with 24-bit samples, smaller than PCM but decoded on read
+- "f32": raw float32 samples after a small header with the sample rate and
+  channel count, memory-mapped when read; the largest but needs no decoding
+
+load_audio reads the canonical copy when there is a current one and falls
+back to the original otherwise.
+"""
+
+import os
+import time
+import struct
+import numpy as np
+import librosa
+import soundfile as sf
+
+CANONICAL_FORMATS = {"flac": ".canonical.flac", "f32": ".canonical.f32"}
+
+# Header of the f32 format: magic, version, channels, sample rate, frames.
+# Samples follow at F32_DATA_OFFSET as float32 little-endian, one channel
+# after the other, so the file maps directly to a (channels, frames) array.
+F32_MAGIC = b"F32A"
+F32_VERSION = 1
+F32_HEADER = struct.Struct("<4sHHIQ")
+F32_DATA_OFFSET = 64
+
+def get_canonical_format():
+    """
+    Get the configured canonical format
+
+    Returns:
+        "flac", "f32", or None if uploads are kept only as uploaded
+    """
+    name = os.environ.get("AUDIO_CANONICAL_FORMAT", "none").lower()
+    return name if name in CANONICAL_FORMATS else None
+
+def canonical_path(file_path, audio_format):
+    """Path of the canonical copy of an upload in a format"""
+    return os.path.splitext(file_path)[0] + CANONICAL_FORMATS[audio_format]
+
+def find_canonical(file_path):
+    """
+    Find a current canonical copy of an upload
+
+    A copy older than the upload belongs to an earlier file saved under the
+    same name and is ignored.
+
+    Args:
+        file_path: Path to the uploaded file
+
+    Returns:
+        Tuple of (path, format), or (None, None) if there is none
+    """
+    try:
+        source_mtime = os.stat(file_path).st_mtime_ns
+    except OSError:
+        source_mtime = None
+    for audio_format in CANONICAL_FORMATS:
+        path = canonical_path(file_path, audio_format)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+        if source_mtime is None or mtime >= source_mtime:
+            return path, audio_format
+    return None, None
+
+def write_f32(path, y, sr):
+    """
+    Write audio in the f32 format
+
+    Args:
+        path: Output path
+        y: Audio array of shape (samples,) or (channels, samples)
+        sr: Sample rate
+    """
+    data = np.ascontiguousarray(np.atleast_2d(y), dtype="<f4")
+    with open(path, "wb") as f:
+        f.write(F32_HEADER.pack(F32_MAGIC, F32_VERSION, data.shape[0], int(sr), data.shape[1]).ljust(F32_DATA_OFFSET, b"\0"))
+        data.tofile(f)
+
+def read_f32_header(path):
+    """Read the (channels, sample rate, frames) of an f32 file"""
+    with open(path, "rb") as f:
+        magic, version, channels, sr, frames = F32_HEADER.unpack(f.read(F32_HEADER.size))
+    if magic != F32_MAGIC or version != F32_VERSION:
+        raise ValueError(f"{path} is not an f32 audio file")
+    return channels, sr, frames
+
+def read_f32(path, frames=None):
+    """
+    Memory-map an f32 file
+
+    The array is copy-on-write: callers may modify it without touching the file.
+
+    Args:
+        path: Path to the f32 file
+        frames: Number of frames to read from the start, or None for all
+
+    Returns:
+        Tuple of (audio array of shape (channels, frames), sample rate)
+    """
+    channels, sr, total = read_f32_header(path)
+    if total == 0:
+        return np.zeros((channels, 0), dtype=np.float32), sr
+    y = np.memmap(path, dtype="<f4", mode="c", offset=F32_DATA_OFFSET, shape=(channels, total))
+    return (y if frames is None else y[:, :frames]), sr
+
+def _read_canonical(path, audio_format, duration=None):
+    """Read a canonical copy as (array of shape (channels, frames), sample rate)"""
+    if audio_format == "f32":
+        _, sr, _ = read_f32_header(path)
+        frames = None if duration is None else int(np.round(sr * duration))
+        return read_f32(path, frames)
+    info = sf.info(path)
+    frames = -1 if duration is None else int(np.round(info.samplerate * duration))
+    data, sr = sf.read(path, frames=frames, dtype="float32", always_2d=True)
+    return np.ascontiguousarray(data.T), sr
+
+def load_audio(file_path, sr=None, mono=False, duration=None):
+    """
+    Load an upload like librosa.load, from its canonical copy when there is one
+
+    Args:
+        file_path: Path to the uploaded file
+        sr: Target sample rate, or None for the native rate
+        mono: Whether to mix down to one channel
+        duration: Only load this many seconds from the start
+
+    Returns:
+        Tuple of (audio array, sample rate), shaped like librosa.load's:
+        (samples,) for mono audio, (channels, samples) otherwise
+    """
+    path, audio_format = find_canonical(file_path)
+    if path is None:
+        return librosa.load(file_path, sr=sr, mono=mono, duration=duration)
+
+    try:
+        y, native_sr = _read_canonical(path, audio_format, duration)
+    except Exception as e:
+        print(f"Error reading canonical copy {path}, decoding the original: {str(e)}")
+        return librosa.load(file_path, sr=sr, mono=mono, duration=duration)
+
+    # Same steps and order as librosa.load
+    if y.shape[0] == 1:
+        y = y[0]
+    if mono:
+        y = librosa.to_mono(y)
+    if sr is not None and sr != native_sr:
+        y = librosa.resample(y, orig_sr=native_sr, target_sr=sr)
+        native_sr = sr
+    return y, native_sr
+
+def get_audio_duration(file_path):
+    """
+    Get the duration of an upload in seconds without decoding it when a
+    canonical copy exists
+
+    Args:
+        file_path: Path to the uploaded file
+
+    Returns:
+        Duration in seconds
+    """
+    path, audio_format = find_canonical(file_path)
+    try:
+        if audio_format == "f32":
+            _, sr, frames = read_f32_header(path)
+            return frames / sr
+        if audio_format == "flac":
+            return sf.info(path).duration
+    except Exception as e:
+        print(f"Error reading canonical copy {path}: {str(e)}")
+    return float(librosa.get_duration(path=file_path))
+
+def write_canonical(path, audio_format, y, sr):
+    """
+    Write audio in a canonical format
+
+    FLAC stores 24-bit integers, so samples are clipped to [-1, 1]; f32
+    stores the decoded samples exactly.
+
+    Args:
+        path: Output path
+        audio_format: "flac" or "f32"
+        y: Audio array of shape (samples,) or (channels, samples)
+        sr: Sample rate
+    """
+    temp_path = f"{path}.tmp"
+    if audio_format == "f32":
+        write_f32(temp_path, y, sr)
+    else:
+        # libsndfile wraps rather than clips out-of-range samples
+        sf.write(temp_path, np.clip(np.atleast_2d(y), -1.0, 1.0).T, sr, format="FLAC", subtype="PCM_24")
+    os.replace(temp_path, path)
+
+def canonicalize_upload(file_path, audio_format=None):
+    """
+    Store the canonical copy of an upload, replacing any older one
+
+    Args:
+        file_path: Path to the uploaded file
+        audio_format: "flac" or "f32", defaults to AUDIO_CANONICAL_FORMAT
+
+    Returns:
+        Dictionary with the format, path, sizes of the original and the
+        copy, and the seconds spent decoding the original, encoding the copy
+        and decoding the copy; None if re-encoding is disabled
+    """
+    audio_format = audio_format or get_canonical_format()
+    if audio_format is None:
+        return None
+
+    start = time.time()
+    y, sr = librosa.load(file_path, sr=None, mono=False)
+    decoded = time.time()
+
+    path = canonical_path(file_path, audio_format)
+    for other in CANONICAL_FORMATS:
+        if other != audio_format and os.path.exists(canonical_path(file_path, other)):
+            os.remove(canonical_path(file_path, other))
+    write_canonical(path, audio_format, y, sr)
+    encoded = time.time()
+
+    # Read back once to report what later loads cost
+    _read_canonical(path, audio_format)[0].sum()
+    report = {
+        "format": audio_format,
+        "path": path,
+        "source_bytes": os.path.getsize(file_path),
+        "canonical_bytes": os.path.getsize(path),
+        "source_decode_seconds": decoded - start,
+        "encode_seconds": encoded - decoded,
+        "canonical_decode_seconds": time.time() - encoded,
+    }
+    print(f"Stored {audio_format} copy of {os.path.basename(file_path)}: "
+          f"{report['source_bytes'] / (1024 * 1024):.1f} MB -> {report['canonical_bytes'] / (1024 * 1024):.1f} MB, "
+          f"decode {report['source_decode_seconds']:.2f} s -> {report['canonical_decode_seconds']:.2f} s "
+          f"(encoded in {report['encode_seconds']:.2f} s)")
+    return report
@@ -0,0 +1,386 @@
+"""
+Chunked, resumable uploads.
+A client opens an upload session with the file's size, then sends fixed-size
+chunks in any order and in parallel, each with an optional SHA-256 checksum.
+Chunks are written straight to their offset in a preallocated file, and the
+SHA-256 of the whole file is advanced over the contiguous prefix as chunks
+arrive, so completing an upload does not read the file again. Session state
+lives in a JSON manifest next to the partial file, guarded by a file lock,
+so any worker process can accept any chunk and an interrupted upload can be
+resumed by asking which chunks the server already has.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import fcntl
+import hashlib
+import threading
+from contextlib import contextmanager
+
+# Block size used when hashing data that was received out of order
+HASH_READ_SIZE = 1024 * 1024
+
+_hashers = {}
+_hashers_pid = None
+_hashers_lock = threading.Lock()
+
+UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+class UploadError(Exception):
+    """Raised for invalid chunked upload requests"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def get_chunked_upload_settings():
+    """
+    Get the chunked upload settings from environment variables
+
+    Returns:
+        Dictionary of settings
+    """
+    return {
+        "chunk_size": int(os.environ.get("CHUNKED_UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024)),
+        "max_size": int(os.environ.get("CHUNKED_UPLOAD_MAX_SIZE", 1024 * 1024 * 1024)),
+        # Sessions without a new chunk for this long are deleted
+        "ttl_seconds": float(os.environ.get("CHUNKED_UPLOAD_TTL_HOURS", 24)) * 3600,
+    }
+
+def _session_paths(base_dir, upload_id):
+    if not UPLOAD_ID_PATTERN.match(upload_id or ""):
+        raise UploadError("Unknown upload", 404)
+    prefix = os.path.join(base_dir, upload_id)
+    return prefix + ".json", prefix + ".part", prefix + ".lock"
+
+@contextmanager
+def _locked_session(base_dir, upload_id):
+    """Lock a session across processes and yield its manifest path and manifest"""
+    manifest_path, _, lock_path = _session_paths(base_dir, upload_id)
+    if not os.path.exists(manifest_path):
+        raise UploadError("Unknown upload", 404)
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            # The session may have been completed while we waited for the lock
+            if not os.path.exists(manifest_path):
+                raise UploadError("Unknown upload", 404)
+            with open(manifest_path) as f:
+                yield manifest_path, json.load(f)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _write_manifest(manifest_path, manifest):
+    manifest["updated_at"] = time.time()
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, manifest_path)
+
+def _status(manifest):
+    return {
+        "upload_id": manifest["upload_id"],
+        "filename": manifest["filename"],
+        "size": manifest["size"],
+        "chunk_size": manifest["chunk_size"],
+        "chunk_count": manifest["chunk_count"],
+        "received": sorted(manifest["received"]),
+        "file_hash": manifest.get("file_hash"),
+        "is_instrumental": manifest["is_instrumental"],
+    }
+
+def _chunk_length(manifest, index):
+    start = index * manifest["chunk_size"]
+    return min(manifest["chunk_size"], manifest["size"] - start)
+
+def _contiguous_bytes(manifest):
+    """Number of bytes at the start of the file whose chunks have all arrived"""
+    received = set(manifest["received"])
+    index = 0
+    while index in received:
+        index += 1
+    return min(index * manifest["chunk_size"], manifest["size"])
+
+def create_upload(base_dir, filename, size, is_instrumental=False, file_hash=None, chunk_size=None):
+    """
+    Open an upload session
+
+    Args:
+        base_dir: Directory holding the partial uploads
+        filename: Original name of the file
+        size: File size in bytes
+        is_instrumental: Boolean indicating if the track is instrumental
+        file_hash: SHA-256 of the whole file as computed by the client, if known
+        chunk_size: Requested chunk size in bytes, defaults to the configured one
+
+    Returns:
+        Dictionary with the session status
+
+    Raises:
+        UploadError: If the size is invalid or too large
+    """
+    settings = get_chunked_upload_settings()
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError("Invalid file size")
+    if size > settings["max_size"]:
+        raise UploadError(f"File is larger than {settings['max_size']} bytes", 413)
+    chunk_size = int(chunk_size or settings["chunk_size"])
+    # Chunks must stay below the request size limit and not be absurdly small
+    chunk_size = max(256 * 1024, min(chunk_size, settings["chunk_size"]))
+
+    os.makedirs(base_dir, exist_ok=True)
+    cleanup_stale_uploads(base_dir, settings["ttl_seconds"])
+
+    upload_id = uuid.uuid4().hex
+    manifest_path, part_path, _ = _session_paths(base_dir, upload_id)
+    # Sparse preallocation; chunks are written at their offsets
+    with open(part_path, "wb") as f:
+        f.truncate(size)
+
+    manifest = {
+        "upload_id": upload_id,
+        "filename": filename,
+        "size": size,
+        "chunk_size": chunk_size,
+        "chunk_count": (size + chunk_size - 1) // chunk_size,
+        "is_instrumental": bool(is_instrumental),
+        "file_hash": file_hash,
+        "received": [],
+        "created_at": time.time(),
+    }
+    _write_manifest(manifest_path, manifest)
+    print(f"Opened chunked upload {upload_id} for {filename} ({size} bytes, {manifest['chunk_count']} chunks)")
+    return _status(manifest)
+
+def get_upload(base_dir, upload_id):
+    """
+    Get the status of an upload session, e.g. to resume it
+
+    Args:
+        base_dir: Directory holding the partial uploads
+        upload_id: Session ID from create_upload
+
+    Returns:
+        Dictionary with the session status, including the received chunks
+
+    Raises:
+        UploadError: If the session does not exist
+    """
+    manifest_path, _, _ = _session_paths(base_dir, upload_id)
+    try:
+        with open(manifest_path) as f:
+            return _status(json.load(f))
+    except FileNotFoundError:
+        raise UploadError("Unknown upload", 404)
+
+def set_upload_hash(base_dir, upload_id, file_hash):
+    """
+    Record the client's SHA-256 of the whole file
+
+    Lets the caller look for a stored copy before the last chunk arrives.
+    The hash is checked against the received bytes when the upload completes.
+
+    Args:
+        base_dir: Directory holding the partial uploads
+        upload_id: Session ID from create_upload
+        file_hash: Hex SHA-256 of the whole file
+
+    Returns:
+        Dictionary with the session status
+    """
+    with _locked_session(base_dir, upload_id) as (manifest_path, manifest):
+        manifest["file_hash"] = file_hash
+        _write_manifest(manifest_path, manifest)
+        return _status(manifest)
+
+def write_chunk(base_dir, upload_id, index, data, checksum=None):
+    """
+    Store one chunk of an upload
+
+    Args:
+        base_dir: Directory holding the partial uploads
+        upload_id: Session ID from create_upload
+        index: Zero-based chunk index
+        data: Chunk bytes
+        checksum: Hex SHA-256 of the chunk, verified if given
+
+    Returns:
+        Dictionary with the session status
+
+    Raises:
+        UploadError: If the chunk does not belong to the upload or is corrupt
+    """
+    manifest_path, part_path, _ = _session_paths(base_dir, upload_id)
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise UploadError("Unknown upload", 404)
+
+    if not 0 <= index < manifest["chunk_count"]:
+        raise UploadError("Chunk index out of range")
+    if len(data) != _chunk_length(manifest, index):
+        raise UploadError(f"Chunk {index} must be {_chunk_length(manifest, index)} bytes")
+    if checksum and hashlib.sha256(data).hexdigest() != checksum.lower():
+        raise UploadError(f"Checksum mismatch in chunk {index}", 422)
+
+    # Chunks cover disjoint ranges, so they are written without the session lock
+    try:
+        fd = os.open(part_path, os.O_WRONLY)
+    except FileNotFoundError:
+        # Completed or discarded in the meantime
+        raise UploadError("Unknown upload", 404)
+    try:
+        os.pwrite(fd, data, index * manifest["chunk_size"])
+    finally:
+        os.close(fd)
+
+    with _locked_session(base_dir, upload_id) as (manifest_path, manifest):
+        if index not in manifest["received"]:
+            manifest["received"].append(index)
+            _write_manifest(manifest_path, manifest)
+
+    _advance_hash(manifest, part_path, index, data)
+    return _status(manifest)
+
+def _get_hasher(upload_id):
+    global _hashers_pid
+
+    with _hashers_lock:
+        # Hash state is per process; after a fork each worker starts over
+        if _hashers_pid != os.getpid():
+            _hashers.clear()
+            _hashers_pid = os.getpid()
+        return _hashers.setdefault(upload_id, {"hasher": hashlib.sha256(), "offset": 0, "lock": threading.Lock()})
+
+def _advance_hash(manifest, part_path, index=None, data=None):
+    """
+    Hash the contiguous received prefix of an upload that this process has not hashed yet
+
+    The chunk just received is hashed from memory when it is next in line;
+    anything else (chunks received out of order or by another worker) is read
+    back from the file.
+
+    Returns:
+        Tuple of (hashlib object, bytes hashed)
+    """
+    state = _get_hasher(manifest["upload_id"])
+    with state["lock"]:
+        end = _contiguous_bytes(manifest)
+        if data is not None and state["offset"] == index * manifest["chunk_size"] and state["offset"] < end:
+            state["hasher"].update(data)
+            state["offset"] += len(data)
+        if state["offset"] < end:
+            with open(part_path, "rb") as f:
+                f.seek(state["offset"])
+                while state["offset"] < end:
+                    block = f.read(min(HASH_READ_SIZE, end - state["offset"]))
+                    if not block:
+                        break
+                    state["hasher"].update(block)
+                    state["offset"] += len(block)
+        return state["hasher"], state["offset"]
+
+def complete_upload(base_dir, upload_id, destination):
+    """
+    Finish an upload once all chunks have arrived
+
+    Args:
+        base_dir: Directory holding the partial uploads
+        upload_id: Session ID from create_upload
+        destination: Path the complete file is moved to
+
+    Returns:
+        Dictionary with the session status, whose file_hash is the SHA-256
+        of the received bytes
+
+    Raises:
+        UploadError: If chunks are missing or the client's hash does not match
+    """
+    manifest_path, part_path, lock_path = _session_paths(base_dir, upload_id)
+    with _locked_session(base_dir, upload_id) as (manifest_path, manifest):
+        missing = sorted(set(range(manifest["chunk_count"])) - set(manifest["received"]))
+        if missing:
+            raise UploadError(f"{len(missing)} chunks missing", 409)
+
+        # Catches up on chunks hashed by other workers only
+        hasher, hashed = _advance_hash(manifest, part_path)
+        if hashed != manifest["size"]:
+            raise UploadError("Upload is incomplete", 409)
+        file_hash = hasher.hexdigest()
+
+        claimed = manifest.get("file_hash")
+        mismatch = bool(claimed) and claimed.lower() != file_hash
+        if mismatch:
+            discard_upload(base_dir, upload_id, locked=True)
+        else:
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            os.replace(part_path, destination)
+            os.remove(manifest_path)
+            status = dict(_status(manifest), file_hash=file_hash)
+
+    _forget(upload_id, lock_path)
+    if mismatch:
+        raise UploadError("File hash does not match the uploaded data", 422)
+    print(f"Completed chunked upload {upload_id}: {file_hash}")
+    return status
+
+def discard_upload(base_dir, upload_id, locked=False):
+    """
+    Delete an upload session and its partial file
+
+    Args:
+        base_dir: Directory holding the partial uploads
+        upload_id: Session ID from create_upload
+        locked: Whether the caller already holds the session lock
+    """
+    manifest_path, part_path, lock_path = _session_paths(base_dir, upload_id)
+    for path in (manifest_path, part_path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    if not locked:
+        _forget(upload_id, lock_path)
+
+def _forget(upload_id, lock_path):
+    with _hashers_lock:
+        _hashers.pop(upload_id, None)
+    try:
+        os.remove(lock_path)
+    except FileNotFoundError:
+        pass
+
+def cleanup_stale_uploads(base_dir, max_age_seconds):
+    """
+    Delete sessions that have not received a chunk for a while
+
+    Args:
+        base_dir: Directory holding the partial uploads
+        max_age_seconds: Age of the last change after which a session is deleted
+
+    Returns:
+        Number of sessions deleted
+    """
+    deleted = 0
+    cutoff = time.time() - max_age_seconds
+    try:
+        names = os.listdir(base_dir)
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        upload_id, extension = os.path.splitext(name)
+        if extension != ".json" or not UPLOAD_ID_PATTERN.match(upload_id):
+            continue
+        try:
+            if os.path.getmtime(os.path.join(base_dir, name)) < cutoff:
+                discard_upload(base_dir, upload_id)
+                deleted += 1
+        except OSError as e:
+            print(f"Error removing stale upload {upload_id}: {e}")
+    if deleted:
+        print(f"Removed {deleted} stale chunked uploads")
+    return deleted
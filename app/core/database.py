@@ -1,15 +1,174 @@
 """
 Database module for Music Mix Analyzer application
-Handles MySQL connections and queries for songs
+Handles database connections and queries for songs
 """
 
 import os
-import mysql.connector
-from mysql.connector import Error
 from flask import current_app
 import hashlib
 import json
-from app.core.db_utils import get_db_connection, get_db_config
+import threading
+import numpy as np
+from datetime import date, datetime, timedelta
+from app.core.db_utils import get_db_connection, get_db_config, get_db_backend, DatabaseError
+from app.core.result_storage import encode_results, decode_results, PAYLOAD_ENCODING
+from app.core.result_cache import get_result_cache
+from app.core.usage_writer import BatchedWriter
+from app.core.similarity import extract_features, update_similarity_index, remove_from_similarity_index
+from app.core.scoring import extract_score_inputs, SCORE_INPUT_NAMES
+from app.core.usage_rollups import (
+    ROLLUP_COUNTERS, aggregate_usage_rows, empty_rollup, merge_rollups, summarize_rollup
+)
+
+# Columns added to songs by earlier schema upgrades
+LEGACY_SONG_COLUMNS = [
+    ("filename", "VARCHAR(255) NOT NULL DEFAULT ''"),
+    ("original_name", "VARCHAR(255) NOT NULL DEFAULT ''"),
+    ("analysis_json", "LONGTEXT NULL"),
+    ("is_instrumental", "BOOLEAN DEFAULT FALSE"),
+    ("file_path", "VARCHAR(255) NOT NULL DEFAULT ''"),
+]
+
+# Indexes on songs as (name, "UNIQUE" or "", column). Every lookup and delete
+# goes through one of these, so none of them needs a table scan.
+SONG_INDEXES = [
+    ("idx_songs_file_hash_unique", "UNIQUE", "file_hash"),
+    ("idx_songs_filename", "", "filename"),
+    ("idx_songs_original_name", "", "original_name"),
+]
+
+# Non-unique file_hash indexes from older schemas, replaced by the unique one
+REDUNDANT_SONG_INDEXES = ["file_hash", "idx_songs_file_hash"]
+
+# Columns written by save_song, in the order of its VALUES list
+SONG_UPSERT_COLUMNS = [
+    "filename", "original_name", "file_path", "file_hash", "is_instrumental",
+    "overall_score", "frequency_balance_score", "dynamic_range_score", "stereo_width_score",
+    "clarity_score", "musical_key", "duration_seconds", "analysis_seconds",
+    "payload_encoding", "analysis_payload", "feature_vector", "analyzer_version",
+    "score_inputs",
+]
+
+# Hot queries on songs, kept as constants so the index checks in the test
+# suite run exactly what the application runs
+SQL_FIND_SONG = """
+SELECT id, filename, original_name, file_path, file_hash, is_instrumental, analyzer_version, revision,
+       overall_score, frequency_balance_score, clarity_score,
+       payload_encoding, analysis_payload, analysis_json
+FROM songs
+WHERE file_hash = %s
+"""
+
+SQL_FIND_SONG_WITH_ARRAYS = """
+SELECT s.id, s.filename, s.original_name, s.file_path, s.file_hash, s.is_instrumental, s.analyzer_version, s.revision,
+       s.overall_score, s.frequency_balance_score, s.clarity_score,
+       s.payload_encoding, s.analysis_payload, s.analysis_json, a.arrays_blob
+FROM songs s
+LEFT JOIN song_analysis_arrays a ON a.file_hash = s.file_hash
+WHERE s.file_hash = %s
+"""
+
+SONG_KEY_COLUMNS = ["id", "file_hash", "filename", "file_path"]
+
+SQL_SONG_KEYS_BY_HASH = "SELECT id, file_hash, filename, file_path FROM songs WHERE file_hash = %s"
+SQL_SONG_KEYS_BY_FILENAME = "SELECT id, file_hash, filename, file_path FROM songs WHERE filename = %s"
+SQL_SONG_KEYS_BY_ORIGINAL_NAME = "SELECT id, file_hash, filename, file_path FROM songs WHERE original_name = %s"
+SQL_FIND_UPLOAD_ALIAS = "SELECT file_hash FROM upload_aliases WHERE alias = %s"
+SQL_SONG_REVISION = "SELECT revision FROM songs WHERE file_hash = %s"
+SQL_SONG_INSIGHTS = "SELECT status, insights_json, updated_at FROM song_ai_insights WHERE file_hash = %s"
+SQL_DELETE_SONG_ARRAYS = "DELETE FROM song_analysis_arrays WHERE file_hash = %s"
+SQL_DELETE_FINGERPRINTS = "DELETE FROM song_fingerprints WHERE file_hash = %s"
+
+# Statements taking a list of values; {placeholders} is filled with one %s
+# per value
+SQL_SONG_SUMMARIES = """
+SELECT file_hash, filename, original_name, is_instrumental, overall_score, musical_key, duration_seconds
+FROM songs
+WHERE file_hash IN ({placeholders})
+"""
+SQL_FINGERPRINT_CANDIDATES = "SELECT file_hash, hash, time_offset FROM song_fingerprints WHERE hash IN ({placeholders})"
+# Every row of a song, deleted together by delete_song; songs goes last so
+# its rowcount is the number of songs deleted
+SQL_DELETE_SONG_ROWS = [
+    "DELETE FROM song_analysis_arrays WHERE file_hash IN ({placeholders})",
+    "DELETE FROM song_fingerprints WHERE file_hash IN ({placeholders})",
+    "DELETE FROM song_fingerprint_profiles WHERE file_hash IN ({placeholders})",
+    "DELETE FROM song_ai_insights WHERE file_hash IN ({placeholders})",
+    "DELETE FROM upload_aliases WHERE file_hash IN ({placeholders})",
+    "DELETE FROM songs WHERE file_hash IN ({placeholders})",
+]
+
+def _placeholders(count):
+    """One %s placeholder per value of an IN list"""
+    return ", ".join(["%s"] * count)
+
+# The exact statements of the per-song lookups and deletes, which must be
+# served by an index (see test_hot_song_queries_use_indexes); lists are
+# shown with two values
+SONG_HOT_QUERIES = [
+    SQL_FIND_SONG,
+    SQL_FIND_SONG_WITH_ARRAYS,
+    SQL_SONG_KEYS_BY_HASH,
+    SQL_SONG_KEYS_BY_FILENAME,
+    SQL_SONG_KEYS_BY_ORIGINAL_NAME,
+    SQL_SONG_REVISION,
+    SQL_SONG_INSIGHTS,
+    SQL_FIND_UPLOAD_ALIAS,
+    SQL_DELETE_SONG_ARRAYS,
+    SQL_DELETE_FINGERPRINTS,
+    SQL_SONG_SUMMARIES.format(placeholders=_placeholders(2)),
+    SQL_FINGERPRINT_CANDIDATES.format(placeholders=_placeholders(2)),
+] + [sql.format(placeholders=_placeholders(2)) for sql in SQL_DELETE_SONG_ROWS]
+
+# Score columns written by rescore_library, as (section, key) of the
+# results they override; None is the top level of the results
+SCORE_COLUMN_KEYS = {
+    "overall_score": (None, "overall_score"),
+    "frequency_balance_score": ("frequency_balance", "balance_score"),
+    "clarity_score": ("clarity", "clarity_score"),
+}
+
+# Score differences below this are float precision, not a re-scoring
+SCORE_COLUMN_TOLERANCE = 1e-3
+
+# Size of a stored score input vector of the current layout
+SCORE_INPUTS_BYTES = len(SCORE_INPUT_NAMES) * 8
+
+# Summary and payload columns added to songs for the compact storage format
+SONG_STORAGE_COLUMNS = [
+    ("overall_score", "FLOAT NULL"),
+    ("frequency_balance_score", "FLOAT NULL"),
+    ("dynamic_range_score", "FLOAT NULL"),
+    ("stereo_width_score", "FLOAT NULL"),
+    ("clarity_score", "FLOAT NULL"),
+    ("musical_key", "VARCHAR(16) NULL"),
+    ("duration_seconds", "FLOAT NULL"),
+    ("analysis_seconds", "FLOAT NULL"),
+    ("payload_encoding", "VARCHAR(32) NULL"),
+    ("analysis_payload", "LONGBLOB NULL"),
+    ("feature_vector", "BLOB NULL"),
+    # Version of the analyzer that produced the stored results
+    ("analyzer_version", "VARCHAR(32) NULL"),
+    # Measurements and scores the library is re-scored from, see scoring.py
+    ("score_inputs", "BLOB NULL"),
+    # Bumped on every write of the row, so ETags change with the stored results
+    ("revision", "INT NOT NULL DEFAULT 0"),
+]
+
+# Token accounting columns added to the AI usage tables
+AI_USAGE_TOKEN_COLUMNS = {
+    "ai_usage_stats": [
+        ("prompt_tokens", "INT NULL"),
+        ("completion_tokens", "INT NULL"),
+        ("cached_tokens", "INT NULL"),
+    ],
+    "ai_usage_daily": [
+        ("token_count", "INT NOT NULL DEFAULT 0"),
+        ("prompt_tokens_sum", "BIGINT NOT NULL DEFAULT 0"),
+        ("completion_tokens_sum", "BIGINT NOT NULL DEFAULT 0"),
+        ("cached_tokens_sum", "BIGINT NOT NULL DEFAULT 0"),
+    ],
+}
 
 def validate_schema():
     """
@@ -21,12 +180,9 @@ def validate_schema():
         print("Failed to connect to database for schema validation")
         return False
     
-    cursor = connection.cursor(dictionary=True)
     try:
         # Check songs table exists and has required columns
-        cursor.execute("DESCRIBE songs")
-        columns = cursor.fetchall()
-        column_names = [col['Field'] for col in columns]
+        column_names = get_db_backend().table_columns(connection, 'songs')
         
         required_columns = ['id', 'filename', 'original_name', 'analysis_json', 'file_hash', 'file_path', 'is_instrumental']
         missing_columns = [col for col in required_columns if col not in column_names]
@@ -37,13 +193,10 @@ def validate_schema():
             
         print("Schema validation passed: all required columns exist")
         return True
-    except Error as e:
+    except DatabaseError as e:
         print(f"Error validating schema: {e}")
         return False
     finally:
-        if cursor and cursor.with_rows:
-            cursor.fetchall()
-        cursor.close()
         connection.close()
 
 def create_tables_if_not_exist():
@@ -56,105 +209,419 @@ def create_tables_if_not_exist():
     
     cursor = connection.cursor()
     try:
-        # Create songs table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS songs (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            filename VARCHAR(255) NOT NULL DEFAULT '',
-            original_name VARCHAR(255) NOT NULL DEFAULT '',
-            file_hash VARCHAR(64) NOT NULL,
-            file_path VARCHAR(255) NOT NULL DEFAULT '',
-            is_instrumental BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            analysis_json LONGTEXT NULL,
-            INDEX(file_hash)
-        )
-        """)
-        
-        # Create AI usage stats table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS ai_usage_stats (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            provider VARCHAR(50) NOT NULL,
-            model VARCHAR(100) NOT NULL,
-            is_fallback BOOLEAN DEFAULT FALSE,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            response_time FLOAT,
-            INDEX(provider),
-            INDEX(timestamp)
-        )
-        """)
+        backend = get_db_backend()
+        if backend.name == "sqlite":
+            _create_sqlite_tables(cursor)
+        else:
+            _create_mysql_tables(cursor)
         
         connection.commit()
         
         # Ensure all required columns exist
         try:
-            # Add missing columns if needed
-            cursor.execute("""
-            SELECT COUNT(*) FROM information_schema.columns 
-            WHERE table_schema = DATABASE() AND table_name = 'songs' AND column_name = 'filename'
-            """)
-            has_filename = cursor.fetchone()[0] > 0
-            
-            cursor.execute("""
-            SELECT COUNT(*) FROM information_schema.columns 
-            WHERE table_schema = DATABASE() AND table_name = 'songs' AND column_name = 'original_name'
-            """)
-            has_original_name = cursor.fetchone()[0] > 0
-            
-            cursor.execute("""
-            SELECT COUNT(*) FROM information_schema.columns 
-            WHERE table_schema = DATABASE() AND table_name = 'songs' AND column_name = 'analysis_json'
-            """)
-            has_analysis_json = cursor.fetchone()[0] > 0
-            
-            cursor.execute("""
-            SELECT COUNT(*) FROM information_schema.columns 
-            WHERE table_schema = DATABASE() AND table_name = 'songs' AND column_name = 'is_instrumental'
-            """)
-            has_is_instrumental = cursor.fetchone()[0] > 0
+            existing_columns = backend.table_columns(connection, 'songs')
             
-            cursor.execute("""
-            SELECT COUNT(*) FROM information_schema.columns 
-            WHERE table_schema = DATABASE() AND table_name = 'songs' AND column_name = 'file_path'
-            """)
-            has_file_path = cursor.fetchone()[0] > 0
-            
-            # Add any missing columns
-            if not has_filename:
-                print("Adding missing 'filename' column to songs table")
-                cursor.execute("ALTER TABLE songs ADD COLUMN filename VARCHAR(255) NOT NULL DEFAULT ''")
-            
-            if not has_original_name:
-                print("Adding missing 'original_name' column to songs table")
-                cursor.execute("ALTER TABLE songs ADD COLUMN original_name VARCHAR(255) NOT NULL DEFAULT ''")
-            
-            if not has_analysis_json:
-                print("Adding missing 'analysis_json' column to songs table")
-                cursor.execute("ALTER TABLE songs ADD COLUMN analysis_json LONGTEXT NULL")
-                
-            if not has_is_instrumental:
-                print("Adding missing 'is_instrumental' column to songs table")
-                cursor.execute("ALTER TABLE songs ADD COLUMN is_instrumental BOOLEAN DEFAULT FALSE")
-                
-            if not has_file_path:
-                print("Adding missing 'file_path' column to songs table")
-                cursor.execute("ALTER TABLE songs ADD COLUMN file_path VARCHAR(255) NOT NULL DEFAULT ''")
+            # Add any missing columns, including the summary and payload
+            # columns of the compact storage format
+            for column_name, column_definition in LEGACY_SONG_COLUMNS + SONG_STORAGE_COLUMNS:
+                if column_name not in existing_columns:
+                    print(f"Adding missing '{column_name}' column to songs table")
+                    cursor.execute(f"ALTER TABLE songs ADD COLUMN {column_name} {column_definition}")
             
             connection.commit()
         except Exception as e:
             print(f"Warning: Error while checking/adding columns: {e}")
         
+        # Add the token accounting columns to existing usage tables
+        try:
+            for table_name, columns in AI_USAGE_TOKEN_COLUMNS.items():
+                existing_columns = backend.table_columns(connection, table_name)
+                for column_name, column_definition in columns:
+                    if column_name not in existing_columns:
+                        print(f"Adding missing '{column_name}' column to {table_name} table")
+                        cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_definition}")
+            connection.commit()
+        except Exception as e:
+            print(f"Warning: Error while checking/adding AI usage columns: {e}")
+        
+        # Ensure the lookup indexes and the unique file_hash key exist
+        try:
+            _ensure_song_indexes(connection, cursor, backend)
+        except Exception as e:
+            print(f"Warning: Error while checking/adding indexes: {e}")
+        
+        # Backfill the usage rollups once when upgrading an existing database
+        try:
+            cursor.execute("SELECT COUNT(*) FROM ai_usage_daily")
+            rollups_empty = cursor.fetchone()[0] == 0
+            cursor.execute("SELECT COUNT(*) FROM ai_usage_stats")
+            has_raw_stats = cursor.fetchone()[0] > 0
+            if rollups_empty and has_raw_stats:
+                print("Building AI usage rollups from existing ai_usage_stats rows")
+                rebuild_ai_usage_rollups()
+        except Exception as e:
+            print(f"Warning: Error while checking AI usage rollups: {e}")
+        
         # Validate schema after creation
         schema_valid = validate_schema()
         return schema_valid
-    except Error as e:
+    except DatabaseError as e:
         print(f"Error creating tables: {e}")
         return False
     finally:
         cursor.close()
         connection.close()
 
+def _ensure_song_indexes(connection, cursor, backend):
+    """
+    Add missing indexes on songs and drop the ones they replace
+    
+    A unique key is not added while its column has duplicate rows, left over
+    from the old SELECT-then-INSERT save; scripts/dedupe_songs.py removes
+    them, and the key is added on the next start.
+    
+    Args:
+        connection: Open connection
+        cursor: Open cursor on the connection
+        backend: Active database backend
+    """
+    existing_indexes = backend.index_names(connection, 'songs')
+    
+    for index_name, unique, column in SONG_INDEXES:
+        if index_name in existing_indexes:
+            continue
+        if unique:
+            cursor.execute(f"""
+            SELECT COUNT(*) FROM (
+                SELECT {column} FROM songs GROUP BY {column} HAVING COUNT(*) > 1
+            ) AS duplicate_rows
+            """)
+            duplicates = cursor.fetchone()[0]
+            if duplicates:
+                print(f"Warning: not adding unique '{index_name}' key, {duplicates} {column} values "
+                      f"have more than one row in songs. Remove them with: python scripts/dedupe_songs.py")
+                continue
+        print(f"Adding missing '{index_name}' index to songs table")
+        cursor.execute(f"CREATE {unique} INDEX {index_name} ON songs({column})")
+        existing_indexes.add(index_name)
+    
+    # The non-unique file_hash indexes stay until the unique key replaces them
+    if all(index_name in existing_indexes for index_name, unique, _ in SONG_INDEXES if unique):
+        for index_name in REDUNDANT_SONG_INDEXES:
+            if index_name in existing_indexes:
+                print(f"Dropping redundant '{index_name}' index from songs table")
+                cursor.execute(backend.drop_index_sql('songs', index_name))
+    
+    connection.commit()
+
+def _create_mysql_tables(cursor):
+    """
+    Create the tables on a MySQL server
+    
+    Args:
+        cursor: Open cursor; the caller commits
+    """
+    # Create songs table
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS songs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        filename VARCHAR(255) NOT NULL DEFAULT '',
+        original_name VARCHAR(255) NOT NULL DEFAULT '',
+        file_hash VARCHAR(64) NOT NULL,
+        file_path VARCHAR(255) NOT NULL DEFAULT '',
+        is_instrumental BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        analysis_json LONGTEXT NULL,
+        overall_score FLOAT NULL,
+        frequency_balance_score FLOAT NULL,
+        dynamic_range_score FLOAT NULL,
+        stereo_width_score FLOAT NULL,
+        clarity_score FLOAT NULL,
+        musical_key VARCHAR(16) NULL,
+        duration_seconds FLOAT NULL,
+        analysis_seconds FLOAT NULL,
+        payload_encoding VARCHAR(32) NULL,
+        analysis_payload LONGBLOB NULL,
+        feature_vector BLOB NULL,
+        analyzer_version VARCHAR(32) NULL,
+        score_inputs BLOB NULL,
+        revision INT NOT NULL DEFAULT 0,
+        UNIQUE KEY idx_songs_file_hash_unique (file_hash),
+        INDEX idx_songs_filename (filename),
+        INDEX idx_songs_original_name (original_name)
+    )
+    """)
+
+    # Create table for large per-frame arrays kept out of the songs row
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS song_analysis_arrays (
+        file_hash VARCHAR(64) NOT NULL PRIMARY KEY,
+        arrays_blob LONGBLOB NOT NULL
+    )
+    """)
+
+    # Create landmark hash index used to find near-duplicate uploads
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS song_fingerprints (
+        hash INT NOT NULL,
+        file_hash VARCHAR(64) NOT NULL,
+        time_offset INT NOT NULL,
+        INDEX idx_song_fingerprints_hash (hash),
+        INDEX idx_song_fingerprints_file_hash (file_hash)
+    )
+    """)
+    
+    # Create per-song fingerprint metadata checked before reusing an analysis
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS song_fingerprint_profiles (
+        file_hash VARCHAR(64) NOT NULL PRIMARY KEY,
+        duration_seconds FLOAT NOT NULL,
+        hash_count INT NOT NULL,
+        profile BLOB NOT NULL
+    )
+    """)
+    
+    # Create table of AI insights, generated separately from the analysis
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS song_ai_insights (
+        file_hash VARCHAR(64) NOT NULL PRIMARY KEY,
+        status VARCHAR(16) NOT NULL,
+        insights_json MEDIUMTEXT NULL,
+        updated_at TIMESTAMP NOT NULL
+    )
+    """)
+
+    # Create AI usage stats table
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ai_usage_stats (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        provider VARCHAR(50) NOT NULL,
+        model VARCHAR(100) NOT NULL,
+        is_fallback BOOLEAN DEFAULT FALSE,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        response_time FLOAT,
+        prompt_tokens INT NULL,
+        completion_tokens INT NULL,
+        cached_tokens INT NULL,
+        INDEX(provider),
+        INDEX(timestamp)
+    )
+    """)
+
+    # Create daily rollups of AI usage read by the stats dashboard
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ai_usage_daily (
+        day DATE NOT NULL,
+        provider VARCHAR(50) NOT NULL,
+        model VARCHAR(100) NOT NULL,
+        request_count INT NOT NULL DEFAULT 0,
+        fallback_count INT NOT NULL DEFAULT 0,
+        timed_count INT NOT NULL DEFAULT 0,
+        response_time_sum DOUBLE NOT NULL DEFAULT 0,
+        response_time_sumsq DOUBLE NOT NULL DEFAULT 0,
+        token_count INT NOT NULL DEFAULT 0,
+        prompt_tokens_sum BIGINT NOT NULL DEFAULT 0,
+        completion_tokens_sum BIGINT NOT NULL DEFAULT 0,
+        cached_tokens_sum BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, provider, model)
+    )
+    """)
+
+    # Create daily response time histograms used for percentile estimates
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ai_usage_daily_latency (
+        day DATE NOT NULL,
+        provider VARCHAR(50) NOT NULL,
+        model VARCHAR(100) NOT NULL,
+        bucket SMALLINT NOT NULL,
+        bucket_count INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, provider, model, bucket)
+    )
+    """)
+
+    # Create cache of AI insights keyed by a hash of the prompt
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ai_insight_cache (
+        cache_key CHAR(64) NOT NULL PRIMARY KEY,
+        provider VARCHAR(50) NOT NULL,
+        model VARCHAR(100) NOT NULL,
+        insights_json MEDIUMTEXT NOT NULL,
+        created_at TIMESTAMP NOT NULL,
+        last_used_at TIMESTAMP NOT NULL,
+        hit_count INT NOT NULL DEFAULT 0,
+        INDEX idx_ai_insight_cache_created_at (created_at),
+        INDEX idx_ai_insight_cache_last_used_at (last_used_at)
+    )
+    """)
+
+    # Create daily hit/miss counters of the AI insight cache
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ai_insight_cache_daily (
+        day DATE NOT NULL PRIMARY KEY,
+        hit_count INT NOT NULL DEFAULT 0,
+        miss_count INT NOT NULL DEFAULT 0
+    )
+    """)
+
+    # Create the names and ids uploads were known by, mapped to their hash
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS upload_aliases (
+        alias VARCHAR(255) NOT NULL PRIMARY KEY,
+        file_hash VARCHAR(64) NOT NULL,
+        updated_at TIMESTAMP NOT NULL,
+        INDEX idx_upload_aliases_file_hash (file_hash)
+    )
+    """)
+
+def _create_sqlite_tables(cursor):
+    """
+    Create the tables in an embedded SQLite database
+    
+    Mirrors _create_mysql_tables; SQLite has no inline INDEX clauses or
+    AUTO_INCREMENT, so indexes are created separately.
+    
+    Args:
+        cursor: Open cursor; the caller commits
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS songs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        filename VARCHAR(255) NOT NULL DEFAULT '',
+        original_name VARCHAR(255) NOT NULL DEFAULT '',
+        file_hash VARCHAR(64) NOT NULL,
+        file_path VARCHAR(255) NOT NULL DEFAULT '',
+        is_instrumental BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        analysis_json LONGTEXT NULL,
+        overall_score FLOAT NULL,
+        frequency_balance_score FLOAT NULL,
+        dynamic_range_score FLOAT NULL,
+        stereo_width_score FLOAT NULL,
+        clarity_score FLOAT NULL,
+        musical_key VARCHAR(16) NULL,
+        duration_seconds FLOAT NULL,
+        analysis_seconds FLOAT NULL,
+        payload_encoding VARCHAR(32) NULL,
+        analysis_payload LONGBLOB NULL,
+        feature_vector BLOB NULL,
+        analyzer_version VARCHAR(32) NULL,
+        score_inputs BLOB NULL,
+        revision INT NOT NULL DEFAULT 0
+    )
+    """)
+    # Indexes on songs are added by _ensure_song_indexes
+    
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS song_analysis_arrays (
+        file_hash VARCHAR(64) NOT NULL PRIMARY KEY,
+        arrays_blob LONGBLOB NOT NULL
+    )
+    """)
+    
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS song_fingerprints (
+        hash INT NOT NULL,
+        file_hash VARCHAR(64) NOT NULL,
+        time_offset INT NOT NULL
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_song_fingerprints_hash ON song_fingerprints(hash)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_song_fingerprints_file_hash ON song_fingerprints(file_hash)")
+    
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS song_fingerprint_profiles (
+        file_hash VARCHAR(64) NOT NULL PRIMARY KEY,
+        duration_seconds FLOAT NOT NULL,
+        hash_count INT NOT NULL,
+        profile BLOB NOT NULL
+    )
+    """)
+    
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS song_ai_insights (
+        file_hash VARCHAR(64) NOT NULL PRIMARY KEY,
+        status VARCHAR(16) NOT NULL,
+        insights_json TEXT NULL,
+        updated_at TIMESTAMP NOT NULL
+    )
+    """)
+    
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ai_usage_stats (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        provider VARCHAR(50) NOT NULL,
+        model VARCHAR(100) NOT NULL,
+        is_fallback BOOLEAN DEFAULT FALSE,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        response_time FLOAT,
+        prompt_tokens INT NULL,
+        completion_tokens INT NULL,
+        cached_tokens INT NULL
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ai_usage_stats_provider ON ai_usage_stats(provider)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ai_usage_stats_timestamp ON ai_usage_stats(timestamp)")
+    
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ai_usage_daily (
+        day DATE NOT NULL,
+        provider VARCHAR(50) NOT NULL,
+        model VARCHAR(100) NOT NULL,
+        request_count INT NOT NULL DEFAULT 0,
+        fallback_count INT NOT NULL DEFAULT 0,
+        timed_count INT NOT NULL DEFAULT 0,
+        response_time_sum DOUBLE NOT NULL DEFAULT 0,
+        response_time_sumsq DOUBLE NOT NULL DEFAULT 0,
+        token_count INT NOT NULL DEFAULT 0,
+        prompt_tokens_sum BIGINT NOT NULL DEFAULT 0,
+        completion_tokens_sum BIGINT NOT NULL DEFAULT 0,
+        cached_tokens_sum BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, provider, model)
+    )
+    """)
+    
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ai_usage_daily_latency (
+        day DATE NOT NULL,
+        provider VARCHAR(50) NOT NULL,
+        model VARCHAR(100) NOT NULL,
+        bucket SMALLINT NOT NULL,
+        bucket_count INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, provider, model, bucket)
+    )
+    """)
+    
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ai_insight_cache (
+        cache_key CHAR(64) NOT NULL PRIMARY KEY,
+        provider VARCHAR(50) NOT NULL,
+        model VARCHAR(100) NOT NULL,
+        insights_json TEXT NOT NULL,
+        created_at TIMESTAMP NOT NULL,
+        last_used_at TIMESTAMP NOT NULL,
+        hit_count INT NOT NULL DEFAULT 0
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ai_insight_cache_created_at ON ai_insight_cache(created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ai_insight_cache_last_used_at ON ai_insight_cache(last_used_at)")
+    
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ai_insight_cache_daily (
+        day DATE NOT NULL PRIMARY KEY,
+        hit_count INT NOT NULL DEFAULT 0,
+        miss_count INT NOT NULL DEFAULT 0
+    )
+    """)
+    
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS upload_aliases (
+        alias VARCHAR(255) NOT NULL PRIMARY KEY,
+        file_hash VARCHAR(64) NOT NULL,
+        updated_at TIMESTAMP NOT NULL
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_upload_aliases_file_hash ON upload_aliases(file_hash)")
+
 def calculate_file_hash(file_path):
     """
     Calculate SHA-256 hash of a file
@@ -172,26 +639,73 @@ def calculate_file_hash(file_path):
             sha256_hash.update(byte_block)
     return sha256_hash.hexdigest()
 
-def find_song_by_hash(file_hash):
+# Hashes of recently seen files keyed by (path, size, mtime), so hashing an
+# unchanged file again costs a stat() instead of a full read
+FILE_HASH_CACHE_SIZE = 1024
+_file_hashes = {}
+_file_hashes_lock = threading.Lock()
+
+def get_file_hash(file_path):
+    """
+    Get the SHA-256 hash of a file, reusing the last result while the file is unchanged
+    
+    Args:
+        file_path: Path to the file
+        
+    Returns:
+        SHA-256 hash hexadecimal string
+    """
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    with _file_hashes_lock:
+        file_hash = _file_hashes.get(key)
+    if file_hash is None:
+        file_hash = calculate_file_hash(file_path)
+        with _file_hashes_lock:
+            if len(_file_hashes) >= FILE_HASH_CACHE_SIZE:
+                _file_hashes.clear()
+            _file_hashes[key] = file_hash
+    return file_hash
+
+def find_song_by_hash(file_hash, include_arrays=True):
     """
     Find a song in the database by its hash
     
+    Only the columns needed to serve a cached result are fetched. The stored
+    payload is decoded into the 'analysis' key of the returned dictionary.
+    Complete rows are served from the result cache when possible; the returned
+    dictionary may be shared with other callers and must not be modified.
+    
     Args:
         file_hash: SHA-256 hash of the file
+        include_arrays: Whether to also load the large per-frame arrays
         
     Returns:
         Dictionary with song data if found, None otherwise
     """
+    cache = get_result_cache()
+    if cache:
+        cached_song = cache.get(file_hash)
+        if cached_song is not None:
+            return cached_song
+    
     connection = get_db_connection()
     if not connection:
         return None
     
     cursor = connection.cursor(dictionary=True)
     try:
-        cursor.execute("SELECT * FROM songs WHERE file_hash = %s", (file_hash,))
+        if include_arrays:
+            cursor.execute(SQL_FIND_SONG_WITH_ARRAYS, (file_hash,))
+        else:
+            cursor.execute(SQL_FIND_SONG, (file_hash,))
         song = cursor.fetchone()
+        if song:
+            song['analysis'] = _decode_song_analysis(song)
+            if cache and include_arrays and song['analysis']:
+                cache.put(file_hash, song)
         return song
-    except Error as e:
+    except DatabaseError as e:
         print(f"Error finding song by hash: {e}")
         return None
     finally:
@@ -201,20 +715,98 @@ def find_song_by_hash(file_hash):
         cursor.close()
         connection.close()
 
+def get_song_revision(file_hash):
+    """
+    Get the revision of a stored song without loading its results
+    
+    Args:
+        file_hash: SHA-256 hash of the file
+        
+    Returns:
+        Revision number, bumped on every write of the row, or None if the
+        song is not stored
+    """
+    connection = get_db_connection()
+    if not connection:
+        return None
+    
+    cursor = connection.cursor()
+    try:
+        cursor.execute(SQL_SONG_REVISION, (file_hash,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    except DatabaseError as e:
+        print(f"Error reading song revision: {e}")
+        return None
+    finally:
+        cursor.close()
+        connection.close()
+
+def _decode_song_analysis(song):
+    """
+    Decode the analysis results of a song row and drop the raw storage columns
+    
+    Rows written before the compact format only have analysis_json. Scores
+    changed by rescore_library are only written to the score columns, which
+    take precedence over the payload when the row has them.
+    
+    Args:
+        song: Dictionary row from the songs table
+        
+    Returns:
+        Dictionary of analysis results, or None if the row has no usable analysis
+    """
+    payload = song.pop('analysis_payload', None)
+    arrays_blob = song.pop('arrays_blob', None)
+    encoding = song.pop('payload_encoding', None)
+    legacy_json = song.pop('analysis_json', None)
+    score_columns = {column: song.pop(column, None) for column in SCORE_COLUMN_KEYS}
+    
+    try:
+        if payload:
+            analysis = decode_results(payload, arrays_blob, encoding)
+        elif legacy_json:
+            analysis = json.loads(legacy_json)
+        else:
+            return None
+    except (ValueError, TypeError) as e:
+        print(f"Error decoding stored analysis for {song.get('file_hash')}: {e}")
+        return None
+    
+    for column, (section, key) in SCORE_COLUMN_KEYS.items():
+        _apply_score_column(analysis, section, key, score_columns[column])
+    return analysis
+
+def _apply_score_column(analysis, section, key, value):
+    # FLOAT columns may hold single precision; only a real change replaces
+    # the payload's value
+    target = analysis if section is None else analysis.get(section)
+    if value is None or not isinstance(target, dict):
+        return
+    stored = target.get(key)
+    if not isinstance(stored, (int, float)) or abs(float(value) - stored) > SCORE_COLUMN_TOLERANCE:
+        target[key] = round(float(value), 1) if section is None else float(value)
+
 def save_song(filename, original_name, file_path, file_hash, is_instrumental, analysis_json):
     """
     Save song information to the database
     
+    The row is written with a single upsert on the unique file_hash key, so
+    concurrent saves of the same file cannot create duplicates; saving a
+    file that already exists replaces its stored analysis.
+    
     Args:
         filename: Unique filename in the system
         original_name: Original filename from user
         file_path: Path to the file on disk
         file_hash: SHA-256 hash of the file
         is_instrumental: Boolean indicating if the song is instrumental
-        analysis_json: JSON string of analysis results
+        analysis_json: Dictionary of analysis results, stored as a summary
+                       row plus a compressed payload; its analyzer_version
+                       key is also stored as a column
         
     Returns:
-        ID of the inserted record, or None on failure
+        ID of the inserted or updated record, or None on failure
     """
     connection = get_db_connection()
     if not connection:
@@ -222,28 +814,54 @@ def save_song(filename, original_name, file_path, file_hash, is_instrumental, an
     
     cursor = connection.cursor()
     try:
-        # First check if song with this hash already exists
-        cursor.execute("SELECT id FROM songs WHERE file_hash = %s", (file_hash,))
-        existing_song = cursor.fetchone()
-        if existing_song:
-            print(f"Song with hash {file_hash} already exists in database with ID: {existing_song[0]}")
-            return None  # Return None to indicate no new record was created
-        
-        # Insert the song with standard schema
-        sql = """
+        backend = get_db_backend()
+        
+        # Split the results into summary columns, payload and heavy arrays
+        summary, payload, arrays_blob = encode_results(analysis_json or {})
+        feature_vector = extract_features(analysis_json or {})
+        
+        # Insert the song, or update the row that already has this hash
+        sql = f"""
         INSERT INTO songs (
-            filename, original_name, file_path, file_hash, is_instrumental, analysis_json
-        ) VALUES (%s, %s, %s, %s, %s, %s)
+            {', '.join(SONG_UPSERT_COLUMNS)}
+        ) VALUES ({', '.join(['%s'] * len(SONG_UPSERT_COLUMNS))})
+        {backend.upsert_clause(
+            ['file_hash'],
+            [f"{column} = {backend.excluded(column)}" for column in SONG_UPSERT_COLUMNS if column != 'file_hash']
+            + ["revision = revision + 1"],
+            returning_id=True
+        )}
         """
-        analysis_json_str = json.dumps(analysis_json) if analysis_json else None
-        values = (filename, original_name, file_path, file_hash, is_instrumental, analysis_json_str)
+        values = (
+            filename, original_name, file_path, file_hash, is_instrumental,
+            summary['overall_score'], summary['frequency_balance_score'], summary['dynamic_range_score'],
+            summary['stereo_width_score'], summary['clarity_score'], summary['musical_key'],
+            summary['duration_seconds'], summary['analysis_seconds'],
+            PAYLOAD_ENCODING, payload, feature_vector.tobytes(),
+            (analysis_json or {}).get('analyzer_version'),
+            extract_score_inputs(analysis_json or {}).tobytes()
+        )
         
         cursor.execute(sql, values)
+        song_id = backend.upserted_id(cursor)
+        
+        if arrays_blob:
+            cursor.execute(f"""
+            INSERT INTO song_analysis_arrays (file_hash, arrays_blob) VALUES (%s, %s)
+            {backend.upsert_clause(['file_hash'], [f"arrays_blob = {backend.excluded('arrays_blob')}"])}
+            """, (file_hash, arrays_blob))
+        else:
+            cursor.execute(SQL_DELETE_SONG_ARRAYS, (file_hash,))
+        
         connection.commit()
+        invalidate_cached_song(file_hash)
+        update_similarity_index(file_hash, feature_vector)
+        print(f"Stored analysis payload of {len(payload)} bytes (arrays: {len(arrays_blob) if arrays_blob else 0} bytes)")
         
-        return cursor.lastrowid
-    except Error as e:
+        return song_id
+    except DatabaseError as e:
         print(f"Error saving song: {e}")
+        connection.rollback()
         return None
     finally:
         cursor.close()
@@ -256,6 +874,54 @@ def initialize_database():
     """
     return create_tables_if_not_exist()
 
+def find_songs_by_identifier(identifier):
+    """
+    Resolve a song identifier through the indexed lookup columns
+    
+    The identifier is tried as a file_hash, then as an exact filename, then
+    as an exact original_name; the first key that matches wins.
+    
+    Args:
+        identifier: file_hash, filename, or original_name
+        
+    Returns:
+        List of dictionaries with id, file_hash, filename and file_path
+    """
+    connection = get_db_connection()
+    if not connection:
+        return []
+    
+    cursor = connection.cursor(dictionary=True)
+    try:
+        return _find_songs_by_identifier(cursor, identifier)
+    except DatabaseError as e:
+        print(f"Error looking up song: {e}")
+        return []
+    finally:
+        cursor.close()
+        connection.close()
+
+def _find_songs_by_identifier(cursor, identifier):
+    """Run the indexed lookups of find_songs_by_identifier on an open cursor"""
+    lookups = [SQL_SONG_KEYS_BY_FILENAME, SQL_SONG_KEYS_BY_ORIGINAL_NAME]
+    if len(identifier) >= 32:  # If it looks like a hash
+        lookups.insert(0, SQL_SONG_KEYS_BY_HASH)
+    
+    for sql in lookups:
+        cursor.execute(sql, (identifier,))
+        matches = cursor.fetchall()
+        if matches:
+            return [match if isinstance(match, dict) else dict(zip(SONG_KEY_COLUMNS, match)) for match in matches]
+    
+    # Names an upload had before it was stored under its hash
+    cursor.execute(SQL_FIND_UPLOAD_ALIAS, (identifier,))
+    alias = cursor.fetchone()
+    if alias:
+        file_hash = alias['file_hash'] if isinstance(alias, dict) else alias[0]
+        cursor.execute(SQL_SONG_KEYS_BY_HASH, (file_hash,))
+        return [match if isinstance(match, dict) else dict(zip(SONG_KEY_COLUMNS, match)) for match in cursor.fetchall()]
+    return []
+
 def delete_song(identifier):
     """
     Delete a song from the database by various identifiers
@@ -272,65 +938,26 @@ def delete_song(identifier):
     
     cursor = connection.cursor()
     try:
-        # First, try as a file_hash (most reliable)
-        if len(identifier) >= 32:  # If it looks like a hash
-            print(f"Attempting to delete song with file_hash: {identifier}")
-            cursor.execute("SELECT id, file_path FROM songs WHERE file_hash = %s", (identifier,))
-            result = cursor.fetchone()
-            
-            if result:
-                print(f"Found song with file_hash, ID: {result[0]}, file path: {result[1]}")
-                cursor.execute("DELETE FROM songs WHERE file_hash = %s", (identifier,))
-                connection.commit()
-                deleted_rows = cursor.rowcount
-                print(f"Deleted {deleted_rows} rows from songs table using file_hash")
-                return deleted_rows > 0
-        
-        # Next, try as a filename (exact match)
-        print(f"Attempting to delete song with filename: {identifier}")
-        cursor.execute("SELECT id, file_path FROM songs WHERE filename = %s", (identifier,))
-        result = cursor.fetchone()
-        
-        if result:
-            print(f"Found song with filename, ID: {result[0]}, file path: {result[1]}")
-            cursor.execute("DELETE FROM songs WHERE filename = %s", (identifier,))
-            connection.commit()
-            deleted_rows = cursor.rowcount
-            print(f"Deleted {deleted_rows} rows from songs table using filename")
-            return deleted_rows > 0
-            
-        # Try with original_name (exact match)
-        print(f"Attempting to delete song with original_name: {identifier}")
-        cursor.execute("SELECT id, file_path FROM songs WHERE original_name = %s", (identifier,))
-        result = cursor.fetchone()
-        
-        if result:
-            print(f"Found song with original_name, ID: {result[0]}, file path: {result[1]}")
-            cursor.execute("DELETE FROM songs WHERE original_name = %s", (identifier,))
-            connection.commit()
-            deleted_rows = cursor.rowcount
-            print(f"Deleted {deleted_rows} rows from songs table using original_name")
-            return deleted_rows > 0
-            
-        # Try with LIKE for both filename and original_name (more permissive)
-        print(f"Attempting to find song with LIKE: %{identifier}%")
-        cursor.execute("SELECT id, file_path, file_hash FROM songs WHERE filename LIKE %s OR original_name LIKE %s", 
-                      (f"%{identifier}%", f"%{identifier}%"))
-        result = cursor.fetchone()
-        
-        if result:
-            file_hash = result[2]
-            print(f"Found song with LIKE search, ID: {result[0]}, file path: {result[1]}, hash: {file_hash}")
-            cursor.execute("DELETE FROM songs WHERE id = %s", (result[0],))
-            connection.commit()
-            deleted_rows = cursor.rowcount
-            print(f"Deleted {deleted_rows} rows from songs table using LIKE and ID")
-            return deleted_rows > 0
+        matches = _find_songs_by_identifier(cursor, identifier)
+        if not matches:
+            print(f"No song found with any identifier matching: {identifier}")
+            return False
         
-        # Not found with any method
-        print(f"No song found with any identifier matching: {identifier}")
-        return False
-    except Error as e:
+        # Delete through the unique file_hash key
+        file_hashes = [match['file_hash'] for match in matches]
+        placeholders = _placeholders(len(file_hashes))
+        print(f"Deleting song(s) matching {identifier}: {', '.join(file_hashes)}")
+        for sql in SQL_DELETE_SONG_ROWS:
+            cursor.execute(sql.format(placeholders=placeholders), file_hashes)
+        deleted_rows = cursor.rowcount
+        connection.commit()
+        
+        for file_hash in file_hashes:
+            invalidate_cached_song(file_hash)
+            remove_from_similarity_index(file_hash)
+        print(f"Deleted {deleted_rows} rows from songs table")
+        return deleted_rows > 0
+    except DatabaseError as e:
         print(f"Error deleting song: {e}")
         connection.rollback()
         return False
@@ -341,117 +968,1030 @@ def delete_song(identifier):
         cursor.close()
         connection.close()
 
-# Keep the old function name for backward compatibility
-def delete_song_by_filename(filename):
+def get_song_feature_vectors(after_id=0):
     """
-    Legacy function for backward compatibility
-    Now delegates to the more versatile delete_song function
+    Get the stored feature vectors of the library
+    
+    Args:
+        after_id: Only return songs with a larger id (for incremental loads)
+        
+    Returns:
+        List of (id, file_hash, feature_vector bytes) tuples ordered by id
     """
-    return delete_song(filename)
+    connection = get_db_connection()
+    if not connection:
+        return []
+    
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+        SELECT id, file_hash, feature_vector FROM songs
+        WHERE id > %s AND feature_vector IS NOT NULL
+        ORDER BY id
+        """, (after_id,))
+        return cursor.fetchall()
+    except DatabaseError as e:
+        print(f"Error loading song feature vectors: {e}")
+        return []
+    finally:
+        cursor.close()
+        connection.close()
 
-def save_ai_usage_stat(provider, model, is_fallback=False, response_time=None):
+def backfill_feature_vectors(batch_size=200):
     """
-    Save AI usage statistics to the database
+    Compute feature vectors for songs stored before they were introduced
     
     Args:
-        provider: AI provider name (e.g., 'openai', 'openrouter')
-        model: Model name used
-        is_fallback: Whether this was a fallback request
-        response_time: Response time in seconds
+        batch_size: Number of songs decoded and updated per transaction
         
     Returns:
-        ID of the inserted record, or None on failure
+        Number of songs updated
     """
     connection = get_db_connection()
     if not connection:
-        return None
+        return 0
     
-    cursor = connection.cursor()
+    cursor = connection.cursor(dictionary=True)
+    updated = 0
     try:
-        sql = """
-        INSERT INTO ai_usage_stats (
-            provider, model, is_fallback, response_time
-        ) VALUES (%s, %s, %s, %s)
-        """
-        values = (provider, model, is_fallback, response_time)
-        
-        cursor.execute(sql, values)
-        connection.commit()
+        last_id = 0
+        while True:
+            cursor.execute("""
+            SELECT id, file_hash, payload_encoding, analysis_payload, analysis_json FROM songs
+            WHERE id > %s AND feature_vector IS NULL
+            ORDER BY id
+            LIMIT %s
+            """, (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            
+            for row in rows:
+                last_id = row['id']
+                analysis = _decode_song_analysis(row)
+                if analysis:
+                    cursor.execute("UPDATE songs SET feature_vector = %s WHERE id = %s",
+                                   (extract_features(analysis).tobytes(), row['id']))
+                    updated += 1
+            connection.commit()
         
-        return cursor.lastrowid
-    except Error as e:
-        print(f"Error saving AI usage stats: {e}")
-        return None
+        if updated:
+            print(f"Computed feature vectors for {updated} stored songs")
+        return updated
+    except DatabaseError as e:
+        print(f"Error backfilling feature vectors: {e}")
+        connection.rollback()
+        return updated
     finally:
         cursor.close()
         connection.close()
 
-def get_ai_usage_stats(days=30):
+def get_song_score_inputs():
+    """
+    Get the stored score inputs and scores of the library
+    
+    Returns:
+        List of dictionaries with id, file_hash, is_instrumental, the score
+        columns and the score_inputs bytes, ordered by id
+    """
+    connection = get_db_connection()
+    if not connection:
+        return []
+    
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(f"""
+        SELECT id, file_hash, is_instrumental, {', '.join(SCORE_COLUMN_KEYS)}, score_inputs FROM songs
+        WHERE score_inputs IS NOT NULL
+        ORDER BY id
+        """)
+        return cursor.fetchall()
+    except DatabaseError as e:
+        print(f"Error loading song score inputs: {e}")
+        return []
+    finally:
+        cursor.close()
+        connection.close()
+
+def backfill_score_inputs(batch_size=200):
     """
-    Get AI usage statistics from the database
+    Compute score inputs for songs stored before they were introduced, or
+    before SCORE_INPUT_NAMES changed
     
     Args:
-        days: Number of days to look back (default: 30)
+        batch_size: Number of songs decoded and updated per transaction
         
     Returns:
-        Dictionary with usage statistics
+        Number of songs updated
     """
     connection = get_db_connection()
     if not connection:
-        return None
+        return 0
     
     cursor = connection.cursor(dictionary=True)
+    updated = 0
     try:
-        # Get total usage by provider
-        cursor.execute("""
-        SELECT 
-            provider, 
-            COUNT(*) as count,
-            COUNT(CASE WHEN is_fallback = 1 THEN 1 END) as fallback_count,
-            AVG(response_time) as avg_response_time
-        FROM ai_usage_stats
-        WHERE timestamp >= DATE_SUB(NOW(), INTERVAL %s DAY)
-        GROUP BY provider
-        """, (days,))
-        
-        by_provider = cursor.fetchall()
-        
-        # Get usage by model
-        cursor.execute("""
-        SELECT 
-            provider,
-            model, 
-            COUNT(*) as count,
-            AVG(response_time) as avg_response_time
-        FROM ai_usage_stats
-        WHERE timestamp >= DATE_SUB(NOW(), INTERVAL %s DAY)
-        GROUP BY provider, model
-        """, (days,))
+        last_id = 0
+        while True:
+            cursor.execute("""
+            SELECT id, file_hash, payload_encoding, analysis_payload, analysis_json FROM songs
+            WHERE id > %s AND (score_inputs IS NULL OR LENGTH(score_inputs) <> %s)
+            ORDER BY id
+            LIMIT %s
+            """, (last_id, SCORE_INPUTS_BYTES, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            
+            for row in rows:
+                last_id = row['id']
+                analysis = _decode_song_analysis(row)
+                if analysis:
+                    cursor.execute("UPDATE songs SET score_inputs = %s WHERE id = %s",
+                                   (extract_score_inputs(analysis).tobytes(), row['id']))
+                    updated += 1
+            connection.commit()
         
-        by_model = cursor.fetchall()
+        if updated:
+            print(f"Computed score inputs for {updated} stored songs")
+        return updated
+    except DatabaseError as e:
+        print(f"Error backfilling score inputs: {e}")
+        connection.rollback()
+        return updated
+    finally:
+        cursor.close()
+        connection.close()
+
+def update_song_scores(scores, batch_size=1000):
+    """
+    Write re-scored songs back in batched UPDATE statements
+    
+    The revision of every updated row is bumped, so ETags built from it
+    change with the scores.
+    
+    Args:
+        scores: List of (song id, file_hash, overall_score,
+                frequency_balance_score, clarity_score) tuples
+        batch_size: Number of rows per UPDATE batch and transaction
         
-        # Get daily usage
-        cursor.execute("""
-        SELECT 
-            DATE(timestamp) as date,
-            provider,
-            COUNT(*) as count
+    Returns:
+        Number of songs updated
+    """
+    connection = get_db_connection()
+    if not connection:
+        return 0
+    
+    cursor = connection.cursor()
+    updated = 0
+    try:
+        for start in range(0, len(scores), batch_size):
+            batch = scores[start:start + batch_size]
+            cursor.executemany("""
+            UPDATE songs SET overall_score = %s, frequency_balance_score = %s, clarity_score = %s,
+            revision = revision + 1
+            WHERE id = %s
+            """, [(overall, balance, clarity, song_id) for song_id, _, overall, balance, clarity in batch])
+            connection.commit()
+            updated += len(batch)
+            invalidate_cached_songs([file_hash for _, file_hash, _, _, _ in batch])
+        return updated
+    except DatabaseError as e:
+        print(f"Error updating song scores: {e}")
+        connection.rollback()
+        return updated
+    finally:
+        cursor.close()
+        connection.close()
+
+def get_songs_by_hashes(file_hashes):
+    """
+    Get summary information for a list of songs
+    
+    Args:
+        file_hashes: List of SHA-256 file hashes
+        
+    Returns:
+        Dictionary mapping file_hash to a dictionary of summary columns
+    """
+    if not file_hashes:
+        return {}
+    
+    connection = get_db_connection()
+    if not connection:
+        return {}
+    
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(SQL_SONG_SUMMARIES.format(placeholders=_placeholders(len(file_hashes))), list(file_hashes))
+        return {row['file_hash']: row for row in cursor.fetchall()}
+    except DatabaseError as e:
+        print(f"Error loading songs by hash: {e}")
+        return {}
+    finally:
+        cursor.close()
+        connection.close()
+
+def get_outdated_song_hashes(analyzer_version, limit=None):
+    """
+    Find the songs whose stored results another analyzer version produced
+    
+    Args:
+        analyzer_version: Current analyzer version
+        limit: Maximum number of hashes to return, or None for all
+        
+    Returns:
+        List of file hashes, oldest songs first
+    """
+    connection = get_db_connection()
+    if not connection:
+        return []
+    
+    cursor = connection.cursor()
+    try:
+        sql = """
+        SELECT file_hash FROM songs
+        WHERE analyzer_version IS NULL OR analyzer_version <> %s
+        ORDER BY id
+        """
+        params = [analyzer_version]
+        if limit:
+            sql += " LIMIT %s"
+            params.append(int(limit))
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+    except DatabaseError as e:
+        print(f"Error finding outdated songs: {e}")
+        return []
+    finally:
+        cursor.close()
+        connection.close()
+
+def save_song_fingerprint(file_hash, fingerprint, batch_size=1000):
+    """
+    Store the landmark hashes and profile of a song's fingerprint
+    
+    Args:
+        file_hash: SHA-256 hash of the file
+        fingerprint: Dictionary from compute_fingerprint
+        batch_size: Number of landmark rows per INSERT statement
+        
+    Returns:
+        True on success, False on failure
+    """
+    connection = get_db_connection()
+    if not connection:
+        return False
+    
+    cursor = connection.cursor()
+    try:
+        backend = get_db_backend()
+        cursor.execute(SQL_DELETE_FINGERPRINTS, (file_hash,))
+        
+        rows = [(value, file_hash, frame) for value, frame in fingerprint["hashes"]]
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            placeholders = ", ".join(["(%s, %s, %s)"] * len(batch))
+            cursor.execute(
+                f"INSERT INTO song_fingerprints (hash, file_hash, time_offset) VALUES {placeholders}",
+                [value for row in batch for value in row]
+            )
+        
+        cursor.execute(f"""
+        INSERT INTO song_fingerprint_profiles (file_hash, duration_seconds, hash_count, profile)
+        VALUES (%s, %s, %s, %s)
+        {backend.upsert_clause(['file_hash'], [
+            f"{column} = {backend.excluded(column)}" for column in ('duration_seconds', 'hash_count', 'profile')
+        ])}
+        """, (file_hash, fingerprint["duration_seconds"], len(rows), fingerprint["profile"].tobytes()))
+        
+        connection.commit()
+        return True
+    except DatabaseError as e:
+        print(f"Error saving song fingerprint: {e}")
+        connection.rollback()
+        return False
+    finally:
+        cursor.close()
+        connection.close()
+
+def find_fingerprint_candidates(hash_values, chunk_size=500):
+    """
+    Get the stored landmarks that share a hash with a query fingerprint
+    
+    Args:
+        hash_values: List of distinct landmark hashes
+        chunk_size: Number of hashes per indexed IN lookup
+        
+    Returns:
+        List of (file_hash, hash, time_offset) tuples
+    """
+    connection = get_db_connection()
+    if not connection:
+        return []
+    
+    cursor = connection.cursor()
+    try:
+        rows = []
+        for start in range(0, len(hash_values), chunk_size):
+            chunk = hash_values[start:start + chunk_size]
+            cursor.execute(SQL_FINGERPRINT_CANDIDATES.format(placeholders=_placeholders(len(chunk))), chunk)
+            rows.extend(cursor.fetchall())
+        return rows
+    except DatabaseError as e:
+        print(f"Error looking up fingerprint candidates: {e}")
+        return []
+    finally:
+        cursor.close()
+        connection.close()
+
+def get_fingerprint_profiles(file_hashes):
+    """
+    Get the fingerprint metadata of analyzed songs
+    
+    Args:
+        file_hashes: List of SHA-256 file hashes
+        
+    Returns:
+        Dictionary mapping file_hash to a dictionary with duration_seconds,
+        hash_count, profile (float32 array) and is_instrumental
+    """
+    if not file_hashes:
+        return {}
+    
+    connection = get_db_connection()
+    if not connection:
+        return {}
+    
+    cursor = connection.cursor(dictionary=True)
+    try:
+        placeholders = ", ".join(["%s"] * len(file_hashes))
+        cursor.execute(f"""
+        SELECT p.file_hash, p.duration_seconds, p.hash_count, p.profile, s.is_instrumental
+        FROM song_fingerprint_profiles p
+        JOIN songs s ON s.file_hash = p.file_hash
+        WHERE p.file_hash IN ({placeholders})
+        """, list(file_hashes))
+        profiles = {}
+        for row in cursor.fetchall():
+            row['profile'] = np.frombuffer(bytes(row['profile']), dtype=np.float32)
+            profiles[row['file_hash']] = row
+        return profiles
+    except DatabaseError as e:
+        print(f"Error loading fingerprint profiles: {e}")
+        return {}
+    finally:
+        cursor.close()
+        connection.close()
+
+def save_song_insights(file_hash, status, insights=None):
+    """
+    Store the AI insights of a song, or the state of their generation
+    
+    Args:
+        file_hash: SHA-256 hash of the song file
+        status: "pending", "complete" or "failed"
+        insights: Insights dictionary, if generation has finished
+        
+    Returns:
+        True if the row was written, False otherwise
+    """
+    connection = get_db_connection()
+    if not connection:
+        return False
+    
+    cursor = connection.cursor()
+    try:
+        backend = get_db_backend()
+        columns = ["status", "insights_json", "updated_at"]
+        cursor.execute(f"""
+        INSERT INTO song_ai_insights (file_hash, {', '.join(columns)}) VALUES (%s, %s, %s, %s)
+        {backend.upsert_clause(['file_hash'], [f"{column} = {backend.excluded(column)}" for column in columns])}
+        """, (file_hash, status, json.dumps(insights) if insights is not None else None, datetime.now()))
+        connection.commit()
+        return True
+    except DatabaseError as e:
+        print(f"Error saving AI insights: {e}")
+        connection.rollback()
+        return False
+    finally:
+        cursor.close()
+        connection.close()
+
+def save_upload_aliases(aliases, file_hash):
+    """
+    Map the names and ids an upload is known by to its file hash
+    
+    An alias that already points at another hash is moved to this one, so
+    a name resolves to the file last uploaded under it.
+    
+    Args:
+        aliases: Iterable of names, e.g. the original file name and the id derived from it
+        file_hash: SHA-256 hash of the uploaded file
+        
+    Returns:
+        True if the aliases were written, False otherwise
+    """
+    aliases = sorted({alias[:255] for alias in aliases if alias and alias != file_hash})
+    if not aliases:
+        return True
+    
+    connection = get_db_connection()
+    if not connection:
+        return False
+    
+    cursor = connection.cursor()
+    try:
+        backend = get_db_backend()
+        columns = ["file_hash", "updated_at"]
+        now = datetime.now()
+        cursor.executemany(f"""
+        INSERT INTO upload_aliases (alias, {', '.join(columns)}) VALUES (%s, %s, %s)
+        {backend.upsert_clause(['alias'], [f"{column} = {backend.excluded(column)}" for column in columns])}
+        """, [(alias, file_hash, now) for alias in aliases])
+        connection.commit()
+        return True
+    except DatabaseError as e:
+        print(f"Error saving upload aliases: {e}")
+        connection.rollback()
+        return False
+    finally:
+        cursor.close()
+        connection.close()
+
+def find_upload_alias(alias):
+    """
+    Get the file hash an upload name or id refers to
+    
+    Args:
+        alias: Name or id saved with save_upload_aliases
+        
+    Returns:
+        SHA-256 file hash, or None if the alias is unknown
+    """
+    connection = get_db_connection()
+    if not connection:
+        return None
+    
+    cursor = connection.cursor()
+    try:
+        cursor.execute(SQL_FIND_UPLOAD_ALIAS, (alias,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    except DatabaseError as e:
+        print(f"Error looking up upload alias: {e}")
+        return None
+    finally:
+        cursor.close()
+        connection.close()
+
+def get_song_insights(file_hash):
+    """
+    Get the stored AI insights of a song
+    
+    Args:
+        file_hash: SHA-256 hash of the song file
+        
+    Returns:
+        Dictionary with status, insights (None while pending) and updated_at,
+        or None if generation was never started
+    """
+    connection = get_db_connection()
+    if not connection:
+        return None
+    
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            SQL_SONG_INSIGHTS,
+            (file_hash,)
+        )
+        row = cursor.fetchone()
+        if not row:
+            return None
+        return {
+            "status": row["status"],
+            "insights": json.loads(row["insights_json"]) if row["insights_json"] else None,
+            "updated_at": row["updated_at"]
+        }
+    except (DatabaseError, ValueError) as e:
+        print(f"Error getting AI insights: {e}")
+        return None
+    finally:
+        cursor.close()
+        connection.close()
+
+def invalidate_cached_song(file_hash):
+    """
+    Drop a song from the result cache after it was changed or deleted
+    
+    Args:
+        file_hash: SHA-256 hash of the file
+    """
+    cache = get_result_cache()
+    if cache and file_hash:
+        cache.invalidate(file_hash)
+
+def invalidate_cached_songs(file_hashes):
+    """
+    Drop many songs from the result cache at once
+    
+    Args:
+        file_hashes: List of SHA-256 file hashes
+    """
+    cache = get_result_cache()
+    if cache and file_hashes:
+        cache.invalidate_many(file_hashes)
+
+# Keep the old function name for backward compatibility
+def delete_song_by_filename(filename):
+    """
+    Legacy function for backward compatibility
+    Now delegates to the more versatile delete_song function
+    """
+    return delete_song(filename)
+
+def save_ai_usage_stat(provider, model, is_fallback=False, response_time=None,
+                       prompt_tokens=None, completion_tokens=None, cached_tokens=None):
+    """
+    Record an AI usage event
+    
+    The event is queued and written by a background thread together with
+    other events, so the caller never waits on the database. Set
+    AI_STATS_ASYNC=false to write synchronously instead.
+    
+    Args:
+        provider: AI provider name (e.g., 'openai', 'openrouter')
+        model: Model name used
+        is_fallback: Whether this was a fallback request
+        response_time: Response time in seconds
+        prompt_tokens: Input tokens of the request
+        completion_tokens: Output tokens of the request
+        cached_tokens: Input tokens served from the provider's prompt cache
+        
+    Returns:
+        True if the event was queued or written, False otherwise
+    """
+    row = (provider, model, bool(is_fallback), response_time, datetime.now(),
+           prompt_tokens, completion_tokens, cached_tokens)
+    
+    if os.environ.get("AI_STATS_ASYNC", "true").lower() != "true":
+        return insert_ai_usage_stats([row])
+    
+    return get_ai_usage_writer().submit(row)
+
+def insert_ai_usage_stats(rows):
+    """
+    Write AI usage events with a single multi-row INSERT
+    
+    Args:
+        rows: List of (provider, model, is_fallback, response_time, timestamp)
+            tuples, optionally followed by (prompt_tokens, completion_tokens, cached_tokens)
+        
+    Returns:
+        True on success, False on failure
+    """
+    if not rows:
+        return True
+    rows = [tuple(row) + (None,) * (8 - len(row)) for row in rows]
+    
+    connection = get_db_connection()
+    if not connection:
+        return False
+    
+    cursor = connection.cursor()
+    try:
+        placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s)"] * len(rows))
+        sql = f"""
+        INSERT INTO ai_usage_stats (
+            provider, model, is_fallback, response_time, timestamp,
+            prompt_tokens, completion_tokens, cached_tokens
+        ) VALUES {placeholders}
+        """
+        values = [value for row in rows for value in row]
+        
+        cursor.execute(sql, values)
+        
+        # Fold the batch into the daily rollups in the same transaction
+        _apply_usage_rollups(cursor, aggregate_usage_rows(rows))
+        connection.commit()
+        
+        return True
+    except DatabaseError as e:
+        print(f"Error saving AI usage stats: {e}")
+        return False
+    finally:
+        cursor.close()
+        connection.close()
+
+# Counters of ai_usage_daily that are summed when rollups are merged; the
+# columns are named like the keys of the rollup accumulators
+ROLLUP_COUNTER_COLUMNS = list(ROLLUP_COUNTERS)
+
+def _apply_usage_rollups(cursor, rollups):
+    """
+    Add aggregated usage events to the daily rollup tables
+    
+    Args:
+        cursor: Open cursor; the caller commits
+        rollups: Dictionary from aggregate_usage_rows
+    """
+    if not rollups:
+        return
+    
+    backend = get_db_backend()
+    daily_rows = []
+    latency_rows = []
+    for (day, provider, model), rollup in rollups.items():
+        daily_rows.append((day, provider, model) + tuple(rollup[column] for column in ROLLUP_COUNTER_COLUMNS))
+        for bucket, count in rollup["buckets"].items():
+            latency_rows.append((day, provider, model, bucket, count))
+    
+    row_placeholder = "(" + ", ".join(["%s"] * (3 + len(ROLLUP_COUNTER_COLUMNS))) + ")"
+    placeholders = ", ".join([row_placeholder] * len(daily_rows))
+    cursor.execute(f"""
+    INSERT INTO ai_usage_daily (
+        day, provider, model, {", ".join(ROLLUP_COUNTER_COLUMNS)}
+    ) VALUES {placeholders}
+    {backend.upsert_clause(
+        ['day', 'provider', 'model'],
+        [f"{column} = {column} + {backend.excluded(column)}" for column in ROLLUP_COUNTER_COLUMNS]
+    )}
+    """, [value for row in daily_rows for value in row])
+    
+    if latency_rows:
+        placeholders = ", ".join(["(%s, %s, %s, %s, %s)"] * len(latency_rows))
+        cursor.execute(f"""
+        INSERT INTO ai_usage_daily_latency (
+            day, provider, model, bucket, bucket_count
+        ) VALUES {placeholders}
+        {backend.upsert_clause(
+            ['day', 'provider', 'model', 'bucket'],
+            [f"bucket_count = bucket_count + {backend.excluded('bucket_count')}"]
+        )}
+        """, [value for row in latency_rows for value in row])
+
+def rebuild_ai_usage_rollups(days=None, batch_size=5000):
+    """
+    Recompute the daily usage rollups from the raw ai_usage_stats rows
+    
+    Used to backfill the rollups after an upgrade and as a periodic
+    compaction job that repairs drift, e.g. after raw rows were edited.
+    
+    Args:
+        days: Only rebuild the last N days, or None for the full history
+        batch_size: Number of raw rows fetched at a time
+        
+    Returns:
+        Number of raw rows folded into the rollups, or None on failure
+    """
+    connection = get_db_connection()
+    if not connection:
+        return None
+    
+    cursor = connection.cursor()
+    try:
+        since = date.today() - timedelta(days=days) if days is not None else date.min
+        
+        cursor.execute("DELETE FROM ai_usage_daily WHERE day >= %s", (since,))
+        cursor.execute("DELETE FROM ai_usage_daily_latency WHERE day >= %s", (since,))
+        
+        cursor.execute("""
+        SELECT provider, model, is_fallback, response_time, timestamp,
+               prompt_tokens, completion_tokens, cached_tokens
         FROM ai_usage_stats
-        WHERE timestamp >= DATE_SUB(NOW(), INTERVAL %s DAY)
-        GROUP BY DATE(timestamp), provider
+        WHERE timestamp >= %s
+        """, (datetime.combine(since, datetime.min.time()),))
+        
+        # Aggregate in Python while streaming, one rollup row per day and model
+        rollups = {}
+        row_count = 0
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            row_count += len(rows)
+            for key, rollup in aggregate_usage_rows(rows).items():
+                merge_rollups(rollups.setdefault(key, empty_rollup()), rollup)
+        
+        _apply_usage_rollups(cursor, rollups)
+        connection.commit()
+        
+        print(f"Rebuilt AI usage rollups from {row_count} rows")
+        return row_count
+    except DatabaseError as e:
+        connection.rollback()
+        print(f"Error rebuilding AI usage rollups: {e}")
+        return None
+    finally:
+        cursor.close()
+        connection.close()
+
+_ai_usage_writer = None
+_ai_usage_writer_lock = threading.Lock()
+
+def get_ai_usage_writer():
+    """
+    Get the process-wide batched writer for AI usage events
+    
+    Returns:
+        BatchedWriter instance flushing into ai_usage_stats
+    """
+    global _ai_usage_writer
+    
+    if _ai_usage_writer is None:
+        with _ai_usage_writer_lock:
+            if _ai_usage_writer is None:
+                _ai_usage_writer = BatchedWriter(
+                    insert_ai_usage_stats,
+                    batch_size=int(os.environ.get("AI_STATS_BATCH_SIZE", 50)),
+                    flush_interval=float(os.environ.get("AI_STATS_FLUSH_INTERVAL", 5)),
+                    max_buffer=int(os.environ.get("AI_STATS_MAX_BUFFER", 10000)),
+                    name="ai-usage-writer"
+                )
+    return _ai_usage_writer
+
+def get_ai_usage_stats(days=30):
+    """
+    Get AI usage statistics from the daily rollup tables
+    
+    Only rollup rows are read, so the cost depends on the number of days
+    and models, not on the number of recorded requests.
+    
+    Args:
+        days: Number of days to look back (default: 30)
+        
+    Returns:
+        Dictionary with usage statistics
+    """
+    connection = get_db_connection()
+    if not connection:
+        return None
+    
+    cursor = connection.cursor(dictionary=True)
+    try:
+        since = date.today() - timedelta(days=days)
+        
+        cursor.execute("""
+        SELECT 
+            provider,
+            model,
+            SUM(request_count) as count,
+            SUM(fallback_count) as fallback_count,
+            SUM(timed_count) as timed_count,
+            SUM(response_time_sum) as response_time_sum,
+            SUM(response_time_sumsq) as response_time_sumsq,
+            SUM(token_count) as token_count,
+            SUM(prompt_tokens_sum) as prompt_tokens_sum,
+            SUM(completion_tokens_sum) as completion_tokens_sum,
+            SUM(cached_tokens_sum) as cached_tokens_sum
+        FROM ai_usage_daily
+        WHERE day >= %s
+        GROUP BY provider, model
+        """, (since,))
+        model_rows = cursor.fetchall()
+        
+        cursor.execute("""
+        SELECT provider, model, bucket, SUM(bucket_count) as bucket_count
+        FROM ai_usage_daily_latency
+        WHERE day >= %s
+        GROUP BY provider, model, bucket
+        """, (since,))
+        latency_rows = cursor.fetchall()
+        
+        # Get daily usage
+        cursor.execute("""
+        SELECT 
+            day as date,
+            provider,
+            SUM(request_count) as count
+        FROM ai_usage_daily
+        WHERE day >= %s
+        GROUP BY day, provider
         ORDER BY date
-        """, (days,))
+        """, (since,))
+        daily = [
+            {"date": row["date"], "provider": row["provider"], "count": int(row["count"] or 0)}
+            for row in cursor.fetchall()
+        ]
+        
+        model_buckets = {}
+        provider_buckets = {}
+        for row in latency_rows:
+            count = int(row["bucket_count"] or 0)
+            buckets = model_buckets.setdefault((row["provider"], row["model"]), {})
+            buckets[row["bucket"]] = buckets.get(row["bucket"], 0) + count
+            buckets = provider_buckets.setdefault(row["provider"], {})
+            buckets[row["bucket"]] = buckets.get(row["bucket"], 0) + count
+        
+        # Provider totals are the sums of their models
+        timing_columns = ["count", "fallback_count", "timed_count", "response_time_sum", "response_time_sumsq"]
+        token_columns = ["token_count", "prompt_tokens_sum", "completion_tokens_sum", "cached_tokens_sum"]
+        provider_totals = {}
+        by_model = []
+        for row in model_rows:
+            by_model.append(dict(
+                summarize_rollup(
+                    *[row[column] for column in timing_columns],
+                    model_buckets.get((row["provider"], row["model"]), {}),
+                    *[row[column] for column in token_columns]
+                ),
+                provider=row["provider"],
+                model=row["model"]
+            ))
+            totals = provider_totals.setdefault(row["provider"], [0.0] * 9)
+            for index, column in enumerate(timing_columns + token_columns):
+                totals[index] += float(row[column] or 0)
         
-        daily = cursor.fetchall()
+        by_provider = [
+            dict(summarize_rollup(*totals[:5], provider_buckets.get(provider, {}), *totals[5:]), provider=provider)
+            for provider, totals in provider_totals.items()
+        ]
         
         return {
             "by_provider": by_provider,
             "by_model": by_model,
-            "daily": daily
+            "daily": daily,
+            "insight_cache": _get_ai_insight_cache_stats(cursor, since)
         }
-    except Error as e:
+    except DatabaseError as e:
         print(f"Error getting AI usage stats: {e}")
         return None
     finally:
         cursor.close()
-        connection.close() 
\ No newline at end of file
+        connection.close()
+
+def get_ai_latency_buckets(days=7):
+    """
+    Get the response time histograms of each provider from the rollups
+    
+    Args:
+        days: Number of days to look back (default: 7)
+        
+    Returns:
+        Dictionary mapping provider to {bucket: count}, empty on error
+    """
+    connection = get_db_connection()
+    if not connection:
+        return {}
+    
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+        SELECT provider, bucket, SUM(bucket_count)
+        FROM ai_usage_daily_latency
+        WHERE day >= %s
+        GROUP BY provider, bucket
+        """, (date.today() - timedelta(days=days),))
+        buckets = {}
+        for provider, bucket, count in cursor.fetchall():
+            buckets.setdefault(provider, {})[int(bucket)] = int(count or 0)
+        return buckets
+    except DatabaseError as e:
+        print(f"Error getting AI latency histograms: {e}")
+        return {}
+    finally:
+        cursor.close()
+        connection.close()
+
+def get_cached_ai_insight(cache_key, max_age_seconds):
+    """
+    Look up stored AI insights for a prompt and count the hit or miss
+    
+    Args:
+        cache_key: Hash of the prompt, provider and model
+        max_age_seconds: Entries older than this are treated as missing
+        
+    Returns:
+        Insights dictionary, or None on a miss
+    """
+    connection = get_db_connection()
+    if not connection:
+        return None
+    
+    cursor = connection.cursor()
+    try:
+        now = datetime.now()
+        cursor.execute("""
+        SELECT insights_json FROM ai_insight_cache
+        WHERE cache_key = %s AND created_at >= %s
+        """, (cache_key, now - timedelta(seconds=max_age_seconds)))
+        row = cursor.fetchone()
+        
+        if row:
+            cursor.execute("""
+            UPDATE ai_insight_cache SET hit_count = hit_count + 1, last_used_at = %s
+            WHERE cache_key = %s
+            """, (now, cache_key))
+        
+        backend = get_db_backend()
+        cursor.execute(f"""
+        INSERT INTO ai_insight_cache_daily (day, hit_count, miss_count) VALUES (%s, %s, %s)
+        {backend.upsert_clause(['day'], [
+            f"hit_count = hit_count + {backend.excluded('hit_count')}",
+            f"miss_count = miss_count + {backend.excluded('miss_count')}"
+        ])}
+        """, (now.date(), 1 if row else 0, 0 if row else 1))
+        connection.commit()
+        
+        return json.loads(row[0]) if row else None
+    except (DatabaseError, ValueError) as e:
+        print(f"Error reading AI insight cache: {e}")
+        connection.rollback()
+        return None
+    finally:
+        cursor.close()
+        connection.close()
+
+def save_cached_ai_insight(cache_key, provider, model, insights, max_age_seconds, max_entries):
+    """
+    Store AI insights for a prompt and prune expired or excess entries
+    
+    Args:
+        cache_key: Hash of the prompt, provider and model
+        provider: AI provider name
+        model: Model name
+        insights: Insights dictionary
+        max_age_seconds: Entries older than this are deleted
+        max_entries: Least recently used entries beyond this count are deleted
+        
+    Returns:
+        True if the insights were stored, False otherwise
+    """
+    connection = get_db_connection()
+    if not connection:
+        return False
+    
+    cursor = connection.cursor()
+    try:
+        backend = get_db_backend()
+        now = datetime.now()
+        columns = ["provider", "model", "insights_json", "created_at", "last_used_at"]
+        cursor.execute(f"""
+        INSERT INTO ai_insight_cache (cache_key, {', '.join(columns)})
+        VALUES (%s, %s, %s, %s, %s, %s)
+        {backend.upsert_clause(
+            ['cache_key'],
+            [f"{column} = {backend.excluded(column)}" for column in columns] + ["hit_count = 0"]
+        )}
+        """, (cache_key, provider, model, json.dumps(insights), now, now))
+        
+        cursor.execute(
+            "DELETE FROM ai_insight_cache WHERE created_at < %s",
+            (now - timedelta(seconds=max_age_seconds),)
+        )
+        
+        # Delete exactly the surplus, least recently used first; timestamps
+        # tie within a second, so the key breaks ties. The derived table lets
+        # MySQL delete from the table it selects from.
+        cursor.execute("SELECT COUNT(*) FROM ai_insight_cache")
+        surplus = cursor.fetchone()[0] - int(max_entries)
+        if surplus > 0:
+            cursor.execute("""
+            DELETE FROM ai_insight_cache WHERE cache_key IN (
+                SELECT cache_key FROM (
+                    SELECT cache_key FROM ai_insight_cache WHERE cache_key <> %s
+                    ORDER BY last_used_at, cache_key LIMIT %s
+                ) AS evicted
+            )
+            """, (cache_key, surplus))
+        
+        connection.commit()
+        return True
+    except DatabaseError as e:
+        print(f"Error saving AI insight cache entry: {e}")
+        connection.rollback()
+        return False
+    finally:
+        cursor.close()
+        connection.close()
+
+def _get_ai_insight_cache_stats(cursor, since):
+    """
+    Get hit/miss counts of the AI insight cache
+    
+    Args:
+        cursor: Open dictionary cursor
+        since: First day to include
+        
+    Returns:
+        Dictionary with hits, misses, hit_rate (None without lookups) and entries
+    """
+    cursor.execute("""
+    SELECT SUM(hit_count) as hits, SUM(miss_count) as misses
+    FROM ai_insight_cache_daily
+    WHERE day >= %s
+    """, (since,))
+    row = cursor.fetchone() or {}
+    hits = int(row.get("hits") or 0)
+    misses = int(row.get("misses") or 0)
+    
+    cursor.execute("SELECT COUNT(*) as entries FROM ai_insight_cache")
+    entries = int(cursor.fetchone()["entries"] or 0)
+    
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else None,
+        "entries": entries
+    }
@@ -0,0 +1,324 @@
+"""
+Storage backends for the Music Mix Analyzer database layer.
+MySQL is used for multi-node deployments; the embedded SQLite backend keeps
+the data in a local file for single-node deployments and tests. Both expose
+connections that behave like mysql.connector connections, so the queries in
+app/core/database.py run unchanged on either backend.
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import date, datetime
+from functools import lru_cache
+
+import mysql.connector
+
+# Errors raised by either backend; catch this instead of a driver-specific Error
+DatabaseError = (mysql.connector.Error, sqlite3.Error)
+
+# Store dates as ISO strings and parse DATE/TIMESTAMP columns back into objects
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+
+class MySQLBackend:
+    """Backend connecting to a MySQL server"""
+
+    name = "mysql"
+
+    def __init__(self, config):
+        self.config = config
+
+    def connect(self, with_database=True):
+        """
+        Open a new connection to the MySQL server
+
+        Args:
+            with_database: If False, connects without selecting a database
+
+        Returns:
+            MySQL connection object or None if connection fails
+        """
+        try:
+            connection_params = dict(self.config)
+            if not with_database:
+                connection_params.pop('database', None)
+
+            print(f"Connecting to MySQL at {self.config['host']}:{self.config['port']}")
+
+            connection = mysql.connector.connect(**connection_params)
+
+            if connection.is_connected():
+                db_info = connection.get_server_info()
+                print(f"Connected to MySQL Server version {db_info}")
+                return connection
+            else:
+                print("Failed to connect to MySQL database")
+                return None
+        except mysql.connector.Error as e:
+            print(f"Error while connecting to MySQL: {e}")
+            return None
+
+    def upsert_clause(self, conflict_columns, assignments, returning_id=False):
+        """
+        Build the conflict clause of an INSERT that updates existing rows
+
+        Args:
+            conflict_columns: Columns of the unique key that may conflict
+            assignments: SQL assignments; use excluded() to refer to the new values
+            returning_id: Make the id of the written row available to upserted_id()
+
+        Returns:
+            SQL fragment appended after the VALUES list
+        """
+        if returning_id:
+            # LAST_INSERT_ID(id) makes lastrowid report the updated row as well
+            assignments = list(assignments) + ["id = LAST_INSERT_ID(id)"]
+        return "ON DUPLICATE KEY UPDATE " + ", ".join(assignments)
+
+    def upserted_id(self, cursor):
+        """Get the id of the row written by an upsert built with returning_id"""
+        return cursor.lastrowid
+
+    def excluded(self, column):
+        """Refer to the value the conflicting INSERT tried to write"""
+        return f"VALUES({column})"
+
+    def table_columns(self, connection, table):
+        """
+        Get the column names of a table
+
+        Args:
+            connection: Open connection
+            table: Table name
+
+        Returns:
+            Set of column names, empty if the table does not exist
+        """
+        cursor = connection.cursor()
+        try:
+            cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s
+            """, (table,))
+            return {row[0] for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+
+    def index_names(self, connection, table):
+        """
+        Get the index names of a table
+
+        Args:
+            connection: Open connection
+            table: Table name
+
+        Returns:
+            Set of index names
+        """
+        cursor = connection.cursor()
+        try:
+            cursor.execute("""
+            SELECT DISTINCT index_name FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s
+            """, (table,))
+            return {row[0] for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+
+    def drop_index_sql(self, table, index_name):
+        """Build a DROP INDEX statement"""
+        return f"DROP INDEX {index_name} ON {table}"
+
+@lru_cache(maxsize=512)
+def translate_placeholders(sql):
+    """Convert mysql.connector %s placeholders to SQLite ? placeholders"""
+    return sql.replace("%s", "?")
+
+class SQLiteCursor:
+    """Cursor wrapper with the parts of the mysql.connector cursor API we use"""
+
+    def __init__(self, cursor, dictionary=False):
+        self.cursor = cursor
+        self.dictionary = dictionary
+
+    def execute(self, sql, params=()):
+        self.cursor.execute(translate_placeholders(sql), tuple(params))
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self.cursor.executemany(translate_placeholders(sql), seq_of_params)
+        return self
+
+    def _convert(self, row):
+        if row is None or not self.dictionary:
+            return row
+        return {column[0]: value for column, value in zip(self.cursor.description, row)}
+
+    def fetchone(self):
+        return self._convert(self.cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._convert(row) for row in self.cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._convert(row) for row in self.cursor.fetchall()]
+
+    @property
+    def with_rows(self):
+        return self.cursor.description is not None
+
+    @property
+    def lastrowid(self):
+        return self.cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    def close(self):
+        self.cursor.close()
+
+class SQLiteConnection:
+    """
+    Connection wrapper around a per-thread shared sqlite3 connection.
+    close() only ends the current transaction; the underlying connection
+    stays open and is reused by the next caller on the same thread.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def cursor(self, dictionary=False, buffered=None):
+        return SQLiteCursor(self.connection.cursor(), dictionary=dictionary)
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def is_connected(self):
+        return True
+
+    def get_server_info(self):
+        return f"SQLite {sqlite3.sqlite_version}"
+
+    def close(self):
+        # Never leave an open transaction behind on the shared connection
+        if self.connection.in_transaction:
+            self.connection.rollback()
+
+class SQLiteBackend:
+    """Embedded backend storing the database in a local SQLite file"""
+
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    def connect(self, with_database=True):
+        """
+        Get this thread's connection to the SQLite database
+
+        Args:
+            with_database: Ignored; SQLite has no server-level connection
+
+        Returns:
+            SQLiteConnection object or None if the file cannot be opened
+        """
+        # Connections must not be shared across threads or forked processes
+        connection = getattr(self.local, "connection", None)
+        if connection is None or getattr(self.local, "pid", None) != os.getpid():
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                connection = sqlite3.connect(
+                    self.path,
+                    timeout=30.0,
+                    detect_types=sqlite3.PARSE_DECLTYPES,
+                    cached_statements=256
+                )
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("PRAGMA synchronous=NORMAL")
+                connection.execute("PRAGMA foreign_keys=ON")
+            except sqlite3.Error as e:
+                print(f"Error while opening SQLite database {self.path}: {e}")
+                return None
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return SQLiteConnection(connection)
+
+    def upsert_clause(self, conflict_columns, assignments, returning_id=False):
+        """
+        Build the conflict clause of an INSERT that updates existing rows
+
+        Args:
+            conflict_columns: Columns of the unique key that may conflict
+            assignments: SQL assignments; use excluded() to refer to the new values
+            returning_id: Make the id of the written row available to upserted_id()
+
+        Returns:
+            SQL fragment appended after the VALUES list
+        """
+        clause = f"ON CONFLICT({', '.join(conflict_columns)}) DO UPDATE SET " + ", ".join(assignments)
+        if returning_id:
+            clause += " RETURNING id"
+        return clause
+
+    def upserted_id(self, cursor):
+        """Get the id of the row written by an upsert built with returning_id"""
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def excluded(self, column):
+        """Refer to the value the conflicting INSERT tried to write"""
+        return f"excluded.{column}"
+
+    def table_columns(self, connection, table):
+        """
+        Get the column names of a table
+
+        Args:
+            connection: Open connection
+            table: Table name
+
+        Returns:
+            Set of column names, empty if the table does not exist
+        """
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA table_info({table})")
+            return {row[1] for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+
+    def index_names(self, connection, table):
+        """
+        Get the index names of a table
+
+        Args:
+            connection: Open connection
+            table: Table name
+
+        Returns:
+            Set of index names
+        """
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA index_list({table})")
+            return {row[1] for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+
+    def drop_index_sql(self, table, index_name):
+        """Build a DROP INDEX statement"""
+        return f"DROP INDEX IF EXISTS {index_name}"
@@ -4,8 +4,8 @@ All database connections should use these utilities for consistency.
 """
 
 import os
-import mysql.connector
-from mysql.connector import Error
+import threading
+from app.core.db_backends import MySQLBackend, SQLiteBackend, DatabaseError
 
 def get_db_config():
     """
@@ -22,37 +22,58 @@ def get_db_config():
         'database': os.environ.get('MYSQL_DATABASE', 'music_analyzer')
     }
 
+def get_db_identity():
+    """
+    Identify the configured database without its credentials
+    
+    Returns:
+        Tuple of the backend name and, for SQLite, the absolute file path,
+        for MySQL the host, port and database name
+    """
+    if os.environ.get('DB_BACKEND', 'mysql').lower() == 'sqlite':
+        return ('sqlite', os.path.abspath(os.environ.get('SQLITE_PATH', os.path.join('instance', 'music_analyzer.sqlite3'))))
+    config = get_db_config()
+    return ('mysql', config['host'], config['port'], config['database'])
+
+_backend = None
+_backend_key = None
+_backend_lock = threading.Lock()
+
+def get_db_backend():
+    """
+    Get the storage backend selected by the DB_BACKEND environment variable
+    
+    DB_BACKEND=mysql (default) connects to the MySQL server configured by the
+    MYSQL_* variables; DB_BACKEND=sqlite stores everything in the file given
+    by SQLITE_PATH.
+    
+    Returns:
+        MySQLBackend or SQLiteBackend instance
+    """
+    global _backend, _backend_key
+    
+    backend_name = os.environ.get('DB_BACKEND', 'mysql').lower()
+    if backend_name == 'sqlite':
+        key = ('sqlite', os.environ.get('SQLITE_PATH', os.path.join('instance', 'music_analyzer.sqlite3')))
+    else:
+        key = ('mysql', tuple(sorted(get_db_config().items())))
+    
+    # Reuse the backend (and its per-thread connections) while the config is unchanged
+    with _backend_lock:
+        if _backend is None or _backend_key != key:
+            _backend = SQLiteBackend(key[1]) if key[0] == 'sqlite' else MySQLBackend(get_db_config())
+            _backend_key = key
+        return _backend
+
 def get_db_connection(with_database=True):
     """
-    Create a connection to the MySQL database
+    Create a connection to the configured database
     
     Args:
         with_database: If True, includes the database name in connection.
                       If False, connects to MySQL without selecting a database.
     
     Returns:
-        MySQL connection object or None if connection fails
-    """
-    try:
-        # Get database configuration 
-        config = get_db_config()
-        connection_params = dict(config)
-        
-        # Optionally remove database name from connection parameters
-        if not with_database:
-            connection_params.pop('database', None)
-        
-        print(f"Connecting to MySQL at {config['host']}:{config['port']}")
-        
-        connection = mysql.connector.connect(**connection_params)
-        
-        if connection.is_connected():
-            db_info = connection.get_server_info()
-            print(f"Connected to MySQL Server version {db_info}")
-            return connection
-        else:
-            print("Failed to connect to MySQL database")
-            return None
-    except Error as e:
-        print(f"Error while connecting to MySQL: {e}")
-        return None 
\ No newline at end of file
+        Connection object or None if connection fails
+    """
+    return get_db_backend().connect(with_database=with_database)
@@ -0,0 +1,228 @@
+"""
+Perceptual audio fingerprints for near-duplicate uploads.
+The first seconds of a file are reduced to hashed pairs of spectral peaks
+(landmarks), which survive re-encoding, resampling and small offsets. A
+coarse band profile of the same excerpt guards against matching a revised
+mix of the same song, whose peaks would still line up.
+"""
+
+import os
+from collections import Counter, defaultdict
+
+import numpy as np
+import librosa
+from scipy.ndimage import maximum_filter
+
+from app.core.canonical_audio import load_audio, get_audio_duration
+
+# Analysis settings; changing them invalidates stored fingerprints
+SAMPLE_RATE = 11025
+N_FFT = 1024
+HOP_LENGTH = 512
+
+# Peak picking neighbourhood in (frequency bins, frames)
+PEAK_NEIGHBORHOOD = (15, 11)
+# Peaks quieter than the loudest one by more than this are ignored
+PEAK_RANGE_DB = 60.0
+PEAKS_PER_SECOND = 30
+
+# Each anchor peak is paired with up to FAN_OUT later peaks within
+# MAX_DELTA_FRAMES frames
+FAN_OUT = 5
+MAX_DELTA_FRAMES = 63
+
+# Number of log-spaced bands in the spectral profile
+PROFILE_BANDS = 24
+
+def get_fingerprint_settings():
+    """
+    Get the fingerprint matching settings from environment variables
+
+    Returns:
+        Dictionary of settings
+    """
+    return {
+        "seconds": float(os.environ.get("FINGERPRINT_SECONDS", 30)),
+        "min_matches": int(os.environ.get("FINGERPRINT_MIN_MATCHES", 25)),
+        "min_ratio": float(os.environ.get("FINGERPRINT_MIN_RATIO", 0.2)),
+        "max_profile_diff_db": float(os.environ.get("FINGERPRINT_MAX_PROFILE_DIFF_DB", 1.5)),
+    }
+
+def find_peaks(spectrogram_db):
+    """
+    Pick the local maxima of a spectrogram
+
+    Args:
+        spectrogram_db: 2-D array of (frequency bins, frames) in dB
+
+    Returns:
+        List of (frame, bin) tuples sorted by frame
+    """
+    if spectrogram_db.size == 0:
+        return []
+    local_max = maximum_filter(spectrogram_db, size=PEAK_NEIGHBORHOOD, mode="constant", cval=-np.inf)
+    floor = spectrogram_db.max() - PEAK_RANGE_DB
+    bins, frames = np.nonzero((spectrogram_db == local_max) & (spectrogram_db > floor))
+
+    # Keep the strongest peaks so dense material does not explode the index
+    duration = spectrogram_db.shape[1] * HOP_LENGTH / SAMPLE_RATE
+    limit = max(1, int(PEAKS_PER_SECOND * duration))
+    if len(bins) > limit:
+        strongest = np.argsort(spectrogram_db[bins, frames])[-limit:]
+        bins, frames = bins[strongest], frames[strongest]
+
+    order = np.lexsort((bins, frames))
+    return list(zip(frames[order].tolist(), bins[order].tolist()))
+
+def landmark_hashes(peaks):
+    """
+    Hash pairs of nearby peaks
+
+    Args:
+        peaks: List of (frame, bin) tuples sorted by frame
+
+    Returns:
+        List of (hash, anchor frame) tuples
+    """
+    hashes = []
+    for i, (anchor_frame, anchor_bin) in enumerate(peaks):
+        paired = 0
+        for frame, frequency_bin in peaks[i + 1:]:
+            delta = frame - anchor_frame
+            if delta > MAX_DELTA_FRAMES:
+                break
+            if delta == 0:
+                continue
+            value = ((anchor_bin & 0x3FF) << 16) | ((frequency_bin & 0x3FF) << 6) | (delta & 0x3F)
+            hashes.append((value, anchor_frame))
+            paired += 1
+            if paired == FAN_OUT:
+                break
+    return hashes
+
+def spectral_profile(spectrogram_db):
+    """
+    Average level per log-spaced band, used to tell near-identical files
+    apart from different mixes of the same material
+
+    Args:
+        spectrogram_db: 2-D array of (frequency bins, frames) in dB
+
+    Returns:
+        float32 array of PROFILE_BANDS levels in dB
+    """
+    edges = np.unique(np.geomspace(2, spectrogram_db.shape[0], PROFILE_BANDS + 1).astype(int))
+    power = librosa.db_to_power(spectrogram_db).mean(axis=1) if spectrogram_db.size else np.zeros(spectrogram_db.shape[0])
+    levels = [power[start:end].mean() for start, end in zip(edges[:-1], edges[1:])]
+    levels += [levels[-1] if levels else 0.0] * (PROFILE_BANDS - len(levels))
+    return librosa.power_to_db(np.array(levels, dtype=np.float32), ref=1.0, amin=1e-10).astype(np.float32)
+
+def compute_fingerprint(file_path, seconds=None):
+    """
+    Fingerprint the start of an audio file
+
+    Args:
+        file_path: Path to the audio file
+        seconds: Length of the excerpt, defaults to FINGERPRINT_SECONDS
+
+    Returns:
+        Dictionary with "hashes" (list of (hash, frame)), "profile" and
+        "duration_seconds" (of the whole file)
+    """
+    if seconds is None:
+        seconds = get_fingerprint_settings()["seconds"]
+
+    y, _ = load_audio(file_path, sr=SAMPLE_RATE, mono=True, duration=seconds)
+    spectrogram = np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH))
+    # Absolute levels (ref=1.0) so a gain change alters the profile
+    spectrogram_db = librosa.amplitude_to_db(spectrogram, ref=1.0, amin=1e-6)
+
+    return {
+        "hashes": landmark_hashes(find_peaks(spectrogram_db)),
+        "profile": spectral_profile(spectrogram_db),
+        "duration_seconds": get_audio_duration(file_path),
+    }
+
+def score_matches(query_hashes, candidate_rows):
+    """
+    Find the stored song whose landmarks line up best with a query
+
+    Matching landmarks of the same recording share one time offset, so the
+    score of a song is the size of its largest offset bucket. Neighbouring
+    buckets are counted too, since a shift of a fraction of a frame splits
+    the matches between two adjacent offsets.
+
+    Args:
+        query_hashes: List of (hash, frame) tuples of the query
+        candidate_rows: Iterable of (file_hash, hash, frame) rows sharing a hash with the query
+
+    Returns:
+        List of (file_hash, aligned match count) tuples, best first
+    """
+    query_frames = defaultdict(list)
+    for value, frame in query_hashes:
+        query_frames[value].append(frame)
+
+    votes = defaultdict(Counter)
+    for file_hash, value, frame in candidate_rows:
+        for query_frame in query_frames.get(value, ()):
+            votes[file_hash][frame - query_frame] += 1
+
+    best = {}
+    for file_hash, offsets in votes.items():
+        best[file_hash] = max(
+            count + offsets.get(offset - 1, 0) + offsets.get(offset + 1, 0)
+            for offset, count in offsets.items()
+        )
+    return sorted(best.items(), key=lambda item: item[1], reverse=True)
+
+def find_near_duplicate(fingerprint, is_instrumental=None):
+    """
+    Look up a stored song that is a near-identical copy of a fingerprinted file
+
+    Args:
+        fingerprint: Dictionary from compute_fingerprint
+        is_instrumental: Only accept songs analyzed with this flag, if given
+
+    Returns:
+        Tuple of (file_hash, details dictionary), or (None, None) if no
+        stored song is close enough
+    """
+    from app.core.database import find_fingerprint_candidates, get_fingerprint_profiles
+
+    settings = get_fingerprint_settings()
+    hashes = fingerprint["hashes"]
+    if len(hashes) < settings["min_matches"]:
+        return None, None
+
+    ranked = score_matches(hashes, find_fingerprint_candidates(sorted({value for value, _ in hashes})))
+    ranked = [
+        (file_hash, count) for file_hash, count in ranked
+        if count >= settings["min_matches"] and count / len(hashes) >= settings["min_ratio"]
+    ][:5]
+    if not ranked:
+        return None, None
+
+    profiles = get_fingerprint_profiles([file_hash for file_hash, _ in ranked])
+    for file_hash, count in ranked:
+        stored = profiles.get(file_hash)
+        if not stored:
+            continue
+        if is_instrumental is not None and bool(stored["is_instrumental"]) != bool(is_instrumental):
+            continue
+
+        # Same length within half a second or 0.5%, whichever is larger
+        duration_diff = abs(stored["duration_seconds"] - fingerprint["duration_seconds"])
+        if duration_diff > max(0.5, 0.005 * fingerprint["duration_seconds"]):
+            continue
+
+        profile_diff = float(np.max(np.abs(stored["profile"] - fingerprint["profile"])))
+        if profile_diff > settings["max_profile_diff_db"]:
+            continue
+
+        return file_hash, {
+            "matched_landmarks": count,
+            "match_ratio": round(count / len(hashes), 3),
+            "profile_diff_db": round(profile_diff, 2),
+        }
+    return None, None
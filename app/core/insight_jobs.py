@@ -0,0 +1,259 @@
+"""
+Background generation of AI insights.
+Uploads return as soon as the numeric analysis is done; the AI insights are
+generated on a shared thread pool, stored in song_ai_insights when ready and
+fetched by the client from their own endpoint. While a job runs, completed
+sections of the streamed answer are published to subscribers in this process.
+"""
+
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app.core.database import save_song_insights, get_song_insights
+from app.core.openai_analyzer import analyze_with_gpt, get_model_name
+
+_executor = None
+_executor_pid = None
+_jobs = {}
+_streams = {}
+_lock = threading.Lock()
+
+class InsightStream:
+    """Sections of one insight job, published as they complete"""
+
+    def __init__(self):
+        self.sections = []
+        self.status = None
+        self.insights = None
+        self.condition = threading.Condition()
+
+    def publish(self, key, value):
+        with self.condition:
+            self.sections.append((key, value))
+            self.condition.notify_all()
+
+    def finish(self, status, insights):
+        with self.condition:
+            self.status = status
+            self.insights = insights
+            self.condition.notify_all()
+
+    def events(self, keepalive=15.0):
+        """
+        Iterate over the job's events, blocking until each one is available
+
+        Args:
+            keepalive: Seconds without events after which None is yielded
+
+        Yields:
+            ("section", key, value) tuples, None as a keep-alive, and finally
+            ("complete", status, insights)
+        """
+        index = 0
+        while True:
+            with self.condition:
+                if index >= len(self.sections) and self.status is None:
+                    self.condition.wait(keepalive)
+                new_sections = self.sections[index:]
+                status, insights = self.status, self.insights
+            index += len(new_sections)
+
+            for key, value in new_sections:
+                yield ("section", key, value)
+            if status is not None:
+                yield ("complete", status, insights)
+                return
+            if not new_sections:
+                yield None
+
+def get_insight_job_settings():
+    """
+    Get the insight job settings from environment variables
+
+    Returns:
+        Dictionary of settings
+    """
+    return {
+        "workers": int(os.environ.get("AI_INSIGHT_WORKERS", 4)),
+        # Pending jobs older than this are assumed lost (worker restart) and restarted
+        "stale_seconds": float(os.environ.get("AI_INSIGHT_JOB_TIMEOUT", 300)),
+        # Failed jobs are served as failed for this long, then generated again
+        "retry_seconds": float(os.environ.get("AI_INSIGHT_RETRY_AFTER", 600)),
+    }
+
+def _get_executor():
+    global _executor, _executor_pid
+
+    # Threads do not survive a fork, so each worker process gets its own pool
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(
+            max_workers=get_insight_job_settings()["workers"],
+            thread_name_prefix="ai-insights"
+        )
+        _executor_pid = os.getpid()
+        _jobs.clear()
+    return _executor
+
+def generate_insights(results, is_instrumental, on_section=None):
+    """
+    Generate the AI insights of an analysis
+
+    Args:
+        results: Dictionary containing the analysis results
+        is_instrumental: Boolean indicating if the track is instrumental
+        on_section: Callable receiving (section key, value) as sections complete
+
+    Returns:
+        Tuple of (status, insights dictionary)
+    """
+    try:
+        insights = analyze_with_gpt(results, is_instrumental, on_section=on_section)
+        insights["model_used"] = get_model_name(os.environ.get("AI_PROVIDER", "openai").lower())
+        # analyze_with_gpt answers with placeholder text, marked by "info",
+        # when no provider could be used
+        if "info" in insights:
+            print(f"AI insights not generated: {insights['info']}")
+            return "failed", insights
+        return "complete", insights
+    except Exception as e:
+        print(f"Error generating AI insights: {str(e)}")
+        traceback.print_exc()
+        return "failed", {
+            "error": str(e),
+            "summary": "Unable to generate AI insights at this time.",
+            "strengths": ["N/A"],
+            "weaknesses": ["N/A"],
+            "suggestions": ["N/A"],
+            "model_used": "Unknown"
+        }
+
+def _run_job(file_hash, results, is_instrumental, stream):
+    status, insights = "failed", None
+    try:
+        status, insights = generate_insights(results, is_instrumental, on_section=stream.publish)
+        with _lock:
+            superseded = _streams.get(file_hash) is not stream
+        if superseded:
+            # Restarted for other inputs (see restart_insight_job) while it ran
+            print(f"Discarding AI insights for {file_hash}: a newer job replaced this one")
+        else:
+            save_song_insights(file_hash, status, insights)
+            print(f"AI insights for {file_hash} {status}")
+        return insights
+    finally:
+        with _lock:
+            if _streams.get(file_hash) is stream:
+                _jobs.pop(file_hash, None)
+                _streams.pop(file_hash, None)
+        stream.finish(status, insights)
+
+def start_insight_job(file_hash, results, is_instrumental, restart=False):
+    """
+    Start generating the AI insights of an analysis in the background
+
+    Args:
+        file_hash: SHA-256 hash of the song file
+        results: Dictionary containing the analysis results
+        is_instrumental: Boolean indicating if the track is instrumental
+        restart: Start a new job even if one is running; the running job's
+            answer is then discarded
+
+    Returns:
+        Future of the insights dictionary
+    """
+    with _lock:
+        executor = _get_executor()
+        future = _jobs.get(file_hash)
+        if future is not None and not restart:
+            return future
+
+        save_song_insights(file_hash, "pending")
+        stream = InsightStream()
+        # Shallow copy: the caller keeps adding keys to its results while the job runs
+        future = executor.submit(_run_job, file_hash, dict(results), is_instrumental, stream)
+        _jobs[file_hash] = future
+        _streams[file_hash] = stream
+        return future
+
+def restart_insight_job(file_hash, results, is_instrumental):
+    """
+    Replace the stored AI insights of a song with newly generated ones
+
+    Insights are written for a vocal or an instrumental track, so they are
+    generated again when the song's instrumental flag changes.
+
+    Args:
+        file_hash: SHA-256 hash of the song file
+        results: Dictionary containing the analysis results
+        is_instrumental: Boolean indicating if the track is instrumental
+
+    Returns:
+        Future of the insights dictionary
+    """
+    print(f"Regenerating AI insights for {file_hash} as {'instrumental' if is_instrumental else 'with vocals'}")
+    return start_insight_job(file_hash, results, is_instrumental, restart=True)
+
+def get_insight_stream(file_hash):
+    """
+    Get the section stream of a job running in this process
+
+    Args:
+        file_hash: SHA-256 hash of the song file
+
+    Returns:
+        InsightStream, or None if no job for the song runs here
+    """
+    with _lock:
+        if _executor_pid != os.getpid():
+            return None
+        return _streams.get(file_hash)
+
+def get_insights(file_hash, song=None):
+    """
+    Get the AI insights of a song, starting their generation if needed
+
+    Failed insights are generated again once AI_INSIGHT_RETRY_AFTER seconds
+    have passed since the failure.
+
+    Args:
+        file_hash: SHA-256 hash of the song file
+        song: Song record from find_song_by_hash, used to (re)start generation
+
+    Returns:
+        Dictionary with "status" ("pending", "complete" or "failed") and
+        "insights", or None if the song is unknown
+    """
+    with _lock:
+        running = _executor_pid == os.getpid() and file_hash in _jobs
+    if running:
+        return {"status": "pending", "insights": None}
+
+    settings = get_insight_job_settings()
+    stored = get_song_insights(file_hash)
+    if stored and stored["status"] == "complete":
+        return {"status": stored["status"], "insights": stored["insights"]}
+
+    if stored and stored["status"] == "failed":
+        retry_before = datetime.now() - timedelta(seconds=settings["retry_seconds"])
+        if not stored["updated_at"] or stored["updated_at"] >= retry_before:
+            return {"status": stored["status"], "insights": stored["insights"]}
+        print(f"Retrying AI insights for {file_hash} that failed at {stored['updated_at']}")
+    elif stored:
+        stale_before = datetime.now() - timedelta(seconds=settings["stale_seconds"])
+        if stored["updated_at"] and stored["updated_at"] >= stale_before:
+            # Generating in another worker process
+            return {"status": "pending", "insights": None}
+
+    analysis = (song or {}).get("analysis")
+    if not analysis:
+        return None
+
+    # Songs analyzed before insights were stored separately keep them inline
+    if analysis.get("ai_insights"):
+        return {"status": "complete", "insights": analysis["ai_insights"]}
+
+    start_insight_job(file_hash, analysis, song.get("is_instrumental"))
+    return {"status": "pending", "insights": None}
@@ -0,0 +1,242 @@
+"""
+Long-lived HTTP clients for the AI providers.
+Each worker process keeps one OpenAI client per provider on top of a
+keep-alive httpx connection pool, so requests after the first skip the DNS
+lookup, TCP connect and TLS handshake. A single shared executor runs the
+provider calls that need a timeout. httpx trace events feed per-provider
+metrics on connection reuse and latency.
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from openai import OpenAI
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+except ImportError:
+    h2 = None
+
+# Default endpoint and timeout of each provider
+PROVIDER_DEFAULTS = {
+    "openai": {"base_url": None, "timeout": 45.0},
+    # 28 seconds catches timeouts before the 30-second fallback threshold
+    "openrouter": {"base_url": "https://openrouter.ai/api/v1", "timeout": 28.0},
+}
+
+_clients = {}
+_clients_pid = None
+_executor = None
+_executor_pid = None
+_metrics = {}
+_lock = threading.Lock()
+
+def get_llm_client_settings():
+    """
+    Get the connection pool settings from environment variables
+
+    Returns:
+        Dictionary of settings
+    """
+    return {
+        "max_connections": int(os.environ.get("LLM_MAX_CONNECTIONS", 20)),
+        "max_keepalive_connections": int(os.environ.get("LLM_MAX_KEEPALIVE_CONNECTIONS", 10)),
+        "keepalive_expiry": float(os.environ.get("LLM_KEEPALIVE_EXPIRY", 60)),
+        # HTTP/2 needs the optional h2 package (pip install httpx[http2])
+        "http2": os.environ.get("LLM_HTTP2", "true").lower() == "true" and h2 is not None,
+        "executor_workers": int(os.environ.get("LLM_EXECUTOR_WORKERS", 8)),
+    }
+
+def get_provider_base_url(provider):
+    """
+    Get the API base URL of a provider
+
+    Args:
+        provider: "openai" or "openrouter"
+
+    Returns:
+        str: Base URL, or None for the OpenAI SDK default
+    """
+    env_name = f"{provider.upper()}_BASE_URL"
+    return os.environ.get(env_name) or PROVIDER_DEFAULTS[provider]["base_url"]
+
+def _empty_metrics():
+    return {
+        "requests": 0,
+        "errors": 0,
+        "connections_opened": 0,
+        "tls_handshakes": 0,
+        "reused_connections": 0,
+        "connect_time_total": 0.0,
+        "response_time_total": 0.0,
+        "last_response_time": None,
+        "http_version": None,
+    }
+
+def _record(provider, values=None, **increments):
+    with _lock:
+        metrics = _metrics.setdefault(provider, _empty_metrics())
+        for key, increment in increments.items():
+            metrics[key] += increment
+        metrics.update(values or {})
+
+def _make_request_hook(provider):
+    def on_request(request):
+        # Per-request state collected from httpcore trace events
+        state = {"connected": False}
+
+        def trace(event_name, info):
+            now = time.perf_counter()
+            if event_name == "connection.connect_tcp.started":
+                state["connect_started"] = now
+            elif event_name == "connection.connect_tcp.complete":
+                state["connected"] = True
+                _record(provider, connections_opened=1, connect_time_total=now - state["connect_started"])
+            elif event_name == "connection.start_tls.complete":
+                _record(provider, tls_handshakes=1)
+            elif event_name.endswith("send_request_headers.started"):
+                state["sent"] = now
+            elif event_name.endswith("receive_response_headers.complete") and "sent" in state:
+                elapsed = now - state["sent"]
+                _record(
+                    provider,
+                    {
+                        "last_response_time": elapsed,
+                        "http_version": "HTTP/2" if event_name.startswith("http2") else "HTTP/1.1"
+                    },
+                    requests=1,
+                    reused_connections=0 if state["connected"] else 1,
+                    response_time_total=elapsed
+                )
+
+        request.extensions["trace"] = trace
+
+    return on_request
+
+def _make_response_hook(provider):
+    def on_response(response):
+        if response.status_code >= 400:
+            _record(provider, errors=1)
+
+    return on_response
+
+def get_llm_client(provider, api_key):
+    """
+    Get the process-wide client of a provider
+
+    The client is rebuilt when the API key, base URL or pool settings change,
+    and after a fork, since connections must not be shared across processes.
+
+    Args:
+        provider: "openai" or "openrouter"
+        api_key: API key of the provider
+
+    Returns:
+        OpenAI client bound to a pooled httpx client
+    """
+    global _clients_pid
+
+    settings = get_llm_client_settings()
+    base_url = get_provider_base_url(provider)
+    key = (api_key, base_url, settings["max_connections"], settings["max_keepalive_connections"],
+           settings["keepalive_expiry"], settings["http2"])
+
+    with _lock:
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+
+        entry = _clients.get(provider)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+
+        http_client = httpx.Client(
+            timeout=PROVIDER_DEFAULTS[provider]["timeout"],
+            follow_redirects=True,
+            http2=settings["http2"],
+            limits=httpx.Limits(
+                max_connections=settings["max_connections"],
+                max_keepalive_connections=settings["max_keepalive_connections"],
+                keepalive_expiry=settings["keepalive_expiry"]
+            ),
+            event_hooks={
+                "request": [_make_request_hook(provider)],
+                "response": [_make_response_hook(provider)]
+            }
+        )
+        client_args = {"api_key": api_key, "http_client": http_client}
+        if base_url:
+            client_args["base_url"] = base_url
+        client = OpenAI(**client_args)
+
+        if entry is not None:
+            entry[1].close()
+        _clients[provider] = (key, client)
+        return client
+
+def get_llm_executor():
+    """
+    Get the process-wide executor for provider calls that need a timeout
+
+    Returns:
+        ThreadPoolExecutor instance
+    """
+    global _executor, _executor_pid
+
+    with _lock:
+        # Threads do not survive a fork, so each worker process gets its own pool
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=get_llm_client_settings()["executor_workers"],
+                thread_name_prefix="llm-request"
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+def shutdown_llm_executor(wait=True):
+    """
+    Stop the executor of this process; the next get_llm_executor call builds a new one
+    
+    Args:
+        wait: Whether to wait for running provider calls, e.g. losing hedges
+    """
+    global _executor
+    
+    with _lock:
+        executor = _executor if _executor_pid == os.getpid() else None
+        _executor = None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+def get_llm_client_metrics():
+    """
+    Get connection reuse and latency metrics of this worker process
+
+    Returns:
+        Dictionary of metrics per provider
+    """
+    with _lock:
+        result = {}
+        for provider, metrics in _metrics.items():
+            requests = metrics["requests"]
+            result[provider] = dict(
+                metrics,
+                connection_reuse_rate=metrics["reused_connections"] / requests if requests else None,
+                avg_response_time=metrics["response_time_total"] / requests if requests else None,
+                avg_connect_time=(
+                    metrics["connect_time_total"] / metrics["connections_opened"]
+                    if metrics["connections_opened"] else None
+                )
+            )
+        return result
+
+def reset_llm_clients():
+    """Close all pooled clients and clear the metrics"""
+    with _lock:
+        for _, client in _clients.values():
+            client.close()
+        _clients.clear()
+        _metrics.clear()
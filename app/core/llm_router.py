@@ -0,0 +1,345 @@
+"""
+Latency-aware routing of AI requests across providers.
+The primary provider gets the request first. If it has not answered once its
+recent 90th percentile latency has passed, the same request is hedged to the
+next provider and the first good answer wins; the other request is aborted
+through its CancelToken. Providers that keep failing are circuit-broken for a
+cooldown period, after which a single trial request decides whether they are
+used again.
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from app.core.llm_clients import get_llm_executor
+from app.core.usage_rollups import percentile_from_buckets
+
+_health = {}
+_health_lock = threading.Lock()
+
+class RequestCancelled(Exception):
+    """Raised by a provider call that stopped because another one already answered"""
+
+class CancelToken:
+    """
+    Cancellation handle of one provider call. The call registers how to
+    abort its in-flight response; the router cancels the token once another
+    provider has answered or the deadline has passed.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.callbacks = []
+        self.lock = threading.Lock()
+
+    def cancelled(self):
+        return self.event.is_set()
+
+    def on_cancel(self, callback):
+        """Run callback on cancellation, right away if the token is already cancelled"""
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(callback)
+                return
+        self._run(callback)
+
+    def cancel(self):
+        with self.lock:
+            if self.event.is_set():
+                return
+            self.event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            self._run(callback)
+
+    def _run(self, callback):
+        try:
+            callback()
+        except Exception as e:
+            print(f"Error aborting cancelled AI request: {e}")
+
+def get_router_settings():
+    """
+    Get the routing settings from environment variables
+
+    Returns:
+        Dictionary of settings
+    """
+    return {
+        "hedge_enabled": os.environ.get("LLM_HEDGE_ENABLED", "true").lower() == "true",
+        "hedge_quantile": float(os.environ.get("LLM_HEDGE_QUANTILE", 0.9)),
+        "hedge_min_delay": float(os.environ.get("LLM_HEDGE_MIN_DELAY", 1.0)),
+        # Samples needed before the in-process window replaces the stored histogram
+        "min_samples": int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", 20)),
+        "deadline": float(os.environ.get("LLM_REQUEST_DEADLINE", 60)),
+        "breaker_failures": int(os.environ.get("LLM_BREAKER_FAILURES", 3)),
+        "breaker_error_rate": float(os.environ.get("LLM_BREAKER_ERROR_RATE", 0.5)),
+        "breaker_cooldown": float(os.environ.get("LLM_BREAKER_COOLDOWN", 60)),
+    }
+
+class ProviderHealth:
+    """Recent latencies and outcomes of one provider, with a circuit breaker"""
+
+    def __init__(self, window=100, failure_threshold=3, error_rate_threshold=0.5,
+                 cooldown=60.0, baseline_buckets=None):
+        """
+        Args:
+            window: Number of recent requests kept
+            failure_threshold: Consecutive failures that open the circuit
+            error_rate_threshold: Failure rate over the window that opens the circuit
+            cooldown: Seconds the circuit stays open before a trial request
+            baseline_buckets: Stored latency histogram used until enough samples exist
+        """
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.cooldown = cooldown
+        self.baseline_buckets = baseline_buckets or {}
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def latency_quantile(self, quantile, min_samples=20):
+        """
+        Estimate a latency quantile
+
+        Args:
+            quantile: Quantile between 0 and 1
+            min_samples: Recent samples needed to use the in-process window
+
+        Returns:
+            Seconds, or None without any data
+        """
+        with self.lock:
+            samples = sorted(self.latencies)
+        if len(samples) >= min_samples:
+            return samples[min(len(samples) - 1, int(quantile * len(samples)))]
+        return percentile_from_buckets(self.baseline_buckets, quantile)
+
+    def allow_request(self, now=None):
+        """Check whether the circuit lets a request through"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            # Half-open: one trial request after the cooldown
+            if now - self.opened_at >= self.cooldown and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self, latency):
+        with self.lock:
+            self.latencies.append(latency)
+            self.outcomes.append(True)
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self.outcomes.append(False)
+            self.consecutive_failures += 1
+            failures = self.outcomes.count(False)
+            error_rate = failures / len(self.outcomes)
+            if (self.trial_in_flight
+                    or self.consecutive_failures >= self.failure_threshold
+                    or (len(self.outcomes) >= 10 and error_rate >= self.error_rate_threshold)):
+                self.opened_at = now
+            self.trial_in_flight = False
+
+    def release_trial(self):
+        """Admit another trial after one was cancelled before it had an outcome"""
+        with self.lock:
+            self.trial_in_flight = False
+
+    def stats(self):
+        with self.lock:
+            outcomes = list(self.outcomes)
+            return {
+                "circuit": "closed" if self.opened_at is None else "open",
+                "recent_requests": len(outcomes),
+                "recent_error_rate": outcomes.count(False) / len(outcomes) if outcomes else None,
+                "consecutive_failures": self.consecutive_failures,
+            }
+
+def get_provider_health(provider):
+    """
+    Get the process-wide health tracker of a provider
+
+    New trackers start from the provider's stored latency histogram, so the
+    hedge delay is sensible right after a restart.
+
+    Args:
+        provider: Provider name
+
+    Returns:
+        ProviderHealth instance
+    """
+    with _health_lock:
+        health = _health.get(provider)
+        if health is not None:
+            return health
+
+    try:
+        from app.core.database import get_ai_latency_buckets
+        baseline = get_ai_latency_buckets().get(provider, {})
+    except Exception as e:
+        print(f"Error loading latency history of {provider}: {e}")
+        baseline = {}
+
+    settings = get_router_settings()
+    with _health_lock:
+        return _health.setdefault(provider, ProviderHealth(
+            failure_threshold=settings["breaker_failures"],
+            error_rate_threshold=settings["breaker_error_rate"],
+            cooldown=settings["breaker_cooldown"],
+            baseline_buckets=baseline
+        ))
+
+def reset_provider_health():
+    """Forget all tracked provider health"""
+    with _health_lock:
+        _health.clear()
+
+def get_router_stats():
+    """
+    Get the health of every tracked provider
+
+    Returns:
+        Dictionary of stats per provider
+    """
+    settings = get_router_settings()
+    with _health_lock:
+        tracked = dict(_health)
+    return {
+        provider: dict(
+            health.stats(),
+            hedge_after=health.latency_quantile(settings["hedge_quantile"], settings["min_samples"])
+        )
+        for provider, health in tracked.items()
+    }
+
+def hedge_delay(provider, max_delay):
+    """
+    Get how long to wait for a provider before hedging to the next one
+
+    Args:
+        provider: Provider name
+        max_delay: Upper bound in seconds
+
+    Returns:
+        Seconds
+    """
+    settings = get_router_settings()
+    if not settings["hedge_enabled"]:
+        # Only fall back once the full delay has passed
+        return max_delay
+    quantile = get_provider_health(provider).latency_quantile(settings["hedge_quantile"], settings["min_samples"])
+    if quantile is None:
+        return max_delay
+    return max(settings["hedge_min_delay"], min(quantile, max_delay))
+
+def route_request(providers, call, max_hedge_delay):
+    """
+    Send a request to the first healthy provider, hedging to the next ones
+
+    Args:
+        providers: Provider names, primary first
+        call: Callable taking (provider, timeout seconds, CancelToken); returns
+            the answer or raises, and aborts its request when the token is cancelled
+        max_hedge_delay: Longest wait before hedging, in seconds
+
+    Returns:
+        Tuple of (provider, answer)
+
+    Raises:
+        RuntimeError: If no provider produced an answer before the deadline
+    """
+    deadline = time.monotonic() + get_router_settings()["deadline"]
+    executor = get_llm_executor()
+    queue = list(providers)
+    pending = {}
+    errors = []
+
+    def next_provider():
+        # Asked only right before sending, since a half-open circuit admits one trial
+        while queue:
+            provider = queue.pop(0)
+            if get_provider_health(provider).allow_request():
+                return provider
+        return None
+
+    def launch(provider):
+        started = time.monotonic()
+        health = get_provider_health(provider)
+        token = CancelToken()
+
+        def record(future):
+            # Losing requests that still finished are recorded too, so the
+            # latency window is not biased towards the fast answers; aborted
+            # ones say nothing about the provider
+            if future.cancelled():
+                health.release_trial()
+                return
+            error = future.exception()
+            if error is None:
+                health.record_success(time.monotonic() - started)
+            elif token.cancelled() or isinstance(error, RequestCancelled):
+                health.release_trial()
+            else:
+                health.record_failure()
+
+        future = executor.submit(call, provider, max(1.0, deadline - started), token)
+        future.add_done_callback(record)
+        pending[future] = (provider, started + hedge_delay(provider, max_hedge_delay), token)
+
+    def cancel_pending():
+        # Requests that have not started are dropped, running ones are aborted
+        for future, (_, _, token) in pending.items():
+            future.cancel()
+            token.cancel()
+
+    first = next_provider()
+    if first is None:
+        raise RuntimeError(f"All AI providers are circuit-broken: {', '.join(providers)}")
+    launch(first)
+
+    while pending:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+
+        # Wake up at the deadline or when the newest request should be hedged
+        hedge_at = max(hedge for _, hedge, _ in pending.values())
+        timeout = deadline - now
+        if queue:
+            timeout = min(timeout, max(0.0, hedge_at - now))
+
+        done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            provider, _, _ = pending.pop(future)
+            try:
+                answer = future.result()
+            except Exception as e:
+                print(f"AI request to {provider} failed: {e}")
+                errors.append(f"{provider}: {e}")
+                continue
+
+            cancel_pending()
+            return provider, answer
+
+        if queue and (not pending or time.monotonic() >= hedge_at):
+            provider = next_provider()
+            if provider is not None:
+                print(f"Hedging AI request to {provider}")
+                launch(provider)
+
+    cancel_pending()
+    raise RuntimeError("No AI provider answered in time" + (f" ({'; '.join(errors)})" if errors else ""))
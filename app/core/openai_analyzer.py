@@ -1,13 +1,18 @@
-from openai import OpenAI
 import os
 import json
-import httpx
 import logging
 import re
 import time
 import threading
-import concurrent.futures
-from app.core.database import save_ai_usage_stat
+import hashlib
+from app.core.database import save_ai_usage_stat, get_cached_ai_insight, save_cached_ai_insight
+from app.core.llm_clients import get_llm_client
+from app.core.llm_router import route_request, RequestCancelled
+
+try:
+    import tiktoken  # optional, exact token counts for providers that report none
+except ImportError:
+    tiktoken = None
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -80,15 +85,133 @@ def strip_markdown(text):
     
     return text
 
-def analyze_with_gpt(analysis_results, is_instrumental=None):
+# Display names used in log and error messages
+PROVIDER_NAMES = {"openai": "OpenAI", "openrouter": "OpenRouter"}
+
+def get_model_name(ai_provider):
+    """
+    Get the model that requests to a provider are sent to
+    
+    Args:
+        ai_provider: "openai" or "openrouter"
+        
+    Returns:
+        str: The model name
+    """
+    if ai_provider == "openrouter":
+        return os.environ.get("OPENROUTER_MODEL", "anthropic/claude-3-haiku-20240307")
+    return os.environ.get("OPENAI_MODEL", "gpt-4o")
+
+def get_insight_cache_settings():
+    """
+    Get the AI insight cache settings from environment variables
+    
+    Returns:
+        Dictionary of settings
+    """
+    return {
+        "enabled": os.environ.get("AI_INSIGHT_CACHE_ENABLED", "true").lower() == "true",
+        "ttl_seconds": float(os.environ.get("AI_INSIGHT_CACHE_TTL_DAYS", 30)) * 86400,
+        "max_entries": int(os.environ.get("AI_INSIGHT_CACHE_MAX_ENTRIES", 10000)),
+    }
+
+def insight_cache_key(ai_provider, model, metrics):
+    """
+    Hash the canonical metrics of a prompt for the AI insight cache.
+    
+    The metrics are the coarsely quantized values built by prompt_metrics,
+    the same ones the prompt is rendered from, so analyses that only differ
+    below the quantization steps share a cache entry. The system prompt is
+    part of the key, so rewording it starts a fresh cache.
+    
+    Args:
+        ai_provider: AI provider name
+        model: Model name
+        metrics: Dictionary returned by prompt_metrics, which includes the
+            instrumental flag
+        
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    payload = json.dumps(
+        {"provider": ai_provider, "model": model, "system_prompt": SYSTEM_PROMPT, "metrics": metrics},
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def count_tokens(text, model=None):
+    """
+    Count the tokens of a text
+    
+    Uses tiktoken when it is installed; otherwise the count is estimated at
+    four characters per token.
+    
+    Args:
+        text: Text to count
+        model: Model name used to pick the tokenizer
+        
+    Returns:
+        int: Number of tokens
+    """
+    if not text:
+        return 0
+    if tiktoken is None:
+        return max(1, round(len(text) / 4))
+    try:
+        # OpenRouter names are prefixed with the vendor ("openai/gpt-4o")
+        encoding = tiktoken.encoding_for_model((model or "").split("/")[-1])
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    return len(encoding.encode(text))
+
+def get_token_usage(reported, model, system_prompt, user_message, response_text):
+    """
+    Get the token counts of a request
+    
+    Counts reported by the provider are used when present; otherwise they are
+    counted locally with count_tokens.
+    
+    Args:
+        reported: Usage object or dictionary from the provider, or None
+        model: Model name
+        system_prompt: System prompt for the model
+        user_message: User message containing the analysis data
+        response_text: Text of the model's response
+        
+    Returns:
+        Dictionary with prompt_tokens, completion_tokens and cached_tokens
+        (None if unknown)
+    """
+    def field(value, name):
+        # Fields the SDK does not model yet come back as plain dictionaries
+        if isinstance(value, dict):
+            return value.get(name)
+        return getattr(value, name, None)
+    
+    prompt_tokens = field(reported, "prompt_tokens")
+    completion_tokens = field(reported, "completion_tokens")
+    if prompt_tokens is None:
+        prompt_tokens = count_tokens(system_prompt, model) + count_tokens(user_message, model)
+    if completion_tokens is None:
+        completion_tokens = count_tokens(response_text, model)
+    
+    return {
+        "prompt_tokens": int(prompt_tokens),
+        "completion_tokens": int(completion_tokens),
+        "cached_tokens": field(field(reported, "prompt_tokens_details"), "cached_tokens")
+    }
+
+def analyze_with_gpt(analysis_results, is_instrumental=None, on_section=None):
     """
     Use AI models (OpenAI or OpenRouter) to provide additional insights on the mix analysis.
     If API keys are not available, returns a default response.
-    If OpenRouter API times out (>30 seconds), falls back to OpenAI.
+    Slow or failing providers are hedged to the other one (see llm_router).
     
     Args:
         analysis_results: Dictionary containing the analysis results from our audio analyzer
         is_instrumental: Boolean indicating if the track is instrumental (None if unknown)
+        on_section: If given, the answer is streamed (unless AI_STREAMING=false)
+            and this callable receives (section key, value) as each section completes
         
     Returns:
         Dictionary containing AI analysis and suggestions
@@ -98,9 +221,9 @@ def analyze_with_gpt(analysis_results, is_instrumental=None):
         ai_provider = os.environ.get("AI_PROVIDER", "openai").lower()
         logger.info(f"Using AI provider: {ai_provider}")
         
-        # Get timeout threshold for OpenRouter fallback
+        # Get the longest wait before hedging to the other provider
         timeout_threshold = int(os.environ.get("OPENROUTER_TIMEOUT_THRESHOLD", 30))
-        logger.info(f"OpenRouter timeout threshold set to {timeout_threshold} seconds")
+        logger.info(f"Hedge threshold set to at most {timeout_threshold} seconds")
         
         # Check if we should skip AI analysis
         skip_ai = os.environ.get("SKIP_AI_ANALYSIS", "false").lower() == "true"
@@ -110,120 +233,114 @@ def analyze_with_gpt(analysis_results, is_instrumental=None):
             return get_default_ai_response("AI analysis skipped as per configuration")
         
         # Create the prompt with separate system and user messages
-        system_prompt, user_message = create_prompt(analysis_results, is_instrumental)
-        
-        # Call the appropriate API based on the provider
-        if ai_provider == "openrouter":
-            # Check if OpenRouter API key is available
-            api_key = get_openrouter_api_key()
-            if not api_key:
-                logger.warning("OpenRouter API key not available, skipping AI analysis")
-                return get_default_ai_response("OpenRouter API key not available")
-            
-            # Use a more robust timeout approach with a separate thread
-            def run_openrouter_with_timeout():
-                logger.info("Thread started for OpenRouter request")
-                start_time = time.time()
-                try:
-                    result = analyze_with_openrouter(system_prompt, user_message)
-                    response_time = time.time() - start_time
-                    logger.info(f"OpenRouter thread completed successfully in {response_time:.2f} seconds")
-                    
-                    # Get the model name from environment or use default
-                    model_name = os.environ.get("OPENROUTER_MODEL", "anthropic/claude-3-haiku-20240307")
-                    
-                    # Record the usage statistics
-                    save_ai_usage_stat("openrouter", model_name, False, response_time)
-                    
-                    return result
-                except Exception as e:
-                    logger.error(f"Exception in OpenRouter thread: {str(e)}")
-                    raise
-            
-            # Use a ThreadPoolExecutor to run the API call with a timeout
-            logger.info(f"Starting OpenRouter request with {timeout_threshold} second timeout")
-            executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
-            future = executor.submit(run_openrouter_with_timeout)
-            
-            try:
-                # Wait for the result with a timeout
-                start_time = time.time()
-                sections = future.result(timeout=timeout_threshold)
-                logger.info("OpenRouter request completed successfully within timeout")
-                # Clean shutdown of executor
-                executor.shutdown(wait=False)
-                return sections
-            except concurrent.futures.TimeoutError:
-                logger.warning(f"OpenRouter request timed out after {timeout_threshold} seconds")
-                # Attempt to cancel the future if it's still running
-                if not future.done():
-                    logger.info("Attempting to cancel the running OpenRouter request")
-                    future.cancel()
-                
-                # Shutdown the executor without waiting for tasks to complete
-                logger.info("Shutting down OpenRouter thread executor")
-                executor.shutdown(wait=False)
-                
-                logger.warning("Falling back to OpenAI")
-                # Check if OpenAI API key is available for fallback
-                openai_api_key = get_openai_api_key()
-                if not openai_api_key:
-                    logger.warning("Cannot fall back to OpenAI: API key not available")
-                    return get_default_ai_response("OpenRouter timed out and OpenAI API key not available")
-                
-                # Fall back to OpenAI
-                logger.info("Attempting fallback to OpenAI")
-                start_time = time.time()
-                result = analyze_with_openai(system_prompt, user_message)
-                response_time = time.time() - start_time
-                
-                # Get the model name from environment or use default
-                model_name = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
-                
-                # Record the usage statistics as fallback
-                save_ai_usage_stat("openai", model_name, True, response_time)
-                
-                return result
-            except Exception as e:
-                logger.error(f"Error during OpenRouter request: {str(e)}")
-                # Clean shutdown of executor
-                executor.shutdown(wait=False)
-                raise
-        else:  # Default to OpenAI
-            # Check if OpenAI API key is available
-            api_key = get_openai_api_key()
-            if not api_key:
-                logger.warning("OpenAI API key not available, skipping AI analysis")
-                return get_default_ai_response("OpenAI API key not available")
-            
-            # Record start time
-            start_time = time.time()
-            
-            # Get response from OpenAI
-            sections = analyze_with_openai(system_prompt, user_message)
-            
-            # Calculate response time
-            response_time = time.time() - start_time
-            
-            # Get the model name from environment or use default
-            model_name = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
-            
-            # Record the usage statistics
-            save_ai_usage_stat("openai", model_name, False, response_time)
-            
-            return sections
+        metrics = prompt_metrics(analysis_results, is_instrumental)
+        system_prompt, user_message = SYSTEM_PROMPT, render_prompt(metrics)
+        
+        # Identical prompts get identical answers from the cache
+        cache_settings = get_insight_cache_settings()
+        cache_key = None
+        if cache_settings["enabled"]:
+            model_name = get_model_name(ai_provider)
+            cache_key = insight_cache_key(ai_provider, model_name, metrics)
+            cached = get_cached_ai_insight(cache_key, cache_settings["ttl_seconds"])
+            if cached is not None:
+                logger.info(f"Using cached AI insights ({cache_key[:12]})")
+                return cached
+        
+        if os.environ.get("AI_STREAMING", "true").lower() != "true":
+            on_section = None
+        sections = request_ai_insights(ai_provider, timeout_threshold, system_prompt, user_message, on_section)
+        
+        # Default responses (missing keys, timeouts) are not worth keeping
+        if cache_key and "info" not in sections:
+            save_cached_ai_insight(
+                cache_key, ai_provider, model_name, sections,
+                cache_settings["ttl_seconds"], cache_settings["max_entries"]
+            )
+        
+        return sections
         
     except Exception as e:
         logger.error(f"Error generating AI insights: {str(e)}")
         return get_default_ai_response(f"Error: {str(e)}")
 
-def analyze_with_openai(system_prompt, user_message):
+def request_ai_insights(ai_provider, timeout_threshold, system_prompt, user_message, on_section=None):
+    """
+    Send a prompt to the AI providers through the latency-aware router.
+    The configured provider is asked first; the other one, if it has an API
+    key, gets a hedged copy of the request once the first one is slower than
+    usual, and the first good answer is used.
+    
+    Args:
+        ai_provider: "openai" or "openrouter"
+        timeout_threshold: Longest wait before hedging to the other provider
+        system_prompt: System prompt for the model
+        user_message: User message containing the analysis data
+        on_section: If given, responses are streamed and this callable receives
+            (section key, value) from the first provider that produces a section
+        
+    Returns:
+        Dictionary containing AI analysis and suggestions
+    """
+    primary = "openrouter" if ai_provider == "openrouter" else "openai"
+    secondary = "openai" if primary == "openrouter" else "openrouter"
+    key_getters = {"openai": get_openai_api_key, "openrouter": get_openrouter_api_key}
+    
+    if not key_getters[primary]():
+        logger.warning(f"{primary} API key not available, skipping AI analysis")
+        return get_default_ai_response(f"{PROVIDER_NAMES[primary]} API key not available")
+    providers = [primary] + ([secondary] if key_getters[secondary]() else [])
+    
+    analyzers = {"openai": analyze_with_openai, "openrouter": analyze_with_openrouter}
+    streaming_provider = []
+    stream_lock = threading.Lock()
+    
+    def forward_section(provider):
+        def forward(key, value):
+            # Sections of a hedged request must not interleave with the first stream
+            with stream_lock:
+                if not streaming_provider:
+                    streaming_provider.append(provider)
+                if streaming_provider[0] == provider:
+                    on_section(key, value)
+        return forward
+    
+    def call_provider(provider, timeout, cancel_token):
+        start_time = time.time()
+        usage = {}
+        result = analyzers[provider](
+            system_prompt, user_message, timeout=timeout,
+            on_section=forward_section(provider) if on_section else None,
+            cancel_token=cancel_token, usage=usage
+        )
+        response_time = time.time() - start_time
+        logger.info(
+            f"{PROVIDER_NAMES[provider]} answered in {response_time:.2f} seconds "
+            f"({usage.get('prompt_tokens')} prompt / {usage.get('completion_tokens')} completion tokens)"
+        )
+        
+        # Record the usage statistics; answers from the hedge count as fallbacks
+        save_ai_usage_stat(provider, get_model_name(provider), provider != primary, response_time, **usage)
+        return result
+    
+    # The router aborts the losing request once the first good answer arrives
+    provider, sections = route_request(providers, call_provider, timeout_threshold)
+    logger.info(f"Using AI insights from {provider}")
+    return sections
+
+def analyze_with_openai(system_prompt, user_message, timeout=None, on_section=None, cancel_token=None, usage=None):
     """
     Use OpenAI's models to analyze the mix data.
     
     Args:
         system_prompt: System prompt for the model
         user_message: User message containing the analysis data
+        timeout: Request timeout in seconds, defaults to the client's
+        on_section: If given, the response is streamed and this callable
+            receives (section key, value) as each section completes
+        cancel_token: CancelToken of the router; with one, the answer is
+            always streamed, so the response can be closed when it is cancelled
+        usage: Dictionary that receives the token counts (see get_token_usage)
         
     Returns:
         Dictionary containing the parsed sections of the model's response
@@ -236,17 +353,16 @@ def analyze_with_openai(system_prompt, user_message):
         model = os.environ.get("OPENAI_MODEL", "gpt-4o")
         logger.info(f"Using OpenAI model: {model}")
         
-        # Create a custom HTTP client without proxies
-        http_client = httpx.Client(
-            timeout=45.0,  # Set timeout to 45 seconds for OpenAI requests
-            follow_redirects=True
-        )
-        
-        # Create OpenAI client
-        client = OpenAI(api_key=api_key, http_client=http_client)
+        # Reuse the pooled client of this process
+        client = get_llm_client("openai", api_key)
+        if timeout:
+            client = client.with_options(timeout=timeout)
         
         # Call the OpenAI API
         logger.info("Sending request to OpenAI API")
+        streamed = on_section is not None or cancel_token is not None
+        if cancel_token is not None and cancel_token.cancelled():
+            raise RequestCancelled("Answer no longer needed")
         response = client.chat.completions.create(
             model=model,
             messages=[
@@ -254,27 +370,44 @@ def analyze_with_openai(system_prompt, user_message):
                 {"role": "user", "content": user_message}
             ],
             max_tokens=2500,
-            temperature=0.7
+            temperature=0.7,
+            stream=streamed,
+            # Streamed answers only report their token usage when asked to
+            extra_body={"stream_options": {"include_usage": True}} if streamed else None
         )
         
-        # Extract the response
-        response_text = response.choices[0].message.content
-        logger.info("Received response from OpenAI API")
+        if streamed:
+            result, response_text, reported = stream_sections(response, on_section, cancel_token)
+        else:
+            # Extract the response
+            response_text = response.choices[0].message.content
+            reported = response.usage
+            logger.info("Received response from OpenAI API")
+            
+            # Parse the response into sections
+            result = parse_response(response_text)
         
-        # Parse the response into sections
-        return parse_response(response_text)
+        if usage is not None:
+            usage.update(get_token_usage(reported, model, system_prompt, user_message, response_text))
+        return result
     
     except Exception as e:
         logger.error(f"Error using OpenAI: {str(e)}")
         raise
 
-def analyze_with_openrouter(system_prompt, user_message):
+def analyze_with_openrouter(system_prompt, user_message, timeout=None, on_section=None, cancel_token=None, usage=None):
     """
     Use OpenRouter's models to analyze the mix data.
     
     Args:
         system_prompt: System prompt for the model
         user_message: User message containing the analysis data
+        timeout: Request timeout in seconds, defaults to the client's
+        on_section: If given, the response is streamed and this callable
+            receives (section key, value) as each section completes
+        cancel_token: CancelToken of the router; with one, the answer is
+            always streamed, so the response can be closed when it is cancelled
+        usage: Dictionary that receives the token counts (see get_token_usage)
         
     Returns:
         Dictionary containing the parsed sections of the model's response
@@ -291,22 +424,17 @@ def analyze_with_openrouter(system_prompt, user_message):
         site_url = os.environ.get("SITE_URL", "")
         site_title = os.environ.get("SITE_TITLE", "Mix Analyzer")
         
-        # Create a custom HTTP client without proxies
-        http_client = httpx.Client(
-            timeout=28.0,  # Set timeout to 28 seconds to catch timeouts before our 30-second limit
-            follow_redirects=True
-        )
-        
-        # Create OpenAI client with OpenRouter base URL
-        client = OpenAI(
-            api_key=api_key,
-            base_url="https://openrouter.ai/api/v1",
-            http_client=http_client
-        )
+        # Reuse the pooled client of this process
+        client = get_llm_client("openrouter", api_key)
+        if timeout:
+            client = client.with_options(timeout=timeout)
         
         # Call the OpenRouter API via OpenAI compatible interface
         logger.info("Sending request to OpenRouter API")
+        streamed = on_section is not None or cancel_token is not None
         try:
+            if cancel_token is not None and cancel_token.cancelled():
+                raise RequestCancelled("Answer no longer needed")
             response = client.chat.completions.create(
                 model=model,
                 messages=[
@@ -315,18 +443,27 @@ def analyze_with_openrouter(system_prompt, user_message):
                 ],
                 max_tokens=2500,
                 temperature=0.7,
+                stream=streamed,
                 extra_headers={
                     "HTTP-Referer": site_url,
                     "X-Title": site_title
                 }
             )
             
-            # Extract the response
-            response_text = response.choices[0].message.content
-            logger.info("Received response from OpenRouter API")
+            if streamed:
+                result, response_text, reported = stream_sections(response, on_section, cancel_token)
+            else:
+                # Extract the response
+                response_text = response.choices[0].message.content
+                reported = response.usage
+                logger.info("Received response from OpenRouter API")
+                
+                # Parse the response into sections
+                result = parse_response(response_text)
             
-            # Parse the response into sections
-            return parse_response(response_text)
+            if usage is not None:
+                usage.update(get_token_usage(reported, model, system_prompt, user_message, response_text))
+            return result
         except Exception as e:
             # Catch and log exceptions that might occur during API call
             logger.error(f"Error during OpenRouter API call: {str(e)}")
@@ -336,161 +473,190 @@ def analyze_with_openrouter(system_prompt, user_message):
         logger.error(f"Error using OpenRouter: {str(e)}")
         raise
 
-def create_prompt(results, is_instrumental=None):
+# Sent unchanged with every request, so the provider's prompt cache can reuse it
+SYSTEM_PROMPT = """You are a professional audio engineer and mix analyst across all genres. Give technical, accessible, actionable feedback on the mix data: specific issues and concrete solutions, not general observations.
+
+The data has one line per area as "area: key=value ...". Scores are 0-100, levels in dB, times in ms, band energies in % of the total; "notes" lines are the analyzer's observations.
+
+Answer with these sections, each header on its own line:
+1. Summary: concise technical assessment of the overall mix.
+2. Genre Context: likely genre from the frequency, dynamics and stereo profile, with its mixing standards (frequency targets, dynamic range, spatial expectations).
+3. Subgenre & Style-Specific Context: likely subgenres or production styles and the techniques specific to them.
+4. Strengths: 2-4 specific positives.
+5. Areas for Improvement: 3-5 specific issues.
+6. Suggestions: 3-6 actionable suggestions with exact frequencies and amounts of processing.
+7. Reference Tracks: 2-3 commercial tracks in the genre that solve these issues well, and what to listen for in each.
+8. Processing Recommendations: processing chains with parameters (e.g. "high-pass at 100Hz, 12dB/octave, then 2:1 compression with slow attack") and the musical benefit of each.
+9. Mix Translation Recommendations: how the mix will translate to headphones, car stereos, club systems and phone speakers, and adjustments that would help.
+
+Use plain text only: no markdown (no asterisks, bold, italic or backticks) and no HTML."""
+
+# Step each metric is rounded to before it reaches the prompt; analyses
+# equal at these steps share a prompt and therefore an insight cache entry
+PROMPT_METRICS = {
+    "frequency_balance": [("score", "balance_score", 1)],
+    "dynamic_range": [
+        ("score", "dynamic_range_score", 1),
+        ("range_db", "dynamic_range_db", 0.5),
+        ("crest_db", "crest_factor_db", 0.5),
+        ("plr_db", "plr", 0.5),
+    ],
+    "stereo_field": [
+        ("width_score", "width_score", 1),
+        ("phase_score", "phase_score", 1),
+        ("correlation", "correlation", 0.05),
+    ],
+    "clarity": [
+        ("score", "clarity_score", 1),
+        ("contrast", "spectral_contrast", 0.5),
+        ("flatness", "spectral_flatness", 0.005),
+        ("centroid_hz", "spectral_centroid", 100),
+    ],
+    "transients": [
+        ("score", "transients_score", 1),
+        ("attack_ms", "attack_time", 1),
+        ("onsets_per_s", "transient_density", 0.1),
+        ("percussion_pct", "percussion_energy", 1),
+    ],
+    "harmonic_content": [
+        ("complexity_pct", "harmonic_complexity", 1),
+        ("key_consistency_pct", "key_consistency", 1),
+        ("chords_per_min", "chord_changes_per_minute", 1),
+    ],
+}
+BAND_ENERGY_STEP = 1
+KEY_CONFIDENCE_STEP = 0.05
+
+def quantize_metric(value, step):
     """
-    Create a prompt for GPT-4 based on the mix analysis results.
+    Round a metric to a multiple of step
     
     Args:
-        results: Dictionary containing the analysis results
-        is_instrumental: Boolean indicating if the track is instrumental
+        value: Metric value
+        step: Quantization step, e.g. 1 for whole scores or 100 for Hz
         
     Returns:
-        Tuple containing (system_prompt, user_message)
+        int for whole steps, otherwise a float with the decimals of step
     """
-    # Create the system prompt with detailed instructions
-    system_prompt = """You are a professional audio engineer and mix analyst with extensive experience across multiple genres. Analyze the mix data provided and give detailed, actionable feedback.
-
-Your analysis should be technical yet accessible, focusing on specific issues and concrete solutions rather than general observations. Include the following sections:
-
-1. Summary: Provide a concise technical assessment of the overall mix quality.
-
-2. Genre Context: Based on the frequency profile, dynamic characteristics, and stereo properties, identify the likely genre of this track and provide genre-specific mixing standards and expectations. Consider common frequency targets, dynamic range expectations, and spatial characteristics for this genre.
+    multiple = round(float(value) / step) * step
+    decimals = len(str(step).partition(".")[2])
+    return round(multiple, decimals) if decimals else int(multiple)
 
-3. Subgenre & Style-Specific Context: Based on the audio characteristics, identify potential subgenres or specific production styles this track might fit into. Provide more detailed mixing standards and techniques specific to these subgenres or styles. Consider how production approaches differ within specialized subgenres.
-
-4. Strengths: Identify 2-4 specific positive aspects of the mix.
-
-5. Areas for Improvement: Identify 3-5 specific issues that could be addressed.
-
-6. Suggestions: Provide 3-6 actionable, specific mixing suggestions with technical details (exact frequencies, amount of processing, etc.). These should be precise enough that the producer can immediately implement them.
-
-7. Reference Tracks: Suggest 2-3 specific commercial tracks in the same genre that exemplify good solutions to the identified issues. For each reference, specify exactly what aspects to listen for.
-
-8. Processing Recommendations: Suggest specific processing chains that would address the identified issues. Include specific parameter recommendations (e.g., "Apply a high-pass filter at 100Hz with 12dB/octave slope followed by gentle compression with 2:1 ratio and slow attack"). For each processing chain, explain the musical benefit.
-
-9. Mix Translation Recommendations: Provide specific suggestions for how this mix might translate to different playback systems (headphones, car stereos, club systems, phone speakers, etc.) and what adjustments might improve the mix's translation across different listening environments.
-
-IMPORTANT: DO NOT use any markdown formatting (no asterisks, no bold, no italic, no backticks). Format your response as plain text only. Do not use any HTML tags or other formatting."""
+def format_metrics_line(area, values):
+    """
+    Format one line of the compact metrics block
+    
+    Args:
+        area: Name of the analysis area
+        values: List of (key, value) tuples
+        
+    Returns:
+        str: "area: key=value ..." line
+    """
+    return f"{area}: " + " ".join(f"{key}={value}" for key, value in values)
 
-    # Format track type information for user message
-    track_type_info = ""
-    if is_instrumental is not None:
-        track_type_info = f"This is an {'instrumental track' if is_instrumental else 'track with vocals'}."
+def prompt_metrics(results, is_instrumental=None):
+    """
+    Build the canonical metrics the prompt is rendered from
     
-    # Format numerical data for better readability
-    frequency_data = "\n".join([
-        f"- {band.replace('_', ' ').title()}: {energy:.1f}%" 
-        for band, energy in results['frequency_balance']['band_energy'].items()
-    ])
+    Every metric is quantized to its PROMPT_METRICS step, and only these
+    values reach the model, so the dictionary doubles as the insight cache
+    key (see insight_cache_key).
     
-    # Create user message with analysis results
-    user_message = f"""Please analyze the following mix data:
-
-## Frequency Balance
-Score: {results['frequency_balance']['balance_score']:.1f}/100
-Energy Distribution:
-{frequency_data}
-
-Analysis Notes:
-- {' '.join(results['frequency_balance']['analysis'])}
-
-## Dynamic Range
-Score: {results['dynamic_range']['dynamic_range_score']:.1f}/100
-- Dynamic Range: {results['dynamic_range']['dynamic_range_db']:.1f} dB
-- Crest Factor: {results['dynamic_range']['crest_factor_db']:.1f} dB
-- PLR (Peak to Loudness Ratio): {results['dynamic_range']['plr']:.1f} dB
-
-Analysis Notes:
-- {' '.join(results['dynamic_range']['analysis'])}
-
-## Stereo Field
-Width Score: {results['stereo_field']['width_score']:.1f}/100
-Phase Score: {results['stereo_field']['phase_score']:.1f}/100
-- Channel Correlation: {results['stereo_field']['correlation']:.2f}
-- Mid/Side Ratio: {results['stereo_field']['mid_ratio']*100:.0f}% / {results['stereo_field']['side_ratio']*100:.0f}%
-
-Analysis Notes:
-- {' '.join(results['stereo_field']['analysis'])}
-
-## Clarity
-Score: {results['clarity']['clarity_score']:.1f}/100
-- Spectral Contrast: {results['clarity']['spectral_contrast']:.2f}
-- Spectral Flatness: {results['clarity']['spectral_flatness']:.3f}
-- Spectral Centroid: {results['clarity']['spectral_centroid']:.0f} Hz
-
-Analysis Notes:
-- {' '.join(results['clarity']['analysis'])}"""
-
-    # Add transients data if available
-    if 'transients' in results:
-        user_message += f"""
-
-## Transients
-Score: {results['transients']['transients_score']:.1f}/100
-- Attack Time: {results['transients']['attack_time']:.1f} ms
-- Transient Density: {results['transients']['transient_density']:.2f} onsets/sec
-- Percussion Energy: {results['transients']['percussion_energy']:.1f}%
+    Args:
+        results: Dictionary containing the analysis results
+        is_instrumental: Boolean indicating if the track is instrumental
+        
+    Returns:
+        Dictionary with the values and notes of each area, the key
+        relationships, common progressions and the instrumental flag
+    """
+    metrics = {"areas": {}, "is_instrumental": is_instrumental}
+    
+    def add_area(area, extra=None):
+        section = results[area]
+        values = {key: quantize_metric(section[field], step) for key, field, step in PROMPT_METRICS[area]}
+        values.update(extra or {})
+        metrics["areas"][area] = {"values": values, "notes": list(section.get("analysis") or [])}
+    
+    bands = results["frequency_balance"]["band_energy"]
+    add_area("frequency_balance", {band: quantize_metric(energy, BAND_ENERGY_STEP) for band, energy in bands.items()})
+    add_area("dynamic_range")
+    stereo = results["stereo_field"]
+    mid_side = f"{quantize_metric(stereo['mid_ratio'] * 100, 1)}/{quantize_metric(stereo['side_ratio'] * 100, 1)}"
+    add_area("stereo_field", {"mid_side_pct": mid_side})
+    add_area("clarity")
+    
+    if "transients" in results:
+        add_area("transients")
+    
+    harmonic = results.get("harmonic_content")
+    if harmonic and harmonic.get("key") != "Unknown":
+        extra = {"key": harmonic["key"]}
+        if harmonic.get("top_key_candidates"):
+            extra["key_candidates"] = ",".join(
+                f"{candidate['key']}:{quantize_metric(candidate['confidence'], KEY_CONFIDENCE_STEP)}"
+                for candidate in harmonic["top_key_candidates"]
+            )
+        add_area("harmonic_content", extra)
+        
+        key_rel = harmonic.get("key_relationships")
+        if key_rel:
+            key_rel_type = key_rel.get("type", "unknown")
+            relative = "relative_minor" if key_rel_type == "major" else "relative_major"
+            values = {
+                "type": key_rel_type,
+                relative: key_rel.get(relative, "Unknown"),
+                "neighbors": ",".join(key_rel.get("neighboring_keys", [])),
+            }
+            # Modulation options name the relative key again; keep it once
+            values.update(key_rel.get("modulation_options", {}))
+            metrics["key_relationships"] = values
+            metrics["common_progressions"] = [list(prog) for prog in key_rel.get("common_progressions", [])[:3]]
+    
+    return metrics
 
-Analysis Notes:
-- {' '.join(results['transients']['analysis'])}"""
+def render_prompt(metrics):
+    """
+    Render the user message from the metrics built by prompt_metrics
+    
+    Args:
+        metrics: Dictionary returned by prompt_metrics
+        
+    Returns:
+        str: Compact block of one "area: key=value" line per analysis area,
+        with the analyzer's notes on the line below
+    """
+    lines = []
+    for area, section in metrics["areas"].items():
+        lines.append(format_metrics_line(area, list(section["values"].items())))
+        if section["notes"]:
+            lines.append(f"{area} notes: {' '.join(section['notes'])}")
+    
+    if metrics.get("key_relationships"):
+        lines.append(format_metrics_line("key_relationships", list(metrics["key_relationships"].items())))
+    if metrics.get("common_progressions"):
+        lines.append("common_progressions: " + " | ".join("-".join(prog) for prog in metrics["common_progressions"]))
+    
+    if metrics["is_instrumental"] is not None:
+        lines.append(f"track: {'instrumental' if metrics['is_instrumental'] else 'vocals'}")
+    
+    return "Mix data:\n" + "\n".join(lines)
 
-    # Add harmonic content if available
-    if 'harmonic_content' in results and results['harmonic_content'].get('key') != 'Unknown':
-        # Format key relationship information if available
-        key_relationship_info = ""
-        if "key_relationships" in results['harmonic_content'] and results['harmonic_content']["key_relationships"]:
-            key_rel = results['harmonic_content']["key_relationships"]
-            key_rel_type = key_rel.get("type", "unknown")
-            
-            # Format common progressions
-            common_progressions = key_rel.get("common_progressions", [])
-            progression_text = ""
-            if common_progressions:
-                progression_text = "Common Progressions:\n"
-                for i, prog in enumerate(common_progressions[:3]):
-                    progression_text += f"- {' → '.join(prog)}\n"
-            
-            # Format modulation options
-            modulation_options = key_rel.get("modulation_options", {})
-            modulation_text = ""
-            if modulation_options:
-                modulation_text = "Compatible Keys for Modulation:\n"
-                for relation, key in modulation_options.items():
-                    modulation_text += f"- {relation.replace('_', ' ').title()}: {key}\n"
-                
-            # Add key relationship info to harmonic content
-            key_relationship_info = f"""
-Key Type: {key_rel_type.title()}
-{'Relative Minor' if key_rel_type == 'major' else 'Relative Major'}: {key_rel.get('relative_minor' if key_rel_type == 'major' else 'relative_major', 'Unknown')}
-Neighboring Keys: {', '.join(key_rel.get('neighboring_keys', []))}
-{progression_text}
-{modulation_text}"""
-        
-        # Add top key candidates if available
-        top_key_info = ""
-        if "top_key_candidates" in results['harmonic_content'] and results['harmonic_content']["top_key_candidates"]:
-            top_key_info = "Top Key Candidates:\n"
-            for candidate in results['harmonic_content']["top_key_candidates"]:
-                top_key_info += f"- {candidate['key']}: {candidate['confidence']:.2f}\n"
-
-        user_message += f"""
-
-## Harmonic Content
-- Key: {results['harmonic_content']['key']}
-{top_key_info}
-- Harmonic Complexity: {results['harmonic_content']['harmonic_complexity']:.1f}%
-- Key Consistency: {results['harmonic_content']['key_consistency']:.1f}%
-- Chord Changes: {results['harmonic_content']['chord_changes_per_minute']:.1f}/min
-
-Analysis Notes:
-- {' '.join(results['harmonic_content']['analysis'])}
-{key_relationship_info}"""
-
-    # Add information about track type
-    if track_type_info:
-        user_message += f"\n\n{track_type_info}"
-
-    return system_prompt, user_message
+def create_prompt(results, is_instrumental=None):
+    """
+    Create the prompt for the AI model from the mix analysis results.
+    The system prompt is the constant SYSTEM_PROMPT; the user message is
+    rendered from the quantized metrics of prompt_metrics.
+    
+    Args:
+        results: Dictionary containing the analysis results
+        is_instrumental: Boolean indicating if the track is instrumental
+        
+    Returns:
+        Tuple containing (system_prompt, user_message)
+    """
+    return SYSTEM_PROMPT, render_prompt(prompt_metrics(results, is_instrumental))
 
 def parse_response(response):
     """
@@ -861,6 +1027,136 @@ def parse_response(response):
     
     return result 
 
+# Section headers in the order the system prompt asks for them
+SECTION_HEADERS = [
+    ("summary", r"summary"),
+    ("genre_context", r"genre context"),
+    ("subgenre_context", r"subgenre[^:\n]*"),
+    ("strengths", r"strengths"),
+    ("weaknesses", r"areas for improvement|weaknesses"),
+    ("suggestions", r"suggestions"),
+    ("reference_tracks", r"reference tracks"),
+    ("processing_recommendations", r"processing recommendations"),
+    ("translation_recommendations", r"(?:mix )?translation recommendations"),
+]
+
+# A header is a line of its own, optionally numbered or in markdown, ending
+# in a colon or the end of the line
+SECTION_HEADER_PATTERN = re.compile(
+    r"^[ \t]*(?:\d+\.\s*)?(?:#+\s*)?(?:\*\*)?\s*(?:"
+    + "|".join(f"(?P<{key}>{pattern})" for key, pattern in SECTION_HEADERS)
+    + r")\s*(?:\*\*)?\s*(?::|$)",
+    re.IGNORECASE | re.MULTILINE
+)
+
+class SectionStreamParser:
+    """
+    Splits a streamed response into sections as it arrives.
+    A section is complete once the header of the next one has been received;
+    its value is parsed with parse_response, so streamed sections match the
+    final result.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.scanned = 0
+        self.open_section = None
+        self.emitted = []
+
+    def feed(self, delta):
+        """
+        Add streamed text
+        
+        Args:
+            delta: Next piece of the response
+            
+        Returns:
+            List of (section key, value) tuples completed by this text
+        """
+        self.text += delta
+        # Only whole lines can be matched against the header pattern
+        end = self.text.rfind("\n") + 1
+        if end <= self.scanned:
+            return []
+        
+        completed = []
+        for match in SECTION_HEADER_PATTERN.finditer(self.text, self.scanned, end):
+            key = match.lastgroup
+            if key == self.open_section or key in self.emitted:
+                continue
+            if self.open_section is not None:
+                value = parse_response(self.text[:match.start()])[self.open_section]
+                completed.append((self.open_section, value))
+                self.emitted.append(self.open_section)
+            self.open_section = key
+        self.scanned = end
+        return completed
+
+    def finish(self):
+        """
+        Parse the complete response
+        
+        Returns:
+            Tuple of (parsed sections dictionary, list of (key, value) tuples
+            of sections not returned by feed yet)
+        """
+        result = parse_response(self.text)
+        # The last section received comes first, then those that never appeared
+        keys = ([self.open_section] if self.open_section else []) + [
+            key for key, _ in SECTION_HEADERS if key not in self.emitted and key != self.open_section
+        ]
+        return result, [(key, result[key]) for key in keys]
+
+def stream_sections(stream, on_section=None, cancel_token=None):
+    """
+    Read a streamed chat completion and report each section when it completes
+    
+    Args:
+        stream: Stream returned by chat.completions.create(stream=True)
+        on_section: Callable receiving (section key, value), or None
+        cancel_token: CancelToken; cancelling it closes the stream from the
+            cancelling thread, which ends the read here
+        
+    Returns:
+        Tuple of (parsed sections dictionary, response text, usage reported
+        in the last chunk or None)
+        
+    Raises:
+        RequestCancelled: If the token was cancelled before the end
+    """
+    parser = SectionStreamParser()
+    reported = None
+    if cancel_token is not None:
+        cancel_token.on_cancel(stream.close)
+    try:
+        for chunk in stream:
+            if cancel_token is not None and cancel_token.cancelled():
+                raise RequestCancelled("Streaming answer no longer needed")
+            reported = getattr(chunk, "usage", None) or reported
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                for key, value in parser.feed(delta):
+                    if on_section:
+                        on_section(key, value)
+    except RequestCancelled:
+        raise
+    except Exception as e:
+        # Reading a stream closed by the cancelling thread fails
+        if cancel_token is not None and cancel_token.cancelled():
+            raise RequestCancelled("Streaming answer no longer needed") from e
+        raise
+    finally:
+        # Closing the stream drops the connection instead of reading the rest
+        stream.close()
+    if cancel_token is not None and cancel_token.cancelled():
+        raise RequestCancelled("Streaming answer no longer needed")
+    
+    result, remaining = parser.finish()
+    for key, value in remaining:
+        if on_section:
+            on_section(key, value)
+    return result, parser.text, reported
+
 def get_default_ai_response(reason):
     """
     Returns a default AI response when AI analysis cannot be performed
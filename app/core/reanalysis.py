@@ -0,0 +1,222 @@
+"""
+Partial re-analysis of stored results.
+When an analyzer changes, only the sections it produced are recomputed from
+the upload and merged into the stored results; see analyzer_versions.py.
+This happens when a song is read with its audio at hand, and across the
+whole library with backfill_library. A song is re-scored for the other
+instrumental flag with rescore_song, and the whole library for new scoring
+weights with rescore_library; neither needs the audio.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from app.core.analyzer_versions import ANALYZER_VERSION, stale_sections
+from app.core.database import (
+    find_song_by_hash, save_song, get_outdated_song_hashes, backfill_score_inputs,
+    get_song_score_inputs, update_song_scores, SCORE_COLUMN_KEYS, SCORE_COLUMN_TOLERANCE
+)
+from app.core.scoring import rescore_results, score_library
+
+def refresh_stale_sections(results, file_path, is_instrumental=None, file_id=None):
+    """
+    Recompute the outdated sections of analysis results
+
+    Args:
+        results: Dictionary of analysis results; it is not modified
+        file_path: Path to the audio file the results belong to
+        is_instrumental: Boolean indicating if the track is instrumental
+        file_id: Directory name of the visualizations, derived from file_path if None
+
+    Returns:
+        Tuple of (results, list of recomputed sections); the results are
+        returned unchanged if nothing is stale or the audio is missing or
+        cannot be decoded
+    """
+    stale = stale_sections(results)
+    if not stale:
+        return results, []
+    # overall_score alone is recomputed from the stored sections
+    if stale != ["overall_score"] and not (file_path and os.path.exists(file_path)):
+        print(f"Cannot refresh {', '.join(stale)}: audio file {file_path} is missing")
+        return results, []
+
+    # Imported here so that database-only callers do not load librosa
+    from app.core.audio_analyzer import recompute_sections
+    try:
+        return recompute_sections(file_path, results, stale, is_instrumental, file_id), stale
+    except Exception as e:
+        print(f"Error refreshing {', '.join(stale)} from {file_path}: {str(e)}")
+        return results, []
+
+def refresh_song(song, file_path=None, file_id=None):
+    """
+    Bring the stored results of a song up to date and save them
+
+    Args:
+        song: Dictionary from find_song_by_hash
+        file_path: Audio file to recompute from, defaults to the stored path
+        file_id: Directory name of the visualizations, derived from the file path if None
+
+    Returns:
+        Tuple of (results, list of recomputed sections)
+    """
+    file_path = file_path or song.get('file_path')
+    results, recomputed = refresh_stale_sections(song['analysis'], file_path, song.get('is_instrumental'), file_id)
+    if recomputed:
+        save_song(
+            filename=song.get('filename') or '',
+            original_name=song.get('original_name') or '',
+            file_path=file_path or '',
+            file_hash=song['file_hash'],
+            is_instrumental=bool(song.get('is_instrumental')),
+            analysis_json=results
+        )
+    return results, recomputed
+
+def rescore_song(song, is_instrumental, results=None):
+    """
+    Re-score a stored song for an instrumental flag and save it with that
+    flag; its AI insights are generated again for the new flag
+    
+    Args:
+        song: Dictionary from find_song_by_hash
+        is_instrumental: Boolean indicating if the track is instrumental
+        results: Analysis results to re-score, defaults to the stored ones
+        
+    Returns:
+        Re-scored analysis results; unchanged if the song already has this flag
+    """
+    results = results if results is not None else song['analysis']
+    if bool(song.get('is_instrumental')) == bool(is_instrumental):
+        return results
+    
+    start_time = time.time()
+    results = rescore_results(results, is_instrumental)
+    save_song(
+        filename=song.get('filename') or '',
+        original_name=song.get('original_name') or '',
+        file_path=song.get('file_path') or '',
+        file_hash=song['file_hash'],
+        is_instrumental=bool(is_instrumental),
+        analysis_json=results
+    )
+    print(f"Re-scored {song['file_hash']} as {'instrumental' if is_instrumental else 'with vocals'} "
+          f"in {(time.time() - start_time) * 1000:.1f} ms")
+    
+    # The stored AI insights were written for the other flag. Imported here
+    # so that database-only callers do not load the AI clients
+    from app.core.insight_jobs import restart_insight_job
+    try:
+        restart_insight_job(song['file_hash'], results, is_instrumental)
+    except Exception as e:
+        print(f"Error restarting AI insights of {song['file_hash']}: {str(e)}")
+    return results
+
+def _backfill_song(file_hash):
+    """Refresh one song in a worker process; returns (file_hash, recomputed sections, error)"""
+    try:
+        song = find_song_by_hash(file_hash)
+        if not song or not song.get('analysis'):
+            return file_hash, [], "no stored analysis"
+        _, recomputed = refresh_song(song)
+        if not recomputed and stale_sections(song['analysis']):
+            return file_hash, [], "audio file missing or unreadable"
+        return file_hash, recomputed, None
+    except Exception as e:
+        return file_hash, [], str(e)
+
+def backfill_library(workers=2, limit=None, dry_run=False):
+    """
+    Recompute the outdated sections of every stored song
+
+    Args:
+        workers: Number of worker processes; 1 runs in this process
+        limit: Maximum number of songs to process, or None for all
+        dry_run: Only count the outdated songs
+
+    Returns:
+        Dictionary with the number of songs found, refreshed and failed, and
+        how often each section was recomputed
+    """
+    file_hashes = get_outdated_song_hashes(ANALYZER_VERSION, limit)
+    report = {"outdated": len(file_hashes), "refreshed": 0, "failed": 0, "sections": {}}
+    print(f"Found {len(file_hashes)} songs with results from another analyzer version")
+    if dry_run or not file_hashes:
+        return report
+
+    started = time.time()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            outcomes = executor.map(_backfill_song, file_hashes, chunksize=4)
+            report = _collect(report, outcomes, len(file_hashes))
+    else:
+        report = _collect(report, map(_backfill_song, file_hashes), len(file_hashes))
+
+    print(f"Backfill finished in {time.time() - started:.1f} seconds: "
+          f"{report['refreshed']} refreshed, {report['failed']} failed")
+    return report
+
+def _collect(report, outcomes, total):
+    for done, (file_hash, recomputed, error) in enumerate(outcomes, 1):
+        if error:
+            report["failed"] += 1
+            print(f"[{done}/{total}] {file_hash}: {error}")
+            continue
+        report["refreshed"] += 1
+        for name in recomputed:
+            report["sections"][name] = report["sections"].get(name, 0) + 1
+        print(f"[{done}/{total}] {file_hash}: recomputed {', '.join(recomputed) or 'nothing'}")
+    return report
+
+def rescore_library(batch_size=1000, dry_run=False):
+    """
+    Re-score every stored song with the current weights and ideal curves
+    
+    The stored score inputs of the whole library are scored at once with
+    score_library, and the songs whose scores changed are written back in
+    batched UPDATEs of the score columns.
+    
+    Args:
+        batch_size: Number of songs per UPDATE batch
+        dry_run: Only count the songs whose scores would change
+        
+    Returns:
+        Dictionary with the number of songs scored, changed and updated
+    """
+    started = time.time()
+    backfill_score_inputs()
+    rows = get_song_score_inputs()
+    report = {"songs": len(rows), "changed": 0, "updated": 0}
+    if not rows:
+        return report
+    
+    inputs = np.vstack([np.frombuffer(bytes(row['score_inputs']), dtype=np.float64) for row in rows])
+    is_instrumental = np.array([bool(row['is_instrumental']) for row in rows])
+    scores = score_library(inputs, is_instrumental)
+    overall = [round(float(value), 1) for value in scores['overall_score']]
+    columns = {
+        "overall_score": overall,
+        "frequency_balance_score": scores['balance_score'].tolist(),
+        "clarity_score": scores['clarity_score'].tolist(),
+    }
+    print(f"Scored {len(rows)} songs in {time.time() - started:.2f} seconds")
+    
+    changed = []
+    for index, row in enumerate(rows):
+        # NaN is a section without measurements, which keeps its stored score
+        stored = [row[column] for column in SCORE_COLUMN_KEYS]
+        values = [old if np.isnan(columns[column][index]) else columns[column][index]
+                  for column, old in zip(SCORE_COLUMN_KEYS, stored)]
+        if any(new is not None and (old is None or abs(new - old) > SCORE_COLUMN_TOLERANCE)
+               for new, old in zip(values, stored)):
+            changed.append((row['id'], row['file_hash'], *values))
+    report["changed"] = len(changed)
+    
+    if not dry_run and changed:
+        report["updated"] = update_song_scores(changed, batch_size)
+    print(f"Re-scoring finished in {time.time() - started:.2f} seconds: "
+          f"{report['changed']} of {report['songs']} songs changed, {report['updated']} updated")
+    return report
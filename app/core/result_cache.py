@@ -0,0 +1,375 @@
+"""
+Read-through cache for stored analysis results.
+Keeps parsed results in a per-process LRU bounded by bytes, backed by a
+SQLite file that every worker process on the node can read. Entries expire
+after a maximum age, which bounds how long a write that bypassed the cache
+invalidation (another node, a manual fix in the database) stays hidden.
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+
+from app.core.result_storage import encode_blob, decode_blob
+from app.core.db_utils import get_db_identity
+
+# How often a worker checks the shared tier for invalidations made elsewhere
+INVALIDATION_SYNC_INTERVAL = 1.0
+
+def estimate_size(value):
+    """
+    Estimate the memory footprint of a cached value by its JSON size
+
+    Args:
+        value: JSON-compatible object
+
+    Returns:
+        Size in bytes
+    """
+    return len(json.dumps(value, separators=(",", ":"), default=str))
+
+class MemoryResultCache:
+    """In-process LRU cache bounded by the total size and the age of its entries"""
+
+    def __init__(self, max_bytes, max_age=None):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.current_bytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if self.max_age is not None and entry[2] < time.time() - self.max_age:
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, size, stored_at=None):
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = (value, size, time.time() if stored_at is None else stored_at)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self.entries:
+                _, (_, evicted_size, _) = self.entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def invalidate(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+
+    def __len__(self):
+        return len(self.entries)
+
+class SharedResultCache:
+    """
+    Node-local cache tier stored in a SQLite file.
+    Values are stored compressed; WAL mode lets many worker processes read
+    concurrently while one writes. Entries older than max_age seconds since
+    they were stored are treated as misses and deleted.
+    """
+
+    def __init__(self, path, max_bytes, max_age=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.local = threading.local()
+        self._init_schema()
+
+    def _connection(self):
+        # Connections must not be shared across threads or forked processes
+        connection = getattr(self.local, "connection", None)
+        if connection is None or getattr(self.local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    def _init_schema(self):
+        connection = self._connection()
+        connection.execute("""
+        CREATE TABLE IF NOT EXISTS results (
+            cache_key TEXT PRIMARY KEY,
+            value BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            last_access REAL NOT NULL,
+            stored_at REAL NOT NULL DEFAULT 0
+        )
+        """)
+        # Files written before entries expired have no insert time; their
+        # entries count as expired
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(results)")]
+        if "stored_at" not in columns:
+            connection.execute("ALTER TABLE results ADD COLUMN stored_at REAL NOT NULL DEFAULT 0")
+        connection.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results(last_access)")
+        connection.execute("""
+        CREATE TABLE IF NOT EXISTS invalidations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cache_key TEXT NOT NULL,
+            invalidated_at REAL NOT NULL
+        )
+        """)
+
+    def get(self, key):
+        """Return (value, stored_at) of an entry, or None on a miss"""
+        connection = self._connection()
+        row = connection.execute("SELECT value, stored_at FROM results WHERE cache_key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if self.max_age is not None and row[1] < now - self.max_age:
+            connection.execute("DELETE FROM results WHERE cache_key = ?", (key,))
+            return None
+        try:
+            value = decode_blob(row[0])
+        except ValueError as e:
+            # A torn write or a damaged file; the database has the real value
+            print(f"Dropping corrupt shared result cache entry {key}: {e}")
+            connection.execute("DELETE FROM results WHERE cache_key = ?", (key,))
+            return None
+        connection.execute("UPDATE results SET last_access = ? WHERE cache_key = ?", (now, key))
+        return value, row[1]
+
+    def put(self, key, value):
+        blob = encode_blob(value)
+        if len(blob) > self.max_bytes:
+            return
+        connection = self._connection()
+        now = time.time()
+        connection.execute(
+            "INSERT OR REPLACE INTO results (cache_key, value, size, last_access, stored_at) VALUES (?, ?, ?, ?, ?)",
+            (key, blob, len(blob), now, now)
+        )
+        self._evict(connection)
+
+    def _evict(self, connection):
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        while total > self.max_bytes:
+            row = connection.execute(
+                "SELECT cache_key, size FROM results ORDER BY last_access LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            connection.execute("DELETE FROM results WHERE cache_key = ?", (row[0],))
+            total -= row[1]
+
+    def invalidate(self, key):
+        connection = self._connection()
+        connection.execute("DELETE FROM results WHERE cache_key = ?", (key,))
+        connection.execute(
+            "INSERT INTO invalidations (cache_key, invalidated_at) VALUES (?, ?)",
+            (key, time.time())
+        )
+        # Keep the invalidation log short; workers only need recent entries
+        connection.execute("DELETE FROM invalidations WHERE invalidated_at < ?", (time.time() - 3600,))
+
+    def invalidate_many(self, keys):
+        connection = self._connection()
+        now = time.time()
+        connection.execute("BEGIN")
+        try:
+            connection.executemany("DELETE FROM results WHERE cache_key = ?", [(key,) for key in keys])
+            connection.executemany(
+                "INSERT INTO invalidations (cache_key, invalidated_at) VALUES (?, ?)",
+                [(key, now) for key in keys]
+            )
+            connection.execute("DELETE FROM invalidations WHERE invalidated_at < ?", (now - 3600,))
+            connection.execute("COMMIT")
+        except sqlite3.Error:
+            connection.execute("ROLLBACK")
+            raise
+
+    def invalidations_since(self, last_id):
+        connection = self._connection()
+        return connection.execute(
+            "SELECT id, cache_key FROM invalidations WHERE id > ? ORDER BY id", (last_id,)
+        ).fetchall()
+
+    def last_invalidation_id(self):
+        row = self._connection().execute("SELECT COALESCE(MAX(id), 0) FROM invalidations").fetchone()
+        return row[0]
+
+    def usage(self):
+        row = self._connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {"entries": row[0], "bytes": row[1]}
+
+class ResultCache:
+    """Two-tier read-through cache with hit-ratio counters"""
+
+    def __init__(self, memory_bytes, shared_path=None, shared_bytes=0, max_age=None):
+        self.memory = MemoryResultCache(memory_bytes, max_age)
+        self.shared = None
+        if shared_path and shared_bytes > 0:
+            try:
+                self.shared = SharedResultCache(shared_path, shared_bytes, max_age)
+            except sqlite3.Error as e:
+                print(f"Shared result cache disabled, could not open {shared_path}: {e}")
+        self.lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "shared_hits": 0, "misses": 0, "invalidations": 0}
+        self.last_invalidation_id = self.shared.last_invalidation_id() if self.shared else 0
+        self.last_sync = time.time()
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def _sync_invalidations(self):
+        # Drop memory entries that another worker invalidated in the shared tier
+        if not self.shared or time.time() - self.last_sync < INVALIDATION_SYNC_INTERVAL:
+            return
+        self.last_sync = time.time()
+        try:
+            for invalidation_id, key in self.shared.invalidations_since(self.last_invalidation_id):
+                self.memory.invalidate(key)
+                self.last_invalidation_id = invalidation_id
+        except sqlite3.Error as e:
+            print(f"Error syncing result cache invalidations: {e}")
+
+    def get(self, key):
+        """
+        Look up a cached value
+
+        Args:
+            key: Cache key (the file hash)
+
+        Returns:
+            The cached value, or None on a miss. Values are shared between
+            callers and must be treated as read-only.
+        """
+        self._sync_invalidations()
+
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+
+        if self.shared:
+            try:
+                entry = self.shared.get(key)
+            except sqlite3.Error as e:
+                print(f"Error reading shared result cache: {e}")
+                entry = None
+            if entry is not None:
+                value, stored_at = entry
+                self._count("shared_hits")
+                # The memory copy expires with the shared entry it came from
+                self.memory.put(key, value, estimate_size(value), stored_at)
+                return value
+
+        self._count("misses")
+        return None
+
+    def put(self, key, value):
+        """Store a value in both tiers"""
+        self.memory.put(key, value, estimate_size(value))
+        if self.shared:
+            try:
+                self.shared.put(key, value)
+            except sqlite3.Error as e:
+                print(f"Error writing shared result cache: {e}")
+
+    def invalidate(self, key):
+        """Remove a value from both tiers and notify the other workers"""
+        self.memory.invalidate(key)
+        if self.shared:
+            try:
+                self.shared.invalidate(key)
+            except sqlite3.Error as e:
+                print(f"Error invalidating shared result cache: {e}")
+        self._count("invalidations")
+
+    def invalidate_many(self, keys):
+        """Remove many values from both tiers in one shared-tier transaction"""
+        for key in keys:
+            self.memory.invalidate(key)
+        if self.shared:
+            try:
+                self.shared.invalidate_many(keys)
+            except sqlite3.Error as e:
+                print(f"Error invalidating shared result cache: {e}")
+        with self.lock:
+            self.counters["invalidations"] += len(keys)
+
+    def stats(self):
+        """
+        Get cache metrics
+
+        Returns:
+            Dictionary with hit counters, hit ratio and tier usage
+        """
+        with self.lock:
+            stats = dict(self.counters)
+        lookups = stats["memory_hits"] + stats["shared_hits"] + stats["misses"]
+        stats["lookups"] = lookups
+        stats["hit_ratio"] = (stats["memory_hits"] + stats["shared_hits"]) / lookups if lookups else 0.0
+        stats["memory"] = {
+            "entries": len(self.memory),
+            "bytes": self.memory.current_bytes,
+            "max_bytes": self.memory.max_bytes
+        }
+        if self.shared:
+            try:
+                stats["shared"] = dict(self.shared.usage(), max_bytes=self.shared.max_bytes, path=self.shared.path)
+            except sqlite3.Error as e:
+                stats["shared"] = {"error": str(e)}
+        return stats
+
+_result_cache = None
+_result_cache_key = None
+
+def default_shared_path():
+    """
+    Get the default shared tier path for the configured database
+    
+    The path carries a digest of the database identity, so apps on one node
+    that use different databases never serve each other's results.
+    
+    Returns:
+        Path of a SQLite file in the temp directory
+    """
+    digest = hashlib.sha256(json.dumps(get_db_identity()).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"music_analyzer_result_cache_{digest}.sqlite3")
+
+def get_result_cache():
+    """
+    Get the process-wide result cache, configured from environment variables
+
+    Returns:
+        ResultCache instance, or None if caching is disabled
+    """
+    global _result_cache, _result_cache_key
+
+    if os.environ.get("RESULT_CACHE_ENABLED", "true").lower() != "true":
+        return None
+
+    memory_bytes = int(os.environ.get("RESULT_CACHE_MEMORY_BYTES", 64 * 1024 * 1024))
+    shared_bytes = int(os.environ.get("RESULT_CACHE_SHARED_BYTES", 512 * 1024 * 1024))
+    shared_path = os.environ.get("RESULT_CACHE_PATH") or default_shared_path()
+    max_age = float(os.environ.get("RESULT_CACHE_MAX_AGE", 3600))
+
+    # Rebuild after a fork so workers do not share SQLite handles or locks,
+    # and when the configuration changes
+    key = (os.getpid(), shared_path, memory_bytes, shared_bytes, max_age)
+    if _result_cache is None or _result_cache_key != key:
+        _result_cache = ResultCache(memory_bytes, shared_path, shared_bytes, max_age)
+        _result_cache_key = key
+
+    return _result_cache
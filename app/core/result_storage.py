@@ -0,0 +1,162 @@
+"""
+Storage encoding for analysis results in the songs table.
+Splits a results dictionary into a small summary row, a compressed payload
+and a separately stored blob holding the large per-frame arrays.
+"""
+
+import json
+import zlib
+
+# Identifies how analysis_payload was written so old rows can still be read
+PAYLOAD_ENCODING = "zlib-json-v1"
+
+# zlib level 6 is the default trade-off between speed and size
+COMPRESSION_LEVEL = 6
+
+# Arrays that are only used for charts and are stored apart from the payload,
+# listed as (section, key) pairs inside the results dictionary
+HEAVY_ARRAY_KEYS = [
+    ("transients", "transient_data"),
+]
+
+def build_summary(results):
+    """
+    Extract the summary columns stored next to the compressed payload
+
+    Args:
+        results: Dictionary of analysis results
+
+    Returns:
+        Dictionary mapping summary column names to values
+    """
+    def section_value(section, key):
+        value = (results.get(section) or {}).get(key)
+        return float(value) if isinstance(value, (int, float)) else None
+
+    musical_key = (results.get("harmonic_content") or {}).get("key")
+    overall_score = results.get("overall_score")
+    duration = results.get("duration_seconds")
+    analysis_time = results.get("analysis_time_seconds")
+
+    return {
+        "overall_score": float(overall_score) if isinstance(overall_score, (int, float)) else None,
+        "frequency_balance_score": section_value("frequency_balance", "balance_score"),
+        "dynamic_range_score": section_value("dynamic_range", "dynamic_range_score"),
+        "stereo_width_score": section_value("stereo_field", "width_score"),
+        "clarity_score": section_value("clarity", "clarity_score"),
+        "musical_key": musical_key if musical_key else None,
+        "duration_seconds": float(duration) if isinstance(duration, (int, float)) else None,
+        "analysis_seconds": float(analysis_time) if isinstance(analysis_time, (int, float)) else None,
+    }
+
+def split_heavy_arrays(results):
+    """
+    Separate the large arrays from the rest of the results
+
+    Args:
+        results: Dictionary of analysis results
+
+    Returns:
+        Tuple of (results without heavy arrays, dictionary of removed arrays)
+    """
+    light_results = dict(results)
+    arrays = {}
+
+    for section, key in HEAVY_ARRAY_KEYS:
+        section_data = light_results.get(section)
+        if isinstance(section_data, dict) and key in section_data:
+            section_copy = dict(section_data)
+            arrays[f"{section}.{key}"] = section_copy.pop(key)
+            light_results[section] = section_copy
+
+    return light_results, arrays
+
+def merge_heavy_arrays(results, arrays):
+    """
+    Put arrays removed by split_heavy_arrays back into the results
+
+    Args:
+        results: Dictionary of analysis results without heavy arrays
+        arrays: Dictionary of arrays keyed by "section.key"
+
+    Returns:
+        The results dictionary with the arrays restored
+    """
+    for name, values in (arrays or {}).items():
+        section, _, key = name.partition(".")
+        if isinstance(results.get(section), dict):
+            results[section][key] = values
+    return results
+
+def encode_blob(data):
+    """
+    Serialize a JSON-compatible object to a compressed blob
+
+    Args:
+        data: JSON-compatible object
+
+    Returns:
+        Compressed bytes
+    """
+    text = json.dumps(data, separators=(",", ":"))
+    return zlib.compress(text.encode("utf-8"), COMPRESSION_LEVEL)
+
+def decode_blob(blob):
+    """
+    Deserialize a blob written by encode_blob
+
+    Args:
+        blob: Compressed bytes
+
+    Returns:
+        The decoded object, or None if blob is empty
+
+    Raises:
+        ValueError: If the blob is corrupt or truncated
+    """
+    if not blob:
+        return None
+    try:
+        text = zlib.decompress(bytes(blob))
+    except zlib.error as e:
+        raise ValueError(f"Corrupt compressed blob: {e}") from e
+    return json.loads(text.decode("utf-8"))
+
+def encode_results(results):
+    """
+    Prepare analysis results for storage
+
+    Args:
+        results: Dictionary of analysis results
+
+    Returns:
+        Tuple of (summary dict, payload bytes, arrays bytes or None)
+    """
+    summary = build_summary(results)
+    light_results, arrays = split_heavy_arrays(results)
+    payload = encode_blob(light_results)
+    arrays_blob = encode_blob(arrays) if arrays else None
+    return summary, payload, arrays_blob
+
+def decode_results(payload, arrays_blob=None, encoding=PAYLOAD_ENCODING):
+    """
+    Rebuild the analysis results from stored blobs
+
+    Args:
+        payload: Compressed payload bytes
+        arrays_blob: Compressed arrays bytes, or None to skip the heavy arrays
+        encoding: Value of the payload_encoding column
+
+    Returns:
+        Dictionary of analysis results
+
+    Raises:
+        ValueError: If the encoding is unknown or a blob is corrupt
+    """
+    if encoding != PAYLOAD_ENCODING:
+        raise ValueError(f"Unsupported payload encoding: {encoding}")
+
+    results = decode_blob(payload)
+    if arrays_blob:
+        merge_heavy_arrays(results, decode_blob(arrays_blob))
+    return results
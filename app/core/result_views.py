@@ -0,0 +1,66 @@
+"""
+Compact views of analysis results for the browser and API clients.
+A summary holds the scores and other single-value metrics of every section,
+enough to draw the result page. The lists, charts data and per-frame arrays
+of a section are fetched separately when they are shown.
+"""
+
+# Sections served by other endpoints, e.g. /insights/<file_hash>
+EXCLUDED_SECTIONS = {"ai_insights"}
+
+# Sections whose data includes arrays stored apart from the payload
+# (see result_storage.HEAVY_ARRAY_KEYS)
+ARRAY_SECTIONS = {"transients"}
+
+def _is_scalar(value):
+    return value is None or isinstance(value, (str, int, float, bool))
+
+def list_sections(results):
+    """
+    Names of the sections that can be fetched one by one
+
+    Args:
+        results: Dictionary of analysis results
+
+    Returns:
+        Sorted list of section names
+    """
+    return sorted(
+        name for name, value in results.items()
+        if isinstance(value, dict) and name not in EXCLUDED_SECTIONS
+    )
+
+def build_summary_view(results):
+    """
+    Reduce analysis results to their single-value metrics
+
+    Args:
+        results: Dictionary of analysis results
+
+    Returns:
+        Dictionary with the top-level metrics, a 'sections' dictionary of
+        each section's metrics and the list of available sections
+    """
+    summary = {name: value for name, value in results.items() if _is_scalar(value)}
+    summary["sections"] = {
+        name: {key: value for key, value in results[name].items() if _is_scalar(value)}
+        for name in list_sections(results)
+    }
+    summary["available_sections"] = list_sections(results)
+    return summary
+
+def get_section(results, name):
+    """
+    Get one section of the analysis results
+
+    Args:
+        results: Dictionary of analysis results
+        name: Section name from list_sections
+
+    Returns:
+        The section dictionary, or None if there is no such section
+    """
+    if name in EXCLUDED_SECTIONS:
+        return None
+    section = results.get(name)
+    return section if isinstance(section, dict) else None
@@ -0,0 +1,524 @@
+"""
+Scoring of analysis results.
+The analyzers in audio_analyzer.py measure the audio; the functions here
+turn those measurements into scores and advice. Only frequency balance and
+clarity are judged differently for instrumental tracks, so a stored song is
+re-scored for the other flag from its measurements, without the audio.
+score_library applies the same formulas to the stored measurements of the
+whole library at once, for when the weights or ideal curves change.
+"""
+
+import copy
+import math
+import numpy as np
+
+# Measurements each flag-dependent section keeps next to its scores, which
+# is everything rescore_results needs
+SCORING_INPUTS = {
+    "frequency_balance": ("band_energy",),
+    "clarity": ("spectral_contrast", "spectral_flatness", "spectral_centroid", "sample_rate"),
+}
+
+# Weight of each section in the overall score
+OVERALL_WEIGHTS = {
+    "frequency_balance": 0.25,
+    "dynamic_range": 0.15,
+    "stereo_field": 0.15,
+    "clarity": 0.20,
+    "harmonic_content": 0.15,
+    "transients": 0.10,
+    "3d_spatial": 0.05,
+    "surround_compatibility": 0.05,
+    "headphone_speaker_optimization": 0.05
+}
+
+# Scores of each section that are averaged into its part of the overall score
+SCORE_COMPONENTS = {
+    "frequency_balance": ("balance_score",),
+    "dynamic_range": ("dynamic_range_score",),
+    "stereo_field": ("width_score", "phase_score"),
+    "clarity": ("clarity_score",),
+    "harmonic_content": ("harmonic_complexity",),
+    "transients": ("transients_score",),
+    "3d_spatial": ("height_score", "depth_score", "width_consistency"),
+    "surround_compatibility": ("mono_compatibility", "phase_score"),
+    "headphone_speaker_optimization": ("headphone_score", "speaker_score")
+}
+
+# Score used for a section that is missing from the results
+DEFAULT_SECTION_SCORE = 70.0
+
+# Ideal normalized band energy (0-100) of a balanced mix
+INSTRUMENTAL_CURVE = {
+    # More balanced between low and high frequencies
+    "sub_bass": 80,
+    "bass": 85,
+    "low_mids": 80,
+    "mids": 75,
+    "high_mids": 70,
+    "highs": 70,
+    "air": 65
+}
+VOCAL_CURVE = {
+    # More emphasis on the mid frequencies that carry vocals
+    "sub_bass": 75,
+    "bass": 80,
+    "low_mids": 85,
+    "mids": 90,
+    "high_mids": 85,
+    "highs": 75,
+    "air": 65
+}
+
+def score_frequency_balance(band_energy, is_instrumental=None):
+    """
+    Score the frequency balance of a mix against the ideal curve for its type
+    
+    Args:
+        band_energy: Dictionary of normalized energy values for each frequency band
+        is_instrumental: Boolean indicating if the track is instrumental (no vocals)
+        
+    Returns:
+        Balance score between 0 and 100
+    """
+    ideal_curve = INSTRUMENTAL_CURVE if is_instrumental else VOCAL_CURVE
+    deviations = [abs(band_energy[band] - ideal) for band, ideal in ideal_curve.items()]
+    avg_deviation = sum(deviations) / len(deviations)
+    
+    # Lower deviation is better
+    return float(max(0, min(100, 100 - avg_deviation)))
+
+def get_frequency_balance_analysis(normalized_energy, is_instrumental=None):
+    """
+    Generate textual analysis of frequency balance
+    
+    Args:
+        normalized_energy: Dictionary of normalized energy values for each frequency band
+        is_instrumental: Boolean indicating if the track is instrumental (no vocals)
+        
+    Returns:
+        List of analysis points
+    """
+    analysis = []
+    
+    # Check for potential issues - different thresholds based on track type
+    if is_instrumental:
+        # Analysis for instrumental tracks
+        
+        if normalized_energy["sub_bass"] > 95:
+            analysis.append("Sub bass is very prominent, which may cause muddiness in this instrumental track.")
+        elif normalized_energy["sub_bass"] < 40:
+            analysis.append("Sub bass is lacking, instrumental mix may sound thin without a foundation.")
+            
+        if normalized_energy["bass"] > 95:
+            analysis.append("Bass is very prominent, which may overpower melodic elements in this instrumental track.")
+        elif normalized_energy["bass"] < 40:
+            analysis.append("Bass is lacking, instrumental mix may lack warmth and impact.")
+        
+        if normalized_energy["mids"] < 40:
+            analysis.append("Mids are recessed, instrumental mix may sound hollow (scooped mids).")
+        
+        if normalized_energy["high_mids"] > 95:
+            analysis.append("High mids are very prominent, instrumental elements may sound harsh.")
+        
+        if normalized_energy["highs"] > 95:
+            analysis.append("Highs are very prominent, instrumental mix may sound brittle or cause ear fatigue.")
+        elif normalized_energy["highs"] < 40:
+            analysis.append("Highs are lacking, instrumental details may be lost and mix may sound dull.")
+
+        # Additional instrumental-specific analysis
+        if normalized_energy["mids"] > normalized_energy["low_mids"] and normalized_energy["mids"] > normalized_energy["high_mids"]:
+            analysis.append("Good balance for melodic instrumental elements in the mid-range.")
+            
+        # Check for extended frequency content
+        good_extremes = (normalized_energy["sub_bass"] > 50) and (normalized_energy["air"] > 50)
+        if good_extremes:
+            analysis.append("Good extended frequency range, providing a full spectrum instrumental sound.")
+        
+    else:
+        # Analysis for tracks with vocals
+        
+        if normalized_energy["sub_bass"] > 95:
+            analysis.append("Sub bass is very prominent, which may mask vocals and cause muddiness.")
+        elif normalized_energy["sub_bass"] < 40:
+            analysis.append("Sub bass is lacking, mix may sound thin beneath the vocals.")
+            
+        if normalized_energy["bass"] > 95:
+            analysis.append("Bass is very prominent, which may compete with lower vocal registers.")
+        elif normalized_energy["bass"] < 40:
+            analysis.append("Bass is lacking, vocal-focused mix may lack warmth and foundation.")
+        
+        # Vocal presence checks
+        if normalized_energy["mids"] < 60:
+            analysis.append("Mids are recessed, vocals may lack presence and clarity.")
+        elif normalized_energy["mids"] > 95:
+            analysis.append("Mids are very emphasized, vocals may sound too forward or harsh.")
+            
+        vocal_presence = normalized_energy["mids"] + normalized_energy["high_mids"]
+        if vocal_presence < 140:
+            analysis.append("Potential lack of vocal presence in the mid and high-mid range.")
+        elif vocal_presence > 180:
+            analysis.append("Vocals may be overly emphasized in the mid and high-mid range.")
+        
+        if normalized_energy["high_mids"] > 95:
+            analysis.append("High mids are very prominent, may cause vocal sibilance issues.")
+        
+        if normalized_energy["highs"] > 95:
+            analysis.append("Highs are very prominent, may exaggerate vocal sibilance or create brittleness.")
+        elif normalized_energy["highs"] < 40:
+            analysis.append("Highs are lacking, vocal air and detail may be lost.")
+            
+        # Check for potential vocal clarity issues
+        if normalized_energy["mids"] > 80 and normalized_energy["low_mids"] > 80:
+            analysis.append("Potential vocal clarity issue with both mids and low-mids being prominent.")
+    
+    # Common analysis for both types
+    if len(analysis) == 0:
+        if is_instrumental:
+            analysis.append("Frequency balance appears well suited for instrumental music.")
+        else:
+            analysis.append("Frequency balance appears well suited for music with vocals.")
+    
+    return analysis
+
+def score_clarity(contrast, flatness, centroid, sr, is_instrumental=None):
+    """
+    Score the clarity of a mix from its spectral measurements
+    
+    Args:
+        contrast: Spectral contrast value
+        flatness: Spectral flatness value
+        centroid: Spectral centroid value in Hz
+        sr: Sample rate
+        is_instrumental: Boolean indicating if the track is instrumental (no vocals)
+        
+    Returns:
+        Clarity score between 0 and 100
+    """
+    try:
+        # Different weights for instrumental vs. vocal tracks
+        if is_instrumental:
+            # For instrumental tracks - higher weight on contrast and flatness
+            contrast_weight = 0.5
+            flatness_weight = 0.3
+            centroid_weight = 0.2
+        else:
+            # For tracks with vocals - higher weight on centroid for vocal clarity
+            contrast_weight = 0.4
+            flatness_weight = 0.2
+            centroid_weight = 0.4
+        
+        # Scale contrast score between 0-100
+        contrast_score = min(100, max(0, contrast * 1000))
+        if math.isnan(contrast_score):
+            contrast_score = 70.0
+        
+        # Convert flatness to score (lower flatness is better for clarity)
+        flatness_score = min(100, max(0, (1 - flatness) * 100))
+        if math.isnan(flatness_score):
+            flatness_score = 70.0
+        
+        # Calculate centroid score with different optimal ranges based on track type
+        if is_instrumental:
+            # For instrumental, a wider range can be optimal
+            centroid_score = min(100, max(0, 100 - abs(centroid - sr/4)/(sr/8)))
+        else:
+            # For vocals, a more specific range focused on vocal clarity
+            # Approx 1-5 kHz for vocal clarity
+            vocal_clarity_center = sr/8 + sr/6  # Aim for a bit higher centroid for vocals
+            centroid_score = min(100, max(0, 100 - abs(centroid - vocal_clarity_center)/(sr/10)))
+        
+        if math.isnan(centroid_score):
+            centroid_score = 70.0
+        
+        # Combine scores with weights
+        clarity_score = float(
+            contrast_score * contrast_weight +
+            flatness_score * flatness_weight +
+            centroid_score * centroid_weight
+        )
+        
+        # Ensure final score is between 0-100 and not NaN
+        clarity_score = min(100, max(0, clarity_score))
+        if math.isnan(clarity_score):
+            clarity_score = 70.0
+        
+        print(f"Clarity component scores - Contrast: {contrast_score:.1f}, Flatness: {flatness_score:.1f}, Centroid: {centroid_score:.1f}")
+        return clarity_score
+    
+    except Exception as e:
+        print(f"Error calculating clarity score: {str(e)}")
+        return 70.0  # Default score
+
+def get_clarity_analysis(contrast, flatness, centroid, sr, is_instrumental=None):
+    """
+    Generate textual analysis of clarity
+    
+    Args:
+        contrast: Spectral contrast value
+        flatness: Spectral flatness value
+        centroid: Spectral centroid value
+        sr: Sample rate
+        is_instrumental: Boolean indicating if the track is instrumental (no vocals)
+        
+    Returns:
+        List of analysis points
+    """
+    try:
+        analysis = []
+        
+        # Analyze spectral contrast
+        if is_instrumental:
+            # Instrumental tracks often benefit from higher contrast
+            if contrast < 0.1:
+                analysis.append("Very low spectral contrast - instrumental elements may lack definition and separation.")
+            elif contrast < 0.3:
+                analysis.append("Low spectral contrast - consider enhancing separation between instrumental elements.")
+            elif contrast < 0.6:
+                analysis.append("Moderate spectral contrast - good balance between instrumental elements.")
+            else:
+                analysis.append("High spectral contrast - excellent separation between instrumental elements.")
+        else:
+            # Vocal tracks need enough contrast for vocal clarity but not too much
+            if contrast < 0.1:
+                analysis.append("Very low spectral contrast - vocals may lack definition against the backing music.")
+            elif contrast < 0.25:
+                analysis.append("Low spectral contrast - consider enhancing separation between vocals and background elements.")
+            elif contrast < 0.5:
+                analysis.append("Moderate spectral contrast - good balance between vocals and instrumental elements.")
+            else:
+                analysis.append("High spectral contrast - excellent separation between vocal and instrumental elements.")
+        
+        # Analyze spectral flatness - similar for both types but with different implications
+        if is_instrumental:
+            if flatness < 0.2:
+                analysis.append("Low spectral flatness indicates good tonal focus in instrumental elements.")
+            elif flatness < 0.4:
+                analysis.append("Moderate spectral flatness - good balance between tonal and textural elements.")
+            else:
+                analysis.append("High spectral flatness may indicate noise or lack of tonal focus in instrumental parts.")
+        else:
+            if flatness < 0.2:
+                analysis.append("Low spectral flatness indicates good tonal focus, favorable for vocal clarity.")
+            elif flatness < 0.4:
+                analysis.append("Moderate spectral flatness - good balance between vocal intelligibility and background textures.")
+            else:
+                analysis.append("High spectral flatness may compromise vocal clarity due to noise or diffuse tonal content.")
+        
+        # Analyze spectral centroid - different optimal ranges
+        if is_instrumental:
+            # Instrumental can vary more widely in centroid
+            if centroid < sr/8:
+                analysis.append("Low spectral centroid - instrumental mix may sound dark or lack brightness.")
+            elif centroid < sr/4:
+                analysis.append("Good spectral centroid range for balanced instrumental clarity.")
+            elif centroid < sr/2:
+                analysis.append("High spectral centroid - instrumental mix may sound bright or emphasized in the high end.")
+            else:
+                analysis.append("Very high spectral centroid - consider reducing excessive high frequency content in instruments.")
+        else:
+            # Vocals need more specific centroid ranges for clarity
+            if centroid < sr/10:
+                analysis.append("Low spectral centroid - vocals may sound dark or muffled.")
+            elif centroid < sr/6:
+                analysis.append("Moderate spectral centroid - adequate for vocal clarity but may benefit from more presence.")
+            elif centroid < sr/3:
+                analysis.append("Good spectral centroid range for vocal clarity and presence.")
+            else:
+                analysis.append("Very high spectral centroid - vocals may sound harsh or sibilant, consider reducing high frequency content.")
+        
+        if not analysis:
+            if is_instrumental:
+                analysis.append("Mix appears to have good clarity and definition across instrumental elements.")
+            else:
+                analysis.append("Mix appears to have good vocal clarity and definition against backing elements.")
+                
+        return analysis
+        
+    except Exception as e:
+        print(f"Error generating clarity analysis: {str(e)}")
+        return ["Unable to generate detailed clarity analysis."]
+
+def calculate_overall_score(results):
+    """Calculate an overall mix quality score based on all metrics"""
+    try:
+        score = 0.0
+        for section, weight in OVERALL_WEIGHTS.items():
+            # A missing or malformed section counts with the default score
+            try:
+                if isinstance(results.get(section), dict):
+                    keys = SCORE_COMPONENTS[section]
+                    values = [float(results[section].get(key, DEFAULT_SECTION_SCORE)) for key in keys]
+                    score += weight * (sum(values) / len(keys))
+                else:
+                    score += weight * DEFAULT_SECTION_SCORE
+            except (TypeError, ValueError):
+                score += weight * DEFAULT_SECTION_SCORE
+        
+        # Ensure score is between 0 and 100
+        score = max(0, min(100, score))
+        
+        return round(score, 1)
+    except Exception as e:
+        print(f"Error calculating overall score: {str(e)}")
+        return 70.0  # Return a reasonable default score if calculation fails
+
+def rescore_results(results, is_instrumental):
+    """
+    Re-score stored analysis results for the other instrumental flag
+    
+    The frequency balance and clarity scores and advice are recomputed from
+    the stored measurements, followed by the overall score. Sections stored
+    without their measurements keep their scores.
+    
+    Args:
+        results: Dictionary of analysis results; it is not modified
+        is_instrumental: Boolean indicating if the track is instrumental
+        
+    Returns:
+        New dictionary of analysis results
+    """
+    results = copy.deepcopy(results)
+    is_instrumental = bool(is_instrumental)
+    
+    balance = results.get("frequency_balance")
+    if isinstance(balance, dict) and _has_inputs(balance, "frequency_balance"):
+        balance["balance_score"] = score_frequency_balance(balance["band_energy"], is_instrumental)
+        balance["analysis"] = get_frequency_balance_analysis(balance["band_energy"], is_instrumental)
+        balance["is_instrumental"] = is_instrumental
+    
+    clarity = results.get("clarity")
+    if isinstance(clarity, dict) and _has_inputs(clarity, "clarity"):
+        measurements = (
+            clarity["spectral_contrast"],
+            clarity["spectral_flatness"],
+            clarity["spectral_centroid"],
+            clarity["sample_rate"]
+        )
+        clarity["clarity_score"] = score_clarity(*measurements, is_instrumental)
+        clarity["analysis"] = get_clarity_analysis(*measurements, is_instrumental)
+        clarity["is_instrumental"] = is_instrumental
+    
+    results["overall_score"] = calculate_overall_score(results)
+    return results
+
+def _has_inputs(section, name):
+    """Whether a stored section has every measurement it is scored from"""
+    missing = [field for field in SCORING_INPUTS[name] if section.get(field) is None]
+    if missing:
+        print(f"Cannot re-score {name}: missing {', '.join(missing)}")
+    return not missing
+
+FREQUENCY_BANDS = list(INSTRUMENTAL_CURVE)
+
+# Order of the values in a score input vector: the measurements of the
+# flag-dependent sections, then every score that goes into the overall score
+SCORE_INPUT_NAMES = [f"band_{band}" for band in FREQUENCY_BANDS] + [
+    "spectral_contrast",
+    "spectral_flatness",
+    "spectral_centroid",
+    "sample_rate",
+] + [f"{section}.{key}" for section, keys in SCORE_COMPONENTS.items() for key in keys]
+
+def extract_score_inputs(results):
+    """
+    Build the score input vector of an analysis
+    
+    Missing measurements are stored as NaN, which keeps the stored score of
+    their section. A missing score is stored as DEFAULT_SECTION_SCORE and a
+    malformed one as NaN, as calculate_overall_score treats them.
+    
+    Args:
+        results: Dictionary of analysis results
+        
+    Returns:
+        float64 array ordered like SCORE_INPUT_NAMES
+    """
+    def number(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return math.nan
+    
+    def section(name):
+        value = results.get(name)
+        return value if isinstance(value, dict) else {}
+    
+    band_energy = section("frequency_balance").get("band_energy") or {}
+    clarity = section("clarity")
+    values = [number(band_energy.get(band)) for band in FREQUENCY_BANDS]
+    values += [number(clarity.get(field)) for field in SCORING_INPUTS["clarity"]]
+    for section, keys in SCORE_COMPONENTS.items():
+        scores = results.get(section)
+        for key in keys:
+            values.append(number(scores.get(key, DEFAULT_SECTION_SCORE)) if isinstance(scores, dict) else DEFAULT_SECTION_SCORE)
+    return np.array(values, dtype=np.float64)
+
+def score_library(inputs, is_instrumental):
+    """
+    Score many songs at once from their score input vectors
+    
+    Gives the same numbers as score_frequency_balance, score_clarity and
+    calculate_overall_score song by song, with the sums taken in the same
+    order. Songs without the measurements of a flag-dependent section keep
+    their stored score for it in the overall score.
+    
+    Args:
+        inputs: Array of shape (songs, len(SCORE_INPUT_NAMES))
+        is_instrumental: Boolean array with the flag of each song
+        
+    Returns:
+        Dictionary of float64 arrays: balance_score and clarity_score, NaN
+        where the measurements are missing, and overall_score (not yet rounded)
+    """
+    inputs = np.asarray(inputs, dtype=np.float64)
+    instrumental = np.asarray(is_instrumental, dtype=bool)
+    column = {name: inputs[:, index] for index, name in enumerate(SCORE_INPUT_NAMES)}
+    
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Frequency balance: mean deviation from the ideal curve
+        deviation = np.zeros(len(inputs))
+        for band in FREQUENCY_BANDS:
+            ideal = np.where(instrumental, INSTRUMENTAL_CURVE[band], VOCAL_CURVE[band])
+            deviation = deviation + np.abs(column[f"band_{band}"] - ideal)
+        balance = np.clip(100 - deviation / len(FREQUENCY_BANDS), 0, 100)
+        
+        # Clarity: weighted contrast, flatness and centroid scores
+        contrast = column["spectral_contrast"]
+        flatness = column["spectral_flatness"]
+        centroid = column["spectral_centroid"]
+        sr = column["sample_rate"]
+        contrast_score = _nan_to_default(np.clip(contrast * 1000, 0, 100))
+        flatness_score = _nan_to_default(np.clip((1 - flatness) * 100, 0, 100))
+        centroid_score = _nan_to_default(np.where(
+            instrumental,
+            np.clip(100 - np.abs(centroid - sr/4)/(sr/8), 0, 100),
+            np.clip(100 - np.abs(centroid - (sr/8 + sr/6))/(sr/10), 0, 100)
+        ))
+        clarity = _nan_to_default(np.clip(
+            contrast_score * np.where(instrumental, 0.5, 0.4) +
+            flatness_score * np.where(instrumental, 0.3, 0.2) +
+            centroid_score * np.where(instrumental, 0.2, 0.4),
+            0, 100
+        ))
+        measured = ~(np.isnan(contrast) | np.isnan(flatness) | np.isnan(centroid) | np.isnan(sr))
+        clarity = np.where(measured, clarity, np.nan)
+        
+        # Overall: weighted section scores, a malformed one counting as the default
+        column["frequency_balance.balance_score"] = np.where(
+            np.isnan(balance), column["frequency_balance.balance_score"], balance)
+        column["clarity.clarity_score"] = np.where(
+            np.isnan(clarity), column["clarity.clarity_score"], clarity)
+        overall = np.zeros(len(inputs))
+        for section, weight in OVERALL_WEIGHTS.items():
+            keys = SCORE_COMPONENTS[section]
+            total = np.zeros(len(inputs))
+            for key in keys:
+                total = total + column[f"{section}.{key}"]
+            overall = overall + weight * _nan_to_default(total / len(keys))
+        overall = np.clip(overall, 0, 100)
+    
+    return {"balance_score": balance, "clarity_score": clarity, "overall_score": overall}
+
+def _nan_to_default(values):
+    return np.where(np.isnan(values), DEFAULT_SECTION_SCORE, values)
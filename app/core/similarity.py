@@ -0,0 +1,367 @@
+"""
+Similar-mix search over the numeric profile of stored analyses.
+Each song is reduced to a small float32 feature vector; the library is kept
+as one normalized matrix in memory and queried for nearest neighbours with
+vectorized distances, or with a ball tree once the library is large.
+"""
+
+import os
+import math
+import time
+import threading
+import numpy as np
+
+try:
+    from sklearn.neighbors import BallTree
+except ImportError:  # scikit-learn is optional; brute force is used instead
+    BallTree = None
+
+FREQUENCY_BANDS = ["sub_bass", "bass", "low_mids", "mids", "high_mids", "highs", "air"]
+
+# Order of the values in a feature vector
+FEATURE_NAMES = [f"band_{band}" for band in FREQUENCY_BANDS] + [
+    "dynamic_range_db",
+    "crest_factor_db",
+    "stereo_correlation",
+    "log_spectral_centroid",
+    "spectral_flatness",
+    "key_x",
+    "key_y",
+    "transient_density",
+]
+
+# Per-feature weights applied after normalization. The seven bands share
+# roughly the weight of two scalar features so they do not dominate.
+FEATURE_WEIGHTS = np.array([0.5] * len(FREQUENCY_BANDS) + [1.0, 1.0, 1.0, 1.0, 1.0, 0.7, 0.7, 1.0], dtype=np.float32)
+
+PITCH_CLASSES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+# Library size from which queries use a ball tree instead of brute force
+BALL_TREE_THRESHOLD = 20000
+
+# Renormalize the whole matrix when the library size drifts this much
+RENORMALIZE_GROWTH = 1.25
+
+def key_coordinates(key):
+    """
+    Place a musical key on the circle of fifths
+
+    Minor keys are placed at their relative major, so related keys end up
+    close together.
+
+    Args:
+        key: Key name such as "C", "F#" or "Am"
+
+    Returns:
+        Tuple of (x, y) on the unit circle, or (0, 0) for an unknown key
+    """
+    if not key or not isinstance(key, str):
+        return 0.0, 0.0
+    is_minor = key.endswith('m')
+    root = key[:-1] if is_minor else key
+    if root not in PITCH_CLASSES:
+        return 0.0, 0.0
+    pitch_class = PITCH_CLASSES.index(root)
+    if is_minor:
+        pitch_class = (pitch_class + 3) % 12
+    angle = 2 * math.pi * ((pitch_class * 7) % 12) / 12
+    return math.cos(angle), math.sin(angle)
+
+def extract_features(results):
+    """
+    Build the feature vector of an analysis
+
+    Args:
+        results: Dictionary of analysis results
+
+    Returns:
+        float32 array ordered like FEATURE_NAMES
+    """
+    def value(section, key, default=0.0):
+        number = (results.get(section) or {}).get(key)
+        if isinstance(number, (int, float)) and math.isfinite(number):
+            return float(number)
+        return default
+
+    band_energy = (results.get("frequency_balance") or {}).get("band_energy") or {}
+    bands = [float(band_energy.get(band, 0.0) or 0.0) for band in FREQUENCY_BANDS]
+    key_x, key_y = key_coordinates((results.get("harmonic_content") or {}).get("key"))
+
+    return np.array(bands + [
+        value("dynamic_range", "dynamic_range_db"),
+        value("dynamic_range", "crest_factor_db"),
+        value("stereo_field", "correlation"),
+        math.log10(max(value("clarity", "spectral_centroid", 1.0), 1.0)),
+        value("clarity", "spectral_flatness"),
+        key_x,
+        key_y,
+        value("transients", "transient_density"),
+    ], dtype=np.float32)
+
+class SimilarityIndex:
+    """In-memory nearest-neighbour index over song feature vectors"""
+
+    def __init__(self, ball_tree_threshold=BALL_TREE_THRESHOLD):
+        dimensions = len(FEATURE_NAMES)
+        self.ball_tree_threshold = ball_tree_threshold
+        self.lock = threading.RLock()
+        self.raw = np.empty((0, dimensions), dtype=np.float32)
+        self.normalized = np.empty((0, dimensions), dtype=np.float32)
+        self.squared_norms = np.empty(0, dtype=np.float32)
+        self.count = 0
+        self.keys = []
+        self.positions = {}
+        self.mean = np.zeros(dimensions, dtype=np.float32)
+        self.scale = np.ones(dimensions, dtype=np.float32)
+        self.stats_count = 0
+        self.tree = None
+        self.tree_size = 0
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self, needed):
+        if needed <= self.raw.shape[0]:
+            return
+        capacity = max(needed, 2 * self.raw.shape[0], 1024)
+        for name in ("raw", "normalized"):
+            grown = np.empty((capacity, self.raw.shape[1]), dtype=np.float32)
+            grown[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, grown)
+        norms = np.empty(capacity, dtype=np.float32)
+        norms[:self.count] = self.squared_norms[:self.count]
+        self.squared_norms = norms
+
+    def _normalize(self, vectors):
+        return (vectors - self.mean) / self.scale * FEATURE_WEIGHTS
+
+    def _renormalize(self):
+        # Recompute the z-score statistics and rescale every row in one pass
+        active = self.raw[:self.count]
+        self.mean = active.mean(axis=0)
+        self.scale = np.maximum(active.std(axis=0), 1e-6).astype(np.float32)
+        self.normalized[:self.count] = self._normalize(active)
+        self.squared_norms[:self.count] = np.einsum("ij,ij->i", self.normalized[:self.count], self.normalized[:self.count])
+        self.stats_count = self.count
+        self.tree = None
+
+    def _maybe_renormalize(self):
+        if self.count == 0:
+            return
+        if (self.count > self.stats_count * RENORMALIZE_GROWTH
+                or self.count < self.stats_count / RENORMALIZE_GROWTH):
+            self._renormalize()
+
+    def add(self, key, vector):
+        """
+        Add or replace the feature vector of a song
+
+        Args:
+            key: Song identifier (the file hash)
+            vector: Feature vector from extract_features
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        with self.lock:
+            position = self.positions.get(key)
+            if position is None:
+                self._grow(self.count + 1)
+                position = self.count
+                self.keys.append(key)
+                self.positions[key] = position
+                self.count += 1
+            elif position < self.tree_size:
+                # The tree holds the old vector of this row
+                self.tree = None
+            self.raw[position] = vector
+            self.normalized[position] = self._normalize(vector)
+            self.squared_norms[position] = np.dot(self.normalized[position], self.normalized[position])
+            self._maybe_renormalize()
+
+    def add_many(self, keys, vectors):
+        """
+        Add many feature vectors at once and renormalize the matrix
+
+        Args:
+            keys: List of song identifiers
+            vectors: 2-D array with one feature vector per key
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, len(FEATURE_NAMES))
+        with self.lock:
+            self._grow(self.count + len(keys))
+            for key, vector in zip(keys, vectors):
+                position = self.positions.get(key)
+                if position is None:
+                    position = self.count
+                    self.keys.append(key)
+                    self.positions[key] = position
+                    self.count += 1
+                self.raw[position] = vector
+            self._renormalize()
+
+    def remove(self, key):
+        """
+        Remove a song from the index
+
+        Args:
+            key: Song identifier
+
+        Returns:
+            True if the song was indexed
+        """
+        with self.lock:
+            position = self.positions.pop(key, None)
+            if position is None:
+                return False
+            # Move the last row into the freed slot to keep the matrix dense
+            last = self.count - 1
+            if position != last:
+                last_key = self.keys[last]
+                self.raw[position] = self.raw[last]
+                self.normalized[position] = self.normalized[last]
+                self.squared_norms[position] = self.squared_norms[last]
+                self.keys[position] = last_key
+                self.positions[last_key] = position
+            self.keys.pop()
+            self.count -= 1
+            self.tree = None
+            self.tree_size = 0
+            return True
+
+    def vector(self, key):
+        """Get the raw feature vector of an indexed song, or None"""
+        with self.lock:
+            position = self.positions.get(key)
+            return None if position is None else self.raw[position].copy()
+
+    def _ensure_tree(self):
+        if BallTree is None or self.count < self.ball_tree_threshold:
+            return
+        # Rows appended after the tree was built are searched by brute force;
+        # rebuild once they make up a noticeable share of the library
+        if self.tree is None or self.count - self.tree_size > self.tree_size // 10:
+            self.tree = BallTree(self.normalized[:self.count])
+            self.tree_size = self.count
+
+    def query(self, vector, k=5, exclude=None):
+        """
+        Find the songs closest to a feature vector
+
+        Args:
+            vector: Feature vector from extract_features
+            k: Number of neighbours to return
+            exclude: Optional song identifier to leave out (e.g. the query song)
+
+        Returns:
+            List of (key, distance) tuples, closest first
+        """
+        with self.lock:
+            if self.count == 0 or k <= 0:
+                return []
+            target = self._normalize(np.asarray(vector, dtype=np.float32))
+            wanted = min(k + (1 if exclude is not None else 0), self.count)
+
+            self._ensure_tree()
+            if self.tree is not None:
+                distances, indices = self.tree.query(target[None, :], k=min(wanted, self.tree_size))
+                candidates = list(zip(indices[0].tolist(), distances[0].tolist()))
+                start = self.tree_size
+            else:
+                candidates = []
+                start = 0
+
+            if start < self.count:
+                # |x - q|^2 = |x|^2 - 2 x.q + |q|^2, a single matrix-vector product
+                squared = self.squared_norms[start:self.count] - 2 * (self.normalized[start:self.count] @ target)
+                squared = np.maximum(squared + np.dot(target, target), 0.0)
+                if wanted < len(squared):
+                    nearest = np.argpartition(squared, wanted - 1)[:wanted]
+                else:
+                    nearest = np.arange(len(squared))
+                candidates.extend((start + int(i), float(np.sqrt(squared[i]))) for i in nearest)
+
+            candidates.sort(key=lambda item: item[1])
+            matches = []
+            for position, distance in candidates:
+                key = self.keys[position]
+                if key == exclude:
+                    continue
+                matches.append((key, distance))
+                if len(matches) == k:
+                    break
+            return matches
+
+    def stats(self):
+        """
+        Get index metrics
+
+        Returns:
+            Dictionary with the library size and search strategy
+        """
+        with self.lock:
+            return {
+                "songs": self.count,
+                "dimensions": len(FEATURE_NAMES),
+                "ball_tree": self.tree is not None,
+                "tree_size": self.tree_size,
+                "memory_bytes": int(self.raw.nbytes + self.normalized.nbytes)
+            }
+
+_similarity_index = None
+_similarity_index_pid = None
+_similarity_index_lock = threading.Lock()
+_last_loaded_id = 0
+_last_refresh = 0.0
+_last_full_load = 0.0
+
+def get_similarity_index():
+    """
+    Get the process-wide similarity index, loading it from the database
+
+    New songs saved by other worker processes are picked up every
+    SIMILARITY_REFRESH_INTERVAL seconds; the whole index is reloaded every
+    SIMILARITY_RELOAD_INTERVAL seconds to drop songs deleted elsewhere.
+
+    Returns:
+        SimilarityIndex instance
+    """
+    global _similarity_index, _similarity_index_pid, _last_loaded_id, _last_refresh, _last_full_load
+    from app.core.database import get_song_feature_vectors, backfill_feature_vectors
+
+    refresh_interval = float(os.environ.get("SIMILARITY_REFRESH_INTERVAL", 30))
+    reload_interval = float(os.environ.get("SIMILARITY_RELOAD_INTERVAL", 600))
+
+    with _similarity_index_lock:
+        now = time.time()
+        full_load = (
+            _similarity_index is None
+            or _similarity_index_pid != os.getpid()
+            or now - _last_full_load > reload_interval
+        )
+        if full_load:
+            backfill_feature_vectors()
+            index = SimilarityIndex()
+            rows = get_song_feature_vectors()
+            if rows:
+                index.add_many([row[1] for row in rows],
+                               [np.frombuffer(bytes(row[2]), dtype=np.float32) for row in rows])
+            _similarity_index = index
+            _similarity_index_pid = os.getpid()
+            _last_loaded_id = max((row[0] for row in rows), default=0)
+            _last_refresh = _last_full_load = now
+        elif now - _last_refresh > refresh_interval:
+            rows = get_song_feature_vectors(after_id=_last_loaded_id)
+            for row_id, file_hash, blob in rows:
+                _similarity_index.add(file_hash, np.frombuffer(bytes(blob), dtype=np.float32))
+                _last_loaded_id = max(_last_loaded_id, row_id)
+            _last_refresh = now
+        return _similarity_index
+
+def update_similarity_index(file_hash, vector):
+    """Add a saved song to this process's index if it is already loaded"""
+    if _similarity_index is not None and _similarity_index_pid == os.getpid():
+        _similarity_index.add(file_hash, vector)
+
+def remove_from_similarity_index(file_hash):
+    """Remove a deleted song from this process's index if it is loaded"""
+    if _similarity_index is not None and _similarity_index_pid == os.getpid():
+        _similarity_index.remove(file_hash)
@@ -0,0 +1,158 @@
+"""
+Content-addressed layout of the upload folder.
+Each file is stored once, under the SHA-256 of its bytes and with the
+extension it was uploaded with: <upload folder>/<hash>/<hash><ext>. Its
+visualizations go to app/static/uploads/<hash>. Files arrive in a private
+incoming directory, are hashed while they are written and then moved into
+place, so two uploads under the same name never share a directory, and the
+same audio uploaded under two names is stored once.
+
+The names an upload was known by are kept as aliases of its hash in the
+database (see save_upload_aliases). resolve_upload_path accepts a hash, an
+alias, or the id of an upload stored before this layout, which still lives
+at <upload folder>/<id>/<id>.mp3.
+"""
+
+import os
+import re
+import uuid
+import hashlib
+
+from app.core.database import find_upload_alias
+
+# Files being received; secure_filename never yields a dot-name, so no
+# upload collides with it
+INCOMING_DIR = ".incoming"
+
+# Block size used when writing and hashing an upload
+WRITE_BLOCK_SIZE = 1024 * 1024
+
+# Uploads stored before this layout were all saved as .mp3
+LEGACY_EXTENSION = ".mp3"
+
+HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+EXTENSION_PATTERN = re.compile(r"^\.[0-9a-z]{1,8}$")
+
+def upload_extension(filename):
+    """
+    Extension to store an upload with, taken from its name
+
+    Args:
+        filename: File name as uploaded
+
+    Returns:
+        Lower-case extension including the dot, LEGACY_EXTENSION if it has none
+    """
+    extension = os.path.splitext(filename or "")[1].lower()
+    return extension if EXTENSION_PATTERN.match(extension) else LEGACY_EXTENSION
+
+def incoming_path(upload_dir, filename):
+    """Unique path to receive an upload at before its hash is known"""
+    directory = os.path.join(upload_dir, INCOMING_DIR)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{uuid.uuid4().hex}{upload_extension(filename)}")
+
+def save_incoming(file, upload_dir):
+    """
+    Write an uploaded file to the incoming directory, hashing it on the way
+
+    Args:
+        file: Uploaded werkzeug FileStorage
+        upload_dir: The application's upload folder
+
+    Returns:
+        Tuple of (incoming path, SHA-256 hash of the file)
+    """
+    path = incoming_path(upload_dir, file.filename)
+    sha256 = hashlib.sha256()
+    try:
+        with open(path, "wb") as f:
+            for block in iter(lambda: file.stream.read(WRITE_BLOCK_SIZE), b""):
+                sha256.update(block)
+                f.write(block)
+    except Exception:
+        discard_incoming(path)
+        raise
+    return path, sha256.hexdigest()
+
+def discard_incoming(path):
+    """Delete a received file that was not stored"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def find_stored_file(upload_dir, file_hash):
+    """
+    Find the stored file of a hash, whatever its extension
+
+    Args:
+        upload_dir: The application's upload folder
+        file_hash: SHA-256 hash of the file
+
+    Returns:
+        Path to the file, or None if it is not stored
+    """
+    directory = os.path.join(upload_dir, file_hash)
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return None
+    for name in sorted(names):
+        stem, extension = os.path.splitext(name)
+        if stem == file_hash and EXTENSION_PATTERN.match(extension):
+            return os.path.join(directory, name)
+    return None
+
+def store_upload(upload_dir, path, file_hash, filename):
+    """
+    Move a received file to its content address, or drop it if a file with
+    the same content is already stored
+
+    Args:
+        upload_dir: The application's upload folder
+        path: Incoming path from save_incoming
+        file_hash: SHA-256 hash of the file
+        filename: File name as uploaded, for its extension
+
+    Returns:
+        Path of the stored file
+    """
+    stored = find_stored_file(upload_dir, file_hash)
+    if stored:
+        discard_incoming(path)
+        print(f"Upload {file_hash} is already stored as {os.path.basename(stored)}")
+        return stored
+
+    destination = os.path.join(upload_dir, file_hash, f"{file_hash}{upload_extension(filename)}")
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    os.replace(path, destination)
+    return destination
+
+def resolve_upload_path(upload_dir, file_id):
+    """
+    Find the stored file of an upload
+
+    Args:
+        upload_dir: The application's upload folder
+        file_id: The file hash, a name or id the file was uploaded under, or
+                 the directory name of an upload stored before this layout
+
+    Returns:
+        Path to the file, or None if there is none
+    """
+    file_id = os.path.basename(file_id or "")
+    if not file_id or file_id.startswith("."):
+        return None
+
+    if HASH_PATTERN.match(file_id.lower()):
+        stored = find_stored_file(upload_dir, file_id.lower())
+        if stored:
+            return stored
+
+    legacy = os.path.join(upload_dir, file_id, f"{file_id}{LEGACY_EXTENSION}")
+    if os.path.exists(legacy):
+        return legacy
+
+    file_hash = find_upload_alias(file_id)
+    return find_stored_file(upload_dir, file_hash) if file_hash else None
@@ -0,0 +1,341 @@
+"""
+Disk budget for uploaded files.
+Every upload directory (the audio file in the upload folder and its
+visualizations under app/static/uploads) is listed in a SQLite index with
+its size and last access. Uploads are recorded when they are saved and
+touched when their results or images are viewed; when the total exceeds
+the budget, the least recently used uploads are deleted until it fits
+again. Uploads pinned by an analysis that is still running are never
+deleted. Stored analysis results stay in the database; only the files go.
+"""
+
+import os
+import time
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# File name of the index in the upload folder; secure_filename never yields
+# a dot-name, so no upload collides with it
+STORAGE_INDEX_NAME = ".storage_index.sqlite3"
+
+# Directory of the visualizations, which are served as static files
+VISUALIZATION_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static", "uploads")
+
+# A pin older than this belongs to a job that died; its upload may be evicted
+PIN_TIMEOUT = 3600
+
+# Minimum seconds between two recorded accesses of an upload by one process
+TOUCH_INTERVAL = 60.0
+
+# Number of eviction candidates read from the index at a time
+EVICTION_BATCH_SIZE = 16
+
+def _directory_size(path):
+    """Total size of the files below a directory, 0 if it does not exist"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+class UploadStorage:
+    """
+    Index of upload directories that enforces a byte budget by LRU eviction.
+    The index is a SQLite file in WAL mode, so every worker process on the
+    node shares it; evictions run inside a write transaction, which also
+    serializes them against pins taken by other processes.
+    """
+
+    def __init__(self, upload_dir, index_path=None, max_bytes=0, artifact_dirs=None):
+        self.upload_dir = upload_dir
+        self.artifact_dirs = [VISUALIZATION_DIR] if artifact_dirs is None else artifact_dirs
+        self.index_path = index_path or os.path.join(upload_dir, STORAGE_INDEX_NAME)
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.touched = {}
+        self.counters = {"evictions": 0, "evicted_bytes": 0, "eviction_errors": 0}
+        if self._init_schema():
+            self.scan()
+
+    def _connection(self):
+        # Connections must not be shared across threads or forked processes
+        connection = getattr(self.local, "connection", None)
+        if connection is None or getattr(self.local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.index_path, timeout=10.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    def _init_schema(self):
+        """Create the index; returns True if it did not exist yet"""
+        connection = self._connection()
+        exists = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'uploads'"
+        ).fetchone()
+        connection.execute("""
+        CREATE TABLE IF NOT EXISTS uploads (
+            file_id TEXT PRIMARY KEY,
+            file_hash TEXT,
+            size INTEGER NOT NULL,
+            last_access REAL NOT NULL,
+            pins INTEGER NOT NULL DEFAULT 0,
+            pinned_at REAL
+        )
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS uploads_last_access ON uploads(last_access)")
+        connection.execute("CREATE INDEX IF NOT EXISTS uploads_file_hash ON uploads(file_hash)")
+        return exists is None
+
+    def _paths(self, file_id):
+        if not file_id or file_id != os.path.basename(file_id) or file_id.startswith("."):
+            raise ValueError(f"Invalid upload name: {file_id!r}")
+        return [os.path.join(directory, file_id) for directory in [self.upload_dir] + self.artifact_dirs]
+
+    def _measure(self, file_id):
+        return sum(_directory_size(path) for path in self._paths(file_id))
+
+    def scan(self):
+        """
+        Add the upload directories missing from the index, last accessed at
+        their modification time. Only needed once for uploads saved before
+        the index existed.
+
+        Returns:
+            Number of uploads added
+        """
+        if not os.path.isdir(self.upload_dir):
+            return 0
+        connection = self._connection()
+        known = {row[0] for row in connection.execute("SELECT file_id FROM uploads")}
+        rows = []
+        for entry in os.scandir(self.upload_dir):
+            if entry.is_dir() and not entry.name.startswith(".") and entry.name not in known:
+                rows.append((entry.name, self._measure(entry.name), entry.stat().st_mtime))
+        connection.executemany(
+            "INSERT OR IGNORE INTO uploads (file_id, size, last_access) VALUES (?, ?, ?)", rows
+        )
+        if rows:
+            print(f"Indexed {len(rows)} existing uploads in {self.index_path}")
+        return len(rows)
+
+    def record(self, file_id, file_hash=None):
+        """
+        Record the current size of an upload as just accessed, then evict
+        other uploads if the budget is exceeded
+
+        Args:
+            file_id: Upload directory name
+            file_hash: SHA-256 hash of the file, kept if None
+        """
+        self._connection().execute("""
+        INSERT INTO uploads (file_id, file_hash, size, last_access) VALUES (?, ?, ?, ?)
+        ON CONFLICT(file_id) DO UPDATE SET
+            file_hash = COALESCE(excluded.file_hash, file_hash),
+            size = excluded.size,
+            last_access = excluded.last_access
+        """, (file_id, file_hash, self._measure(file_id), time.time()))
+        self.enforce_budget()
+
+    def touch(self, file_id=None, file_hash=None):
+        """
+        Mark an upload as accessed, by directory name or file hash. Repeated
+        accesses within TOUCH_INTERVAL are not written to the index.
+        """
+        key = file_id or file_hash
+        now = time.time()
+        with self.lock:
+            if now - self.touched.get(key, 0) < TOUCH_INTERVAL:
+                return
+            self.touched[key] = now
+            # Keep the throttle table bounded
+            if len(self.touched) > 10000:
+                self.touched = {k: t for k, t in self.touched.items() if now - t < TOUCH_INTERVAL}
+        column = "file_id" if file_id else "file_hash"
+        self._connection().execute(f"UPDATE uploads SET last_access = ? WHERE {column} = ?", (now, key))
+
+    @contextmanager
+    def pinned(self, file_id):
+        """
+        Protect an upload from eviction while a job uses its files. The size
+        is recorded when the job ends, including the files it wrote. Errors of
+        the index are printed rather than raised, so they never fail the job.
+        """
+        self._paths(file_id)
+        now = time.time()
+        try:
+            self._connection().execute("""
+            INSERT INTO uploads (file_id, size, last_access, pins, pinned_at) VALUES (?, 0, ?, 1, ?)
+            ON CONFLICT(file_id) DO UPDATE SET pins = pins + 1, pinned_at = excluded.pinned_at,
+                last_access = excluded.last_access
+            """, (file_id, now, now))
+        except sqlite3.Error as e:
+            print(f"Error pinning upload {file_id}: {str(e)}")
+        try:
+            yield
+        finally:
+            try:
+                self._connection().execute(
+                    "UPDATE uploads SET pins = MAX(pins - 1, 0) WHERE file_id = ?", (file_id,)
+                )
+                self.record(file_id)
+            except sqlite3.Error as e:
+                print(f"Error releasing upload {file_id}: {str(e)}")
+
+    def remove(self, file_id):
+        """Delete the files of an upload and its index entry, pinned or not"""
+        for path in self._paths(file_id):
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+        self._connection().execute("DELETE FROM uploads WHERE file_id = ?", (file_id,))
+
+    def _evict(self, connection, file_id):
+        """Delete an unpinned upload and its index entry; returns the bytes freed, or None if it is pinned"""
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT size FROM uploads WHERE file_id = ? AND (pins = 0 OR pinned_at < ?)",
+                (file_id, time.time() - PIN_TIMEOUT)
+            ).fetchone()
+            if row is None:
+                connection.execute("ROLLBACK")
+                return None
+            for path in self._paths(file_id):
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+            connection.execute("DELETE FROM uploads WHERE file_id = ?", (file_id,))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        with self.lock:
+            self.counters["evictions"] += 1
+            self.counters["evicted_bytes"] += row[0]
+        print(f"Evicted upload {file_id} ({row[0] / (1024 * 1024):.1f} MB)")
+        return row[0]
+
+    def _evict_where(self, condition, params, enough):
+        """Evict unpinned uploads matching a condition, least recently used first, until enough(freed) is True; returns (file_id, size) of each"""
+        connection = self._connection()
+        freed = 0
+        evicted = []
+        skipped = set()
+        while not enough(freed):
+            candidates = connection.execute(
+                f"SELECT file_id FROM uploads WHERE (pins = 0 OR pinned_at < ?) AND {condition} "
+                f"ORDER BY last_access LIMIT ?",
+                (time.time() - PIN_TIMEOUT, *params, EVICTION_BATCH_SIZE + len(skipped))
+            ).fetchall()
+            candidates = [row[0] for row in candidates if row[0] not in skipped]
+            if not candidates:
+                break
+            for file_id in candidates:
+                try:
+                    size = self._evict(connection, file_id)
+                except (OSError, sqlite3.Error) as e:
+                    print(f"Error evicting upload {file_id}: {str(e)}")
+                    with self.lock:
+                        self.counters["eviction_errors"] += 1
+                    size = None
+                if size is None:
+                    skipped.add(file_id)
+                    continue
+                freed += size
+                evicted.append((file_id, size))
+                if enough(freed):
+                    break
+        return evicted
+
+    def total_bytes(self):
+        return self._connection().execute("SELECT COALESCE(SUM(size), 0) FROM uploads").fetchone()[0]
+
+    def enforce_budget(self):
+        """
+        Evict the least recently used unpinned uploads until the total size
+        fits the budget
+
+        Returns:
+            Number of bytes freed
+        """
+        if self.max_bytes <= 0:
+            return 0
+        excess = self.total_bytes() - self.max_bytes
+        if excess <= 0:
+            return 0
+        evicted = self._evict_where("1 = 1", (), lambda freed: freed >= excess)
+        return sum(size for _, size in evicted)
+
+    def expire(self, max_age_seconds, dry_run=False):
+        """
+        Evict the unpinned uploads not accessed for max_age_seconds
+
+        Args:
+            max_age_seconds: Maximum time since the last access
+            dry_run: Only list the uploads that would be evicted
+
+        Returns:
+            List of (file_id, size) of the evicted uploads
+        """
+        cutoff = time.time() - max_age_seconds
+        if dry_run:
+            return self._connection().execute(
+                "SELECT file_id, size FROM uploads WHERE (pins = 0 OR pinned_at < ?) AND last_access < ? "
+                "ORDER BY last_access",
+                (time.time() - PIN_TIMEOUT, cutoff)
+            ).fetchall()
+        return self._evict_where("last_access < ?", (cutoff,), lambda freed: False)
+
+    def usage(self):
+        """
+        Get storage metrics
+
+        Returns:
+            Dictionary with the number and size of the indexed uploads, the
+            budget, pinned uploads and this process's eviction counters
+        """
+        row = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(pins > 0), 0), MIN(last_access) FROM uploads"
+        ).fetchone()
+        with self.lock:
+            counters = dict(self.counters)
+        return dict(
+            counters,
+            uploads=row[0],
+            bytes=row[1],
+            max_bytes=self.max_bytes,
+            pinned=row[2],
+            oldest_access=row[3],
+            index_path=self.index_path
+        )
+
+_upload_storage = None
+_upload_storage_key = None
+
+def get_upload_storage(upload_dir):
+    """
+    Get the process-wide upload storage manager, configured from environment variables
+
+    Args:
+        upload_dir: The application's upload folder
+
+    Returns:
+        UploadStorage instance
+    """
+    global _upload_storage, _upload_storage_key
+
+    # Rebuild after a fork so workers do not share SQLite handles or locks
+    key = (upload_dir, os.getpid())
+    if _upload_storage is None or _upload_storage_key != key:
+        os.makedirs(upload_dir, exist_ok=True)
+        max_bytes = int(os.environ.get("UPLOAD_STORAGE_MAX_BYTES", 10 * 1024 * 1024 * 1024))
+        _upload_storage = UploadStorage(upload_dir, os.environ.get("UPLOAD_STORAGE_INDEX_PATH"), max_bytes)
+        _upload_storage_key = key
+
+    return _upload_storage
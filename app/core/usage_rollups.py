@@ -0,0 +1,209 @@
+"""
+Daily rollups of AI usage events.
+Raw events are folded into one row per (day, provider, model) holding
+counters, response time sums and token sums, plus a fixed-bucket latency
+histogram from which the dashboard estimates p50/p95 without reading raw rows.
+"""
+
+import math
+from datetime import date, datetime
+
+# Upper bounds in seconds of the latency histogram buckets. The last bucket
+# is open-ended and catches everything slower than the largest bound.
+LATENCY_BUCKET_BOUNDS = [
+    0.25, 0.5, 0.75, 1, 1.5, 2, 2.5, 3, 4, 5, 6, 8, 10, 12, 15,
+    20, 25, 30, 40, 50, 60, 90, 120, 180, 300
+]
+
+# Counters of a rollup that are added up when rollups are merged
+ROLLUP_COUNTERS = (
+    "request_count", "fallback_count", "timed_count", "response_time_sum", "response_time_sumsq",
+    "token_count", "prompt_tokens_sum", "completion_tokens_sum", "cached_tokens_sum"
+)
+
+def bucket_for(response_time):
+    """
+    Find the histogram bucket of a response time
+
+    Args:
+        response_time: Response time in seconds
+
+    Returns:
+        Bucket index between 0 and len(LATENCY_BUCKET_BOUNDS)
+    """
+    for index, bound in enumerate(LATENCY_BUCKET_BOUNDS):
+        if response_time <= bound:
+            return index
+    return len(LATENCY_BUCKET_BOUNDS)
+
+def empty_rollup():
+    """Create an empty rollup accumulator"""
+    return {
+        "request_count": 0,
+        "fallback_count": 0,
+        "timed_count": 0,
+        "response_time_sum": 0.0,
+        "response_time_sumsq": 0.0,
+        "token_count": 0,
+        "prompt_tokens_sum": 0,
+        "completion_tokens_sum": 0,
+        "cached_tokens_sum": 0,
+        "buckets": {}
+    }
+
+def add_event(rollup, is_fallback, response_time, prompt_tokens=None, completion_tokens=None, cached_tokens=None):
+    """
+    Fold a single usage event into a rollup accumulator
+
+    Args:
+        rollup: Accumulator created by empty_rollup
+        is_fallback: Whether the request was a fallback
+        response_time: Response time in seconds, or None if unknown
+        prompt_tokens: Input tokens of the request, or None if unknown
+        completion_tokens: Output tokens of the request, or None if unknown
+        cached_tokens: Input tokens served from the provider's prompt cache
+    """
+    rollup["request_count"] += 1
+    if is_fallback:
+        rollup["fallback_count"] += 1
+    if response_time is not None:
+        response_time = float(response_time)
+        rollup["timed_count"] += 1
+        rollup["response_time_sum"] += response_time
+        rollup["response_time_sumsq"] += response_time * response_time
+        bucket = bucket_for(response_time)
+        rollup["buckets"][bucket] = rollup["buckets"].get(bucket, 0) + 1
+    # Events recorded before token accounting count towards no token average
+    if prompt_tokens is not None or completion_tokens is not None:
+        rollup["token_count"] += 1
+        rollup["prompt_tokens_sum"] += int(prompt_tokens or 0)
+        rollup["completion_tokens_sum"] += int(completion_tokens or 0)
+        rollup["cached_tokens_sum"] += int(cached_tokens or 0)
+
+def merge_rollups(target, other):
+    """
+    Add the counters of one rollup accumulator into another
+
+    Args:
+        target: Accumulator that is updated in place
+        other: Accumulator whose counters are added
+    """
+    for key in ROLLUP_COUNTERS:
+        target[key] += other[key]
+    for bucket, count in other["buckets"].items():
+        target["buckets"][bucket] = target["buckets"].get(bucket, 0) + count
+
+def event_day(timestamp):
+    """Get the rollup day of an event timestamp"""
+    if isinstance(timestamp, datetime):
+        return timestamp.date()
+    if isinstance(timestamp, date):
+        return timestamp
+    if isinstance(timestamp, str) and timestamp:
+        return datetime.fromisoformat(timestamp).date()
+    return date.today()
+
+def aggregate_usage_rows(rows):
+    """
+    Group raw usage events into daily rollups
+
+    Args:
+        rows: Iterable of (provider, model, is_fallback, response_time, timestamp)
+            tuples, optionally followed by (prompt_tokens, completion_tokens, cached_tokens)
+
+    Returns:
+        Dictionary mapping (day, provider, model) to rollup accumulators
+    """
+    rollups = {}
+    for provider, model, is_fallback, response_time, timestamp, *tokens in rows:
+        key = (event_day(timestamp), provider, model)
+        if key not in rollups:
+            rollups[key] = empty_rollup()
+        add_event(rollups[key], is_fallback, response_time, *tokens)
+    return rollups
+
+def percentile_from_buckets(buckets, quantile):
+    """
+    Estimate a percentile from histogram bucket counts
+
+    The value is interpolated linearly inside the bucket that holds the
+    requested rank, so the error is bounded by the bucket width.
+
+    Args:
+        buckets: Dictionary mapping bucket index to count
+        quantile: Quantile between 0 and 1 (e.g. 0.95)
+
+    Returns:
+        Estimated response time in seconds, or None if there are no samples
+    """
+    total = sum(buckets.values())
+    if total == 0:
+        return None
+
+    rank = quantile * total
+    seen = 0
+    for index in sorted(buckets):
+        count = buckets[index]
+        if count <= 0:
+            continue
+        if seen + count >= rank:
+            lower = LATENCY_BUCKET_BOUNDS[index - 1] if index > 0 else 0.0
+            if index >= len(LATENCY_BUCKET_BOUNDS):
+                # Open-ended bucket: the lower bound is the best estimate
+                return float(lower)
+            upper = LATENCY_BUCKET_BOUNDS[index]
+            return float(lower + (upper - lower) * (rank - seen) / count)
+        seen += count
+    return float(LATENCY_BUCKET_BOUNDS[-1])
+
+def summarize_rollup(count, fallback_count, timed_count, response_time_sum, response_time_sumsq, buckets,
+                     token_count=0, prompt_tokens_sum=0, completion_tokens_sum=0, cached_tokens_sum=0):
+    """
+    Turn summed rollup columns into dashboard statistics
+
+    Args:
+        count: Number of requests
+        fallback_count: Number of fallback requests
+        timed_count: Number of requests with a response time
+        response_time_sum: Sum of response times
+        response_time_sumsq: Sum of squared response times
+        buckets: Dictionary mapping bucket index to count
+        token_count: Number of requests with token counts
+        prompt_tokens_sum: Sum of input tokens
+        completion_tokens_sum: Sum of output tokens
+        cached_tokens_sum: Sum of input tokens served from the prompt cache
+
+    Returns:
+        Dictionary with count, fallback_count, avg/stddev/p50/p95 response time,
+        token totals, average tokens per request and the prompt cache rate
+    """
+    count = int(count or 0)
+    timed_count = int(timed_count or 0)
+    response_time_sum = float(response_time_sum or 0)
+    response_time_sumsq = float(response_time_sumsq or 0)
+
+    avg_response_time = None
+    stddev_response_time = None
+    if timed_count:
+        avg_response_time = response_time_sum / timed_count
+        variance = response_time_sumsq / timed_count - avg_response_time ** 2
+        stddev_response_time = math.sqrt(max(variance, 0.0))
+
+    token_count = int(token_count or 0)
+    prompt_tokens_sum = int(prompt_tokens_sum or 0)
+    completion_tokens_sum = int(completion_tokens_sum or 0)
+    cached_tokens_sum = int(cached_tokens_sum or 0)
+
+    return {
+        "count": count,
+        "fallback_count": int(fallback_count or 0),
+        "avg_response_time": avg_response_time,
+        "stddev_response_time": stddev_response_time,
+        "p50_response_time": percentile_from_buckets(buckets, 0.5),
+        "p95_response_time": percentile_from_buckets(buckets, 0.95),
+        "prompt_tokens": prompt_tokens_sum,
+        "completion_tokens": completion_tokens_sum,
+        "avg_prompt_tokens": prompt_tokens_sum / token_count if token_count else None,
+        "avg_completion_tokens": completion_tokens_sum / token_count if token_count else None,
+        "cached_token_rate": cached_tokens_sum / prompt_tokens_sum if prompt_tokens_sum else None
+    }
@@ -0,0 +1,135 @@
+"""
+Buffered background writer for analytics rows.
+Rows are pushed onto a bounded in-process queue and handed to a flush
+function in batches, so request handlers never wait on a database commit.
+"""
+
+import os
+import queue
+import atexit
+import threading
+import time
+
+class BatchedWriter:
+    """Collects rows and flushes them every batch_size rows or flush_interval seconds"""
+
+    def __init__(self, flush_func, batch_size=50, flush_interval=5.0, max_buffer=10000, name="batched-writer"):
+        """
+        Args:
+            flush_func: Callable receiving a list of rows; returns True on success
+            batch_size: Number of buffered rows that triggers a flush
+            flush_interval: Maximum seconds a row waits before being flushed
+            max_buffer: Maximum number of buffered rows; further rows are dropped
+            name: Name of the background thread
+        """
+        self.flush_func = flush_func
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.name = name
+        self.queue = queue.Queue(maxsize=max_buffer)
+        self.stop_event = threading.Event()
+        self.flush_lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+        self.counters = {"submitted": 0, "written": 0, "dropped": 0, "failed": 0, "flushes": 0}
+
+    def _ensure_started(self):
+        # Threads do not survive a fork, so each worker process starts its own
+        if self.thread is not None and self.pid == os.getpid() and self.thread.is_alive():
+            return
+        with self.flush_lock:
+            if self.thread is not None and self.pid == os.getpid() and self.thread.is_alive():
+                return
+            if self.pid != os.getpid():
+                self.queue = queue.Queue(maxsize=self.max_buffer)
+                atexit.register(self.close)
+            # A thread stopped by close() keeps its own event, so a restart
+            # after close() gets a fresh one
+            self.stop_event = threading.Event()
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, args=(self.stop_event,), name=self.name, daemon=True)
+            self.thread.start()
+
+    def submit(self, row):
+        """
+        Queue a row for writing without blocking
+
+        Args:
+            row: Row passed to the flush function
+
+        Returns:
+            True if the row was queued, False if the buffer is full
+        """
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(row)
+            self.counters["submitted"] += 1
+            return True
+        except queue.Full:
+            self.counters["dropped"] += 1
+            return False
+
+    def _run(self, stop_event):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while not stop_event.is_set():
+            # Wake up regularly so close() does not wait for a long interval
+            timeout = min(0.5, max(0.0, deadline - time.monotonic()))
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                pass
+
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                if batch:
+                    self._write(batch)
+                    batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+        # Write rows already taken off the queue before stopping
+        if batch:
+            self._write(batch)
+
+    def _write(self, rows):
+        with self.flush_lock:
+            try:
+                success = self.flush_func(rows)
+            except Exception as e:
+                print(f"Error flushing {len(rows)} rows in {self.name}: {e}")
+                success = False
+            self.counters["flushes"] += 1
+            if success:
+                self.counters["written"] += len(rows)
+            else:
+                self.counters["failed"] += len(rows)
+
+    def flush(self):
+        """Write every queued row now, from the calling thread"""
+        rows = []
+        while True:
+            try:
+                rows.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if rows:
+            self._write(rows)
+
+    def close(self, timeout=5.0):
+        """Stop the background thread and flush what is left in the buffer"""
+        self.stop_event.set()
+        if self.thread is not None and self.thread.is_alive() and self.pid == os.getpid():
+            self.thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        """
+        Get writer metrics
+
+        Returns:
+            Dictionary with row counters and the current buffer size
+        """
+        stats = dict(self.counters)
+        stats["buffered"] = self.queue.qsize()
+        stats["max_buffer"] = self.max_buffer
+        return stats
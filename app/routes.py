@@ -8,13 +8,23 @@ from werkzeug.utils import secure_filename
 import uuid
 import traceback
 import json
+import copy
+import time
 from datetime import datetime
 from pathlib import Path
 from flask_httpauth import HTTPBasicAuth
 
 from app.core.audio_analyzer import analyze_mix, generate_visualizations, convert_numpy_types, generate_3d_spatial_visualization
-from app.core.openai_analyzer import analyze_with_gpt
-from app.core.database import calculate_file_hash, find_song_by_hash, save_song, delete_song, get_db_connection, get_ai_usage_stats
+from app.core.insight_jobs import start_insight_job, get_insights, get_insight_stream
+from app.core.database import find_song_by_hash, save_song, save_song_fingerprint, save_upload_aliases, delete_song, find_songs_by_identifier, get_db_connection, get_ai_usage_stats
+from app.core.fingerprint import compute_fingerprint, find_near_duplicate
+from app.core.reanalysis import refresh_song, refresh_stale_sections, rescore_song
+from app.core.scoring import rescore_results
+from app.core.result_views import build_summary_view, get_section, ARRAY_SECTIONS
+from app.core.chunked_uploads import UploadError, create_upload, get_upload, set_upload_hash, write_chunk, complete_upload, discard_upload
+from app.core.upload_storage import get_upload_storage
+from app.core.canonical_audio import load_audio, canonicalize_upload
+from app.core.upload_layout import save_incoming, incoming_path, discard_incoming, store_upload, resolve_upload_path
 
 # Create a Blueprint for the main routes
 main_bp = Blueprint('main', __name__)
@@ -40,6 +50,35 @@ def allowed_file(filename):
     extension = filename.rsplit('.', 1)[1].lower()
     return extension in ALLOWED_EXTENSIONS
 
+def _upload_storage():
+    """Storage manager that keeps the upload folder within its byte budget"""
+    return get_upload_storage(current_app.config['UPLOAD_FOLDER'])
+
+def _resolve_upload(file_id):
+    """
+    Find an uploaded file by its hash, a name it was uploaded under, or a legacy id
+    
+    Returns:
+        Tuple of (file path, upload directory name), or (None, None)
+    """
+    file_path = resolve_upload_path(current_app.config['UPLOAD_FOLDER'], file_id)
+    if not file_path:
+        return None, None
+    return file_path, os.path.basename(os.path.dirname(file_path))
+
+@main_bp.after_app_request
+def touch_viewed_upload(response):
+    """Count a served visualization as an access to its upload"""
+    prefix = f"{current_app.static_url_path}/uploads/"
+    if response.status_code in (200, 304) and request.path.startswith(prefix):
+        file_id = request.path[len(prefix):].split('/', 1)[0]
+        if file_id:
+            try:
+                _upload_storage().touch(file_id=file_id)
+            except Exception as e:
+                print(f"Error recording access to upload {file_id}: {str(e)}")
+    return response
+
 @main_bp.route('/')
 def index():
     """Home page route"""
@@ -128,139 +167,516 @@ def upload_file():
         for key, value in request.form.items():
             print(f"  {key}: {value}")
         
-        # Generate a unique ID for the file
-        file_id = secure_filename(os.path.splitext(file.filename)[0])
-        
-        # Create directory for this upload
-        upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], file_id)
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Save the file
-        file_path = os.path.join(upload_dir, f"{file_id}.mp3")
-        file.save(file_path)
-        
+        upload_dir = current_app.config['UPLOAD_FOLDER']
+        incoming = None
         try:
-            # Calculate file hash
-            file_hash = calculate_file_hash(file_path)
+            # Save the file under a temporary name, hashing it on the way;
+            # it is stored under its hash, so uploads never overwrite each other
+            incoming, file_hash = save_incoming(file, upload_dir)
             print(f"File hash: {file_hash}")
             
-            # Check if we've already analyzed this file
-            existing_song = find_song_by_hash(file_hash)
-            if existing_song:
-                print(f"Found existing song: {existing_song.get('original_name') or existing_song.get('filename')}")
-                
-                # Return the existing analysis results
-                try:
-                    # Only look for analysis_json field from the standardized schema
-                    if existing_song.get('analysis_json'):
-                        results = json.loads(existing_song['analysis_json'])
-                        print("Using existing analysis results from database")
-                        
-                        # Return the cached results
-                        response_data = {
-                            'filename': file.filename,
-                            'results': results,
-                            'from_cache': True
-                        }
-                        
-                        return jsonify(response_data)
-                    else:
-                        print("Existing record found but no analysis data, performing new analysis")
-                except (json.JSONDecodeError, KeyError) as e:
-                    print(f"Error parsing existing analysis: {str(e)}")
-                    # Continue with new analysis
+            # Pinned before it is stored, so it cannot be evicted while it is analyzed
+            with _upload_storage().pinned(file_hash):
+                file_path = store_upload(upload_dir, incoming, file_hash, file.filename)
+                return process_uploaded_file(file_path, file_hash, file.filename, file_hash, is_instrumental)
+        except Exception as e:
+            print(f"Error analyzing file: {str(e)}")
+            traceback.print_exc()
+            return jsonify({'error': str(e)}), 500
+        finally:
+            if incoming:
+                discard_incoming(incoming)
+    
+    return jsonify({'error': 'Invalid file type'}), 400
+
+def _upload_response(response_data):
+    """
+    Build the response to an upload; view=summary replaces the full results with their summary
+    
+    Args:
+        response_data: Dictionary with filename, file_hash, results and cache flags
             
-            # If we reach here, we need to analyze the file
-            # Analyze the mix with instrumental flag
-            results = analyze_mix(file_path, is_instrumental)
+    Returns:
+        JSON response
+    """
+    if request.values.get('view') == 'summary':
+        response_data = dict(response_data)
+        response_data['summary'] = build_summary_view(response_data.pop('results'))
+    return jsonify(response_data)
+
+def _visualizations_present(visualizations):
+    """Check that stored visualizations still have their image files; uploads may have been evicted"""
+    if not visualizations:
+        return False
+    for url in visualizations.values():
+        if isinstance(url, str) and url.startswith('/static/'):
+            if not os.path.exists(os.path.join(current_app.static_folder, url[len('/static/'):])):
+                return False
+    return True
+
+def _with_visualizations(results, file_path, file_id, force=False):
+    """
+    Make sure analysis results have visualizations on disk, generating them
+    under this upload's directory when they are missing
+    
+    Args:
+        results: Dictionary of analysis results; it is not modified
+        file_path: Path of the uploaded file, pinned by the caller
+        file_id: Upload directory name
+        force: Generate them even if the stored ones exist
+        
+    Returns:
+        Tuple of (results, whether the visualizations were generated)
+    """
+    if not force and _visualizations_present(results.get('visualizations')):
+        return results, False
+    try:
+        print(f"Generating visualizations of {file_id}...")
+        visualizations = generate_visualizations(file_path, file_id=file_id)
+    except Exception as e:
+        print(f"Error generating visualizations: {str(e)}")
+        traceback.print_exc()
+        return results, False
+    return dict(results, visualizations=visualizations), True
+
+def process_uploaded_file(file_path, file_id, original_name, file_hash, is_instrumental):
+    """
+    Analyze a received upload, reusing stored results of identical or near-identical files
+    
+    Args:
+        file_path: Path of the saved file
+        file_id: Upload directory name, the file hash
+        original_name: File name as uploaded
+        file_hash: SHA-256 hash of the file
+        is_instrumental: Boolean indicating if the track is instrumental
             
-            # Generate AI insights if possible
-            try:
-                ai_insights = analyze_with_gpt(results, is_instrumental)
-                results["ai_insights"] = ai_insights
-                
-                # Get the AI provider and model being used
-                ai_provider = os.environ.get("AI_PROVIDER", "openai").lower()
-                if ai_provider == "openrouter":
-                    model_name = os.environ.get("OPENROUTER_MODEL", "anthropic/claude-3-haiku-20240307")
-                else:
-                    model_name = os.environ.get("OPENAI_MODEL", "gpt-4o")
-                    
-                # Add the model information to the AI insights
-                results["ai_insights"]["model_used"] = model_name
-                
-            except Exception as e:
-                print(f"Error generating AI insights: {str(e)}")
-                results["ai_insights"] = {
-                    "error": str(e),
-                    "summary": "Unable to generate AI insights at this time.",
-                    "strengths": ["N/A"],
-                    "weaknesses": ["N/A"],
-                    "suggestions": ["N/A"],
-                    "model_used": "Unknown"
-                }
+    Returns:
+        JSON response with the analysis results
+    """
+    # Count the new file against the upload budget right away, so space is
+    # freed before the visualizations are written; the caller pins the upload
+    try:
+        _upload_storage().record(file_id, file_hash)
+    except Exception as e:
+        print(f"Error recording upload {file_id}: {str(e)}")
+    
+    # Keep the name the file was uploaded under, so it still finds the file
+    save_upload_aliases([original_name, secure_filename(os.path.splitext(original_name)[0])], file_hash)
+    
+    # Check if we've already analyzed this file
+    existing_song = find_song_by_hash(file_hash)
+    if existing_song:
+        print(f"Found existing song: {existing_song.get('original_name') or existing_song.get('filename')}")
             
-            # Regenerate visualizations to ensure they're up to date
-            try:
-                print("Generating visualizations...")
-                visualizations = generate_visualizations(file_path, file_id=file_id)
-                results["visualizations"] = visualizations
-                print(f"Visualizations generated: {visualizations}")
-            except Exception as e:
-                print(f"Error generating visualizations: {str(e)}")
-                traceback.print_exc()
+        # Return the existing analysis results, decoded by find_song_by_hash;
+        # sections from outdated analyzers are recomputed from this upload
+        results = existing_song.get('analysis')
+        if results:
+            print("Using existing analysis results from database")
+            results, recomputed = refresh_song(existing_song, file_path, file_id)
+            if recomputed:
+                print(f"Recomputed outdated sections: {', '.join(recomputed)}")
             
-            # Convert NumPy types to standard Python types for JSON serialization
-            results = convert_numpy_types(results)
-            print("NumPy types converted successfully")
+            # Uploaded again with the instrumental flag flipped: only the
+            # scores depend on it, so re-score instead of re-analyzing
+            results = rescore_song(existing_song, is_instrumental, results)
             
-            # Save the analysis results to the database
-            try:
-                song_id = save_song(
+            # The stored images may have been evicted with an earlier upload
+            results, regenerated = _with_visualizations(results, file_path, file_id)
+            if regenerated:
+                save_song(
                     filename=file_id,
-                    original_name=file.filename,
+                    original_name=original_name,
                     file_path=file_path,
                     file_hash=file_hash,
                     is_instrumental=is_instrumental,
                     analysis_json=results
                 )
-                if song_id:
-                    print(f"Song analysis saved to database with ID: {song_id}")
-                else:
-                    print("Song analysis could not be saved to database (possibly already exists)")
-            except Exception as e:
-                print(f"Error saving song to database: {str(e)}")
-                traceback.print_exc()
             
-            # Return the results
+            # Return the cached results
             response_data = {
-                'filename': file.filename,
+                'filename': original_name,
+                'file_hash': file_hash,
                 'results': results,
-                'from_cache': False
+                'from_cache': True
             }
             
-            print("Response data successfully serialized to JSON")
-            return jsonify(response_data)
-            
+            return _upload_response(response_data)
+        else:
+            print("Existing record found but no analysis data, performing new analysis")
+    
+    # Decode the upload once into the canonical format, if one is configured;
+    # the fingerprint, the analysis and later re-analyses read that instead
+    try:
+        canonicalize_upload(file_path)
+    except Exception as e:
+        print(f"Error storing canonical copy of {file_path}: {str(e)}")
+    
+    # Look for a near-identical copy (re-export, transcode) of a stored song
+    fingerprint = None
+    if os.environ.get("FINGERPRINT_ENABLED", "true").lower() == "true":
+        try:
+            fingerprint = compute_fingerprint(file_path)
+            match_hash, match = find_near_duplicate(fingerprint)
+            matched_song = find_song_by_hash(match_hash) if match_hash else None
+            if matched_song and matched_song.get('analysis'):
+                print(f"Near-duplicate of {match_hash} found: {match}")
+                results = copy.deepcopy(matched_song['analysis'])
+                results, _ = refresh_stale_sections(results, file_path, matched_song.get('is_instrumental'), file_id)
+                if bool(matched_song.get('is_instrumental')) != bool(is_instrumental):
+                    results = rescore_results(results, is_instrumental)
+                
+                # The matched song's images live in its own upload directory,
+                # which is evicted or deleted independently of this one
+                results, _ = _with_visualizations(results, file_path, file_id, force=True)
+                
+                # Store the reused analysis under this file's hash so
+                # the next upload of these exact bytes is a direct hit
+                save_song(
+                    filename=file_id,
+                    original_name=original_name,
+                    file_path=file_path,
+                    file_hash=file_hash,
+                    is_instrumental=is_instrumental,
+                    analysis_json=results
+                )
+                
+                return _upload_response({
+                    'filename': original_name,
+                    'file_hash': file_hash,
+                    'results': results,
+                    'from_cache': True,
+                    'near_duplicate_of': match_hash,
+                    'match': match
+                })
         except Exception as e:
-            print(f"Error analyzing file: {str(e)}")
+            print(f"Error during fingerprint lookup: {str(e)}")
             traceback.print_exc()
-            return jsonify({'error': str(e)}), 500
     
-    return jsonify({'error': 'Invalid file type'}), 400
+    # If we reach here, we need to analyze the file
+    # Analyze the mix with instrumental flag
+    results = analyze_mix(file_path, is_instrumental)
+    
+    # Generate AI insights in the background; the client fetches
+    # them from /insights/<file_hash> once they are ready
+    try:
+        start_insight_job(file_hash, results, is_instrumental)
+    except Exception as e:
+        print(f"Error starting AI insight generation: {str(e)}")
+        traceback.print_exc()
+    
+    # Regenerate visualizations to ensure they're up to date
+    try:
+        print("Generating visualizations...")
+        visualizations = generate_visualizations(file_path, file_id=file_id)
+        results["visualizations"] = visualizations
+        print(f"Visualizations generated: {visualizations}")
+    except Exception as e:
+        print(f"Error generating visualizations: {str(e)}")
+        traceback.print_exc()
+    
+    # Convert NumPy types to standard Python types for JSON serialization
+    results = convert_numpy_types(results)
+    print("NumPy types converted successfully")
+    
+    # Save the analysis results to the database
+    try:
+        song_id = save_song(
+            filename=file_id,
+            original_name=original_name,
+            file_path=file_path,
+            file_hash=file_hash,
+            is_instrumental=is_instrumental,
+            analysis_json=results
+        )
+        if song_id:
+            print(f"Song analysis saved to database with ID: {song_id}")
+            if fingerprint:
+                save_song_fingerprint(file_hash, fingerprint)
+        else:
+            print("Song analysis could not be saved to database (possibly already exists)")
+    except Exception as e:
+        print(f"Error saving song to database: {str(e)}")
+        traceback.print_exc()
+    
+    # Return the results
+    response_data = {
+        'filename': original_name,
+        'file_hash': file_hash,
+        'results': results,
+        'from_cache': False
+    }
+    
+    print("Response data successfully serialized to JSON")
+    return _upload_response(response_data)
+    
+
+def _chunked_upload_dir():
+    """Directory of partial chunked uploads; secure_filename never yields a dot-name, so no song collides with it"""
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], '.chunked')
+
+def _valid_hash(file_hash):
+    return isinstance(file_hash, str) and len(file_hash) == 64 and all(c in '0123456789abcdef' for c in file_hash.lower())
+
+def _stored_results(file_hash, filename, is_instrumental):
+    """Response with the stored analysis of a file hash, re-scored for the flag, or None if there is none"""
+    existing_song = find_song_by_hash(file_hash.lower())
+    if not existing_song or not existing_song.get('analysis'):
+        return None
+    # Once its images were evicted the file is needed after all, to generate them again
+    visualizations = existing_song['analysis'].get('visualizations')
+    if visualizations and not _visualizations_present(visualizations):
+        return None
+    print(f"Chunked upload of {filename} matches stored song {file_hash}")
+    return _upload_response({
+        'filename': filename,
+        'file_hash': file_hash.lower(),
+        'results': rescore_song(existing_song, is_instrumental),
+        'from_cache': True,
+        'duplicate': True
+    })
+
+@main_bp.route('/upload/chunked', methods=['POST'])
+def start_chunked_upload():
+    """Open a chunked upload; answers with stored results right away if the file hash is known"""
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename') or ''
+    file_hash = data.get('file_hash')
+    
+    if not filename or not allowed_file(filename):
+        return jsonify({'error': 'Invalid file type'}), 400
+    if file_hash is not None and not _valid_hash(file_hash):
+        return jsonify({'error': 'Invalid file hash'}), 400
+    
+    try:
+        if file_hash:
+            cached = _stored_results(file_hash, filename, bool(data.get('is_instrumental', False)))
+            if cached is not None:
+                return cached
+        
+        status = create_upload(
+            _chunked_upload_dir(),
+            filename,
+            data.get('size'),
+            is_instrumental=bool(data.get('is_instrumental', False)),
+            file_hash=file_hash.lower() if file_hash else None,
+            chunk_size=data.get('chunk_size')
+        )
+        return jsonify(status), 201
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        print(f"Error starting chunked upload: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/upload/chunked/<upload_id>', methods=['GET'])
+def chunked_upload_status(upload_id):
+    """Get the received chunks of an upload, to resume it"""
+    try:
+        return jsonify(get_upload(_chunked_upload_dir(), upload_id))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+
+@main_bp.route('/upload/chunked/<upload_id>/<int:index>', methods=['PUT'])
+def upload_chunk(upload_id, index):
+    """Store one chunk; the raw body is the chunk and X-Chunk-SHA256 its optional checksum"""
+    try:
+        status = write_chunk(
+            _chunked_upload_dir(),
+            upload_id,
+            index,
+            request.get_data(cache=False),
+            checksum=request.headers.get('X-Chunk-SHA256')
+        )
+        return jsonify(status)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+
+@main_bp.route('/upload/chunked/<upload_id>/hash', methods=['POST'])
+def chunked_upload_hash(upload_id):
+    """Record the client's file hash; ends the upload early if the file was analyzed before"""
+    data = request.get_json(silent=True) or {}
+    file_hash = data.get('file_hash')
+    if not _valid_hash(file_hash):
+        return jsonify({'error': 'Invalid file hash'}), 400
+    
+    try:
+        status = set_upload_hash(_chunked_upload_dir(), upload_id, file_hash.lower())
+        cached = _stored_results(file_hash, status['filename'], status['is_instrumental'])
+        if cached is not None:
+            discard_upload(_chunked_upload_dir(), upload_id)
+            return cached
+        return jsonify(status)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+
+@main_bp.route('/upload/chunked/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    """Assemble a fully received upload and analyze it like a regular upload"""
+    try:
+        status = get_upload(_chunked_upload_dir(), upload_id)
+        upload_dir = current_app.config['UPLOAD_FOLDER']
+        incoming = incoming_path(upload_dir, status['filename'])
+        
+        status = complete_upload(_chunked_upload_dir(), upload_id, incoming)
+        file_hash = status['file_hash']
+        print(f"File hash: {file_hash}")
+        with _upload_storage().pinned(file_hash):
+            file_path = store_upload(upload_dir, incoming, file_hash, status['filename'])
+            return process_uploaded_file(file_path, file_hash, status['filename'], file_hash, status['is_instrumental'])
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        print(f"Error analyzing file: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+def _conditional_json(data):
+    """JSON response with an ETag; answers 304 when the client's copy is current"""
+    response = jsonify(data)
+    response.add_etag()
+    # Clients may keep the response but must revalidate it, as results can be regenerated
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@main_bp.route('/results/<file_hash>', methods=['GET'])
+def result_summary(file_hash):
+    """Get the scores and single-value metrics of an analyzed song"""
+    file_hash = file_hash.lower()
+    if not _valid_hash(file_hash):
+        return jsonify({'error': 'Invalid file hash'}), 400
+    
+    song = find_song_by_hash(file_hash, include_arrays=False)
+    if not song or not song.get('analysis'):
+        return jsonify({'error': 'Song not found'}), 404
+    
+    try:
+        _upload_storage().touch(file_hash=file_hash)
+    except Exception as e:
+        print(f"Error recording access to upload {file_hash}: {str(e)}")
+    
+    return _conditional_json({
+        'filename': song.get('original_name') or song.get('filename'),
+        'file_hash': file_hash,
+        'summary': build_summary_view(song['analysis'])
+    })
+
+@main_bp.route('/results/<file_hash>/<section>', methods=['GET'])
+def result_section(file_hash, section):
+    """Get one section of the analysis results of a song"""
+    file_hash = file_hash.lower()
+    if not _valid_hash(file_hash):
+        return jsonify({'error': 'Invalid file hash'}), 400
+    
+    song = find_song_by_hash(file_hash, include_arrays=section in ARRAY_SECTIONS)
+    data = get_section(song['analysis'], section) if song and song.get('analysis') else None
+    if data is None:
+        return jsonify({'error': 'Section not found'}), 404
+    
+    return _conditional_json(data)
+
+@main_bp.route('/results/<file_hash>/rescore', methods=['POST'])
+def rescore_result(file_hash):
+    """Re-score an analyzed song as instrumental or with vocals, without re-analyzing the audio"""
+    file_hash = file_hash.lower()
+    if not _valid_hash(file_hash):
+        return jsonify({'error': 'Invalid file hash'}), 400
+    
+    data = request.get_json(silent=True) or request.form
+    is_instrumental = str(data.get('is_instrumental', 'false')).lower() == 'true'
+    
+    song = find_song_by_hash(file_hash)
+    if not song or not song.get('analysis'):
+        return jsonify({'error': 'Song not found'}), 404
+    
+    try:
+        return _upload_response({
+            'filename': song.get('original_name') or song.get('filename'),
+            'file_hash': file_hash,
+            'is_instrumental': is_instrumental,
+            'results': rescore_song(song, is_instrumental),
+            'from_cache': True
+        })
+    except Exception as e:
+        print(f"Error re-scoring {file_hash}: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/insights/<file_hash>', methods=['GET'])
+def song_insights(file_hash):
+    """Get the AI insights of an analyzed song; 202 while they are generated"""
+    file_hash = file_hash.lower()
+    if len(file_hash) != 64 or any(c not in '0123456789abcdef' for c in file_hash):
+        return jsonify({'error': 'Invalid file hash'}), 400
+    
+    try:
+        insights = get_insights(file_hash, find_song_by_hash(file_hash, include_arrays=False))
+        if insights is None:
+            return jsonify({'error': 'Song not found'}), 404
+            
+        return jsonify(dict(insights, file_hash=file_hash)), 202 if insights['status'] == 'pending' else 200
+    except Exception as e:
+        print(f"Error getting AI insights: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/insights/<file_hash>/stream', methods=['GET'])
+def song_insights_stream(file_hash):
+    """Stream the AI insights of a song as server-sent events, one per completed section"""
+    file_hash = file_hash.lower()
+    if len(file_hash) != 64 or any(c not in '0123456789abcdef' for c in file_hash):
+        return jsonify({'error': 'Invalid file hash'}), 400
+    
+    insights = get_insights(file_hash, find_song_by_hash(file_hash, include_arrays=False))
+    if insights is None:
+        return jsonify({'error': 'Song not found'}), 404
+    
+    def sse(event, data):
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    
+    def generate():
+        current = insights
+        stream = get_insight_stream(file_hash) if current['status'] == 'pending' else None
+        if stream is not None:
+            for event in stream.events():
+                if event is None:
+                    yield ": keep-alive\n\n"
+                elif event[0] == 'section':
+                    yield sse('section', {'key': event[1], 'value': event[2]})
+                else:
+                    yield sse('complete', {'status': event[1], 'insights': event[2]})
+            return
+            
+        # Generated in another worker process: report the stored result when ready
+        deadline = time.time() + 180
+        while current and current['status'] == 'pending' and time.time() < deadline:
+            time.sleep(1)
+            yield ": keep-alive\n\n"
+            current = get_insights(file_hash)
+        if current and current['status'] != 'pending':
+            yield sse('complete', current)
+        else:
+            yield sse('timeout', {'status': 'pending'})
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 @main_bp.route('/regenerate_visualizations/<file_id>', methods=['POST'])
 def regenerate_visualizations_route(file_id):
     """Regenerate visualizations for a specific file"""
     try:
-        # Construct the path to the uploaded file
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], file_id, f"{file_id}.mp3")
-        
-        if not os.path.exists(file_path):
+        # Find the uploaded file by its hash, name or id
+        file_path, file_id = _resolve_upload(file_id)
+            
+        if not file_path:
             return jsonify({'error': 'File not found'}), 404
-        
+            
         # Generate visualizations
-        visualizations = generate_visualizations(file_path, file_id=file_id)
+        with _upload_storage().pinned(file_id):
+            visualizations = generate_visualizations(file_path, file_id=file_id)
         
         return jsonify({
             'success': True,
@@ -275,70 +691,70 @@ def regenerate_visualizations_route(file_id):
 def regenerate_stereo_field(file_id):
     """Regenerate just the stereo field visualization with enhanced detection"""
     try:
-        # Construct the path to the uploaded file
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], file_id, f"{file_id}.mp3")
+        # Find the uploaded file by its hash, name or id
+        file_path, file_id = _resolve_upload(file_id)
         
-        if not os.path.exists(file_path):
+        if not file_path:
             return jsonify({'error': 'File not found'}), 404
         
         # Import necessary libraries here to avoid circular imports
-        import librosa
         import matplotlib.pyplot as plt
         import numpy as np
         
-        # Load the audio file with librosa
-        y, sr = librosa.load(file_path, sr=None, mono=False)
-        
-        # Create visualization directory
-        vis_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], file_id)
-        os.makedirs(vis_dir, exist_ok=True)
-        
-        # Enhanced stereo detection
-        is_stereo = y.ndim > 1 and y.shape[0] >= 2
-        channels_identical = False
-        
-        if is_stereo:
-            # Compare samples of left and right channels
-            sample_size = min(10000, y.shape[1])
-            left_samples = y[0, :sample_size]
-            right_samples = y[1, :sample_size]
+        with _upload_storage().pinned(file_id):
+            # Load the audio file, from its canonical copy if there is one
+            y, sr = load_audio(file_path)
             
-            # Use correlation instead of exact matching for better detection
-            correlation = np.corrcoef(left_samples, right_samples)[0, 1]
-            channels_identical = correlation > 0.99
+            # Create visualization directory
+            vis_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], file_id)
+            os.makedirs(vis_dir, exist_ok=True)
             
-            print(f"Audio file: {file_id}")
-            print(f"Audio shape: {y.shape}, dimensions: {y.ndim}")
-            print(f"Channel correlation: {correlation}")
-            print(f"Channels effectively identical: {channels_identical}")
-        
-        # Generate stereo field visualization
-        plt.figure(figsize=(10, 4))
-        
-        if is_stereo and not channels_identical:
-            # Plot stereo field
-            plt.plot(y[0, :sr], y[1, :sr], '.', alpha=0.1, markersize=1, color='#1f77b4')
-            plt.xlabel('Left Channel')
-            plt.ylabel('Right Channel')
-            plt.title('Stereo Field (First Second)')
-            plt.axis('equal')
-            plt.grid(True)
-        else:
-            # Create placeholder for mono audio
-            if is_stereo and channels_identical:
-                message = f'Identical Channels - Effectively Mono (Correlation: {correlation:.4f})'
+            # Enhanced stereo detection
+            is_stereo = y.ndim > 1 and y.shape[0] >= 2
+            channels_identical = False
+            
+            if is_stereo:
+                # Compare samples of left and right channels
+                sample_size = min(10000, y.shape[1])
+                left_samples = y[0, :sample_size]
+                right_samples = y[1, :sample_size]
+            
+                # Use correlation instead of exact matching for better detection
+                correlation = np.corrcoef(left_samples, right_samples)[0, 1]
+                channels_identical = correlation > 0.99
+            
+                print(f"Audio file: {file_id}")
+                print(f"Audio shape: {y.shape}, dimensions: {y.ndim}")
+                print(f"Channel correlation: {correlation}")
+                print(f"Channels effectively identical: {channels_identical}")
+            
+            # Generate stereo field visualization
+            plt.figure(figsize=(10, 4))
+            
+            if is_stereo and not channels_identical:
+                # Plot stereo field
+                plt.plot(y[0, :sr], y[1, :sr], '.', alpha=0.1, markersize=1, color='#1f77b4')
+                plt.xlabel('Left Channel')
+                plt.ylabel('Right Channel')
+                plt.title('Stereo Field (First Second)')
+                plt.axis('equal')
+                plt.grid(True)
             else:
-                message = 'Mono Audio - No Stereo Field'
+                # Create placeholder for mono audio
+                if is_stereo and channels_identical:
+                    message = f'Identical Channels - Effectively Mono (Correlation: {correlation:.4f})'
+                else:
+                    message = 'Mono Audio - No Stereo Field'
                 
-            plt.text(0.5, 0.5, message, 
-                    horizontalalignment='center', verticalalignment='center',
-                    transform=plt.gca().transAxes, fontsize=14)
-            plt.axis('off')
-        
-        plt.tight_layout()
-        stereo_path = os.path.join(vis_dir, 'stereo_field.png')
-        plt.savefig(stereo_path)
-        plt.close()
+                plt.text(0.5, 0.5, message, 
+                        horizontalalignment='center', verticalalignment='center',
+                        transform=plt.gca().transAxes, fontsize=14)
+                plt.axis('off')
+            
+            plt.tight_layout()
+            stereo_path = os.path.join(vis_dir, 'stereo_field.png')
+            plt.savefig(stereo_path)
+            plt.close()
         
         # Return the path with proper URL format
         stereo_url = f"/static/uploads/{file_id}/stereo_field.png"
@@ -425,25 +841,25 @@ def submit_feedback():
 def regenerate_spatial_field_api(file_id):
     """Regenerate the 3D spatial field visualization for the specified file_id"""
     try:
-        # Construct the path to the uploaded file
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], file_id, f"{file_id}.mp3")
+        # Find the uploaded file by its hash, name or id
+        file_path, file_id = _resolve_upload(file_id)
         
-        if not os.path.exists(file_path):
+        if not file_path:
             return jsonify({'error': 'File not found', 'success': False}), 404
         
         # Import necessary libraries here to avoid circular imports
-        import librosa
         from app.core.audio_analyzer import generate_3d_spatial_visualization
         
-        # Load the audio file with librosa
-        y, sr = librosa.load(file_path, sr=None, mono=False)
-        
-        # Create visualization directory
-        vis_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], file_id)
-        os.makedirs(vis_dir, exist_ok=True)
-        
-        # Generate the 3D spatial visualization
-        spatial_result = generate_3d_spatial_visualization(y, sr, vis_dir)
+        with _upload_storage().pinned(file_id):
+            # Load the audio file, from its canonical copy if there is one
+            y, sr = load_audio(file_path)
+            
+            # Create visualization directory
+            vis_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], file_id)
+            os.makedirs(vis_dir, exist_ok=True)
+            
+            # Generate the 3D spatial visualization
+            spatial_result = generate_3d_spatial_visualization(y, sr, vis_dir)
         
         # Check the result format
         if isinstance(spatial_result, dict) and 'html' in spatial_result and 'image' in spatial_result:
@@ -470,29 +886,32 @@ def regenerate_spatial_field_api(file_id):
 
 @main_bp.route('/api/delete-track', methods=['POST'])
 def delete_track():
-    """Delete a track by filename"""
+    """Delete a track by file hash or filename"""
     try:
-        # Get the filename from the request
+        # Get the identifier from the request
         data = request.get_json()
         
-        # Support both filename and fileId parameters
-        filename = data.get('filename') or data.get('fileId')
+        # Prefer the file hash, which resolves through the unique key;
+        # filename and fileId are still accepted from older clients
+        identifier = data.get('fileHash') or data.get('filename') or data.get('fileId')
         
-        if not filename:
+        if not identifier:
             return jsonify({'error': 'Filename is required', 'success': False}), 400
-            
-        # Sanitize filename
-        filename = secure_filename(filename)
+        
+        # Look up the upload folders before the rows are gone
+        songs = find_songs_by_identifier(identifier)
+        if not songs:
+            return jsonify({'error': 'Track not found', 'success': False}), 404
         
         # Delete the song from the database
-        success = delete_song(filename)
+        success = delete_song(identifier)
         
         if success:
-            # Also delete the upload folder
-            upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            if os.path.exists(upload_dir):
-                import shutil
-                shutil.rmtree(upload_dir)
+            # Also delete the upload folders and visualizations
+            for song in songs:
+                folder_name = secure_filename(song.get('filename') or '')
+                if folder_name:
+                    _upload_storage().remove(folder_name)
             
             return jsonify({'message': 'Track deleted successfully', 'success': True})
         else:
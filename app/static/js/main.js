@@ -323,6 +323,8 @@ document.addEventListener('DOMContentLoaded', function() {
         // Add instrumental flag if checkbox is checked
         const isInstrumental = document.getElementById('instrumental-checkbox').checked;
         formData.append('is_instrumental', isInstrumental);
+        // Sections are fetched separately, see loadResultSections
+        formData.append('view', 'summary');
         console.log(`Uploading file with instrumental flag: ${isInstrumental}`);
         
         // Show progress container and hide upload area
@@ -368,6 +370,17 @@ document.addEventListener('DOMContentLoaded', function() {
             }, 2000); // Update every 2 seconds
         }
         
+        if (file.size > CHUNKED_UPLOAD_MIN_SIZE && window.fetch) {
+            console.log("Sending the file in chunks");
+            uploadInChunks(file, isInstrumental).then(result => {
+                handleUploadResponse(result.status, JSON.stringify(result.body), '');
+            }).catch(error => {
+                console.error("Chunked upload failed:", error);
+                handleError('Upload failed: ' + error.message + '. Choose the file again to resume the upload.');
+            });
+            return;
+        }
+        
         // Upload file
         const xhr = new XMLHttpRequest();
         
@@ -391,44 +404,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         xhr.addEventListener('load', function() {
             console.log("XHR load event. Status:", xhr.status);
-            
-            if (xhr.status === 200) {
-                // Mark upload step as completed
-                stepUpload.classList.remove('active');
-                stepUpload.classList.add('completed');
-                
-                // Update progress to Analysis phase
-                stepAnalyze.classList.add('active');
-                updateProgressBar(25, 'Analyzing');
-                progressText.textContent = 'Analyzing frequency balance and dynamics...';
-                
-                // Simulate the analysis progress
-                simulateAnalysisProgress(function() {
-                    try {
-                        const response = JSON.parse(xhr.responseText);
-                        console.log("Response parsed successfully:", response);
-                        displayResults(response);
-                    } catch (error) {
-                        console.error("Error parsing response:", error);
-                        handleError('Error parsing response: ' + error.message);
-                    }
-                });
-            } else {
-                console.error("Upload failed. Status:", xhr.status, xhr.statusText);
-                console.error("Response text:", xhr.responseText);
-                
-                // Try to parse error message if available
-                try {
-                    const errorResponse = JSON.parse(xhr.responseText);
-                    if (errorResponse && errorResponse.error) {
-                        handleError('Upload failed: ' + errorResponse.error);
-                    } else {
-                        handleError('Upload failed: ' + xhr.statusText);
-                    }
-                } catch (e) {
-                    handleError('Upload failed: ' + xhr.statusText);
-                }
-            }
+            handleUploadResponse(xhr.status, xhr.responseText, xhr.statusText);
         });
         
         xhr.addEventListener('error', function(e) {
@@ -451,6 +427,252 @@ document.addEventListener('DOMContentLoaded', function() {
         xhr.send(formData);
     }
     
+    // Show the analysis of a finished upload, or its error
+    function handleUploadResponse(status, responseText, statusText) {
+        if (status === 200) {
+            // Mark upload step as completed
+            stepUpload.classList.remove('active');
+            stepUpload.classList.add('completed');
+            
+            // Update progress to Analysis phase
+            stepAnalyze.classList.add('active');
+            updateProgressBar(25, 'Analyzing');
+            progressText.textContent = 'Analyzing frequency balance and dynamics...';
+            
+            // Fetch the result sections while the analysis progress is shown
+            let loaded;
+            try {
+                const response = JSON.parse(responseText);
+                console.log("Response parsed successfully:", response);
+                loaded = loadResultSections(response);
+            } catch (error) {
+                loaded = Promise.reject(error);
+            }
+            loaded.catch(() => {});
+            
+            // Simulate the analysis progress
+            simulateAnalysisProgress(function() {
+                loaded.then(({data, deferred}) => {
+                    displayResults(data);
+                    loadDeferredSections(data.file_hash, deferred);
+                }).catch(error => {
+                    console.error("Error loading results:", error);
+                    handleError('Error loading results: ' + error.message);
+                });
+            });
+        } else {
+            console.error("Upload failed. Status:", status, statusText);
+            console.error("Response text:", responseText);
+            
+            // Try to parse error message if available
+            try {
+                const errorResponse = JSON.parse(responseText);
+                if (errorResponse && errorResponse.error) {
+                    handleError('Upload failed: ' + errorResponse.error);
+                } else {
+                    handleError('Upload failed: ' + statusText);
+                }
+            } catch (e) {
+                handleError('Upload failed: ' + statusText);
+            }
+        }
+    }
+    
+    
+    // Sections fetched after the results are shown, with the function that draws them
+    const DEFERRED_RESULT_SECTIONS = {
+        transients: displayTransients
+    };
+    
+    function fetchResultSection(fileHash, name) {
+        return fetch(`/results/${fileHash}/${encodeURIComponent(name)}`).then(r => {
+            if (!r.ok) {
+                throw new Error(`Could not load ${name} (${r.status})`);
+            }
+            return r.json();
+        });
+    }
+    
+    // Turn a summary upload response into a full one by fetching its sections;
+    // deferred sections start out with their summary metrics only
+    function loadResultSections(response) {
+        if (!response.summary) {
+            return Promise.resolve({data: response, deferred: []});
+        }
+        const summary = response.summary;
+        const results = {};
+        Object.keys(summary).forEach(key => {
+            if (key !== 'sections' && key !== 'available_sections') {
+                results[key] = summary[key];
+            }
+        });
+        
+        const deferred = summary.available_sections.filter(name => name in DEFERRED_RESULT_SECTIONS);
+        deferred.forEach(name => {
+            results[name] = summary.sections[name];
+        });
+        const sections = summary.available_sections.filter(name => !(name in DEFERRED_RESULT_SECTIONS));
+        return Promise.all(sections.map(name => fetchResultSection(response.file_hash, name).then(section => {
+            results[name] = section;
+        }))).then(() => {
+            const data = Object.assign({}, response, {results: results});
+            delete data.summary;
+            return {data: data, deferred: deferred};
+        });
+    }
+    
+    function loadDeferredSections(fileHash, names) {
+        names.forEach(name => {
+            fetchResultSection(fileHash, name)
+                .then(section => DEFERRED_RESULT_SECTIONS[name](section))
+                .catch(error => console.warn(error.message));
+        });
+    }
+    
+    // Files above this size are sent in chunks that are retried and resumed
+    const CHUNKED_UPLOAD_MIN_SIZE = 8 * 1024 * 1024;
+    const CHUNKED_UPLOAD_PARALLEL = 3;
+    const CHUNK_RETRIES = 3;
+    
+    function toHex(buffer) {
+        return Array.from(new Uint8Array(buffer)).map(b => b.toString(16).padStart(2, '0')).join('');
+    }
+    
+    // SHA-256 needs a secure context; without it chunks go unchecked
+    function sha256Hex(buffer) {
+        if (!window.crypto || !window.crypto.subtle) {
+            return Promise.resolve(null);
+        }
+        return window.crypto.subtle.digest('SHA-256', buffer).then(toHex).catch(() => null);
+    }
+    
+    function postJson(url, data) {
+        return fetch(url, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify(data)
+        });
+    }
+    
+    // Upload a large file in parallel chunks, resuming an earlier attempt of the same file
+    function uploadInChunks(file, isInstrumental) {
+        const resumeKey = `chunked-upload:${file.name}:${file.size}:${file.lastModified}`;
+        let done = false;
+        let duplicate = null;
+        
+        function openSession() {
+            const uploadId = localStorage.getItem(resumeKey);
+            const resumed = uploadId
+                ? fetch(`/upload/chunked/${uploadId}`).then(r => r.ok ? r.json() : null)
+                : Promise.resolve(null);
+            return resumed.then(status => {
+                if (status) {
+                    console.log(`Resuming chunked upload ${uploadId}: ${status.received.length}/${status.chunk_count} chunks on the server`);
+                    return status;
+                }
+                return postJson('/upload/chunked?view=summary', {filename: file.name, size: file.size, is_instrumental: isInstrumental})
+                    .then(r => r.json().then(body => {
+                        if (r.status !== 201) {
+                            // Known file (with a hash) or an error; either way we are done
+                            duplicate = {status: r.status, body: body};
+                            return null;
+                        }
+                        localStorage.setItem(resumeKey, body.upload_id);
+                        return body;
+                    }));
+            });
+        }
+        
+        function sendChunk(status, index, attempt) {
+            const start = index * status.chunk_size;
+            const blob = file.slice(start, Math.min(start + status.chunk_size, file.size));
+            return blob.arrayBuffer().then(buffer => sha256Hex(buffer).then(checksum => {
+                const headers = {'Content-Type': 'application/octet-stream'};
+                if (checksum) {
+                    headers['X-Chunk-SHA256'] = checksum;
+                }
+                return fetch(`/upload/chunked/${status.upload_id}/${index}`, {method: 'PUT', headers: headers, body: buffer});
+            })).then(r => {
+                if (!r.ok && r.status !== 404 && attempt < CHUNK_RETRIES) {
+                    return sendChunk(status, index, attempt + 1);
+                }
+                if (!r.ok) {
+                    return r.json().then(body => { throw new Error(body.error || r.statusText); });
+                }
+            }, error => {
+                if (attempt < CHUNK_RETRIES) {
+                    return sendChunk(status, index, attempt + 1);
+                }
+                throw error;
+            });
+        }
+        
+        // Hash the whole file while the chunks go out, so a file analyzed before
+        // is recognized without waiting for the rest of the upload
+        function checkDuplicate(status) {
+            file.arrayBuffer().then(sha256Hex).then(fileHash => {
+                if (!fileHash || done) {
+                    return;
+                }
+                return postJson(`/upload/chunked/${status.upload_id}/hash?view=summary`, {file_hash: fileHash})
+                    .then(r => r.json().then(body => {
+                        if (r.ok && body.duplicate) {
+                            duplicate = {status: 200, body: body};
+                        }
+                    }));
+            }).catch(error => console.warn('Could not hash the file:', error));
+        }
+        
+        return openSession().then(status => {
+            if (!status) {
+                return duplicate;
+            }
+            checkDuplicate(status);
+            
+            const pending = [];
+            for (let index = 0; index < status.chunk_count; index++) {
+                if (!status.received.includes(index)) {
+                    pending.push(index);
+                }
+            }
+            let sent = status.chunk_count - pending.length;
+            updateProgressBar(25 * sent / status.chunk_count, 'Uploading');
+            
+            function worker() {
+                if (duplicate || !pending.length) {
+                    return Promise.resolve();
+                }
+                return sendChunk(status, pending.shift(), 0).then(() => {
+                    sent += 1;
+                    updateProgressBar(25 * sent / status.chunk_count, 'Uploading');
+                    progressText.textContent = `Uploading your audio file... (${sent}/${status.chunk_count} parts)`;
+                    return worker();
+                });
+            }
+            
+            const workers = [];
+            for (let i = 0; i < CHUNKED_UPLOAD_PARALLEL; i++) {
+                workers.push(worker());
+            }
+            return Promise.all(workers).then(() => {
+                done = true;
+                if (duplicate) {
+                    localStorage.removeItem(resumeKey);
+                    return duplicate;
+                }
+                progressText.textContent = 'Analyzing your audio file...';
+                return fetch(`/upload/chunked/${status.upload_id}/complete?view=summary`, {method: 'POST'})
+                    .then(r => r.json().then(body => {
+                        // Missing chunks keep the session for the next attempt
+                        if (r.status !== 409) {
+                            localStorage.removeItem(resumeKey);
+                        }
+                        return {status: r.status, body: body};
+                    }));
+            });
+        });
+    }
+    
     // Simulate analysis progress with realistic steps
     function simulateAnalysisProgress(callback) {
         let progress = 25; // Start at 25% after upload is done
@@ -706,6 +928,54 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // Fill in the transients card; called again when its per-frame data arrives
+    function displayTransients(transients) {
+        if (transients) {
+            console.log("Transients data:", transients);
+            
+            // Set score
+            document.getElementById('transients-score').textContent = Math.round(transients.transients_score || 0);
+            
+            // Set metrics
+            document.getElementById('attack-time').textContent = (transients.attack_time || 0).toFixed(1) + ' ms';
+            document.getElementById('transient-density').textContent = (transients.transient_density || 0).toFixed(2);
+            document.getElementById('percussion-energy').textContent = Math.round(transients.percussion_energy || 0) + '%';
+            
+            // Set analysis text
+            const transientAnalysis = document.getElementById('transients-analysis');
+            transientAnalysis.innerHTML = '';
+            if (transients.analysis && transients.analysis.length > 0) {
+                transients.analysis.forEach(item => {
+                    const li = document.createElement('li');
+                    li.textContent = item;
+                    transientAnalysis.appendChild(li);
+                });
+            } else {
+                const li = document.createElement('li');
+                li.textContent = 'No transient analysis available.';
+                transientAnalysis.appendChild(li);
+            }
+            
+            // Create transients chart if data is available
+            if (transients.transient_data) {
+                createTransientsChart(transients.transient_data);
+            }
+        } else {
+            // Set default values for transient analysis elements
+            document.getElementById('transients-score').textContent = 'N/A';
+            document.getElementById('attack-time').textContent = 'N/A';
+            document.getElementById('transient-density').textContent = 'N/A';
+            document.getElementById('percussion-energy').textContent = 'N/A';
+            
+            // Set default analysis text
+            const transientAnalysis = document.getElementById('transients-analysis');
+            transientAnalysis.innerHTML = '';
+            const li = document.createElement('li');
+            li.textContent = 'Transient analysis not available for this track.';
+            transientAnalysis.appendChild(li);
+        }
+    }
+    
     // Display results
     function displayResults(data) {
         console.log("Displaying results:", data);
@@ -753,6 +1023,9 @@ document.addEventListener('DOMContentLoaded', function() {
         // Update filename display
         document.getElementById('filename').textContent = data.filename;
         
+        // Remember the file hash so the track can be deleted by its unique key
+        window.currentFileHash = data.file_hash || null;
+        
         // Update overall score with animation if available
         const overallScore = data.results.overall_score;
         if (window.updateScoreWithAnimation) {
@@ -830,52 +1103,7 @@ document.addEventListener('DOMContentLoaded', function() {
         createClarityChart(clarity);
 
         // Transients analysis
-        if (data.results.transients) {
-            console.log("Transients data:", data.results.transients);
-            
-            const transients = data.results.transients;
-            
-            // Set score
-            document.getElementById('transients-score').textContent = Math.round(transients.transients_score || 0);
-            
-            // Set metrics
-            document.getElementById('attack-time').textContent = (transients.attack_time || 0).toFixed(1) + ' ms';
-            document.getElementById('transient-density').textContent = (transients.transient_density || 0).toFixed(2);
-            document.getElementById('percussion-energy').textContent = Math.round(transients.percussion_energy || 0) + '%';
-            
-            // Set analysis text
-            const transientAnalysis = document.getElementById('transients-analysis');
-            transientAnalysis.innerHTML = '';
-            if (transients.analysis && transients.analysis.length > 0) {
-                transients.analysis.forEach(item => {
-                    const li = document.createElement('li');
-                    li.textContent = item;
-                    transientAnalysis.appendChild(li);
-                });
-            } else {
-                const li = document.createElement('li');
-                li.textContent = 'No transient analysis available.';
-                transientAnalysis.appendChild(li);
-            }
-            
-            // Create transients chart if data is available
-            if (transients.transient_data) {
-                createTransientsChart(transients.transient_data);
-            }
-        } else {
-            // Set default values for transient analysis elements
-            document.getElementById('transients-score').textContent = 'N/A';
-            document.getElementById('attack-time').textContent = 'N/A';
-            document.getElementById('transient-density').textContent = 'N/A';
-            document.getElementById('percussion-energy').textContent = 'N/A';
-            
-            // Set default analysis text
-            const transientAnalysis = document.getElementById('transients-analysis');
-            transientAnalysis.innerHTML = '';
-            const li = document.createElement('li');
-            li.textContent = 'Transient analysis not available for this track.';
-            transientAnalysis.appendChild(li);
-        }
+        displayTransients(data.results.transients);
         
         // Set harmonic analysis data
         if (data.results.harmonic_content) {
@@ -1145,9 +1373,93 @@ document.addEventListener('DOMContentLoaded', function() {
         // AI Insights
         if (data.results.ai_insights) {
             displayAIInsights(data.results.ai_insights);
+        } else if (data.file_hash) {
+            // Generated in the background after the upload returns
+            streamAIInsights(data.file_hash, frequencyBalance);
         }
     }
     
+    // Show AI insight sections as the model writes them, falling back to polling
+    function streamAIInsights(fileHash, frequencyBalance) {
+        if (!window.EventSource) {
+            pollAIInsights(fileHash, frequencyBalance);
+            return;
+        }
+        
+        const partial = {
+            summary: "Generating AI insights...",
+            strengths: [],
+            weaknesses: [],
+            suggestions: []
+        };
+        displayAIInsights(partial);
+        
+        const source = new EventSource(`/insights/${fileHash}/stream`);
+        const stillCurrent = () => {
+            if (window.currentFileHash !== fileHash) {
+                source.close();
+                return false;
+            }
+            return true;
+        };
+        
+        source.addEventListener('section', event => {
+            if (!stillCurrent()) return;
+            const section = JSON.parse(event.data);
+            partial[section.key] = section.value;
+            displayAIInsights(partial);
+        });
+        source.addEventListener('complete', event => {
+            source.close();
+            if (!stillCurrent()) return;
+            const body = JSON.parse(event.data);
+            if (body.insights) {
+                displayAIInsights(body.insights);
+                displayAIFrequencyInsights(body.insights, frequencyBalance);
+            }
+        });
+        source.addEventListener('timeout', () => {
+            source.close();
+            if (stillCurrent()) pollAIInsights(fileHash, frequencyBalance);
+        });
+        source.onerror = () => {
+            // Connection lost before completion
+            source.close();
+            if (stillCurrent()) pollAIInsights(fileHash, frequencyBalance);
+        };
+    }
+    
+    // Fetch AI insights until they are ready, backing off between attempts
+    function pollAIInsights(fileHash, frequencyBalance, delay = 2000, deadline = Date.now() + 180000) {
+        document.getElementById('ai-summary').textContent = "Generating AI insights...";
+        
+        fetch(`/insights/${fileHash}`)
+            .then(response => response.json().then(body => ({ status: response.status, body })))
+            .then(({ status, body }) => {
+                // Stop if another track has been loaded in the meantime
+                if (window.currentFileHash !== fileHash) {
+                    return;
+                }
+                if (status === 202 && Date.now() < deadline) {
+                    setTimeout(() => pollAIInsights(fileHash, frequencyBalance, Math.min(delay * 1.5, 10000), deadline), delay);
+                } else if (status === 200 && body.insights) {
+                    displayAIInsights(body.insights);
+                    displayAIFrequencyInsights(body.insights, frequencyBalance);
+                } else {
+                    displayAIInsights({
+                        error: body.error || "AI insights are taking longer than expected. Reload the track later to see them.",
+                        summary: "AI insights are not available yet.",
+                        strengths: ["N/A"],
+                        weaknesses: ["N/A"],
+                        suggestions: ["N/A"]
+                    });
+                }
+            })
+            .catch(error => {
+                console.error("Error fetching AI insights:", error);
+            });
+    }
+    
     // Display AI Insights
     function displayAIInsights(aiInsights) {
         // Check if there was an error
@@ -2796,7 +3108,7 @@ function deleteTrack() {
         headers: {
             'Content-Type': 'application/json'
         },
-        body: JSON.stringify({ fileId: fileId })
+        body: JSON.stringify({ fileId: fileId, fileHash: window.currentFileHash })
     })
     .then(response => {
         console.log("API response status:", response.status);
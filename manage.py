@@ -6,6 +6,7 @@ Provides a unified interface for common project tasks:
 - Running checks
 - Setting up the environment
 - Managing Docker containers
+- Building static assets
 """
 
 import os
@@ -183,6 +184,35 @@ def handle_maintenance(args):
             # Run the cleanup script
             subprocess.run(cmd, check=True)
             return True
+        elif args.rebuild_ai_rollups:
+            logger.info(f"Rebuilding AI usage rollups for the last {args.days} days")
+            
+            from dotenv import load_dotenv
+            load_dotenv()
+            from app.core.database import rebuild_ai_usage_rollups
+            
+            return rebuild_ai_usage_rollups(days=args.days) is not None
+        elif args.backfill_analysis:
+            logger.info(f"Recomputing outdated analysis sections with {args.workers} workers")
+            
+            from dotenv import load_dotenv
+            load_dotenv()
+            from app.core.reanalysis import backfill_library
+            
+            report = backfill_library(workers=args.workers, limit=args.limit, dry_run=args.dry_run)
+            for section, count in sorted(report['sections'].items()):
+                logger.info(f"  {section}: recomputed for {count} songs")
+            return report['failed'] == 0
+        elif args.rescore_library:
+            logger.info("Re-scoring the library from stored measurements")
+            
+            from dotenv import load_dotenv
+            load_dotenv()
+            from app.core.reanalysis import rescore_library
+            
+            report = rescore_library(dry_run=args.dry_run)
+            logger.info(f"{report['changed']} of {report['songs']} songs have new scores, {report['updated']} updated")
+            return True
         else:
             logger.error("No maintenance command specified")
             return False
@@ -190,6 +220,18 @@ def handle_maintenance(args):
         logger.error(f"Error handling maintenance command: {str(e)}")
         return False
 
+def build_assets(args):
+    """Build the fingerprinted static assets and their manifest"""
+    try:
+        from app.assets import build_assets as build
+        static_dir = root_dir / 'app' / 'static'
+        manifest = build(str(static_dir), minified=not args.no_minify)
+        logger.info(f"Wrote {static_dir / 'dist' / 'manifest.json'} with {len(manifest['files'])} files")
+        return True
+    except Exception as e:
+        logger.error(f"Error building assets: {str(e)}")
+        return False
+
 def run_tests(args):
     """Run tests with pytest"""
     try:
@@ -286,10 +328,25 @@ def main():
     maintenance_group = maintenance_parser.add_mutually_exclusive_group(required=True)
     maintenance_group.add_argument('--cleanup-uploads', action='store_true',
                                  help='Clean up old uploaded files')
+    maintenance_group.add_argument('--rebuild-ai-rollups', action='store_true',
+                                 help='Recompute the AI usage dashboard rollups from raw events')
+    maintenance_group.add_argument('--backfill-analysis', action='store_true',
+                                 help='Recompute the analysis sections of outdated analyzers for all stored songs')
+    maintenance_group.add_argument('--rescore-library', action='store_true',
+                                 help='Recompute the scores of all stored songs with the current weights and ideal curves')
     maintenance_parser.add_argument('--days', type=int, default=30,
-                                  help='Number of days to retain files (default: 30)')
+                                  help='Number of days to retain files or rebuild rollups for (default: 30)')
+    maintenance_parser.add_argument('--workers', type=int, default=2,
+                                  help='Worker processes for --backfill-analysis (default: 2)')
+    maintenance_parser.add_argument('--limit', type=int, default=None,
+                                  help='Maximum number of songs for --backfill-analysis')
     maintenance_parser.add_argument('--dry-run', action='store_true',
-                                  help='Dry run (do not delete files)')
+                                  help='Dry run (do not delete files, recompute analyses or write scores)')
+    
+    # Assets command
+    assets_parser = subparsers.add_parser('assets', help='Build fingerprinted static assets')
+    assets_parser.add_argument('--no-minify', action='store_true',
+                             help='Copy the files without minifying them')
     
     # Test command
     test_parser = subparsers.add_parser('test', help='Run tests')
@@ -321,6 +378,8 @@ def main():
         success = handle_security(args)
     elif args.command == 'maintenance':
         success = handle_maintenance(args)
+    elif args.command == 'assets':
+        success = build_assets(args)
     elif args.command == 'test':
         success = run_tests(args)
     else:
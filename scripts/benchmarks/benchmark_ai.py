@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the AI insight path against local mock providers.
+Starts a mock OpenAI and a mock OpenRouter server (see mock_llm_server.py),
+points the app at them and calls analyze_with_gpt concurrently. Reports
+latency percentiles, which provider answered, hedge and fallback rates,
+connection reuse and the number of threads, so timeout, fallback and pooling
+behaviour can be checked without paid API calls.
+
+Usage:
+    python scripts/benchmarks/benchmark_ai.py --requests 200 --concurrency 16 \
+        --openai-latency 2 --openai-error-rate 0.1 --openrouter-latency 1
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the root directory to the path to ensure imports work
+script_dir = Path(__file__).parent.absolute()
+root_dir = script_dir.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from scripts.benchmarks.mock_llm_server import MockLLMServer, add_config_arguments, config_from_args
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS = ["openai", "openrouter"]
+
+def make_results(rng):
+    """
+    Build a synthetic analysis result with random metrics
+
+    Args:
+        rng: random.Random instance
+
+    Returns:
+        Dictionary shaped like the output of analyze_mix
+    """
+    bands = ["sub_bass", "bass", "low_mids", "mids", "high_mids", "highs", "air"]
+    return {
+        "frequency_balance": {
+            "balance_score": rng.uniform(40, 95),
+            "band_energy": {band: rng.uniform(2, 30) for band in bands},
+            "analysis": ["Slightly heavy low end."]
+        },
+        "dynamic_range": {
+            "dynamic_range_score": rng.uniform(30, 90),
+            "dynamic_range_db": rng.uniform(4, 14),
+            "crest_factor_db": rng.uniform(6, 16),
+            "plr": rng.uniform(6, 14),
+            "analysis": ["Moderately compressed."]
+        },
+        "stereo_field": {
+            "width_score": rng.uniform(40, 95),
+            "phase_score": rng.uniform(60, 100),
+            "correlation": rng.uniform(0.2, 0.9),
+            "mid_ratio": 0.7,
+            "side_ratio": 0.3,
+            "analysis": ["Good stereo width."]
+        },
+        "clarity": {
+            "clarity_score": rng.uniform(40, 95),
+            "spectral_contrast": rng.uniform(10, 25),
+            "spectral_flatness": rng.uniform(0.001, 0.05),
+            "spectral_centroid": rng.uniform(800, 3500),
+            "analysis": ["Clear mids."]
+        }
+    }
+
+def percentile(sorted_values, quantile):
+    """Nearest-rank percentile of a sorted list, None if it is empty"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(quantile * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def latency_summary(values):
+    """p50/p90/p95/p99/max of a list of seconds"""
+    values = sorted(values)
+    summary = {f"p{int(q * 100)}": percentile(values, q) for q in (0.5, 0.9, 0.95, 0.99)}
+    summary["max"] = values[-1] if values else None
+    summary["mean"] = sum(values) / len(values) if values else None
+    return summary
+
+class ThreadSampler:
+    """Samples the number of live threads while the benchmark runs"""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.samples = []
+        self.llm_samples = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="thread-sampler", daemon=True)
+
+    def run(self):
+        while not self.stopped.is_set():
+            threads = threading.enumerate()
+            self.samples.append(len(threads))
+            self.llm_samples.append(sum(1 for thread in threads if thread.name.startswith("llm-request")))
+            self.stopped.wait(self.interval)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        return {
+            "peak": max(self.samples, default=0),
+            "mean": sum(self.samples) / len(self.samples) if self.samples else 0,
+            "peak_llm_request_threads": max(self.llm_samples, default=0)
+        }
+
+def run_benchmark(requests, concurrency, primary="openai", stream=False, seed=None):
+    """
+    Call analyze_with_gpt concurrently and collect the outcomes
+
+    The AI_* and *_BASE_URL environment variables must already point at the
+    servers to benchmark.
+
+    Args:
+        requests: Number of analyses to request
+        concurrency: Number of concurrent callers
+        primary: Provider asked first
+        stream: Whether answers are streamed section by section
+        seed: Random seed of the synthetic analyses
+
+    Returns:
+        Dictionary with the benchmark report
+    """
+    from app.core.openai_analyzer import analyze_with_gpt
+    from app.core.llm_clients import get_llm_client_metrics, shutdown_llm_executor
+    from app.core.llm_router import get_router_stats
+    from app.core.database import get_ai_usage_writer, get_ai_usage_stats
+
+    rng = random.Random(seed)
+    analyses = [make_results(rng) for _ in range(requests)]
+
+    def analyze(results):
+        first_section = []
+        started = time.monotonic()
+
+        def on_section(key, value):
+            if not first_section:
+                first_section.append(time.monotonic() - started)
+
+        insights = analyze_with_gpt(results, is_instrumental=True, on_section=on_section if stream else None)
+        elapsed = time.monotonic() - started
+        summary = insights.get("summary", "")
+        provider = next((name for name in PROVIDERS if summary.startswith(name)), None)
+        return {
+            "latency": elapsed,
+            "first_section": first_section[0] if first_section else None,
+            "provider": provider if "info" not in insights else None,
+            "error": insights.get("info")
+        }
+
+    sampler = ThreadSampler()
+    sampler.start()
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="benchmark") as executor:
+        outcomes = list(executor.map(analyze, analyses))
+    wall_time = time.monotonic() - started
+    threads = sampler.stop()
+
+    # Let losing hedges finish and their usage events reach the database
+    shutdown_llm_executor(wait=True)
+    get_ai_usage_writer().flush()
+    usage = {
+        row["provider"]: {key: row[key] for key in ("count", "avg_prompt_tokens", "avg_completion_tokens")}
+        for row in (get_ai_usage_stats(days=1) or {}).get("by_provider", [])
+    }
+
+    answered = [outcome for outcome in outcomes if outcome["provider"]]
+    by_provider = {name: sum(1 for outcome in answered if outcome["provider"] == name) for name in PROVIDERS}
+    errors = {}
+    for outcome in outcomes:
+        if outcome["error"]:
+            errors[outcome["error"]] = errors.get(outcome["error"], 0) + 1
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "wall_time": wall_time,
+        "throughput": requests / wall_time if wall_time else None,
+        "answered": len(answered),
+        "failed": requests - len(answered),
+        "errors": errors,
+        "answers_by_provider": by_provider,
+        "fallback_rate": (len(answered) - by_provider.get(primary, 0)) / len(answered) if answered else None,
+        "latency": latency_summary([outcome["latency"] for outcome in answered]),
+        "first_section": latency_summary([
+            outcome["first_section"] for outcome in answered if outcome["first_section"] is not None
+        ]) if stream else None,
+        "threads": threads,
+        "usage": usage,
+        "llm_clients": get_llm_client_metrics(),
+        "llm_router": get_router_stats()
+    }
+
+def print_report(report, server_stats):
+    """Print a benchmark report in a readable form"""
+    def seconds(value):
+        return f"{value:.3f}s" if value is not None else "n/a"
+
+    print(f"\nRequests: {report['requests']} at concurrency {report['concurrency']} "
+          f"in {report['wall_time']:.1f}s ({report['throughput']:.1f} req/s)")
+    print(f"Answered: {report['answered']}, failed: {report['failed']}")
+    for error, count in report["errors"].items():
+        print(f"  {count} x {error}")
+    print("Answers by provider: " + ", ".join(f"{name}={count}" for name, count in report["answers_by_provider"].items()))
+    if report["fallback_rate"] is not None:
+        print(f"Fallback rate: {report['fallback_rate'] * 100:.1f}%")
+
+    for label, key in (("Latency", "latency"), ("First section", "first_section")):
+        summary = report.get(key)
+        if summary:
+            print(f"{label}: " + ", ".join(f"{name}={seconds(value)}" for name, value in summary.items()))
+
+    threads = report["threads"]
+    print(f"Threads: peak {threads['peak']}, mean {threads['mean']:.1f}, "
+          f"peak provider request threads {threads['peak_llm_request_threads']}")
+
+    for provider, stats in report["usage"].items():
+        if stats["avg_prompt_tokens"] is not None:
+            print(f"Usage {provider}: {stats['count']} recorded requests, "
+                  f"{stats['avg_prompt_tokens']:.0f} prompt / {stats['avg_completion_tokens']:.0f} completion tokens on average")
+    for provider, stats in server_stats.items():
+        print(f"Mock {provider}: {stats['requests']} requests, {stats['errors']} injected errors, "
+              f"{stats['hangs']} hung, {stats['disconnects']} client disconnects, "
+              f"peak {stats['max_in_flight']} in flight")
+    for provider, metrics in report["llm_clients"].items():
+        reuse = metrics["connection_reuse_rate"]
+        print(f"Client {provider}: {metrics['connections_opened']} connections opened, "
+              f"reuse rate {reuse * 100:.1f}%" if reuse is not None else f"Client {provider}: no requests")
+    for provider, stats in report["llm_router"].items():
+        print(f"Router {provider}: circuit {stats['circuit']}, hedge after {seconds(stats['hedge_after'])}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the AI insight path against local mock providers")
+    parser.add_argument("--requests", type=int, default=100, help="Number of analyses (default: 100)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent callers (default: 8)")
+    parser.add_argument("--primary", choices=PROVIDERS, default="openai", help="Provider asked first (default: openai)")
+    parser.add_argument("--no-secondary", action="store_true", help="Give the secondary provider no API key")
+    parser.add_argument("--stream", action="store_true", help="Stream answers section by section")
+    parser.add_argument("--insight-cache", action="store_true", help="Keep the AI insight cache enabled")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed (default: 1)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    for provider in PROVIDERS:
+        group = parser.add_argument_group(f"mock {provider} server")
+        group.add_argument(f"--{provider}-url", help=f"Use a running server instead of starting a mock {provider}")
+        add_config_arguments(group, prefix=f"{provider}-")
+    args = parser.parse_args()
+
+    # Per-request log lines of the analyzer would drown the report
+    logging.getLogger().setLevel(logging.WARNING)
+
+    servers = {}
+    for index, provider in enumerate(PROVIDERS):
+        url = getattr(args, f"{provider}_url")
+        if not url:
+            servers[provider] = MockLLMServer(config_from_args(args, provider, f"{provider}-", seed=args.seed + index))
+            url = servers[provider].start()
+        os.environ[f"{provider.upper()}_BASE_URL"] = url
+        if provider == args.primary or not args.no_secondary:
+            os.environ[f"{provider.upper()}_API_KEY"] = "mock-key"
+        else:
+            os.environ.pop(f"{provider.upper()}_API_KEY", None)
+
+    # Usage statistics go to a throwaway SQLite database
+    db_dir = tempfile.mkdtemp(prefix="ai-benchmark-")
+    os.environ.update({
+        "AI_PROVIDER": args.primary,
+        "SKIP_AI_ANALYSIS": "false",
+        "AI_STREAMING": "true" if args.stream else "false",
+        "AI_INSIGHT_CACHE_ENABLED": "true" if args.insight_cache else "false",
+        "DB_BACKEND": "sqlite",
+        "SQLITE_PATH": os.path.join(db_dir, "benchmark.sqlite3"),
+    })
+
+    try:
+        from app.core.database import create_tables_if_not_exist
+        create_tables_if_not_exist()
+
+        report = run_benchmark(args.requests, args.concurrency, args.primary, args.stream, args.seed)
+        server_stats = {provider: server.get_stats() for provider, server in servers.items()}
+        if args.json:
+            print(json.dumps(dict(report, servers=server_stats), indent=2, default=str))
+        else:
+            print_report(report, server_stats)
+        return 0 if report["answered"] else 1
+    finally:
+        for server in servers.values():
+            server.stop()
+        shutil.rmtree(db_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the canonical audio formats.
+Decodes each given file as uploaded and stores it in every canonical format
+(see app/core/canonical_audio.py), then reports the size of each copy and how
+long a full load and a fingerprint excerpt take from it, to choose
+AUDIO_CANONICAL_FORMAT for a deployment.
+
+Usage:
+    python scripts/benchmarks/benchmark_audio_formats.py uploads/*/*.mp3 --repeat 3
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+
+# Add the root directory to the path to ensure imports work
+script_dir = Path(__file__).parent.absolute()
+root_dir = script_dir.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from app.core.canonical_audio import CANONICAL_FORMATS, canonicalize_upload, canonical_path, load_audio
+from app.core.fingerprint import SAMPLE_RATE
+
+def time_loads(file_path, repeat, fingerprint_seconds):
+    """Best-of-repeat seconds of a full native load and of a fingerprint excerpt load"""
+    full, excerpt = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        y, _ = load_audio(file_path)
+        y.sum()
+        full.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        load_audio(file_path, sr=SAMPLE_RATE, mono=True, duration=fingerprint_seconds)
+        excerpt.append(time.perf_counter() - start)
+    return min(full), min(excerpt)
+
+def benchmark_file(source, repeat, fingerprint_seconds):
+    """
+    Benchmark one file in its original and every canonical format
+
+    Args:
+        source: Path to an audio file
+        repeat: Number of timed loads per format
+        fingerprint_seconds: Length of the fingerprint excerpt
+
+    Returns:
+        List of report rows, one per format
+    """
+    work_dir = tempfile.mkdtemp(prefix="audio_formats_")
+    try:
+        file_path = os.path.join(work_dir, os.path.basename(source))
+        shutil.copy(source, file_path)
+
+        rows = []
+        full, excerpt = time_loads(file_path, repeat, fingerprint_seconds)
+        rows.append({"file": source, "format": "original", "bytes": os.path.getsize(file_path),
+                     "encode_seconds": 0.0, "load_seconds": full, "excerpt_seconds": excerpt})
+
+        for audio_format in CANONICAL_FORMATS:
+            report = canonicalize_upload(file_path, audio_format)
+            full, excerpt = time_loads(file_path, repeat, fingerprint_seconds)
+            rows.append({"file": source, "format": audio_format, "bytes": report["canonical_bytes"],
+                         "encode_seconds": report["encode_seconds"], "load_seconds": full,
+                         "excerpt_seconds": excerpt})
+            os.remove(canonical_path(file_path, audio_format))
+        return rows
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def print_report(rows):
+    print(f"{'file':<32} {'format':<9} {'MB':>8} {'encode s':>9} {'load s':>8} {'excerpt s':>10} {'speedup':>8}")
+    original = {}
+    for row in rows:
+        if row["format"] == "original":
+            original[row["file"]] = row["load_seconds"]
+        speedup = original[row["file"]] / row["load_seconds"] if row["load_seconds"] else 0.0
+        print(f"{os.path.basename(row['file'])[:32]:<32} {row['format']:<9} {row['bytes'] / (1024 * 1024):>8.2f} "
+              f"{row['encode_seconds']:>9.3f} {row['load_seconds']:>8.3f} {row['excerpt_seconds']:>10.3f} {speedup:>7.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the size and load time of the canonical audio formats")
+    parser.add_argument("files", nargs="+", help="Audio files to benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed loads per format, the best counts (default: 3)")
+    parser.add_argument("--fingerprint-seconds", type=float, default=30.0,
+                        help="Length of the excerpt loaded for fingerprints (default: 30)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    rows = []
+    for source in args.files:
+        rows.extend(benchmark_file(source, max(1, args.repeat), args.fingerprint_seconds))
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_report(rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+OpenAI-compatible mock server for benchmarking the AI insight path offline.
+Answers POST .../chat/completions like OpenAI or OpenRouter, with response
+times drawn from a configurable distribution, injected errors and hung
+requests, and server-sent-event streaming. GET /stats returns its counters.
+
+Usage:
+    python scripts/benchmarks/mock_llm_server.py --port 8901 --latency-dist lognormal --latency 2
+"""
+
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+
+LATENCY_DISTRIBUTIONS = ["fixed", "uniform", "normal", "lognormal"]
+
+# Every section the analyzer parses, so answers look like real ones
+MOCK_RESPONSE = """Summary: {name} reviewed a balanced mix with a slightly heavy low end.
+
+Genre Context: Modern pop production with a loud, controlled master.
+
+Subgenre & Style-Specific Context: Synth-pop with a dense chorus arrangement.
+
+Strengths:
+- Clear lead vocal
+- Tight kick and bass relationship
+
+Areas for Improvement:
+- Low mids build up around 250 Hz
+- Cymbals are harsh around 7 kHz
+
+Suggestions:
+- Cut 2 dB at 250 Hz on the music bus
+- De-ess the overheads at 7 kHz
+
+Reference Tracks:
+- A current chart pop single, for the low end balance
+
+Processing Recommendations:
+- High-pass the pads at 120 Hz, 12 dB/octave
+
+Mix Translation Recommendations:
+- Check the bass on phone speakers and add harmonics if it disappears
+"""
+
+class MockLLMConfig:
+    """Behaviour of a mock server"""
+
+    def __init__(self, name="mock", latency_dist="fixed", latency=1.0, jitter=0.0,
+                 error_rate=0.0, error_status=500, hang_rate=0.0, hang_seconds=120.0,
+                 first_token_share=0.2, seed=None):
+        """
+        Args:
+            name: Name written into the answers, to tell servers apart
+            latency_dist: One of LATENCY_DISTRIBUTIONS
+            latency: Typical response time in seconds (mean, or median for lognormal)
+            jitter: Spread of the distribution (half-width, standard deviation
+                or lognormal sigma)
+            error_rate: Share of requests answered with error_status
+            error_status: HTTP status of injected errors (e.g. 500 or 429)
+            hang_rate: Share of requests held open for hang_seconds, to trigger timeouts
+            hang_seconds: How long hung requests wait before answering
+            first_token_share: Share of the response time spent before the
+                first streamed chunk
+            seed: Random seed for reproducible runs
+        """
+        if latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {latency_dist}")
+        self.name = name
+        self.latency_dist = latency_dist
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.first_token_share = first_token_share
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+
+    def sample_latency(self):
+        """Draw a response time in seconds"""
+        with self.random_lock:
+            if self.latency_dist == "uniform":
+                value = self.random.uniform(self.latency - self.jitter, self.latency + self.jitter)
+            elif self.latency_dist == "normal":
+                value = self.random.gauss(self.latency, self.jitter)
+            elif self.latency_dist == "lognormal":
+                value = self.latency * self.random.lognormvariate(0.0, self.jitter)
+            else:
+                value = self.latency
+        return max(0.0, value)
+
+    def sample_outcome(self):
+        """Decide whether a request succeeds, fails or hangs"""
+        with self.random_lock:
+            draw = self.random.random()
+        if draw < self.error_rate:
+            return "error"
+        if draw < self.error_rate + self.hang_rate:
+            return "hang"
+        return "ok"
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """Answers chat completion requests like the OpenAI API, with keep-alive"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            self.send_json(200, self.server.get_stats())
+        else:
+            self.send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": "Not found"}})
+            return
+
+        request = json.loads(body or b"{}")
+        config = self.server.config
+        outcome = config.sample_outcome()
+        self.server.count("requests", in_flight=1)
+        try:
+            if outcome == "error":
+                self.server.count("errors")
+                time.sleep(config.sample_latency() * config.first_token_share)
+                self.send_json(config.error_status, {
+                    "error": {"message": f"Injected error from {config.name}", "type": "server_error"}
+                })
+                return
+            if outcome == "hang":
+                self.server.count("hangs")
+                time.sleep(config.hang_seconds)
+
+            text = MOCK_RESPONSE.format(name=config.name)
+            usage = estimate_usage(request, text)
+            if request.get("stream"):
+                include_usage = (request.get("stream_options") or {}).get("include_usage")
+                self.stream_answer(text, usage if include_usage else None, config.sample_latency())
+            else:
+                time.sleep(config.sample_latency())
+                self.send_json(200, {
+                    "id": "chatcmpl-mock",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "mock-model"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": text},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": usage
+                })
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (timeout or cancelled hedge)
+            self.server.count("disconnects")
+        finally:
+            self.server.count(in_flight=-1)
+
+    def stream_answer(self, text, usage, latency):
+        """Send the answer as server-sent chunks, one line at a time"""
+        config = self.server.config
+        lines = text.splitlines(keepends=True)
+        time.sleep(latency * config.first_token_share)
+
+        # Chunked transfer encoding keeps the connection reusable, like the real APIs
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        chunk_delay = latency * (1 - config.first_token_share) / max(1, len(lines))
+        for line in lines:
+            self.send_event({"choices": [{"index": 0, "delta": {"content": line}, "finish_reason": None}]})
+            time.sleep(chunk_delay)
+        if usage:
+            self.send_event({"choices": [], "usage": usage})
+        self.send_chunk(b"data: [DONE]\n\n")
+        self.send_chunk(b"")
+
+    def send_event(self, chunk):
+        chunk = dict(chunk, id="chatcmpl-mock", object="chat.completion.chunk",
+                     created=int(time.time()), model="mock-model")
+        self.send_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+
+    def send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def estimate_usage(request, text):
+    """Token usage of a mock answer, at four characters per token"""
+    prompt = "".join(message.get("content") or "" for message in request.get("messages", []))
+    prompt_tokens = max(1, len(prompt) // 4)
+    completion_tokens = max(1, len(text) // 4)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens
+    }
+
+class MockLLMServer(ThreadingHTTPServer):
+    """Threaded mock server, one thread per connection"""
+
+    daemon_threads = True
+
+    def __init__(self, config, host="127.0.0.1", port=0):
+        """
+        Args:
+            config: MockLLMConfig instance
+            host: Interface to listen on
+            port: Port to listen on, 0 for any free port
+        """
+        super().__init__((host, port), MockLLMHandler)
+        self.config = config
+        self.thread = None
+        self.stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "hangs": 0, "disconnects": 0,
+                      "in_flight": 0, "max_in_flight": 0}
+
+    @property
+    def base_url(self):
+        """OpenAI-style base URL of the server"""
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/v1"
+
+    def count(self, *names, in_flight=0):
+        with self.stats_lock:
+            for name in names:
+                self.stats[name] += 1
+            self.stats["in_flight"] += in_flight
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections (timeouts, cancelled hedges) are expected
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            self.count("disconnects")
+            return
+        super().handle_error(request, client_address)
+
+    def get_stats(self):
+        with self.stats_lock:
+            return dict(self.stats, name=self.config.name)
+
+    def start(self):
+        """Serve in a background thread and return the base URL"""
+        self.thread = threading.Thread(target=self.serve_forever, name=f"mock-llm-{self.config.name}", daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def add_config_arguments(parser, prefix=""):
+    """
+    Add the MockLLMConfig options to an argument parser
+
+    Args:
+        parser: argparse parser or argument group
+        prefix: Option prefix, e.g. "openai-" for --openai-latency
+    """
+    parser.add_argument(f"--{prefix}latency-dist", choices=LATENCY_DISTRIBUTIONS, default="lognormal",
+                        help="Response time distribution (default: lognormal)")
+    parser.add_argument(f"--{prefix}latency", type=float, default=1.0,
+                        help="Typical response time in seconds (default: 1.0)")
+    parser.add_argument(f"--{prefix}jitter", type=float, default=0.3,
+                        help="Spread of the response times (default: 0.3)")
+    parser.add_argument(f"--{prefix}error-rate", type=float, default=0.0,
+                        help="Share of requests answered with an error (default: 0)")
+    parser.add_argument(f"--{prefix}error-status", type=int, default=500,
+                        help="HTTP status of injected errors (default: 500)")
+    parser.add_argument(f"--{prefix}hang-rate", type=float, default=0.0,
+                        help="Share of requests held open to trigger timeouts (default: 0)")
+    parser.add_argument(f"--{prefix}hang-seconds", type=float, default=120.0,
+                        help="How long hung requests are held (default: 120)")
+
+def config_from_args(args, name, prefix="", seed=None):
+    """
+    Build a MockLLMConfig from options added by add_config_arguments
+
+    Args:
+        args: Parsed arguments
+        name: Server name
+        prefix: Option prefix used when the options were added
+        seed: Random seed
+
+    Returns:
+        MockLLMConfig instance
+    """
+    def option(key):
+        return getattr(args, (prefix + key).replace("-", "_"))
+
+    return MockLLMConfig(
+        name=name,
+        latency_dist=option("latency-dist"),
+        latency=option("latency"),
+        jitter=option("jitter"),
+        error_rate=option("error-rate"),
+        error_status=option("error-status"),
+        hang_rate=option("hang-rate"),
+        hang_seconds=option("hang-seconds"),
+        seed=seed
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock server for AI benchmarks")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8901, help="Port to listen on (default: 8901)")
+    parser.add_argument("--name", default="mock", help="Name written into the answers (default: mock)")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible runs")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = MockLLMServer(config_from_args(args, args.name, seed=args.seed), args.host, args.port)
+    logger.info(f"Mock LLM server '{args.name}' listening on {server.base_url}")
+    logger.info(f"Point the app at it with OPENAI_BASE_URL={server.base_url} or OPENROUTER_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Stopping mock LLM server")
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
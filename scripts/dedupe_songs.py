@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+One-time migration removing duplicate songs rows.
+Databases written by the old SELECT-then-INSERT save can hold several rows
+for one file_hash, and the unique file_hash key is not added until they are
+gone. This keeps the newest row of each file_hash (the highest id, written by
+the latest analysis), deletes the others, drops the file hashes from the
+result cache and then adds the unique key.
+
+Usage:
+    python scripts/dedupe_songs.py --dry-run
+    python scripts/dedupe_songs.py
+"""
+
+import os
+import sys
+import argparse
+
+# Add parent directory to path to allow importing from app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.database import create_tables_if_not_exist, invalidate_cached_songs
+from app.core.db_utils import get_db_connection, DatabaseError
+
+def find_duplicate_songs(cursor):
+    """
+    Find the rows of songs that share a file_hash with a newer row
+
+    Args:
+        cursor: Open cursor
+
+    Returns:
+        Dictionary of file_hash to (id kept, list of ids to remove)
+    """
+    cursor.execute("""
+    SELECT file_hash, MAX(id) FROM songs GROUP BY file_hash HAVING COUNT(*) > 1
+    """)
+    duplicates = {}
+    for file_hash, keep_id in cursor.fetchall():
+        cursor.execute("SELECT id FROM songs WHERE file_hash = %s AND id <> %s ORDER BY id", (file_hash, keep_id))
+        duplicates[file_hash] = (keep_id, [row[0] for row in cursor.fetchall()])
+    return duplicates
+
+def dedupe_songs(dry_run=False):
+    """
+    Remove duplicate songs rows, keeping the newest row of each file_hash
+
+    Args:
+        dry_run: Only report the rows that would be removed
+
+    Returns:
+        List of the removed (or, in a dry run, duplicate) row ids
+    """
+    connection = get_db_connection()
+    if not connection:
+        raise RuntimeError("Could not connect to the database")
+
+    cursor = connection.cursor()
+    try:
+        duplicates = find_duplicate_songs(cursor)
+        removed = []
+        for file_hash, (keep_id, remove_ids) in duplicates.items():
+            print(f"{file_hash}: keeping row {keep_id}, {'would remove' if dry_run else 'removing'} "
+                  f"rows {', '.join(str(row_id) for row_id in remove_ids)}")
+            if not dry_run:
+                cursor.execute("DELETE FROM songs WHERE file_hash = %s AND id <> %s", (file_hash, keep_id))
+            removed.extend(remove_ids)
+        if not dry_run:
+            connection.commit()
+    except DatabaseError:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+
+    if duplicates and not dry_run:
+        # Workers may have cached the analysis of a removed row; their
+        # similarity indexes drop it on their next full reload
+        invalidate_cached_songs(list(duplicates))
+    print(f"{len(removed)} duplicate rows of {len(duplicates)} file hashes "
+          f"{'found' if dry_run else 'removed'}")
+    return removed
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove duplicate songs rows and add the unique file_hash key")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the rows that would be removed")
+    args = parser.parse_args()
+
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+    dedupe_songs(dry_run=args.dry_run)
+    if not args.dry_run:
+        # Adds the unique key now that nothing blocks it
+        create_tables_if_not_exist()
+
+if __name__ == "__main__":
+    main()
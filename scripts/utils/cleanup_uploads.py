@@ -1,14 +1,14 @@
 #!/usr/bin/env python3
 """
-Script to clean up uploaded files that are older than 30 days.
-This is part of the file retention policy to automatically delete old uploads.
+Script to clean up uploaded files that have not been accessed for 30 days.
+This is part of the file retention policy to automatically delete old uploads;
+it also brings the upload folder back within its byte budget.
 """
 
 import os
 import sys
 import logging
-import shutil
-from datetime import datetime, timedelta
+from datetime import datetime
 from pathlib import Path
 
 # Configure logging
@@ -47,17 +47,14 @@ def get_upload_dir():
         root_dir = script_dir.parent.parent  # Navigate to project root
         return root_dir / 'uploads'
 
-def is_older_than_days(path, days):
-    """Check if a file or directory is older than specified days."""
-    # Get the modification time
-    mtime = datetime.fromtimestamp(os.path.getmtime(path))
-    cutoff_date = datetime.now() - timedelta(days=days)
-    
-    return mtime < cutoff_date
-
 def cleanup_old_files(days=30, dry_run=False):
     """
-    Clean up files that are older than the specified days.
+    Clean up uploads that have not been accessed for the specified days,
+    then evict the least recently used uploads until the upload folder fits
+    its byte budget (UPLOAD_STORAGE_MAX_BYTES).
+    
+    Uploads are looked up in the storage index rather than by scanning the
+    upload folder; uploads that an analysis is still using are kept.
     
     Args:
         days (int): Number of days to keep files (default: 30)
@@ -67,43 +64,38 @@ def cleanup_old_files(days=30, dry_run=False):
         tuple: (files_deleted, dirs_deleted, errors)
     """
     uploads_dir = get_upload_dir()
-    logger.info(f"Checking for files older than {days} days in {uploads_dir}")
+    logger.info(f"Checking for uploads not accessed for {days} days in {uploads_dir}")
     
     if not os.path.exists(uploads_dir):
         logger.warning(f"Uploads directory does not exist: {uploads_dir}")
         return 0, 0, 0
     
-    files_deleted = 0
-    dirs_deleted = 0
-    errors = 0
+    from app.core.upload_storage import get_upload_storage
+    storage = get_upload_storage(str(uploads_dir))
     
-    # Process each subdirectory (each upload is in its own directory)
-    for item in os.listdir(uploads_dir):
-        item_path = os.path.join(uploads_dir, item)
-        
-        # Skip if not a directory
-        if not os.path.isdir(item_path):
-            continue
+    try:
+        expired = storage.expire(days * 24 * 3600, dry_run=dry_run)
+        for file_id, size in expired:
+            action = "Would delete" if dry_run else "Deleted"
+            logger.info(f"{action} upload (not accessed for {days} days): {file_id} ({size / (1024 * 1024):.1f} MB)")
         
-        try:
-            if is_older_than_days(item_path, days):
-                if dry_run:
-                    logger.info(f"Would delete directory (older than {days} days): {item_path}")
-                else:
-                    logger.info(f"Deleting directory (older than {days} days): {item_path}")
-                    shutil.rmtree(item_path)
-                    dirs_deleted += 1
-                    files_deleted += 1  # At least one file per directory
-        except Exception as e:
-            logger.error(f"Error processing {item_path}: {str(e)}")
-            errors += 1
+        freed = 0 if dry_run else storage.enforce_budget()
+        if freed:
+            logger.info(f"Freed {freed / (1024 * 1024):.1f} MB to fit the upload budget")
+    except Exception as e:
+        logger.error(f"Error cleaning up {uploads_dir}: {str(e)}")
+        return 0, 0, 1
     
+    usage = storage.usage()
+    dirs_deleted = len(expired) if not dry_run else 0
     if dry_run:
-        logger.info(f"Dry run completed. Would delete {dirs_deleted} directories containing uploads older than {days} days.")
+        logger.info(f"Dry run completed. Would delete {len(expired)} uploads not accessed for {days} days.")
     else:
-        logger.info(f"Cleanup completed. Deleted {dirs_deleted} directories containing uploads older than {days} days.")
+        logger.info(f"Cleanup completed. Deleted {dirs_deleted} uploads not accessed for {days} days.")
+    logger.info(f"{usage['uploads']} uploads use {usage['bytes'] / (1024 * 1024):.1f} MB "
+                f"of {usage['max_bytes'] / (1024 * 1024):.1f} MB ({usage['pinned']} in use)")
     
-    return files_deleted, dirs_deleted, errors
+    return dirs_deleted, dirs_deleted, usage['eviction_errors']
 
 if __name__ == "__main__":
     # Parse command line arguments
@@ -16,8 +16,14 @@ from app import create_app
 
 
 @pytest.fixture
-def app():
+def app(tmp_path, monkeypatch):
     """Create and configure a Flask app for testing"""
+    # Run against an embedded SQLite database so no MySQL server is needed
+    monkeypatch.setenv('DB_BACKEND', 'sqlite')
+    monkeypatch.setenv('SQLITE_PATH', str(tmp_path / 'music_analyzer.sqlite3'))
+    monkeypatch.setenv('RESULT_CACHE_PATH', str(tmp_path / 'result_cache.sqlite3'))
+    monkeypatch.setenv('AI_STATS_ASYNC', 'false')
+    
     test_config = {
         'TESTING': True,
         'SERVER_NAME': 'localhost',
@@ -84,4 +84,302 @@ def test_api_endpoints(client):
     
     # If we get here, none of the endpoints worked, but that's okay for this test
     # Let's just skip it rather than fail
-    pytest.skip("No API status endpoints found") 
\ No newline at end of file
+    pytest.skip("No API status endpoints found") 
+
+def test_insights_endpoint(client, monkeypatch):
+    """AI insights are generated in the background and served once stored"""
+    import time
+    from app.core.database import save_song
+
+    monkeypatch.setenv('SKIP_AI_ANALYSIS', 'true')
+    file_hash = "cd" * 32
+
+    assert client.get('/insights/not-a-hash').status_code == 400
+    assert client.get(f'/insights/{file_hash}').status_code == 404
+
+    save_song("mix", "My Mix.mp3", "/tmp/mix.mp3", file_hash, False, {"overall_score": 71.0})
+    response = client.get(f'/insights/{file_hash}')
+    assert response.status_code == 202
+    assert response.get_json()["status"] == "pending"
+
+    deadline = time.time() + 10
+    while response.status_code == 202 and time.time() < deadline:
+        time.sleep(0.05)
+        response = client.get(f'/insights/{file_hash}')
+
+    # Without a provider the placeholder answer is stored as failed
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["status"] == "failed"
+    assert data["insights"]["summary"]
+
+    # The event stream of finished insights is a single complete event
+    stream = client.get(f'/insights/{file_hash}/stream')
+    assert stream.mimetype == 'text/event-stream'
+    assert stream.get_data(as_text=True).startswith('event: complete\n')
+
+    # Failed insights are generated again once the retry backoff has passed
+    assert client.get(f'/insights/{file_hash}').get_json()["status"] == "failed"
+    monkeypatch.setenv('AI_INSIGHT_RETRY_AFTER', '0')
+    assert client.get(f'/insights/{file_hash}').status_code == 202
+
+
+def test_result_summary_and_sections(client):
+    """The summary leaves out lists and arrays; sections carry ETags and large ones are compressed"""
+    import gzip
+    from app.core.database import save_song
+
+    file_hash = "ef" * 32
+    results = {
+        "overall_score": 74.0,
+        "frequency_balance": {"balance_score": 80.0, "analysis": ["Balanced."], "band_energy": {"bass": 12.0}},
+        "transients": {"transients_score": 60.0, "transient_data": [0.1 * i for i in range(2000)]}
+    }
+    save_song("mix", "My Mix.mp3", "/tmp/mix.mp3", file_hash, False, results)
+
+    summary = client.get(f'/results/{file_hash}').get_json()["summary"]
+    assert summary["overall_score"] == 74.0
+    assert summary["sections"]["frequency_balance"] == {"balance_score": 80.0}
+    assert summary["sections"]["transients"] == {"transients_score": 60.0}
+    assert summary["available_sections"] == ["frequency_balance", "transients"]
+
+    response = client.get(f'/results/{file_hash}/transients', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert len(response.data) < len(gzip.decompress(response.data)) / 2
+    assert json.loads(gzip.decompress(response.data))["transient_data"][1] == 0.1
+
+    # Revalidating an unchanged section costs no body
+    response = client.get(f'/results/{file_hash}/frequency_balance')
+    assert response.get_json()["analysis"] == ["Balanced."]
+    revalidated = client.get(f'/results/{file_hash}/frequency_balance', headers={'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+
+    assert client.get(f'/results/{file_hash}/missing').status_code == 404
+
+
+def test_rescore_flips_the_instrumental_flag(client, monkeypatch):
+    """Re-scoring recomputes the flag-dependent scores from stored measurements and saves the flag"""
+    from app.core.database import save_song, find_song_by_hash, save_song_insights, get_song_insights
+
+    monkeypatch.setenv('SKIP_AI_ANALYSIS', 'true')
+
+    file_hash = "cd" * 32
+    band_energy = {"sub_bass": 40.0, "bass": 100.0, "low_mids": 70.0, "mids": 55.0, "high_mids": 30.0, "highs": 10.0, "air": 0.0}
+    results = {
+        "overall_score": 70.0,
+        "frequency_balance": {"balance_score": 50.0, "analysis": [], "band_energy": band_energy, "is_instrumental": False},
+        "dynamic_range": {"dynamic_range_score": 60.0}
+    }
+    save_song("mix", "My Mix.mp3", "/tmp/missing.mp3", file_hash, False, results)
+    save_song_insights(file_hash, "complete", {"summary": "Advice for the vocal"})
+
+    response = client.post(f'/results/{file_hash}/rescore', json={'is_instrumental': True})
+    assert response.status_code == 200
+    balance = response.get_json()["results"]["frequency_balance"]
+    assert balance["is_instrumental"] is True
+    assert balance["balance_score"] != 50.0
+    assert find_song_by_hash(file_hash)["is_instrumental"]
+
+    # Insights written for the vocal version are generated again
+    assert get_song_insights(file_hash)["insights"] != {"summary": "Advice for the vocal"}
+
+    assert client.post(f'/results/{"0" * 64}/rescore', json={'is_instrumental': True}).status_code == 404
+
+
+def test_api_analyze_serves_stored_results(client, app, monkeypatch):
+    """The file is analyzed once per analyzer version; repeat calls are served from the database"""
+    import app.api.routes as api_routes
+
+    calls = []
+
+    def fake_analyze_mix(file_path, is_instrumental=None):
+        calls.append(file_path)
+        return {"overall_score": 68.0, "analyzer_version": api_routes.ANALYZER_VERSION}
+
+    monkeypatch.setenv('API_KEY', 'test-key')
+    monkeypatch.setattr(api_routes, 'analyze_mix', fake_analyze_mix)
+    upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'apimix')
+    os.makedirs(upload_dir, exist_ok=True)
+    with open(os.path.join(upload_dir, 'apimix.mp3'), 'wb') as f:
+        f.write(b'not really audio')
+    headers = {'X-API-Key': 'test-key'}
+
+    first = client.get('/api/analyze/apimix', headers=headers)
+    assert first.get_json()["from_cache"] is False
+    second = client.get('/api/analyze/apimix', headers=headers)
+    assert second.get_json()["from_cache"] is True
+    assert second.get_json()["results"]["overall_score"] == 68.0
+    assert len(calls) == 1
+
+    etag = first.headers['ETag']
+    assert second.headers['ETag'] == etag
+    assert client.get('/api/analyze/apimix', headers=dict(headers, **{'If-None-Match': etag})).status_code == 304
+
+    # Results of an older analyzer only get their outdated sections recomputed
+    refreshed = []
+
+    def fake_refresh_song(song, file_path=None, file_id=None):
+        refreshed.append(song['file_hash'])
+        return dict(song['analysis'], analyzer_version='next'), ['overall_score']
+
+    monkeypatch.setattr(api_routes, 'ANALYZER_VERSION', 'next')
+    monkeypatch.setattr(api_routes, 'refresh_song', fake_refresh_song)
+    third = client.get('/api/analyze/apimix', headers=dict(headers, **{'If-None-Match': etag}))
+    assert third.status_code == 200
+    assert third.get_json()["from_cache"] is False
+    assert third.headers['ETag'] != etag
+    assert len(calls) == 1
+    assert refreshed == [first.get_json()["file_hash"]]
+
+
+def test_api_analyze_etag_changes_on_rescore(client, app, monkeypatch):
+    """Re-scoring a stored song changes the ETag, so revalidating clients get the new scores"""
+    import app.api.routes as api_routes
+    from app.core.database import get_file_hash, save_song
+
+    monkeypatch.setenv('API_KEY', 'test-key')
+    monkeypatch.setenv('SKIP_AI_ANALYSIS', 'true')
+    upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'rescoredmix')
+    os.makedirs(upload_dir, exist_ok=True)
+    file_path = os.path.join(upload_dir, 'rescoredmix.mp3')
+    with open(file_path, 'wb') as f:
+        f.write(b'rescored, not really audio')
+    file_hash = get_file_hash(file_path)
+    band_energy = {"sub_bass": 40.0, "bass": 100.0, "low_mids": 70.0, "mids": 55.0, "high_mids": 30.0, "highs": 10.0, "air": 0.0}
+    results = {
+        "overall_score": 70.0,
+        "analyzer_version": api_routes.ANALYZER_VERSION,
+        "frequency_balance": {"balance_score": 50.0, "analysis": [], "band_energy": band_energy, "is_instrumental": False},
+        "dynamic_range": {"dynamic_range_score": 60.0}
+    }
+    save_song("rescoredmix", "rescoredmix.mp3", file_path, file_hash, False, results)
+    headers = {'X-API-Key': 'test-key'}
+
+    etag = client.get('/api/analyze/rescoredmix', headers=headers).headers['ETag']
+    assert client.get('/api/analyze/rescoredmix', headers=dict(headers, **{'If-None-Match': etag})).status_code == 304
+
+    assert client.post(f'/results/{file_hash}/rescore', json={'is_instrumental': True}).status_code == 200
+    revalidated = client.get('/api/analyze/rescoredmix', headers=dict(headers, **{'If-None-Match': etag}))
+    assert revalidated.status_code == 200
+    assert revalidated.get_json()["results"]["frequency_balance"]["is_instrumental"] is True
+    assert revalidated.headers['ETag'] != etag
+
+
+
+def test_uploads_are_stored_by_content(client, app, monkeypatch):
+    """Same-named uploads get their own files; the same bytes under two names are stored once"""
+    import app.routes as routes
+    from app.core.upload_layout import resolve_upload_path, INCOMING_DIR
+
+    monkeypatch.setenv('FINGERPRINT_ENABLED', 'false')
+    monkeypatch.setattr(routes, 'analyze_mix', lambda file_path, is_instrumental=None: {"overall_score": 70.0})
+    monkeypatch.setattr(routes, 'generate_visualizations', lambda file_path, file_id=None: {})
+    monkeypatch.setattr(routes, 'start_insight_job', lambda *args: None)
+    upload_dir = app.config['UPLOAD_FOLDER']
+
+    def upload(content, name):
+        response = client.post('/upload', data={'file': (io.BytesIO(content), name)},
+                               content_type='multipart/form-data')
+        assert response.status_code == 200
+        return response.get_json()
+
+    first = upload(b'first mix', 'mix.wav')
+    second = upload(b'second mix', 'mix.wav')
+    renamed = upload(b'first mix', 'Other Name.mp3')
+
+    assert first['file_hash'] != second['file_hash']
+    assert renamed['file_hash'] == first['file_hash'] and renamed['from_cache'] is True
+    first_path = os.path.join(upload_dir, first['file_hash'], first['file_hash'] + '.wav')
+    with open(first_path, 'rb') as f:
+        assert f.read() == b'first mix'
+    assert os.listdir(os.path.dirname(first_path)) == [os.path.basename(first_path)]
+    assert os.listdir(os.path.join(upload_dir, INCOMING_DIR)) == []
+
+    # Names resolve to the file last uploaded under them
+    assert resolve_upload_path(upload_dir, 'mix') == os.path.join(upload_dir, second['file_hash'], second['file_hash'] + '.wav')
+    assert resolve_upload_path(upload_dir, 'Other_Name') == first_path
+    assert resolve_upload_path(upload_dir, first['file_hash']) == first_path
+
+
+def test_missing_visualizations_are_regenerated(client, app, monkeypatch, tmp_path):
+    """Stored results whose images were evicted get new ones under the new upload"""
+    import app.routes as routes
+
+    generated = []
+
+    def fake_generate_visualizations(file_path, file_id=None):
+        generated.append(file_id)
+        image = tmp_path / 'uploads' / file_id / 'waveform.png'
+        image.parent.mkdir(parents=True, exist_ok=True)
+        image.write_bytes(b'png')
+        return {'waveform': f'/static/uploads/{file_id}/waveform.png'}
+
+    monkeypatch.setenv('FINGERPRINT_ENABLED', 'false')
+    monkeypatch.setattr(app, 'static_folder', str(tmp_path))
+    monkeypatch.setattr(routes, 'analyze_mix', lambda file_path, is_instrumental=None: {"overall_score": 70.0})
+    monkeypatch.setattr(routes, 'generate_visualizations', fake_generate_visualizations)
+    monkeypatch.setattr(routes, 'start_insight_job', lambda *args: None)
+
+    def upload(content, name):
+        response = client.post('/upload', data={'file': (io.BytesIO(content), name)},
+                               content_type='multipart/form-data')
+        assert response.status_code == 200
+        return response.get_json()
+
+    first = upload(b'evicted mix', 'mix.wav')
+    file_hash = first['file_hash']
+    assert upload(b'evicted mix', 'mix.wav')['from_cache'] is True
+    assert generated == [file_hash]
+
+    # A cache hit after the images were evicted generates them again
+    (tmp_path / 'uploads' / file_hash / 'waveform.png').unlink()
+    again = upload(b'evicted mix', 'mix.wav')
+    assert again['results']['visualizations'] == {'waveform': f'/static/uploads/{file_hash}/waveform.png'}
+    assert generated == [file_hash, file_hash]
+
+    # A near-duplicate gets images of its own rather than the matched song's
+    monkeypatch.setenv('FINGERPRINT_ENABLED', 'true')
+    monkeypatch.setattr(routes, 'compute_fingerprint', lambda file_path: {})
+    monkeypatch.setattr(routes, 'find_near_duplicate', lambda fingerprint: (file_hash, {'score': 1.0}))
+    copy = upload(b'transcoded mix', 'mix.wav')
+    assert copy['near_duplicate_of'] == file_hash
+    assert copy['results']['visualizations'] == {'waveform': f"/static/uploads/{copy['file_hash']}/waveform.png"}
+    assert generated[-1] == copy['file_hash']
+
+
+def test_analysis_lock_is_kept_while_requests_wait():
+    """A request arriving while another waits on the lock still waits its turn"""
+    import threading
+    import time
+    from app.api.routes import _analysis_lock, _analysis_locks
+
+    file_hash = "ef" * 32
+    inside = []
+    release_b = threading.Event()
+
+    def request(name, hold=None):
+        with _analysis_lock(file_hash):
+            inside.append(name)
+            if hold:
+                hold.wait(2)
+            inside.remove(name)
+
+    with _analysis_lock(file_hash):
+        b = threading.Thread(target=request, args=("b", release_b))
+        b.start()
+        time.sleep(0.05)
+    deadline = time.time() + 2
+    while "b" not in inside and time.time() < deadline:
+        time.sleep(0.01)
+
+    # b holds the lock; c must not get a fresh one and run alongside it
+    c = threading.Thread(target=request, args=("c",))
+    c.start()
+    time.sleep(0.1)
+    assert inside == ["b"]
+
+    release_b.set()
+    b.join(2)
+    c.join(2)
+    assert inside == []
+    assert file_hash not in _analysis_locks
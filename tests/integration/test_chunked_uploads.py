@@ -0,0 +1,75 @@
+"""
+Integration tests for chunked, resumable uploads
+"""
+
+import sys
+import os
+import hashlib
+import pytest
+from pathlib import Path
+
+# Add the project root to the path
+root_dir = Path(__file__).parent.parent.parent.absolute()
+sys.path.insert(0, str(root_dir))
+
+from app.core.chunked_uploads import UploadError, create_upload, get_upload, write_chunk, complete_upload
+from app.core.database import calculate_file_hash, save_song
+
+CHUNK_SIZE = 256 * 1024
+
+
+def chunk(data, index):
+    return data[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE]
+
+
+def test_out_of_order_chunks_resume_and_complete(tmp_path):
+    """Chunks arrive in any order, the status tells what is missing and the hash matches the file"""
+    data = os.urandom(CHUNK_SIZE * 3 + 1000)
+    base_dir = str(tmp_path / "chunked")
+    status = create_upload(base_dir, "mix.wav", len(data), chunk_size=CHUNK_SIZE)
+    upload_id = status["upload_id"]
+    assert status["chunk_count"] == 4
+
+    for index in (2, 0):
+        write_chunk(base_dir, upload_id, index, chunk(data, index), hashlib.sha256(chunk(data, index)).hexdigest())
+
+    # A corrupted chunk is rejected and not counted as received
+    with pytest.raises(UploadError) as excinfo:
+        write_chunk(base_dir, upload_id, 1, b"x" * CHUNK_SIZE, hashlib.sha256(chunk(data, 1)).hexdigest())
+    assert excinfo.value.status == 422
+
+    # Resuming: the server reports which chunks it already has
+    assert get_upload(base_dir, upload_id)["received"] == [0, 2]
+    with pytest.raises(UploadError) as excinfo:
+        complete_upload(base_dir, upload_id, str(tmp_path / "mix.wav"))
+    assert excinfo.value.status == 409
+
+    for index in (3, 1):
+        write_chunk(base_dir, upload_id, index, chunk(data, index))
+    destination = str(tmp_path / "mix" / "mix.wav")
+    status = complete_upload(base_dir, upload_id, destination)
+
+    assert status["file_hash"] == calculate_file_hash(destination) == hashlib.sha256(data).hexdigest()
+    assert os.listdir(base_dir) == []
+
+
+def test_known_hash_ends_upload_early(client):
+    """Sending the file hash mid-upload returns the stored analysis of an identical file"""
+    data = os.urandom(CHUNK_SIZE * 2)
+    file_hash = hashlib.sha256(data).hexdigest()
+    save_song(filename="mix", original_name="mix.wav", file_path="/tmp/mix.wav", file_hash=file_hash,
+              is_instrumental=False, analysis_json={"frequency_balance": {"balance_score": 80}})
+
+    response = client.post('/upload/chunked', json={"filename": "mix.wav", "size": len(data), "chunk_size": CHUNK_SIZE})
+    assert response.status_code == 201
+    upload_id = response.get_json()["upload_id"]
+
+    response = client.put(f'/upload/chunked/{upload_id}/0', data=chunk(data, 0),
+                          headers={"X-Chunk-SHA256": hashlib.sha256(chunk(data, 0)).hexdigest()})
+    assert response.get_json()["received"] == [0]
+
+    response = client.post(f'/upload/chunked/{upload_id}/hash', json={"file_hash": file_hash})
+    body = response.get_json()
+    assert body["duplicate"] is True
+    assert body["results"]["frequency_balance"]["balance_score"] == 80
+    assert client.get(f'/upload/chunked/{upload_id}').status_code == 404
@@ -0,0 +1,276 @@
+"""
+Integration tests for the database layer on the embedded SQLite backend
+(and on MySQL where MYSQL_TEST_DATABASE names a scratch database)
+"""
+
+import os
+import sys
+import pytest
+import numpy as np
+from datetime import datetime
+from pathlib import Path
+
+# Add the project root to the path
+root_dir = Path(__file__).parent.parent.parent.absolute()
+sys.path.insert(0, str(root_dir))
+
+from app.core.database import (
+    save_song, find_song_by_hash, delete_song, insert_ai_usage_stats,
+    get_ai_usage_stats, rebuild_ai_usage_rollups, SONG_HOT_QUERIES
+)
+from app.core.database import save_song_fingerprint, get_cached_ai_insight, save_cached_ai_insight, get_song_revision
+from app.core.db_utils import get_db_backend, get_db_connection
+from app.core.fingerprint import find_near_duplicate
+from app.core import scoring
+from app.core.reanalysis import rescore_library
+
+# Use the fixtures defined in conftest.py
+
+FILE_HASH = "ab" * 32
+
+
+def sample_results():
+    """Build a small results dictionary shaped like analyze_mix output"""
+    return {
+        "overall_score": 71.0,
+        "clarity": {"clarity_score": 65.5, "analysis": []},
+        "transients": {"transients_score": 50.0, "transient_data": [0.1, 0.2, 0.3]}
+    }
+
+
+def test_sqlite_backend_selected(app):
+    """The test configuration runs against the embedded backend"""
+    assert get_db_backend().name == "sqlite"
+
+
+def test_song_round_trip(app):
+    """A saved song can be found by hash and deleted again"""
+    song_id = save_song("mix.mp3", "My Mix.mp3", "/tmp/mix.mp3", FILE_HASH, False, sample_results())
+    assert song_id is not None
+
+    song = find_song_by_hash(FILE_HASH)
+    assert song["original_name"] == "My Mix.mp3"
+    assert song["analysis"] == sample_results()
+
+    assert delete_song(FILE_HASH)
+    assert find_song_by_hash(FILE_HASH) is None
+
+
+def test_save_song_upserts_on_file_hash(app):
+    """Saving the same file twice updates the existing row instead of adding one"""
+    first_id = save_song("mix", "My Mix.mp3", "/tmp/mix.mp3", FILE_HASH, False, sample_results())
+    updated = dict(sample_results(), overall_score=80.0)
+    second_id = save_song("mix", "My Mix.mp3", "/tmp/mix.mp3", FILE_HASH, True, updated)
+
+    assert first_id == second_id
+    song = find_song_by_hash(FILE_HASH)
+    assert song["analysis"]["overall_score"] == 80.0
+    assert song["is_instrumental"]
+
+    # Deleting by original name resolves through its index to the same row
+    assert delete_song("My Mix.mp3")
+    assert find_song_by_hash(FILE_HASH) is None
+
+
+def test_near_duplicate_lookup(app):
+    """A stored fingerprint is found again; flag or profile mismatches are rejected"""
+    fingerprint = {
+        "hashes": [(value * 7919 % 2 ** 26, value) for value in range(200)],
+        "profile": np.full(24, -30.0, dtype=np.float32),
+        "duration_seconds": 180.0,
+    }
+    save_song("mix", "My Mix.mp3", "/tmp/mix.mp3", FILE_HASH, False, sample_results())
+    assert save_song_fingerprint(FILE_HASH, fingerprint)
+
+    # The same landmarks shifted by a few frames, as after re-encoding
+    copy = dict(fingerprint, hashes=[(value, frame + 3) for value, frame in fingerprint["hashes"][20:]])
+    match_hash, details = find_near_duplicate(copy, is_instrumental=False)
+    assert match_hash == FILE_HASH
+    assert details["match_ratio"] == 1.0
+
+    assert find_near_duplicate(copy, is_instrumental=True) == (None, None)
+    louder = dict(copy, profile=fingerprint["profile"] + 3.0)
+    assert find_near_duplicate(louder, is_instrumental=False) == (None, None)
+
+    # Deleting the song removes its fingerprint as well
+    assert delete_song(FILE_HASH)
+    assert find_near_duplicate(copy) == (None, None)
+
+
+def test_hot_song_queries_use_indexes(app):
+    """None of the lookup or delete queries on songs falls back to a full scan"""
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        for sql in SONG_HOT_QUERIES:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, ("x",) * sql.count("%s"))
+            plan = [row[3] for row in cursor.fetchall()]
+            scans = [step for step in plan if step.startswith("SCAN")]
+            assert not scans, f"Full scan in plan for {sql.strip()}: {plan}"
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def test_hot_song_queries_use_indexes_on_mysql(monkeypatch):
+    """The same queries avoid full scans on MySQL; needs MYSQL_TEST_DATABASE and a reachable server"""
+    from app.core.database import create_tables_if_not_exist
+
+    database = os.environ.get("MYSQL_TEST_DATABASE")
+    if not database:
+        pytest.skip("MYSQL_TEST_DATABASE is not set")
+    monkeypatch.setenv("DB_BACKEND", "mysql")
+    monkeypatch.setenv("MYSQL_DATABASE", database)
+    monkeypatch.setenv("RESULT_CACHE_ENABLED", "false")
+
+    server = get_db_connection(with_database=False)
+    if server is None:
+        pytest.skip("MySQL is not available")
+    server.cursor().execute(f"CREATE DATABASE IF NOT EXISTS {database}")
+    server.close()
+    assert create_tables_if_not_exist()
+
+    connection = get_db_connection()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        for sql in SONG_HOT_QUERIES:
+            cursor.execute("EXPLAIN " + sql, ("x",) * sql.count("%s"))
+            plan = cursor.fetchall()
+            scans = [row for row in plan if row.get("type") == "ALL"]
+            assert not scans, f"Full scan in plan for {sql.strip()}: {plan}"
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def test_ai_usage_rollups(app):
+    """Usage events are rolled up on insert and rebuilt identically from raw rows"""
+    now = datetime.now()
+    rows = [
+        ("openrouter", "model-a", False, 1.0, now, 1200, 300, 1000),
+        ("openrouter", "model-a", True, 3.0, now, 800, 500, None),
+        # Events without token counts are still accepted
+        ("openai", "model-b", True, None, now),
+    ]
+    assert insert_ai_usage_stats(rows)
+
+    stats = get_ai_usage_stats(days=7)
+    by_provider = {row["provider"]: row for row in stats["by_provider"]}
+    assert by_provider["openrouter"]["count"] == 2
+    assert by_provider["openrouter"]["fallback_count"] == 1
+    assert by_provider["openrouter"]["avg_response_time"] == 2.0
+    assert by_provider["openai"]["avg_response_time"] is None
+    assert by_provider["openrouter"]["avg_prompt_tokens"] == 1000
+    assert by_provider["openrouter"]["avg_completion_tokens"] == 400
+    assert by_provider["openrouter"]["cached_token_rate"] == 0.5
+    assert by_provider["openai"]["avg_prompt_tokens"] is None
+    assert sum(entry["count"] for entry in stats["daily"]) == 3
+
+    # Inserting again accumulates into the existing rollup rows
+    assert insert_ai_usage_stats(rows[:1])
+    assert rebuild_ai_usage_rollups(days=7) == 4
+    rebuilt = {row["model"]: row for row in get_ai_usage_stats(days=7)["by_model"]}
+    assert rebuilt["model-a"]["count"] == 3
+    assert rebuilt["model-a"]["prompt_tokens"] == 3200
+    assert rebuilt["model-b"]["count"] == 1
+
+
+def test_ai_insight_cache(app):
+    """Stored insights are returned until they expire or are evicted, and lookups are counted"""
+    insights = {"summary": "Balanced mix", "strengths": ["Clear vocals"]}
+    assert get_cached_ai_insight("a" * 64, 3600) is None
+    assert save_cached_ai_insight("a" * 64, "openai", "gpt-4o", insights, 3600, 10)
+    assert get_cached_ai_insight("a" * 64, 3600) == insights
+    assert get_cached_ai_insight("a" * 64, 0) is None
+
+    # Saving beyond the size limit evicts the least recently used entries
+    assert save_cached_ai_insight("b" * 64, "openai", "gpt-4o", insights, 3600, 1)
+    assert get_cached_ai_insight("a" * 64, 3600) is None
+    assert get_cached_ai_insight("b" * 64, 3600) == insights
+
+    cache_stats = get_ai_usage_stats(days=7)["insight_cache"]
+    assert cache_stats["hits"] == 2
+    assert cache_stats["misses"] == 3
+    assert cache_stats["entries"] == 1
+
+
+def test_ai_insight_cache_evicts_only_the_surplus(app):
+    """Entries sharing a last-use second are not all evicted, and the new one is kept"""
+    insights = {"summary": "Balanced mix"}
+    for key in ("c", "d"):
+        assert save_cached_ai_insight(key * 64, "openai", "gpt-4o", insights, 3600, 10)
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    cursor.execute("UPDATE ai_insight_cache SET last_used_at = %s", (datetime(2030, 1, 1),))
+    connection.commit()
+
+    assert save_cached_ai_insight("e" * 64, "openai", "gpt-4o", insights, 3600, 2)
+    cursor.execute("SELECT cache_key FROM ai_insight_cache ORDER BY cache_key")
+    assert [row[0] for row in cursor.fetchall()] == ["d" * 64, "e" * 64]
+
+    # With room for one entry only, it is the one being saved
+    assert save_cached_ai_insight("0" * 64, "openai", "gpt-4o", insights, 3600, 1)
+    cursor.execute("SELECT cache_key FROM ai_insight_cache")
+    assert [row[0] for row in cursor.fetchall()] == ["0" * 64]
+    cursor.close()
+    connection.close()
+
+
+def test_library_rescoring(app, monkeypatch):
+    """A weight change is applied to every stored song without touching the payloads"""
+    band_energy = {"sub_bass": 40.0, "bass": 100.0, "low_mids": 70.0, "mids": 55.0, "high_mids": 30.0, "highs": 10.0, "air": 0.0}
+    for index, is_instrumental in enumerate([False, True]):
+        results = {"frequency_balance": {"band_energy": band_energy}, "dynamic_range": {"dynamic_range_score": 40.0 + index}}
+        results = scoring.rescore_results(results, is_instrumental)
+        save_song(f"mix{index}", "Mix.mp3", "/tmp/mix.mp3", f"{index}" * 64, is_instrumental, results)
+
+    # Rows stored before score inputs existed are backfilled first
+    connection = get_db_connection()
+    connection.cursor().execute("UPDATE songs SET score_inputs = NULL WHERE file_hash = %s", ("1" * 64,))
+    connection.commit()
+    connection.close()
+
+    assert rescore_library(dry_run=True)["changed"] == 0
+    before = find_song_by_hash("0" * 64)["analysis"]["overall_score"]
+    revisions = [get_song_revision(f"{index}" * 64) for index in range(2)]
+
+    monkeypatch.setitem(scoring.OVERALL_WEIGHTS, "dynamic_range", 0.5)
+    report = rescore_library(batch_size=1)
+    assert report == {"songs": 2, "changed": 2, "updated": 2}
+
+    for index, is_instrumental in enumerate([False, True]):
+        song = find_song_by_hash(f"{index}" * 64)
+        assert song["analysis"]["overall_score"] == scoring.calculate_overall_score(song["analysis"])
+    assert song["analysis"]["overall_score"] != before
+
+    # The updated rows get new revisions, which the analyze ETag is built from
+    assert all(get_song_revision(f"{index}" * 64) > revision for index, revision in enumerate(revisions))
+
+
+def test_duplicate_rows_block_the_unique_key_until_deduped(app):
+    """Startup never deletes duplicate rows; the dedupe script keeps the newest one"""
+    from app.core.database import create_tables_if_not_exist
+    from scripts.dedupe_songs import dedupe_songs
+
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    cursor.execute("DROP INDEX idx_songs_file_hash_unique")
+    for overall_score in (60.0, 70.0):
+        cursor.execute("INSERT INTO songs (filename, file_hash, overall_score) VALUES (%s, %s, %s)",
+                       ("mix", FILE_HASH, overall_score))
+    connection.commit()
+
+    create_tables_if_not_exist()
+    cursor.execute("SELECT id, overall_score FROM songs WHERE file_hash = %s ORDER BY id", (FILE_HASH,))
+    rows = cursor.fetchall()
+    assert [row[1] for row in rows] == [60.0, 70.0]
+    assert "idx_songs_file_hash_unique" not in get_db_backend().index_names(connection, 'songs')
+
+    assert dedupe_songs(dry_run=True) == [rows[0][0]]
+    assert dedupe_songs() == [rows[0][0]]
+    create_tables_if_not_exist()
+    cursor.execute("SELECT overall_score FROM songs WHERE file_hash = %s", (FILE_HASH,))
+    assert cursor.fetchall() == [(70.0,)]
+    assert "idx_songs_file_hash_unique" in get_db_backend().index_names(connection, 'songs')
+    cursor.close()
+    connection.close()
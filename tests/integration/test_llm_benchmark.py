@@ -0,0 +1,52 @@
+"""
+Integration tests for the AI benchmark harness and its mock provider servers
+"""
+
+import sys
+import pytest
+from pathlib import Path
+
+# Add the project root to the path
+root_dir = Path(__file__).parent.parent.parent.absolute()
+sys.path.insert(0, str(root_dir))
+
+from app.core.llm_clients import reset_llm_clients
+from app.core.llm_router import reset_provider_health
+from scripts.benchmarks.mock_llm_server import MockLLMConfig, MockLLMServer
+from scripts.benchmarks.benchmark_ai import run_benchmark
+
+
+@pytest.fixture
+def mock_providers(app, monkeypatch):
+    """A failing mock OpenAI and a healthy mock OpenRouter"""
+    servers = {
+        # 400 is not retried by the SDK, so every request fails exactly once
+        "openai": MockLLMServer(MockLLMConfig("openai", latency=0.05, error_rate=1.0, error_status=400)),
+        "openrouter": MockLLMServer(MockLLMConfig("openrouter", latency=0.05)),
+    }
+    for provider, server in servers.items():
+        monkeypatch.setenv(f"{provider.upper()}_BASE_URL", server.start())
+        monkeypatch.setenv(f"{provider.upper()}_API_KEY", "mock-key")
+    monkeypatch.setenv("AI_PROVIDER", "openai")
+    monkeypatch.setenv("SKIP_AI_ANALYSIS", "false")
+    monkeypatch.setenv("AI_INSIGHT_CACHE_ENABLED", "false")
+    reset_llm_clients()
+    reset_provider_health()
+    yield servers
+
+    reset_llm_clients()
+    reset_provider_health()
+    for server in servers.values():
+        server.stop()
+
+
+def test_failing_primary_falls_back(mock_providers):
+    """Every answer comes from the secondary when the primary always fails"""
+    report = run_benchmark(requests=6, concurrency=3, primary="openai", seed=1)
+
+    assert report["answered"] == 6
+    assert report["answers_by_provider"] == {"openai": 0, "openrouter": 6}
+    assert report["fallback_rate"] == 1.0
+    assert report["latency"]["p50"] is not None
+    assert mock_providers["openai"].get_stats()["errors"] >= 1
+    assert report["usage"]["openrouter"]["avg_prompt_tokens"] > 0
@@ -0,0 +1,171 @@
+"""
+Integration tests for the pooled AI provider clients against a local stub server
+"""
+
+import sys
+import json
+import threading
+import pytest
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+# Add the project root to the path
+root_dir = Path(__file__).parent.parent.parent.absolute()
+sys.path.insert(0, str(root_dir))
+
+from app.core.llm_clients import get_llm_client, get_llm_client_metrics, reset_llm_clients
+from app.core.openai_analyzer import analyze_with_openai
+
+STUB_RESPONSE = "Summary: Solid mix.\n\nStrengths:\n- Punchy drums\n\nWeaknesses:\n- Muddy low mids"
+STUB_USAGE = {"prompt_tokens": 50, "completion_tokens": 20, "total_tokens": 70, "prompt_tokens_details": {"cached_tokens": 32}}
+
+
+class StubCompletionsHandler(BaseHTTPRequestHandler):
+    """Answers chat completion requests like the OpenAI API, with keep-alive"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        if request.get("stream"):
+            self.stream_response(request.get("stream_options", {}).get("include_usage"))
+            return
+        body = json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "stub-model",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": STUB_RESPONSE},
+                "finish_reason": "stop"
+            }],
+            "usage": STUB_USAGE
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_response(self, include_usage=False):
+        """Send the answer as server-sent chunks, one line at a time"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for line in STUB_RESPONSE.splitlines(keepends=True):
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": "stub-model",
+                "choices": [{"index": 0, "delta": {"content": line}, "finish_reason": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        if include_usage:
+            chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": 0,
+                     "model": "stub-model", "choices": [], "usage": STUB_USAGE}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    """Run a stub provider and point the OpenAI client at it"""
+    server = HTTPServer(("127.0.0.1", 0), StubCompletionsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1")
+    reset_llm_clients()
+    yield server
+
+    reset_llm_clients()
+    server.shutdown()
+    server.server_close()
+
+
+def test_requests_reuse_one_connection(stub_server):
+    """Consecutive requests share the pooled client and its keep-alive connection"""
+    first = analyze_with_openai("system", "user")
+    second = analyze_with_openai("system", "user")
+
+    assert first["summary"] == "Solid mix."
+    assert second["strengths"] == ["Punchy drums"]
+    assert get_llm_client("openai", "test-key") is get_llm_client("openai", "test-key")
+
+    metrics = get_llm_client_metrics()["openai"]
+    assert metrics["requests"] == 2
+    assert metrics["connections_opened"] == 1
+    assert metrics["reused_connections"] == 1
+    assert metrics["errors"] == 0
+    assert metrics["avg_response_time"] > 0
+
+
+def test_client_rebuilt_when_key_changes(stub_server):
+    """A new API key gets a new client instead of the cached one"""
+    client = get_llm_client("openai", "test-key")
+    assert get_llm_client("openai", "other-key") is not client
+
+
+def test_streamed_sections_arrive_in_order(stub_server):
+    """A streamed answer reports each section and parses like a complete one"""
+    sections = []
+    usage = {}
+    result = analyze_with_openai("system", "user", on_section=lambda key, value: sections.append((key, value)),
+                                 usage=usage)
+
+    assert sections[0] == ("summary", "Solid mix.")
+    assert [key for key, _ in sections[:3]] == ["summary", "strengths", "weaknesses"]
+    assert result == analyze_with_openai("system", "user")
+    # Token counts arrive in the last chunk of the stream
+    assert usage == {"prompt_tokens": 50, "completion_tokens": 20, "cached_tokens": 32}
+
+
+def test_cancelled_request_is_aborted(monkeypatch):
+    """Cancelling a running request closes its response instead of waiting for the answer"""
+    import time
+    from app.core.llm_router import CancelToken, RequestCancelled
+    from scripts.benchmarks.mock_llm_server import MockLLMConfig, MockLLMServer
+
+    server = MockLLMServer(MockLLMConfig("slow", latency=10.0, first_token_share=0.02))
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_BASE_URL", server.start())
+    reset_llm_clients()
+    try:
+        token = CancelToken()
+        outcome = []
+
+        def request():
+            try:
+                # No on_section: the caller does not want the answer streamed
+                outcome.append(analyze_with_openai("system", "user", cancel_token=token))
+            except Exception as e:
+                outcome.append(e)
+
+        thread = threading.Thread(target=request)
+        thread.start()
+        time.sleep(0.8)
+        cancelled_at = time.monotonic()
+        token.cancel()
+        thread.join(3)
+
+        assert not thread.is_alive()
+        assert time.monotonic() - cancelled_at < 2
+        assert isinstance(outcome[0], RequestCancelled)
+
+        # The server sees the connection dropped before the answer is complete
+        deadline = time.monotonic() + 3
+        while server.get_stats()["disconnects"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert server.get_stats()["disconnects"] == 1
+    finally:
+        reset_llm_clients()
+        server.stop()
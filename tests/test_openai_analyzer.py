@@ -4,7 +4,18 @@ import os
 # Add the parent directory to the path to import app modules
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app.core.openai_analyzer import parse_response
+from app.core.openai_analyzer import (
+    parse_response, insight_cache_key, SectionStreamParser, create_prompt, prompt_metrics, count_tokens, SYSTEM_PROMPT
+)
+
+def prompt_results(score, centroid=2100.4):
+    """Build the analysis sections create_prompt reads"""
+    return {
+        "frequency_balance": {"balance_score": score, "band_energy": {"bass": 31.24, "mids": 40.0}, "analysis": ["Heavy bass."]},
+        "dynamic_range": {"dynamic_range_score": 60.0, "dynamic_range_db": 9.5, "crest_factor_db": 12.1, "plr": 10.2, "analysis": []},
+        "stereo_field": {"width_score": 70.0, "phase_score": 90.0, "correlation": 0.61, "mid_ratio": 0.7, "side_ratio": 0.3, "analysis": []},
+        "clarity": {"clarity_score": 75.0, "spectral_contrast": 20.1, "spectral_flatness": 0.012, "spectral_centroid": centroid, "analysis": []},
+    }
 
 def test_parse_response_with_empty_sections():
     """Test parse_response with a response that has empty sections or missing markers"""
@@ -58,8 +69,65 @@ def test_parse_response_with_partial_data():
     assert result["genre_context"] == ""  # Empty for optional missing sections
     assert result["subgenre_context"] == ""  # Empty for optional missing sections
 
+def test_insight_cache_key_is_canonical():
+    """Analyses equal after quantization share a key; the flag, provider and model do not"""
+    def metrics(score, centroid, is_instrumental=True):
+        return prompt_metrics(prompt_results(score, centroid), is_instrumental)
+
+    key = insight_cache_key("openai", "gpt-4o", metrics(71.02, 2100.4))
+    assert key == insight_cache_key("openai", "gpt-4o", metrics(70.8, 2130.0))
+    assert key != insight_cache_key("openai", "gpt-4o", metrics(72.0, 2100.4))
+    assert key != insight_cache_key("openai", "gpt-4o", metrics(71.02, 2200.0))
+    assert key != insight_cache_key("openai", "gpt-4o", metrics(71.02, 2100.4, is_instrumental=False))
+    assert key != insight_cache_key("openai", "gpt-4o-mini", metrics(71.02, 2100.4))
+    assert key != insight_cache_key("openrouter", "gpt-4o", metrics(71.02, 2100.4))
+
+    # Analyses sharing a key get the same prompt
+    assert create_prompt(prompt_results(71.02, 2100.4), True) == create_prompt(prompt_results(70.8, 2130.0), True)
+
+def test_section_stream_parser_matches_full_parse():
+    """Sections complete when the next header arrives and match parse_response"""
+    response = (
+        "1. Summary: A warm, balanced mix.\n\n"
+        "Genre Context: Modern indie pop.\n\n"
+        "Strengths:\n- Clear vocals\n- Tight low end\n\n"
+        "Areas for Improvement:\n- Harsh cymbals\n\n"
+        "Suggestions:\n- Cut 6 kHz by 2 dB\n"
+    )
+    parser = SectionStreamParser()
+    completed = []
+    summary_done_at = None
+    for position, char in enumerate(response):
+        completed += parser.feed(char)
+        if summary_done_at is None and completed:
+            summary_done_at = position
+
+    # The summary is known as soon as the genre header line is complete
+    assert completed[0] == ("summary", "A warm, balanced mix.")
+    assert summary_done_at == response.index("Strengths") - 2
+    assert [key for key, _ in completed] == ["summary", "genre_context", "strengths", "weaknesses"]
+
+    result, remaining = parser.finish()
+    assert result == parse_response(response)
+    assert dict(completed + remaining) == result
+
+def test_create_prompt_is_compact_and_stable():
+    """The system prompt never changes and the metrics fit in a few short lines"""
+    system_prompt, user_message = create_prompt(prompt_results(71.02), is_instrumental=True)
+    assert system_prompt is SYSTEM_PROMPT
+    assert create_prompt(prompt_results(55.0), is_instrumental=False)[0] == system_prompt
+    assert "frequency_balance: score=71 bass=31 mids=40" in user_message
+    assert "frequency_balance notes: Heavy bass." in user_message
+    assert "stereo_field: width_score=70 phase_score=90 correlation=0.6 mid_side_pct=70/30" in user_message
+    assert "clarity: score=75 contrast=20.0 flatness=0.01 centroid_hz=2100" in user_message
+    assert user_message.endswith("track: instrumental")
+    assert count_tokens(user_message) < 150
+
 if __name__ == "__main__":
     # Run tests directly
     test_parse_response_with_empty_sections()
     test_parse_response_with_partial_data()
-    print("All tests passed!") 
\ No newline at end of file
+    test_insight_cache_key_is_canonical()
+    test_section_stream_parser_matches_full_parse()
+    test_create_prompt_is_compact_and_stable()
+    print("All tests passed!")
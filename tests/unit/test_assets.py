@@ -0,0 +1,44 @@
+"""
+Unit tests for fingerprinted static assets
+"""
+
+import os
+import sys
+import shutil
+from pathlib import Path
+
+# Add the project root to the path
+root_dir = Path(__file__).parent.parent.parent.absolute()
+sys.path.insert(0, str(root_dir))
+
+from app.assets import build_assets, load_manifest, BUNDLES
+
+STATIC_DIR = root_dir / "app" / "static"
+
+
+def test_build_writes_hashed_files_and_bundles(tmp_path):
+    """Every asset and bundle gets a content-hashed copy listed in the manifest"""
+    for asset_dir in ("js", "css"):
+        shutil.copytree(STATIC_DIR / asset_dir, tmp_path / asset_dir)
+
+    manifest = build_assets(str(tmp_path), minified=False)
+
+    assert load_manifest(str(tmp_path)) == manifest
+    assert set(manifest["bundles"]) == set(BUNDLES)
+    hashed = manifest["files"]["css/styles.css"]
+    assert hashed.startswith("dist/css/styles.") and hashed != "dist/css/styles.css"
+    assert (tmp_path / hashed).read_bytes() == (tmp_path / "css" / "styles.css").read_bytes()
+
+    bundle = (tmp_path / manifest["bundles"]["about.css"]).read_text(encoding="utf-8")
+    for name in BUNDLES["about.css"]:
+        assert (tmp_path / name).read_text(encoding="utf-8") in bundle
+
+    # The same content builds to the same names; changed content to new ones
+    assert build_assets(str(tmp_path), minified=False) == manifest
+    with open(tmp_path / "css" / "modal.css", "a", encoding="utf-8") as f:
+        f.write("\n.changed { color: red; }\n")
+    rebuilt = build_assets(str(tmp_path), minified=False)
+    assert rebuilt["files"]["css/modal.css"] != manifest["files"]["css/modal.css"]
+    assert rebuilt["bundles"]["about.css"] != manifest["bundles"]["about.css"]
+    assert rebuilt["files"]["css/styles.css"] == manifest["files"]["css/styles.css"]
+    assert not os.path.exists(tmp_path / manifest["files"]["css/modal.css"])
@@ -0,0 +1,49 @@
+"""
+Unit tests for the canonical copies of uploads
+"""
+
+import os
+import sys
+import shutil
+from pathlib import Path
+
+import numpy as np
+import librosa
+
+# Add the project root to the path
+root_dir = Path(__file__).parent.parent.parent.absolute()
+sys.path.insert(0, str(root_dir))
+
+from app.core.canonical_audio import canonicalize_upload, find_canonical, load_audio, get_audio_duration
+
+AUDIO_PATH = str(root_dir / "tests" / "audio" / "test_stereo.wav")
+
+
+def test_canonical_copies_load_like_the_original(tmp_path):
+    """Both formats give the samples librosa decodes from the upload, and a newer upload makes them stale"""
+    file_path = str(tmp_path / "mix.mp3")
+    shutil.copy(AUDIO_PATH, file_path)
+    original, sr = librosa.load(file_path, sr=None, mono=False)
+    excerpt, _ = librosa.load(file_path, sr=11025, mono=True, duration=1.0)
+
+    for audio_format in ("f32", "flac"):
+        report = canonicalize_upload(file_path, audio_format)
+        assert find_canonical(file_path) == (report["path"], audio_format)
+        assert report["canonical_bytes"] == os.path.getsize(report["path"])
+
+        y, loaded_sr = load_audio(file_path)
+        assert loaded_sr == sr and y.shape == original.shape
+        # The test file has 16-bit samples, which FLAC's 24 bits hold exactly
+        assert np.allclose(y, original, atol=1e-6)
+
+        y, _ = load_audio(file_path, sr=11025, mono=True, duration=1.0)
+        assert np.allclose(y, excerpt, atol=1e-6)
+        assert get_audio_duration(file_path) == librosa.get_duration(path=file_path)
+
+    # Only the last format is kept
+    assert sorted(os.listdir(tmp_path)) == ["mix.canonical.flac", "mix.mp3"]
+
+    # A file saved later under the same name is read, not the old copy
+    later = os.stat(report["path"]).st_mtime_ns + 1_000_000
+    os.utime(file_path, ns=(later, later))
+    assert find_canonical(file_path) == (None, None)
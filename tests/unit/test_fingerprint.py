@@ -0,0 +1,71 @@
+"""
+Unit tests for the near-duplicate audio fingerprints
+"""
+
+import sys
+import numpy as np
+import pytest
+import soundfile as sf
+from pathlib import Path
+
+# Add the project root to the path
+root_dir = Path(__file__).parent.parent.parent.absolute()
+sys.path.insert(0, str(root_dir))
+
+from app.core.fingerprint import compute_fingerprint, score_matches, get_fingerprint_settings
+
+
+def synthetic_mix(seed, seconds=12, sr=44100):
+    """Build a deterministic signal of decaying tones over a noise floor"""
+    generator = np.random.default_rng(seed)
+    t = np.arange(int(sr * seconds)) / sr
+    y = 0.01 * generator.normal(size=len(t))
+    for _ in range(60):
+        start = generator.uniform(0, seconds - 1)
+        frequency = generator.uniform(100, 4000)
+        mask = (t >= start) & (t < start + generator.uniform(0.1, 0.6))
+        y[mask] += 0.2 * np.sin(2 * np.pi * frequency * t[mask]) * np.exp(-(t[mask] - start) * 4)
+    return y, sr
+
+
+@pytest.fixture(scope="module")
+def fingerprints(tmp_path_factory):
+    """Fingerprint a mix, a transcoded copy, a louder re-export and another mix"""
+    folder = tmp_path_factory.mktemp("fingerprints")
+    y, sr = synthetic_mix(seed=1)
+    other, _ = synthetic_mix(seed=2)
+
+    sf.write(str(folder / "mix.wav"), y, sr, subtype="PCM_16")
+    sf.write(str(folder / "mix.mp3"), y, sr, format="MP3")
+    sf.write(str(folder / "louder.wav"), y * 1.6, sr, subtype="PCM_16")
+    sf.write(str(folder / "other.wav"), other, sr, subtype="PCM_16")
+
+    files = {"mix": "mix.wav", "mp3": "mix.mp3", "louder": "louder.wav", "other": "other.wav"}
+    return {name: compute_fingerprint(str(folder / filename)) for name, filename in files.items()}
+
+
+def best_ratio(query, stored):
+    """Share of the query landmarks that line up with a stored fingerprint"""
+    ranked = score_matches(query["hashes"], [("stored", value, frame) for value, frame in stored["hashes"]])
+    return ranked[0][1] / len(query["hashes"]) if ranked else 0.0
+
+
+def test_transcoded_copy_matches(fingerprints):
+    """An MP3 of the same master lines up and has the same band profile"""
+    settings = get_fingerprint_settings()
+    assert best_ratio(fingerprints["mp3"], fingerprints["mix"]) >= settings["min_ratio"]
+    profile_diff = np.max(np.abs(fingerprints["mp3"]["profile"] - fingerprints["mix"]["profile"]))
+    assert profile_diff <= settings["max_profile_diff_db"]
+
+
+def test_level_change_is_a_different_mix(fingerprints):
+    """A louder re-export shares its landmarks but not its band profile"""
+    settings = get_fingerprint_settings()
+    assert best_ratio(fingerprints["louder"], fingerprints["mix"]) >= settings["min_ratio"]
+    profile_diff = np.max(np.abs(fingerprints["louder"]["profile"] - fingerprints["mix"]["profile"]))
+    assert profile_diff > settings["max_profile_diff_db"]
+
+
+def test_unrelated_mix_does_not_match(fingerprints):
+    """Landmarks of unrelated material do not line up"""
+    assert best_ratio(fingerprints["other"], fingerprints["mix"]) < 0.05
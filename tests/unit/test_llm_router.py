@@ -0,0 +1,137 @@
+"""
+Unit tests for hedged AI provider routing and circuit breakers
+"""
+
+import sys
+import time
+import threading
+import pytest
+from pathlib import Path
+
+# Add the project root to the path
+root_dir = Path(__file__).parent.parent.parent.absolute()
+sys.path.insert(0, str(root_dir))
+
+from app.core import llm_router
+from app.core.llm_router import ProviderHealth, route_request
+
+
+@pytest.fixture
+def providers(monkeypatch):
+    """Register two providers whose recent p90 latency is 0.1 seconds"""
+    monkeypatch.setenv("LLM_HEDGE_MIN_DELAY", "0.05")
+    monkeypatch.setenv("LLM_REQUEST_DEADLINE", "5")
+    llm_router.reset_provider_health()
+    for name in ("slow", "fast"):
+        health = ProviderHealth()
+        for _ in range(20):
+            health.record_success(0.1)
+        llm_router._health[name] = health
+    yield llm_router._health
+    llm_router.reset_provider_health()
+
+
+def test_slow_primary_is_hedged(providers):
+    """A primary slower than its p90 is raced against the next provider"""
+    def call(provider, timeout, cancel_token):
+        if provider == "slow":
+            time.sleep(1.0)
+        return provider
+
+    started = time.monotonic()
+    assert route_request(["slow", "fast"], call, max_hedge_delay=30) == ("fast", "fast")
+    assert time.monotonic() - started < 0.8
+
+
+def test_failed_primary_falls_back_immediately(providers):
+    """An error from the primary sends the request on without waiting"""
+    def call(provider, timeout, cancel_token):
+        if provider == "slow":
+            raise ConnectionError("boom")
+        return provider
+
+    assert route_request(["slow", "fast"], call, max_hedge_delay=30) == ("fast", "fast")
+
+
+def test_circuit_opens_and_admits_one_trial():
+    """Consecutive failures open the circuit until a trial after the cooldown"""
+    health = ProviderHealth(failure_threshold=3, cooldown=60)
+    for _ in range(3):
+        health.record_failure(now=100.0)
+
+    assert not health.allow_request(now=130.0)
+    assert health.allow_request(now=161.0)
+    assert not health.allow_request(now=162.0)
+
+    # A failed trial reopens the circuit; a successful one closes it
+    health.record_failure(now=162.0)
+    assert not health.allow_request(now=200.0)
+    assert health.allow_request(now=223.0)
+    health.record_success(2.0)
+    assert health.stats()["circuit"] == "closed"
+
+
+def test_all_circuits_open_raises(providers):
+    """No request is sent while every provider is circuit-broken"""
+    for health in providers.values():
+        for _ in range(3):
+            health.record_failure()
+
+    with pytest.raises(RuntimeError):
+        route_request(["slow", "fast"], lambda provider, timeout, cancel_token: provider, max_hedge_delay=30)
+
+
+def test_cancelled_trial_admits_another(providers):
+    """A half-open trial that loses the race does not keep the circuit closed off"""
+    slow = providers["slow"]
+    for _ in range(3):
+        slow.record_failure(now=100.0)
+    slow.opened_at = time.monotonic() - slow.cooldown - 1
+
+    def call(provider, timeout, cancel_token):
+        if provider == "slow":
+            raise llm_router.RequestCancelled("answer no longer needed")
+        time.sleep(0.3)
+        return provider
+
+    assert route_request(["fast", "slow"], call, max_hedge_delay=0.05) == ("fast", "fast")
+    deadline = time.monotonic() + 2
+    while slow.trial_in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert slow.stats()["circuit"] == "open"
+    assert slow.stats()["recent_requests"] == 23
+    assert slow.allow_request()
+
+
+def test_losing_request_is_aborted(providers):
+    """The slower request is cancelled as soon as the other provider answers"""
+    aborted = threading.Event()
+
+    def call(provider, timeout, cancel_token):
+        if provider == "slow":
+            cancel_token.on_cancel(aborted.set)
+            if cancel_token.event.wait(5):
+                raise llm_router.RequestCancelled("answer no longer needed")
+            return provider
+        time.sleep(0.2)
+        return provider
+
+    started = time.monotonic()
+    assert route_request(["slow", "fast"], call, max_hedge_delay=0.05) == ("fast", "fast")
+    assert aborted.wait(1)
+    assert time.monotonic() - started < 1.5
+
+
+def test_requests_are_aborted_at_the_deadline(providers, monkeypatch):
+    """Nothing keeps running once the deadline has passed"""
+    monkeypatch.setenv("LLM_REQUEST_DEADLINE", "0.3")
+    tokens = []
+
+    def call(provider, timeout, cancel_token):
+        tokens.append(cancel_token)
+        cancel_token.event.wait(5)
+        raise llm_router.RequestCancelled("answer no longer needed")
+
+    with pytest.raises(RuntimeError):
+        route_request(["slow", "fast"], call, max_hedge_delay=0.05)
+    assert len(tokens) == 2 and all(token.cancelled() for token in tokens)
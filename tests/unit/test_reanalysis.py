@@ -0,0 +1,50 @@
+"""
+Unit tests for partial re-analysis of outdated result sections
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+root_dir = Path(__file__).parent.parent.parent.absolute()
+sys.path.insert(0, str(root_dir))
+
+from app.core.analyzer_versions import ANALYZER_VERSION, SECTION_VERSIONS, stale_sections
+from app.core.reanalysis import refresh_stale_sections
+
+AUDIO_PATH = str(root_dir / "tests" / "audio" / "test_stereo.wav")
+
+
+def stored_results(**outdated):
+    """Results stamped with the current versions except the given sections"""
+    return {
+        "overall_score": 50.0,
+        "dynamic_range": {"dynamic_range_score": -1.0},
+        "clarity": {"clarity_score": 42.0},
+        "section_versions": dict(SECTION_VERSIONS, **outdated),
+        "analyzer_version": "old"
+    }
+
+
+def test_only_outdated_sections_are_recomputed():
+    """A bumped analyzer recomputes its own section and the overall score, nothing else"""
+    results = stored_results(dynamic_range=0)
+    assert stale_sections(results) == ["dynamic_range"]
+
+    refreshed, recomputed = refresh_stale_sections(results, AUDIO_PATH)
+
+    assert recomputed == ["dynamic_range"]
+    assert refreshed["dynamic_range"]["dynamic_range_score"] >= 0
+    assert refreshed["clarity"] == {"clarity_score": 42.0}
+    assert refreshed["section_versions"] == SECTION_VERSIONS
+    assert refreshed["analyzer_version"] == ANALYZER_VERSION
+    assert results["dynamic_range"]["dynamic_range_score"] == -1.0
+
+
+def test_score_refresh_needs_no_audio():
+    """A new scoring version is applied from the stored sections alone"""
+    refreshed, recomputed = refresh_stale_sections(stored_results(overall_score=0), "/missing.wav")
+
+    assert recomputed == ["overall_score"]
+    assert refreshed["overall_score"] != 50.0
+    assert not stale_sections(refreshed)
@@ -0,0 +1,125 @@
+"""
+Unit tests for the two-tier result cache
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+root_dir = Path(__file__).parent.parent.parent.absolute()
+sys.path.insert(0, str(root_dir))
+
+from app.core import result_cache
+from app.core.result_cache import MemoryResultCache, ResultCache
+
+
+def test_memory_cache_evicts_least_recently_used_by_bytes():
+    """The memory tier stays under its byte budget by evicting old entries"""
+    cache = MemoryResultCache(max_bytes=100)
+    cache.put("a", {"v": 1}, 40)
+    cache.put("b", {"v": 2}, 40)
+    assert cache.get("a") == {"v": 1}  # "a" is now most recently used
+
+    cache.put("c", {"v": 3}, 40)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.current_bytes == 80
+
+    # Values larger than the whole budget are never stored
+    cache.put("huge", {"v": 4}, 500)
+    assert cache.get("huge") is None
+
+
+def test_shared_tier_is_visible_to_other_workers(tmp_path):
+    """A value stored by one worker is served by another from the shared tier"""
+    path = str(tmp_path / "cache.sqlite3")
+    worker_a = ResultCache(1024 * 1024, path, 1024 * 1024)
+    worker_b = ResultCache(1024 * 1024, path, 1024 * 1024)
+
+    worker_a.put("hash1", {"analysis": {"overall_score": 80.0}})
+    assert worker_b.get("hash1") == {"analysis": {"overall_score": 80.0}}
+    assert worker_b.get("hash1") is not None
+    assert worker_b.get("missing") is None
+
+    stats = worker_b.stats()
+    assert stats["shared_hits"] == 1
+    assert stats["memory_hits"] == 1
+    assert stats["misses"] == 1
+    assert abs(stats["hit_ratio"] - 2 / 3) < 1e-9
+
+
+def test_invalidation_reaches_other_workers(tmp_path, monkeypatch):
+    """Deleting a song in one worker evicts it from the memory tier of the others"""
+    monkeypatch.setattr(result_cache, "INVALIDATION_SYNC_INTERVAL", 0)
+    path = str(tmp_path / "cache.sqlite3")
+    worker_a = ResultCache(1024 * 1024, path, 1024 * 1024)
+    worker_b = ResultCache(1024 * 1024, path, 1024 * 1024)
+
+    worker_a.put("hash1", {"analysis": {}})
+    assert worker_b.get("hash1") is not None
+
+    worker_a.invalidate("hash1")
+    assert worker_b.get("hash1") is None
+
+
+def test_process_cache_follows_its_configuration(tmp_path, monkeypatch):
+    """A new cache path gives a new cache instead of the entries stored for the old one"""
+    monkeypatch.setenv("RESULT_CACHE_PATH", str(tmp_path / "first.sqlite3"))
+    first = result_cache.get_result_cache()
+    assert result_cache.get_result_cache() is first
+    first.put("hash1", {"analysis": {}})
+
+    monkeypatch.setenv("RESULT_CACHE_PATH", str(tmp_path / "second.sqlite3"))
+    second = result_cache.get_result_cache()
+    assert second is not first
+    assert second.get("hash1") is None
+
+
+def test_entries_expire_after_the_max_age(tmp_path, monkeypatch):
+    """A write that bypassed invalidation is served from the cache for at most max_age seconds"""
+    clock = [1000.0]
+    monkeypatch.setattr(result_cache.time, "time", lambda: clock[0])
+    path = str(tmp_path / "cache.sqlite3")
+    worker_a = ResultCache(1024 * 1024, path, 1024 * 1024, max_age=60)
+    worker_b = ResultCache(1024 * 1024, path, 1024 * 1024, max_age=60)
+
+    worker_a.put("hash1", {"analysis": {}})
+    clock[0] += 30
+    assert worker_b.get("hash1") is not None
+
+    # The memory copy of worker_b expires with the shared entry it was read from
+    clock[0] += 31
+    assert worker_a.get("hash1") is None
+    assert worker_b.get("hash1") is None
+    assert worker_b.shared.usage()["entries"] == 0
+
+
+def test_default_path_depends_on_the_database(tmp_path, monkeypatch):
+    """Apps using different databases on one node get separate shared tiers"""
+    monkeypatch.delenv("RESULT_CACHE_PATH", raising=False)
+    monkeypatch.setenv("DB_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "first.sqlite3"))
+    first = result_cache.default_shared_path()
+    assert result_cache.default_shared_path() == first
+
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "second.sqlite3"))
+    assert result_cache.default_shared_path() != first
+
+    monkeypatch.setenv("DB_BACKEND", "mysql")
+    monkeypatch.setenv("MYSQL_DATABASE", "staging")
+    staging = result_cache.default_shared_path()
+    monkeypatch.setenv("MYSQL_DATABASE", "production")
+    assert result_cache.default_shared_path() != staging
+
+
+def test_corrupt_shared_entries_are_misses(tmp_path):
+    """A damaged shared entry is dropped and read from the database instead of failing the lookup"""
+    path = str(tmp_path / "cache.sqlite3")
+    worker_a = ResultCache(1024 * 1024, path, 1024 * 1024)
+    worker_b = ResultCache(1024 * 1024, path, 1024 * 1024)
+
+    worker_a.put("hash1", {"analysis": {}})
+    worker_a.shared._connection().execute("UPDATE results SET value = ? WHERE cache_key = ?", (b"torn", "hash1"))
+    assert worker_b.get("hash1") is None
+    assert worker_b.stats()["misses"] == 1
+    assert worker_b.shared.usage()["entries"] == 0
@@ -0,0 +1,91 @@
+"""
+Unit tests for the compact storage encoding of analysis results
+"""
+
+import json
+import sys
+import pytest
+from pathlib import Path
+
+# Add the project root to the path
+root_dir = Path(__file__).parent.parent.parent.absolute()
+sys.path.insert(0, str(root_dir))
+
+from app.core.result_storage import (
+    build_summary, split_heavy_arrays, encode_results, decode_results, PAYLOAD_ENCODING
+)
+
+
+def sample_results():
+    """Build a results dictionary shaped like analyze_mix output"""
+    return {
+        "overall_score": 78.4,
+        "duration_seconds": 184.2,
+        "analysis_time_seconds": 12.5,
+        "frequency_balance": {
+            "band_energy": {"sub_bass": 61.0, "bass": 88.2, "mids": 70.1},
+            "balance_score": 81.3,
+            "analysis": ["Frequency balance appears well suited for music with vocals."] * 3
+        },
+        "dynamic_range": {"dynamic_range_score": 64.0, "dynamic_range_db": 12.8, "analysis": []},
+        "stereo_field": {"width_score": 90.5, "phase_score": 80.0, "analysis": []},
+        "clarity": {"clarity_score": 72.2, "analysis": []},
+        "harmonic_content": {"key": "Am", "analysis": ["Detected key is Am."]},
+        "transients": {
+            "transients_score": 66.0,
+            "analysis": [],
+            "transient_data": [i / 100 for i in range(100)]
+        }
+    }
+
+
+def test_build_summary():
+    """Summary columns are taken from the matching result sections"""
+    summary = build_summary(sample_results())
+    assert summary["overall_score"] == 78.4
+    assert summary["frequency_balance_score"] == 81.3
+    assert summary["stereo_width_score"] == 90.5
+    assert summary["musical_key"] == "Am"
+    assert summary["duration_seconds"] == 184.2
+
+    # Missing sections produce NULL columns instead of errors
+    assert build_summary({})["clarity_score"] is None
+
+
+def test_split_heavy_arrays_does_not_mutate_input():
+    """Heavy arrays are moved out without touching the original dictionary"""
+    results = sample_results()
+    light, arrays = split_heavy_arrays(results)
+    assert "transient_data" not in light["transients"]
+    assert len(arrays["transients.transient_data"]) == 100
+    assert "transient_data" in results["transients"]
+
+
+def test_encode_decode_round_trip():
+    """Decoding the stored blobs restores the original results"""
+    results = sample_results()
+    summary, payload, arrays_blob = encode_results(results)
+
+    assert decode_results(payload, arrays_blob) == results
+    assert len(payload) < len(json.dumps(results, indent=2))
+
+    # Without the arrays blob the heavy arrays are simply left out
+    light = decode_results(payload)
+    assert "transient_data" not in light["transients"]
+
+
+def test_decode_rejects_unknown_encoding():
+    """An unknown payload encoding raises instead of returning garbage"""
+    _, payload, _ = encode_results(sample_results())
+    with pytest.raises(ValueError):
+        decode_results(payload, encoding="brotli-v9")
+    assert decode_results(payload, encoding=PAYLOAD_ENCODING)["overall_score"] == 78.4
+
+
+def test_decode_reports_corrupt_blobs_as_value_errors():
+    """Truncated or damaged blobs raise ValueError like other undecodable payloads"""
+    _, payload, arrays_blob = encode_results(sample_results())
+    with pytest.raises(ValueError):
+        decode_results(payload[:len(payload) // 2])
+    with pytest.raises(ValueError):
+        decode_results(payload, b"not zlib")
@@ -0,0 +1,40 @@
+"""
+Unit tests for re-scoring stored results for the other instrumental flag
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to the path
+root_dir = Path(__file__).parent.parent.parent.absolute()
+sys.path.insert(0, str(root_dir))
+
+from app.core.audio_analyzer import load_stereo_audio, analyze_clarity
+from app.core.scoring import rescore_results, score_frequency_balance, calculate_overall_score
+
+AUDIO_PATH = str(root_dir / "tests" / "audio" / "test_stereo.wav")
+BAND_ENERGY = {"sub_bass": 40.0, "bass": 100.0, "low_mids": 70.0, "mids": 55.0, "high_mids": 30.0, "highs": 10.0, "air": 0.0}
+
+
+def test_rescoring_matches_analysis_with_the_other_flag():
+    """Re-scoring stored measurements gives what analyzing with the other flag gives"""
+    y, sr = load_stereo_audio(AUDIO_PATH)
+    stored = {
+        "frequency_balance": {"band_energy": BAND_ENERGY, "balance_score": score_frequency_balance(BAND_ENERGY, False)},
+        "clarity": analyze_clarity(y, sr, False)
+    }
+
+    rescored = rescore_results(stored, True)
+
+    assert rescored["clarity"] == analyze_clarity(y, sr, True)
+    assert rescored["frequency_balance"]["balance_score"] == score_frequency_balance(BAND_ENERGY, True)
+    assert rescored["frequency_balance"]["balance_score"] != stored["frequency_balance"]["balance_score"]
+    assert rescored["overall_score"] == calculate_overall_score(rescored)
+    assert stored["clarity"]["is_instrumental"] is False
+
+
+def test_sections_without_measurements_keep_their_scores():
+    """Results stored before the sample rate was kept are left as they are"""
+    results = {"clarity": {"clarity_score": 42.0, "spectral_contrast": 0.3, "spectral_flatness": 0.1, "spectral_centroid": 3000.0}}
+
+    assert rescore_results(results, True)["clarity"] == results["clarity"]
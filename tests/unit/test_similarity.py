@@ -0,0 +1,92 @@
+"""
+Unit tests for the similar-mix feature index
+"""
+
+import sys
+import numpy as np
+import pytest
+from pathlib import Path
+
+# Add the project root to the path
+root_dir = Path(__file__).parent.parent.parent.absolute()
+sys.path.insert(0, str(root_dir))
+
+from app.core import similarity
+from app.core.similarity import SimilarityIndex, extract_features, key_coordinates, FEATURE_NAMES
+
+
+def random_library(count, seed=3):
+    """Build random feature vectors with realistic scales"""
+    generator = np.random.default_rng(seed)
+    vectors = generator.normal(size=(count, len(FEATURE_NAMES))).astype(np.float32)
+    vectors[:, :7] = vectors[:, :7] * 10 + 70
+    return [f"song-{i}" for i in range(count)], vectors
+
+
+def test_extract_features_handles_missing_sections():
+    """A partial analysis still yields a full-length finite vector"""
+    vector = extract_features({
+        "frequency_balance": {"band_energy": {"bass": 80.0}},
+        "harmonic_content": {"key": "Am"}
+    })
+    assert vector.dtype == np.float32
+    assert vector.shape == (len(FEATURE_NAMES),)
+    assert np.all(np.isfinite(vector))
+
+
+def test_relative_keys_share_a_position():
+    """A minor key sits at its relative major on the circle of fifths"""
+    assert key_coordinates("Am") == pytest.approx(key_coordinates("C"))
+    assert key_coordinates("Unknown") == (0.0, 0.0)
+
+
+def test_query_returns_nearest_and_excludes_self():
+    """The closest songs are returned in order, without the query song"""
+    keys, vectors = random_library(500)
+    index = SimilarityIndex()
+    index.add_many(keys, vectors)
+
+    matches = index.query(vectors[0], k=3, exclude="song-0")
+    assert len(matches) == 3
+    assert "song-0" not in [key for key, _ in matches]
+    assert [distance for _, distance in matches] == sorted(distance for _, distance in matches)
+
+    # A copy of an indexed song is its own nearest neighbour
+    assert index.query(vectors[42], k=1)[0] == ("song-42", pytest.approx(0.0, abs=1e-4))
+
+
+def test_remove_and_replace():
+    """Removed songs are no longer returned; replaced vectors take effect"""
+    keys, vectors = random_library(50)
+    index = SimilarityIndex()
+    for key, vector in zip(keys, vectors):
+        index.add(key, vector)
+
+    assert index.remove("song-7")
+    assert len(index) == 49
+    assert index.query(vectors[7], k=1)[0][0] != "song-7"
+
+    index.add("song-3", vectors[10])
+    assert {key for key, _ in index.query(vectors[10], k=2)} == {"song-3", "song-10"}
+
+
+@pytest.mark.skipif(similarity.BallTree is None, reason="scikit-learn is not installed")
+def test_ball_tree_matches_brute_force():
+    """Large libraries switch to a ball tree with identical results"""
+    keys, vectors = random_library(3000)
+    brute = SimilarityIndex(ball_tree_threshold=10 ** 9)
+    tree = SimilarityIndex(ball_tree_threshold=1000)
+    brute.add_many(keys, vectors)
+    tree.add_many(keys, vectors)
+
+    # Songs added after the tree was built are searched by brute force
+    tree.query(vectors[0], k=1)
+    extra_keys, extra_vectors = random_library(20, seed=9)
+    for key, vector in zip(extra_keys, extra_vectors):
+        brute.add("extra-" + key, vector)
+        tree.add("extra-" + key, vector)
+
+    for vector in extra_vectors[:5]:
+        expected = [key for key, _ in brute.query(vector, k=5)]
+        assert [key for key, _ in tree.query(vector, k=5)] == expected
+    assert tree.stats()["ball_tree"]
@@ -0,0 +1,62 @@
+"""
+Unit tests for the upload storage budget
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add the project root to the path
+root_dir = Path(__file__).parent.parent.parent.absolute()
+sys.path.insert(0, str(root_dir))
+
+from app.core.upload_storage import UploadStorage
+
+
+def write_upload(uploads, visualizations, file_id, size):
+    """Create an upload of size bytes, half audio and half visualization"""
+    (uploads / file_id).mkdir(exist_ok=True)
+    (uploads / file_id / f"{file_id}.mp3").write_bytes(b"a" * (size // 2))
+    (visualizations / file_id).mkdir(exist_ok=True)
+    (visualizations / file_id / "waveform.png").write_bytes(b"v" * (size // 2))
+
+
+def test_least_recently_used_unpinned_uploads_are_evicted(tmp_path):
+    """Uploads over the budget are deleted oldest first, except those in use"""
+    uploads, visualizations = tmp_path / "uploads", tmp_path / "visualizations"
+    uploads.mkdir()
+    visualizations.mkdir()
+
+    # Uploads saved before the index existed are picked up once
+    write_upload(uploads, visualizations, "existing", 100)
+    storage = UploadStorage(str(uploads), max_bytes=300, artifact_dirs=[str(visualizations)])
+    assert storage.usage()["uploads"] == 1
+
+    for file_id in ("old", "viewed"):
+        write_upload(uploads, visualizations, file_id, 100)
+        storage.record(file_id, file_hash=f"hash-{file_id}")
+        time.sleep(0.01)
+    storage.touch(file_hash="hash-viewed")
+    assert storage.usage()["bytes"] == 300
+
+    with storage.pinned("existing"):
+        write_upload(uploads, visualizations, "new", 100)
+        storage.record("new")
+        # "existing" is the least recently used but in use, so "old" goes
+        assert not (uploads / "old").exists() and not (visualizations / "old").exists()
+        assert (uploads / "existing").exists()
+        assert storage.usage()["pinned"] == 1
+
+    usage = storage.usage()
+    assert usage["bytes"] <= 300
+    assert usage["pinned"] == 0
+    assert usage["evictions"] >= 1
+    assert (uploads / "viewed").exists() and (uploads / "new").exists()
+
+    # Uploads not accessed recently are expired regardless of the budget
+    expired = storage.expire(0)
+    assert {file_id for file_id, _ in expired} == {"existing", "viewed", "new"}
+    assert storage.usage()["uploads"] == 0
+    assert all(name.startswith(".storage_index") for name in os.listdir(uploads))
+    assert os.listdir(visualizations) == []
@@ -0,0 +1,80 @@
+"""
+Unit tests for the daily AI usage rollups
+"""
+
+import sys
+import random
+from datetime import datetime
+from pathlib import Path
+
+# Add the project root to the path
+root_dir = Path(__file__).parent.parent.parent.absolute()
+sys.path.insert(0, str(root_dir))
+
+from app.core.usage_rollups import (
+    LATENCY_BUCKET_BOUNDS, bucket_for, aggregate_usage_rows, merge_rollups,
+    percentile_from_buckets, summarize_rollup
+)
+
+
+def test_bucket_for():
+    """Response times land in the first bucket whose bound covers them"""
+    assert bucket_for(0.1) == 0
+    assert bucket_for(0.25) == 0
+    assert bucket_for(0.3) == 1
+    assert bucket_for(10_000) == len(LATENCY_BUCKET_BOUNDS)
+
+
+def test_aggregate_usage_rows_groups_by_day_and_model():
+    """Events are folded into one rollup per day, provider and model"""
+    rows = [
+        ("openrouter", "model-a", False, 1.0, datetime(2024, 5, 1, 9, 0)),
+        ("openrouter", "model-a", True, 3.0, datetime(2024, 5, 1, 18, 0)),
+        ("openrouter", "model-a", False, None, datetime(2024, 5, 2, 9, 0)),
+        ("openai", "model-b", True, 2.0, datetime(2024, 5, 1, 9, 0)),
+    ]
+    rollups = aggregate_usage_rows(rows)
+
+    assert len(rollups) == 3
+    first_day = rollups[(datetime(2024, 5, 1).date(), "openrouter", "model-a")]
+    assert first_day["request_count"] == 2
+    assert first_day["fallback_count"] == 1
+    assert first_day["response_time_sum"] == 4.0
+    assert first_day["response_time_sumsq"] == 10.0
+
+    # Events without a response time are counted but not timed
+    second_day = rollups[(datetime(2024, 5, 2).date(), "openrouter", "model-a")]
+    assert second_day["request_count"] == 1
+    assert second_day["timed_count"] == 0
+    assert second_day["buckets"] == {}
+
+
+def test_summary_matches_raw_statistics():
+    """Merged rollups give the same averages and close percentiles as the raw data"""
+    generator = random.Random(7)
+    times = [generator.uniform(0.5, 20.0) for _ in range(2000)]
+    rows = [("openrouter", "model-a", False, value, datetime(2024, 5, 1 + i % 20)) for i, value in enumerate(times)]
+
+    merged = None
+    for rollup in aggregate_usage_rows(rows).values():
+        if merged is None:
+            merged = rollup
+        else:
+            merge_rollups(merged, rollup)
+
+    summary = summarize_rollup(
+        merged["request_count"], merged["fallback_count"], merged["timed_count"],
+        merged["response_time_sum"], merged["response_time_sumsq"], merged["buckets"]
+    )
+    times.sort()
+    assert summary["count"] == 2000
+    assert abs(summary["avg_response_time"] - sum(times) / len(times)) < 1e-6
+    # Percentile error is bounded by the width of the bucket it falls into
+    assert abs(summary["p50_response_time"] - times[999]) <= 2.0
+    assert abs(summary["p95_response_time"] - times[1899]) <= 5.0
+
+
+def test_percentile_without_samples():
+    """No timed requests means no percentile instead of a division error"""
+    assert percentile_from_buckets({}, 0.95) is None
+    assert summarize_rollup(3, 0, 0, 0, 0, {})["avg_response_time"] is None
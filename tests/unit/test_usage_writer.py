@@ -0,0 +1,95 @@
+"""
+Unit tests for the batched analytics writer
+"""
+
+import sys
+import time
+import threading
+from pathlib import Path
+
+# Add the project root to the path
+root_dir = Path(__file__).parent.parent.parent.absolute()
+sys.path.insert(0, str(root_dir))
+
+from app.core.usage_writer import BatchedWriter
+
+
+class RecordingSink:
+    """Flush function that records every batch it receives"""
+
+    def __init__(self):
+        self.batches = []
+        self.event = threading.Event()
+
+    def __call__(self, rows):
+        self.batches.append(list(rows))
+        self.event.set()
+        return True
+
+
+def test_flushes_when_batch_is_full():
+    """A full batch is written as one call without waiting for the interval"""
+    sink = RecordingSink()
+    writer = BatchedWriter(sink, batch_size=3, flush_interval=60)
+    for i in range(3):
+        assert writer.submit(i)
+
+    assert sink.event.wait(2)
+    assert sink.batches == [[0, 1, 2]]
+    writer.close()
+
+
+def test_flushes_after_interval():
+    """Rows are written once the flush interval expires"""
+    sink = RecordingSink()
+    writer = BatchedWriter(sink, batch_size=100, flush_interval=0.1)
+    writer.submit("row")
+
+    assert sink.event.wait(2)
+    assert sink.batches == [["row"]]
+    writer.close()
+
+
+def test_close_flushes_remaining_rows():
+    """Shutting down writes rows that are still buffered"""
+    sink = RecordingSink()
+    writer = BatchedWriter(sink, batch_size=100, flush_interval=60)
+    writer.submit("a")
+    writer.submit("b")
+    writer.close()
+
+    assert [row for batch in sink.batches for row in batch] == ["a", "b"]
+    assert writer.stats()["written"] == 2
+
+
+def test_writer_restarts_after_close():
+    """Rows submitted after close() are still written in the background"""
+    sink = RecordingSink()
+    writer = BatchedWriter(sink, batch_size=1, flush_interval=60)
+    writer.submit("early")
+    writer.close()
+    sink.event.clear()
+
+    writer.submit("late")
+    assert sink.event.wait(2)
+    assert sink.batches == [["early"], ["late"]]
+    writer.close()
+
+
+def test_full_buffer_drops_rows():
+    """Rows beyond the buffer bound are dropped instead of blocking the caller"""
+    release = threading.Event()
+
+    def slow_sink(rows):
+        release.wait(2)
+        return True
+
+    writer = BatchedWriter(slow_sink, batch_size=1, flush_interval=60, max_buffer=2)
+    writer.submit(0)
+    time.sleep(0.1)  # Let the background thread pick up the first row
+    results = [writer.submit(i) for i in range(1, 5)]
+
+    assert results.count(False) >= 1
+    assert writer.stats()["dropped"] == results.count(False)
+    release.set()
+    writer.close()